@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Ledger Query Benchmarks
+
+Measures /ledgers/{ledger_id}/query, which answers from the rollups kept
+by streaming ingest, against recomputing the same answers from the raw
+entries. The ledger is a seeded synthetic one (Zipf-distributed
+counterparties, signed log-normal amounts, a few undated rows and blank
+account or counterparty cells), ingested into a temporary stats database,
+so two runs with the same arguments measure the same work.
+
+Usage (from services/dot-finance):
+    python -m bench.ledger_bench run --rows 1000000 --output ../../benchmark-results/ledger.json
+
+``run`` measures:
+- ingest: ingest_file() over the ledger written as CSV (rows/s, rollup groups)
+- per query scenario (totals, trends, top-N; with and without filters):
+  - rollup: query_ledger() latency percentiles
+  - raw_memory: the same answer from the entries already parsed in memory
+  - raw_scan: reading and parsing the CSV, then the same answer (what a
+    service without rollups would do per question)
+and checks that the rollup and raw answers agree.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+# =============================================================================
+# Synthetic Ledger
+# =============================================================================
+
+def make_ledger(rows: int, accounts: int, counterparties: int, months: int, zipf: float, seed: int) -> pd.DataFrame:
+    """Entries over ``months`` months from 2023-01; counterparty use follows a Zipf distribution"""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2023-01-01", "D").astype(np.int64)
+    days = rng.integers(start, start + months * 30, rows)
+    dates = pd.Series(pd.to_datetime(days, unit="D").strftime("%Y-%m-%d"))
+    dates[rng.random(rows) < 0.005] = ""
+    party = np.minimum(rng.zipf(zipf, rows), counterparties) - 1
+    sign = np.where(rng.random(rows) < 0.7, -1.0, 1.0)
+    account = pd.Series((4000 + rng.integers(0, accounts, rows)).astype(str))
+    account[rng.random(rows) < 0.002] = ""
+    counterparty = pd.Series(np.char.add("V", np.char.zfill(party.astype(str), 5)))
+    counterparty[rng.random(rows) < 0.005] = ""
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "date": dates,
+        "account": account,
+        "counterparty": counterparty,
+        "amount": np.round(sign * np.exp(rng.normal(5, 1.2, rows)), 2),
+    })
+
+
+def make_scenarios(ledger: pd.DataFrame, queries: int, seed: int) -> Dict[str, List[Dict[str, Any]]]:
+    """Query parameters per scenario; filters cycle through the busiest accounts and counterparties"""
+    rng = np.random.default_rng(seed + 1)
+    accounts = ledger["account"].value_counts().index[:20].tolist()
+    parties = ledger["counterparty"].value_counts().index[:200].tolist()
+    periods = sorted(p for p in ledger["date"].str[:7].unique() if p)
+
+    def pick(values: List[str]) -> str:
+        return values[int(rng.integers(0, len(values)))]
+
+    def window() -> Tuple[str, str]:
+        first = int(rng.integers(0, max(1, len(periods) - 3)))
+        return periods[first], periods[min(len(periods) - 1, first + 2)]
+
+    scenarios: Dict[str, List[Dict[str, Any]]] = {
+        "totals": [], "totals_account_window": [], "totals_counterparty": [], "trend_month_account": [],
+        "trend_quarter": [], "top_counterparties": [], "top_counterparties_account_window": [], "top_accounts_outflow": [],
+    }
+    for _ in range(queries):
+        start, end = window()
+        scenarios["totals"].append({})
+        scenarios["totals_account_window"].append({"account": pick(accounts), "start": start, "end": end})
+        scenarios["totals_counterparty"].append({"counterparty": pick(parties)})
+        scenarios["trend_month_account"].append({"kind": "trend", "account": pick(accounts)})
+        scenarios["trend_quarter"].append({"kind": "trend", "granularity": "quarter"})
+        scenarios["top_counterparties"].append({"kind": "top", "limit": 10})
+        scenarios["top_counterparties_account_window"].append(
+            {"kind": "top", "account": pick(accounts), "start": start, "end": end, "limit": 10}
+        )
+        scenarios["top_accounts_outflow"].append({"kind": "top", "by": "account", "metric": "outflow", "limit": 10})
+    return scenarios
+
+
+# =============================================================================
+# Raw Recompute
+# =============================================================================
+
+def parse_raw(path: str) -> pd.DataFrame:
+    """The CSV as the columns a raw answer needs (valid amounts only, "YYYY-MM" periods)"""
+    frame = pd.read_csv(path, dtype={"account": str, "counterparty": str, "date": str}, keep_default_na=False)
+    amount = pd.to_numeric(frame["amount"], errors="coerce")
+    frame = frame.assign(amount=amount)[amount.notna()]
+    period = pd.to_datetime(frame["date"], errors="coerce").dt.strftime("%Y-%m").fillna("")
+    return pd.DataFrame({
+        "period": period.to_numpy(),
+        "account": frame["account"].to_numpy(),
+        "counterparty": frame["counterparty"].to_numpy(),
+        "amount": frame["amount"].to_numpy(),
+    })
+
+
+def raw_answer(api, frame: pd.DataFrame, params: Dict[str, Any]) -> Any:
+    """What query_ledger() answers for ``params``, computed from the entries"""
+    kind = params.get("kind", "totals")
+    mask = np.ones(len(frame), dtype=bool)
+    for dimension in ("account", "counterparty"):
+        if params.get(dimension) is not None:
+            mask &= (frame[dimension] == params[dimension]).to_numpy()
+    start = api.normalize_period(params.get("start"), end=False)
+    end = api.normalize_period(params.get("end"), end=True)
+    period = frame["period"]
+    if start or end or kind == "trend":
+        mask &= (period != "").to_numpy()
+    if start:
+        mask &= (period >= start).to_numpy()
+    if end:
+        mask &= (period <= end).to_numpy()
+    selected = frame[mask]
+    if kind == "totals":
+        return float(selected["amount"].sum())
+    if kind == "trend":
+        bucket = selected["period"]
+        if params.get("granularity") == "quarter":
+            bucket = bucket.str[:4] + "-Q" + ((bucket.str[5:].astype(int) + 2) // 3).astype(str)
+        elif params.get("granularity") == "year":
+            bucket = bucket.str[:4]
+        return selected["amount"].groupby(bucket).sum().sort_index().tolist()
+    metric = params.get("metric", "total")
+    values = {
+        "total": selected["amount"],
+        "inflow": selected["amount"].clip(lower=0),
+        "outflow": selected["amount"].clip(upper=0),
+        "count": pd.Series(1, index=selected.index),
+    }[metric]
+    ranked = values.groupby(selected[params.get("by", "counterparty")]).sum()
+    order = pd.DataFrame({"key": ranked.index, "rank": -ranked.abs().to_numpy()}).sort_values(["rank", "key"])
+    return order["key"].head(params.get("limit", 10)).tolist()
+
+
+def rollup_answer(result: Dict[str, Any], params: Dict[str, Any]) -> Any:
+    """The part of a query_ledger() result raw_answer() reproduces"""
+    if result["kind"] == "totals":
+        return float(result["totals"]["total"])
+    if result["kind"] == "trend":
+        return [point["total"] for point in result["points"]]
+    return [row[params.get("by", "counterparty")] for row in result["top"]]
+
+
+def answers_match(rollup: Any, raw: Any) -> bool:
+    if isinstance(rollup, list) and rollup and isinstance(rollup[0], str):
+        return rollup == raw
+    return len(np.atleast_1d(rollup)) == len(np.atleast_1d(raw)) and bool(np.allclose(rollup, raw, rtol=1e-9, atol=1e-6))
+
+
+# =============================================================================
+# Measurement
+# =============================================================================
+
+def latency_stats(samples: List[float]) -> Dict[str, Any]:
+    """Percentiles in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def time_calls(fn: Callable[[Dict[str, Any]], Any], args: List[Dict[str, Any]], warmup: int) -> Dict[str, Any]:
+    for arg in args[:warmup]:
+        fn(arg)
+    samples = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - start)
+    return latency_stats(samples)
+
+
+def run_benchmark(params: Dict[str, Any]) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="ledger-bench-") as tmp:
+        os.environ["FINANCE_STATS_DB"] = os.path.join(tmp, "stats.db")
+        sys.path.insert(0, SRC_DIR)
+        import server as api  # reads FINANCE_STATS_DB at import
+
+        ledger = make_ledger(
+            params["rows"], params["accounts"], params["counterparties"], params["months"], params["zipf"], params["seed"]
+        )
+        scenarios = make_scenarios(ledger, params["queries"], params["seed"])
+        path = os.path.join(tmp, "ledger.csv")
+        ledger.to_csv(path, index=False)
+        size = os.path.getsize(path)
+        del ledger
+
+        results: Dict[str, Any] = {}
+        start = time.perf_counter()
+        ingested = api.ingest_file("bench", path, "csv", api.AnomalyOptions(), None, params["chunk_rows"])
+        seconds = time.perf_counter() - start
+        results["ingest"] = {
+            "rows": ingested["rows"],
+            "bytes": size,
+            "rollup_groups": ingested["rollup_groups"],
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(ingested["rows"] / seconds, 1) if seconds > 0 else None,
+        }
+
+        start = time.perf_counter()
+        raw = parse_raw(path)
+        parse_seconds = time.perf_counter() - start
+
+        for name, calls in scenarios.items():
+            rollup = time_calls(lambda p: api.query_ledger("bench", **p), calls, params["warmup"])
+            raw_calls = calls[:params["raw_queries"]]
+            memory = time_calls(lambda p: raw_answer(api, raw, p), raw_calls, 1)
+            # A scan re-reads the file per question; one timed call plus the measured parse
+            scan_ms = parse_seconds * 1000.0 + memory["p50_ms"]
+            mismatches = sum(
+                not answers_match(rollup_answer(api.query_ledger("bench", **p), p), raw_answer(api, raw, p))
+                for p in raw_calls
+            )
+            results[name] = {
+                "rollup": rollup,
+                "raw_memory": memory,
+                "raw_scan": {"p50_ms": round(scan_ms, 3)},
+                "speedup_memory": round(memory["p50_ms"] / rollup["p50_ms"], 1) if rollup["p50_ms"] else None,
+                "speedup_scan": round(scan_ms / rollup["p50_ms"], 1) if rollup["p50_ms"] else None,
+                "mismatches": mismatches,
+            }
+    return results
+
+
+# =============================================================================
+# Commands
+# =============================================================================
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_results(results: Dict[str, Any]):
+    ingest = results["ingest"]
+    print(
+        f"\n== ingest  {ingest['rows_per_sec']:>10} rows/s  ({ingest['rows']} rows, {ingest['bytes'] / 1e6:.1f} MB, "
+        f"{ingest['rollup_groups']} rollup groups in {ingest['seconds']}s)"
+    )
+    print(f"\n{'scenario':36s} {'rollup p50':>11s} {'p99':>9s} {'raw mem p50':>12s} {'raw scan':>10s} {'x mem':>7s} {'x scan':>8s}")
+    for name, stats in results.items():
+        if name == "ingest":
+            continue
+        print(
+            f"{name:36s} {stats['rollup']['p50_ms']:>9.3f}ms {stats['rollup']['p99_ms']:>7.3f}ms "
+            f"{stats['raw_memory']['p50_ms']:>10.3f}ms {stats['raw_scan']['p50_ms']:>8.0f}ms "
+            f"{stats['speedup_memory']:>7} {stats['speedup_scan']:>8}"
+            + (f"  MISMATCHES {stats['mismatches']}" if stats["mismatches"] else "")
+        )
+
+
+def cmd_run(args) -> int:
+    params = {
+        "rows": args.rows,
+        "accounts": args.accounts,
+        "counterparties": args.counterparties,
+        "months": args.months,
+        "zipf": args.zipf,
+        "chunk_rows": args.chunk_rows,
+        "queries": args.queries,
+        "raw_queries": args.raw_queries,
+        "warmup": args.warmup,
+        "seed": args.seed,
+    }
+    results = run_benchmark(params)
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": params,
+        },
+        "results": results,
+    }
+    print_results(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[bench] wrote {args.output}")
+    mismatched = sum(stats.get("mismatches", 0) for stats in results.values())
+    if mismatched:
+        print(f"[bench] {mismatched} rollup answer(s) differ from the raw recompute", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="Dot.Finance ledger query benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument("--rows", type=int, default=1000000, help="ledger entries")
+    run.add_argument("--accounts", type=int, default=60, help="distinct accounts")
+    run.add_argument("--counterparties", type=int, default=5000, help="distinct counterparties")
+    run.add_argument("--months", type=int, default=24, help="months the entries span")
+    run.add_argument("--zipf", type=float, default=1.3, help="Zipf exponent of counterparty use")
+    run.add_argument("--chunk-rows", type=int, default=100000, help="ingest chunk size")
+    run.add_argument("--queries", type=int, default=200, help="rollup queries per scenario")
+    run.add_argument("--raw-queries", type=int, default=5, help="raw recomputes per scenario (each scans every entry)")
+    run.add_argument("--warmup", type=int, default=10, help="untimed queries before each scenario")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--output", help="write results as JSON")
+    run.set_defaults(func=cmd_run)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,1241 @@
-
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 import uvicorn
 import pandas as pd
 import numpy as np
 import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Literal, Optional, Tuple
+
+try:
+    from scipy.stats import chi2 as _chi2
+except ImportError:  # only the Benford p-value needs it
+    _chi2 = None
+
+try:
+    import pyarrow.parquet as _parquet
+except ImportError:  # only Parquet uploads need it
+    _parquet = None
+
+try:
+    from .telemetry import Telemetry
+except ImportError:  # run as a script from src/
+    from telemetry import Telemetry
+
+# Request/stage latency histograms are served on /metrics; FINANCE_PROFILE_HZ > 0
+# also samples thread stacks for /debug/profile (see telemetry.py).
+FINANCE_PROFILE_HZ = float(os.getenv("FINANCE_PROFILE_HZ", "0"))
+
+# Ledger anomaly detector defaults; each can be overridden per request.
+# FINANCE_Z_THRESHOLD: |robust z| above which an amount is an outlier for its
+# account (3.5 per Iglewicz & Hoaglin); accounts with fewer than
+# FINANCE_MIN_GROUP_SIZE entries are not scored. FINANCE_ROUND_UNIT: amounts that
+# are exact multiples of it are flagged as round. FINANCE_NEAR_DUP_DAYS and
+# FINANCE_NEAR_DUP_TOLERANCE: same counterparty, amounts within the tolerance,
+# posted within that many days. FINANCE_BENFORD_MIN: entries an account needs
+# for its own Benford test. FINANCE_MAX_ANOMALIES: rows listed in a response.
+FINANCE_Z_THRESHOLD = float(os.getenv("FINANCE_Z_THRESHOLD", "3.5"))
+FINANCE_MIN_GROUP_SIZE = int(os.getenv("FINANCE_MIN_GROUP_SIZE", "8"))
+FINANCE_ROUND_UNIT = float(os.getenv("FINANCE_ROUND_UNIT", "1000"))
+FINANCE_NEAR_DUP_DAYS = int(os.getenv("FINANCE_NEAR_DUP_DAYS", "3"))
+FINANCE_NEAR_DUP_TOLERANCE = float(os.getenv("FINANCE_NEAR_DUP_TOLERANCE", "1.0"))
+FINANCE_BENFORD_MIN = int(os.getenv("FINANCE_BENFORD_MIN", "300"))
+FINANCE_MAX_ANOMALIES = int(os.getenv("FINANCE_MAX_ANOMALIES", "500"))
+
+# Streaming ingest (/ingest/ledger/{ledger_id}): uploads are spooled to
+# FINANCE_SPOOL_DIR (system temp dir when empty) and read FINANCE_CHUNK_ROWS rows
+# at a time. Per-account running statistics live in the SQLite file
+# FINANCE_STATS_DB, so later uploads are scored against all earlier ones. The
+# same file holds the month x account x counterparty rollups that
+# /ledgers/{ledger_id}/query answers from.
+FINANCE_CHUNK_ROWS = int(os.getenv("FINANCE_CHUNK_ROWS", "100000"))
+FINANCE_SPOOL_DIR = os.getenv("FINANCE_SPOOL_DIR", "") or None
+FINANCE_STATS_DB = os.getenv("FINANCE_STATS_DB", "finance_stats.db")
 
 app = FastAPI(title="Dot.Finance", version="0.1.0")
 
+_telemetry = Telemetry("finance", profile_hz=FINANCE_PROFILE_HZ)
+_telemetry.instrument(app)
+
+
+class AnomalyOptions(BaseModel):
+    z_threshold: float = Field(FINANCE_Z_THRESHOLD, gt=0)
+    z_scale: Literal["log", "linear"] = "log"  # "log" scores sign(x) * log10(1 + |x|), "linear" the raw amounts
+    min_group_size: int = Field(FINANCE_MIN_GROUP_SIZE, ge=0)
+    round_unit: float = Field(FINANCE_ROUND_UNIT, ge=0)
+    near_duplicate_days: int = Field(FINANCE_NEAR_DUP_DAYS, ge=0)
+    near_duplicate_tolerance: float = Field(FINANCE_NEAR_DUP_TOLERANCE, ge=0)
+    benford_min_entries: int = FINANCE_BENFORD_MIN
+    max_anomalies: int = Field(FINANCE_MAX_ANOMALIES, ge=0)
+
+
+class LedgerAnalysisRequest(AnomalyOptions):
+    entries: Optional[List[Dict[str, Any]]] = None  # one object per entry
+    columns: Optional[Dict[str, List[Any]]] = None  # or column name -> values (cheaper for big ledgers)
+    fields: Optional[Dict[str, str]] = None  # role (amount, account, date, counterparty, id) -> column name
+
+
+# =============================================================================
+# Ledger Frames
+# =============================================================================
+
+# Column names tried (case-insensitively) for each role when not given in "fields"
+FIELD_CANDIDATES = {
+    "amount": ("amount", "value", "sum", "total"),
+    "account": ("account", "account_id", "gl_account", "account_number"),
+    "date": ("date", "posting_date", "posted_at", "booking_date", "transaction_date"),
+    "counterparty": ("counterparty", "vendor", "payee", "supplier", "customer"),
+    "id": ("id", "entry_id", "reference", "voucher"),
+}
+
+# Row flags, as bits of LedgerFrame.flags
+FLAG_BITS = {
+    "robust_z": 1,
+    "duplicate": 2,
+    "near_duplicate": 4,
+    "round_amount": 8,
+    "weekend": 16,
+    "running_z": 32,  # streaming ingest: z against the account's running mean/std
+}
+
+# Weight of each flag in a row's anomaly score; an outlier adds |z| / threshold
+# instead. Round amounts and weekend postings are weak signals on their own.
+FLAG_WEIGHTS = {"duplicate": 2.0, "near_duplicate": 1.5, "round_amount": 0.5, "weekend": 0.5}
+
+# Largest |amount| whose minor units fit in int64 (about 9.2e18 cents), with
+# headroom; larger amounts would all overflow to the same INT64_MIN
+MAX_AMOUNT = 9e16
+
+BENFORD_EXPECTED = np.log10(1.0 + 1.0 / np.arange(1, 10))
+
+# Nigrini's first-digit MAD conformity ranges
+BENFORD_CONFORMITY = ((0.006, "close"), (0.012, "acceptable"), (0.015, "marginal"))
+
+
+def resolve_fields(columns: List[str], overrides: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Role -> column name for the columns present; amount is required"""
+    overrides = overrides or {}
+    by_lower = {str(c).lower(): c for c in columns}
+    fields = {}
+    for role, candidates in FIELD_CANDIDATES.items():
+        name = overrides.get(role)
+        if name is not None:
+            if name not in columns:
+                raise HTTPException(status_code=400, detail=f"missing_column: {role} column {name!r} not in ledger")
+            fields[role] = name
+            continue
+        for candidate in candidates:
+            if candidate in by_lower:
+                fields[role] = by_lower[candidate]
+                break
+    if "amount" not in fields:
+        raise HTTPException(
+            status_code=400,
+            detail=f"missing_column: no amount column (tried {', '.join(FIELD_CANDIDATES['amount'])}; set fields.amount)",
+        )
+    return fields
+
+
+class LedgerFrame:
+    """
+    A ledger in the columnar form the detectors work on.
+
+    ``amount`` is float64 (NaN where unparseable), ``cents`` its int64
+    minor units (0 where not ``valid``: unparseable, or too large for int64
+    cents), ``account``/``counterparty`` int64 group codes (-1 when the
+    column is absent), ``day`` int64 days since the epoch with ``has_day``
+    marking parseable dates. ``frame`` keeps the original columns for
+    reporting.
+    """
+
+    def __init__(self, frame: pd.DataFrame, fields: Dict[str, str]):
+        self.frame = frame
+        self.fields = fields
+        self.rows = len(frame)
+        self.amount = pd.to_numeric(frame[fields["amount"]], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        self.valid = np.abs(self.amount) < MAX_AMOUNT
+        self.cents = np.where(self.valid, np.round(np.nan_to_num(self.amount) * 100.0), 0).astype(np.int64)
+        self.account, self.account_labels = self._codes("account")
+        self.counterparty, self.counterparty_labels = self._codes("counterparty")
+        self.day = np.zeros(self.rows, dtype=np.int64)
+        self.has_day = np.zeros(self.rows, dtype=bool)
+        if "date" in fields:
+            # UTC first: a column mixing offsets has no single timezone to parse into
+            dates = pd.to_datetime(frame[fields["date"]], errors="coerce", utc=True).dt.tz_localize(None)
+            # At the parsed resolution; nanoseconds would overflow past 2262
+            days = dates.to_numpy().astype("datetime64[D]")
+            self.has_day = ~np.isnat(days)
+            self.day = np.where(self.has_day, days.astype(np.int64), 0)
+        # Filled in by the detectors
+        self.flags = np.zeros(self.rows, dtype=np.uint8)
+        self.score = np.zeros(self.rows, dtype=np.float64)
+        self.z = np.full(self.rows, np.nan)
+        self.duplicate_group = np.full(self.rows, -1, dtype=np.int64)
+
+    def _codes(self, role: str):
+        if role not in self.fields:
+            return np.full(self.rows, -1, dtype=np.int64), None
+        codes, labels = pd.factorize(self.frame[self.fields[role]], use_na_sentinel=False)
+        return codes.astype(np.int64), labels
+
+    def flag(self, name: str, mask: np.ndarray, score: Any):
+        self.flags[mask] |= FLAG_BITS[name]
+        self.score[mask] += score[mask] if isinstance(score, np.ndarray) else score
+
+
+def load_ledger(request: LedgerAnalysisRequest) -> pd.DataFrame:
+    if request.columns is not None:
+        lengths = {len(values) for values in request.columns.values()}
+        if len(lengths) > 1:
+            raise HTTPException(status_code=400, detail="invalid_ledger: columns have different lengths")
+        return pd.DataFrame(request.columns)
+    if request.entries is not None:
+        return pd.DataFrame.from_records(request.entries)
+    raise HTTPException(status_code=400, detail="invalid_ledger: provide entries or columns")
+
+
+# =============================================================================
+# Detectors
+# =============================================================================
+
+def robust_z_scores(amount: np.ndarray, groups: np.ndarray, min_group_size: int) -> np.ndarray:
+    """
+    Modified z-score of each amount within its group: 0.6745 (x - median) / MAD.
+
+    Groups whose MAD is 0 (mostly identical amounts) fall back to the mean
+    absolute deviation (scaled by 1.2533); groups smaller than
+    ``min_group_size`` and unparseable amounts get NaN.
+    """
+    by_group = pd.Series(amount).groupby(groups)
+    median = by_group.transform("median").to_numpy()
+    count = by_group.transform("count").to_numpy()
+    deviation = np.abs(amount - median)
+    by_deviation = pd.Series(deviation).groupby(groups)
+    mad = by_deviation.transform("median").to_numpy()
+    mean_ad = by_deviation.transform("mean").to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(
+            mad > 0,
+            0.6745 * (amount - median) / mad,
+            np.where(mean_ad > 0, (amount - median) / (1.253314 * mean_ad), 0.0),
+        )
+    z[count < max(1, min_group_size)] = np.nan
+    return z
+
+
+def first_digits(amount: np.ndarray) -> np.ndarray:
+    """First significant digit of |amount| (1-9); 0 below 10 or when not finite"""
+    magnitude = np.abs(amount)
+    usable = np.isfinite(magnitude) & (magnitude >= 10)
+    values = magnitude[usable]
+    mantissa = values / 10.0 ** np.floor(np.log10(values))
+    # log10 rounding can land a power of ten one decade off
+    mantissa = np.where(mantissa >= 10, mantissa / 10, np.where(mantissa < 1, mantissa * 10, mantissa))
+    digits = np.zeros(len(amount), dtype=np.int8)
+    digits[usable] = np.clip(mantissa.astype(np.int8), 1, 9)
+    return digits
+
+
+def benford_conformity(mad: float) -> str:
+    for limit, label in BENFORD_CONFORMITY:
+        if mad <= limit:
+            return label
+    return "nonconformity"
+
+
+def benford_test(counts: np.ndarray) -> Dict[str, Any]:
+    """First-digit test of counts[0..8] (digits 1-9) against Benford's law"""
+    n = int(counts.sum())
+    if n == 0:
+        return {"entries": 0, "conformity": "insufficient_data"}
+    observed = counts / n
+    expected = BENFORD_EXPECTED * n
+    mad = float(np.abs(observed - BENFORD_EXPECTED).mean())
+    chi_square = float(((counts - expected) ** 2 / expected).sum())
+    return {
+        "entries": n,
+        "mad": round(mad, 5),
+        "chi_square": round(chi_square, 3),
+        "p_value": float(_chi2.sf(chi_square, 8)) if _chi2 is not None else None,
+        "conformity": benford_conformity(mad),
+        "digits": [
+            {"digit": d + 1, "count": int(counts[d]), "observed": round(float(observed[d]), 5), "expected": round(float(BENFORD_EXPECTED[d]), 5)}
+            for d in range(9)
+        ],
+    }
+
+
+def benford_by_group(digits: np.ndarray, groups: np.ndarray, groups_count: int) -> np.ndarray:
+    """Digit counts per group: a (groups_count, 9) matrix"""
+    usable = (digits > 0) & (groups >= 0)
+    flat = np.bincount(groups[usable] * 9 + (digits[usable] - 1), minlength=groups_count * 9)
+    return flat.reshape(groups_count, 9)
+
+
+def scaled_amounts(amount: np.ndarray, scale: str) -> np.ndarray:
+    """Amounts on the scale outliers are scored on"""
+    # Amounts are heavy-tailed (lognormal-ish), so on a linear scale the tail of
+    # every busy account would be "outliers"; the log scale keeps z near normal
+    if scale == "linear":
+        return amount
+    return np.sign(amount) * np.log10(1.0 + np.abs(amount))
+
+
+def detect_outliers(ledger: LedgerFrame, options: AnomalyOptions) -> Dict[str, Any]:
+    z = robust_z_scores(scaled_amounts(ledger.amount, options.z_scale), ledger.account, options.min_group_size)
+    ledger.z = z
+    with np.errstate(invalid="ignore"):
+        outlier = np.abs(z) > options.z_threshold
+    ledger.flag("robust_z", outlier, np.abs(np.nan_to_num(z)) / options.z_threshold)
+    return {
+        "flagged": int(outlier.sum()),
+        "scored": int(np.isfinite(z).sum()),
+        "threshold": options.z_threshold,
+        "scale": options.z_scale,
+        "by_account": "account" in ledger.fields,
+    }
+
+
+def detect_benford(ledger: LedgerFrame, options: AnomalyOptions) -> Dict[str, Any]:
+    digits = first_digits(ledger.amount)
+    report = benford_test(np.bincount(digits[digits > 0], minlength=10)[1:])
+    if ledger.account_labels is not None:
+        matrix = benford_by_group(digits, ledger.account, len(ledger.account_labels))
+        totals = matrix.sum(axis=1)
+        tested = np.flatnonzero(totals >= max(1, options.benford_min_entries))
+        report["accounts_tested"] = int(len(tested))
+        report["accounts"] = []
+        if len(tested):
+            shares = matrix[tested] / totals[tested, None]
+            mads = np.abs(shares - BENFORD_EXPECTED).mean(axis=1)
+            worst = np.argsort(-mads, kind="stable")
+            report["accounts"] = [
+                {
+                    "account": _plain(ledger.account_labels[tested[i]]),
+                    "entries": int(totals[tested[i]]),
+                    "mad": round(float(mads[i]), 5),
+                    "conformity": benford_conformity(float(mads[i])),
+                }
+                for i in worst
+                if mads[i] > BENFORD_CONFORMITY[-1][0]
+            ][:50]
+    return report
+
+
+def _row_hash(*columns: np.ndarray) -> np.ndarray:
+    return pd.util.hash_pandas_object(pd.DataFrame({str(i): c for i, c in enumerate(columns)}), index=False).to_numpy()
+
+
+def _window_order(party: np.ndarray, major: np.ndarray, width: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Rows in (party, major) order and, per sorted row, the end of its window:
+    the later rows of its party with ``major`` at most ``width`` more. None when
+    the packed (party, major) key would not fit in 63 bits.
+    """
+    low = int(major.min())
+    width = min(width, int(major.max()) - low)
+    span = int(major.max()) - low + width + 1
+    if int(party.max()) * span + span >= 2 ** 63:
+        return None
+    packed = party * span + (major - low)
+    order = np.argsort(packed, kind="stable")
+    packed = packed[order]
+    return order, np.searchsorted(packed, packed + width, side="right")
+
+
+def _near_pairs(party: np.ndarray, cents: np.ndarray, day: np.ndarray, key: np.ndarray,
+                tolerance: int, days: int) -> Tuple[np.ndarray, int]:
+    """
+    Rows with a partner of the same party at most ``tolerance`` cents and
+    ``days`` days away and a different exact key, and the number of such
+    pairs. Rows are sorted by (party, day) or (party, cents), whichever gives
+    the smaller windows, and each is compared with every row of its window.
+    """
+    near = np.zeros(len(party), dtype=bool)
+    if not len(party) or tolerance < 0 or days < 0:
+        return near, 0
+    party = party - party.min()
+    windows = [(_window_order(party, day, days), cents, tolerance), (_window_order(party, cents, tolerance), day, days)]
+    windows = [(w[0], w[1], other, width) for w, other, width in windows if w is not None]
+    # Both orders share the row positions, so the ends alone compare the total window sizes
+    order, end, other, width = min(windows, key=lambda w: int(w[1].sum()))
+    other, key = other[order], key[order]
+    near_sorted = np.zeros(len(order), dtype=bool)
+    pairs = 0
+    # Offset by offset over the rows whose window reaches that far, so the work is the total window size
+    active = np.arange(len(order))
+    offset = 1
+    while True:
+        active = active[end[active] > active + offset]
+        if not len(active):
+            break
+        partner = active + offset
+        pair = (np.abs(other[partner] - other[active]) <= width) & (key[partner] != key[active])
+        near_sorted[active[pair]] = True
+        near_sorted[partner[pair]] = True
+        pairs += int(pair.sum())
+        offset += 1
+    near[order[near_sorted]] = True
+    return near, pairs
+
+
+def detect_duplicates(ledger: LedgerFrame, options: AnomalyOptions) -> Dict[str, Any]:
+    """
+    Exact duplicates: same counterparty (or account), amount and day, found
+    by grouping rows on a 64-bit hash of those columns. Near duplicates:
+    same counterparty, amounts at most ``near_duplicate_tolerance`` apart and
+    posted at most ``near_duplicate_days`` apart, without being exact copies;
+    every such pair is found (see _near_pairs).
+    """
+    if "date" not in ledger.fields:
+        return {"skipped": "no date column"}
+    party = ledger.counterparty if "counterparty" in ledger.fields else ledger.account
+    usable = ledger.valid & ledger.has_day
+
+    exact_key = _row_hash(party, ledger.cents, ledger.day)
+    groups, _ = pd.factorize(np.where(usable, exact_key, 0))
+    exact = (np.bincount(groups)[groups] > 1) & usable
+    ledger.duplicate_group = np.where(exact, groups, -1)
+    ledger.flag("duplicate", exact, FLAG_WEIGHTS["duplicate"])
+
+    rows = np.flatnonzero(usable)
+    near_rows, pairs = _near_pairs(
+        party[rows], ledger.cents[rows], ledger.day[rows], exact_key[rows],
+        int(round(options.near_duplicate_tolerance * 100)), options.near_duplicate_days,
+    )
+    near = np.zeros(ledger.rows, dtype=bool)
+    near[rows[near_rows]] = True
+    ledger.flag("near_duplicate", near, FLAG_WEIGHTS["near_duplicate"])
+    return {
+        "duplicate_rows": int(exact.sum()),
+        "duplicate_groups": int(len(np.unique(ledger.duplicate_group[exact]))),
+        "near_duplicate_rows": int(near.sum()),
+        "near_duplicate_pairs": pairs,
+        "key": "counterparty" if "counterparty" in ledger.fields else "account",
+    }
+
+
+def detect_round_and_weekend(ledger: LedgerFrame, options: AnomalyOptions) -> Dict[str, Any]:
+    unit = int(round(options.round_unit * 100))
+    round_amount = ledger.valid & (ledger.cents != 0) & (ledger.cents % unit == 0) if unit > 0 else np.zeros(ledger.rows, dtype=bool)
+    ledger.flag("round_amount", round_amount, FLAG_WEIGHTS["round_amount"])
+    report = {"round_amount": {"flagged": int(round_amount.sum()), "unit": options.round_unit}}
+    if "date" in ledger.fields:
+        # 1970-01-01 was a Thursday: (day + 3) % 7 counts from Monday = 0
+        weekend = ledger.has_day & ((ledger.day + 3) % 7 >= 5)
+        ledger.flag("weekend", weekend, FLAG_WEIGHTS["weekend"])
+        report["weekend"] = {"flagged": int(weekend.sum())}
+    else:
+        report["weekend"] = {"skipped": "no date column"}
+    return report
+
+
+# =============================================================================
+# Analysis
+# =============================================================================
+
+def _plain(value: Any) -> Any:
+    """A numpy/pandas scalar as a JSON-friendly Python value"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value)
+    if value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def top_anomalies(ledger: LedgerFrame, limit: int) -> List[Dict[str, Any]]:
+    """The ``limit`` highest-scoring flagged rows, most anomalous first"""
+    flagged = np.flatnonzero(ledger.flags)
+    top = flagged[np.argsort(-ledger.score[flagged], kind="stable")[: max(0, limit)]]
+    columns = {role: ledger.frame[name].to_numpy() for role, name in ledger.fields.items() if role != "amount"}
+    anomalies = []
+    for row in top.tolist():
+        bits = int(ledger.flags[row])
+        entry = {
+            "row": row,
+            "score": round(float(ledger.score[row]), 4),
+            "flags": [name for name, bit in FLAG_BITS.items() if bits & bit],
+            "amount": _plain(ledger.amount[row]),
+        }
+        for role, values in columns.items():
+            entry[role] = _plain(values[row])
+        if np.isfinite(ledger.z[row]):
+            entry["z"] = round(float(ledger.z[row]), 3)
+        if bits & FLAG_BITS["duplicate"]:
+            entry["duplicate_group"] = int(ledger.duplicate_group[row])
+        anomalies.append(entry)
+    return anomalies
+
+
+def analyze_frame(frame: pd.DataFrame, options: AnomalyOptions, fields: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Run every detector over a ledger DataFrame; see /analyze/ledger for the result"""
+    with _telemetry.stage("prepare"):
+        ledger = LedgerFrame(frame, resolve_fields(list(frame.columns), fields))
+    detectors = {}
+    with _telemetry.stage("robust_z"):
+        detectors["robust_z"] = detect_outliers(ledger, options)
+    with _telemetry.stage("benford"):
+        detectors["benford"] = detect_benford(ledger, options)
+    with _telemetry.stage("duplicates"):
+        detectors["duplicates"] = detect_duplicates(ledger, options)
+    with _telemetry.stage("flags"):
+        detectors.update(detect_round_and_weekend(ledger, options))
+    with _telemetry.stage("report"):
+        anomalies = top_anomalies(ledger, options.max_anomalies)
+        flagged = int(np.count_nonzero(ledger.flags))
+        counts = {name: int(np.count_nonzero(ledger.flags & bit)) for name, bit in FLAG_BITS.items()}
+    return {
+        "rows": ledger.rows,
+        "invalid_amounts": int((~ledger.valid).sum()),
+        "fields": ledger.fields,
+        "flagged_rows": flagged,
+        "flag_counts": counts,
+        "anomalies": anomalies,
+        "detectors": detectors,
+        "insight": ledger_insight(ledger.rows, flagged, counts, detectors["benford"]),
+    }
+
+
+def ledger_insight(rows: int, flagged: int, counts: Dict[str, int], benford: Dict[str, Any]) -> str:
+    if rows == 0:
+        return "The ledger has no entries."
+    notable = ", ".join(f"{n} {name.replace('_', ' ')}" for name, n in counts.items() if n)
+    text = f"{flagged} of {rows} entries flagged" + (f" ({notable})." if notable else ".")
+    if benford.get("entries"):
+        text += f" First digits: {benford['conformity']} with Benford's law (MAD {benford['mad']:.4f})."
+    return text
+
+
+# =============================================================================
+# Streaming Ingest (running per-account statistics)
+# =============================================================================
+
+DIGIT_COLUMNS = [f"d{d}" for d in range(1, 10)]
+STAT_COLUMNS = ["count", "mean", "m2", "min", "max"] + DIGIT_COLUMNS
+
+# Rollup dimensions, in key order; bit i of a rollup's level marks dimension i
+# as rolled up (stored as "")
+ROLLUP_DIMENSIONS = ("period", "account", "counterparty")
+ROLLUP_AGG = {"count": "sum", "total": "sum", "inflow": "sum", "outflow": "sum", "min": "min", "max": "max", "flagged": "sum"}
+ROLLUP_COLUMNS = list(ROLLUP_AGG)
+ROLLUP_MERGE = {
+    "count": "count + excluded.count",
+    "total": "total + excluded.total",
+    "inflow": "inflow + excluded.inflow",
+    "outflow": "outflow + excluded.outflow",
+    "min": "min(min, excluded.min)",
+    "max": "max(max, excluded.max)",
+    "flagged": "flagged + excluded.flagged",
+}
+ROLLUP_SUMS = {
+    "count": "SUM(count)",
+    "total": "SUM(total)",
+    "inflow": "SUM(inflow)",
+    "outflow": "SUM(outflow)",
+    "min": "MIN(min)",
+    "max": "MAX(max)",
+    "flagged": "SUM(flagged)",
+}
+
+# Bits per dimension in a packed rollup key (three fit in an int64)
+_ROLLUP_KEY_BITS = 21
+_ROLLUP_KEY_MASK = (1 << _ROLLUP_KEY_BITS) - 1
+
+
+class LedgerStatsStore:
+    """
+    Per-account running statistics and rollups of ingested ledgers, in SQLite.
+
+    Each account keeps count, mean and M2 (sum of squared deviations, so
+    variance = M2 / (count - 1)) of its scaled amounts, the min/max amount
+    and a first-digit histogram. ``ledgers`` records the scale the stats were
+    built on and how much has been ingested.
+
+    ``rollups`` holds count, total, inflow, outflow, min/max and flagged
+    rows per month x account x counterparty, plus every coarser level with
+    some of those dimensions rolled up (see RollupBuilder), so a query reads
+    pre-aggregated rows instead of entries. Reads (queries, ``meta`` and
+    ``load``) use their own connection; under WAL they are not blocked by an
+    upload being saved.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ledgers (ledger TEXT PRIMARY KEY, scale TEXT NOT NULL, rows INTEGER NOT NULL,"
+            " uploads INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS account_stats (ledger TEXT NOT NULL, account TEXT NOT NULL,"
+            + "".join(f" {c} REAL NOT NULL," for c in STAT_COLUMNS)
+            + " PRIMARY KEY (ledger, account)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rollups (ledger TEXT NOT NULL, level INTEGER NOT NULL, period TEXT NOT NULL,"
+            " account TEXT NOT NULL, counterparty TEXT NOT NULL, count INTEGER NOT NULL, total REAL NOT NULL,"
+            " inflow REAL NOT NULL, outflow REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL,"
+            " flagged INTEGER NOT NULL, PRIMARY KEY (ledger, level, period, account, counterparty)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS rollups_account ON rollups (ledger, level, account, period)")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS rollups_counterparty ON rollups (ledger, level, counterparty, period)"
+        )
+        self._lock = threading.Lock()
+        self._reader = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._read_lock = threading.Lock()
+
+    def meta(self, ledger: str) -> Optional[Dict[str, Any]]:
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT scale, rows, uploads, updated FROM ledgers WHERE ledger = ?", (ledger,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"ledger": ledger, "scale": row[0], "rows": row[1], "uploads": row[2], "updated": row[3]}
+
+    def load(self, ledger: str) -> pd.DataFrame:
+        """Stats of every account, indexed by account"""
+        with self._read_lock:
+            rows = self._reader.execute(
+                f"SELECT account, {', '.join(STAT_COLUMNS)} FROM account_stats WHERE ledger = ?", (ledger,)
+            ).fetchall()
+        frame = pd.DataFrame(rows, columns=["account"] + STAT_COLUMNS)
+        return frame.set_index("account").astype(np.float64)
+
+    def save(self, ledger: str, scale: str, stats: pd.DataFrame, rows: int, rollups: Optional[pd.DataFrame] = None):
+        """
+        Replace the touched accounts' stats, add ``rollups`` (from
+        RollupBuilder.levels) to the stored ones and ``rows`` to the ledger,
+        atomically.
+        """
+        columns = ", ".join(STAT_COLUMNS)
+        marks = ", ".join("?" for _ in STAT_COLUMNS)
+        values = stats[STAT_COLUMNS].to_numpy(dtype=np.float64).tolist()
+        rollup_columns = ["level", *ROLLUP_DIMENSIONS, *ROLLUP_COLUMNS]
+        if rollups is not None and len(rollups):
+            rollup_rows = zip(*(rollups[c].tolist() for c in rollup_columns))
+        else:
+            rollup_rows = iter(())
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO account_stats (ledger, account, {columns}) VALUES (?, ?, {marks})",
+                    [(ledger, str(account), *row) for account, row in zip(stats.index, values)],
+                )
+                self._db.executemany(
+                    f"INSERT INTO rollups (ledger, {', '.join(rollup_columns)})"
+                    f" VALUES (?, {', '.join('?' for _ in rollup_columns)})"
+                    f" ON CONFLICT (ledger, level, {', '.join(ROLLUP_DIMENSIONS)}) DO UPDATE SET "
+                    + ", ".join(f"{c} = {merge}" for c, merge in ROLLUP_MERGE.items()),
+                    ((ledger, *row) for row in rollup_rows),
+                )
+                self._db.execute(
+                    "INSERT INTO ledgers (ledger, scale, rows, uploads, updated) VALUES (?, ?, ?, 1, ?)"
+                    " ON CONFLICT (ledger) DO UPDATE SET rows = rows + excluded.rows, uploads = uploads + 1,"
+                    " updated = excluded.updated",
+                    (ledger, scale, rows, time.time()),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def delete(self, ledger: str) -> bool:
+        with self._lock:
+            self._db.execute("DELETE FROM account_stats WHERE ledger = ?", (ledger,))
+            self._db.execute("DELETE FROM rollups WHERE ledger = ?", (ledger,))
+            return self._db.execute("DELETE FROM ledgers WHERE ledger = ?", (ledger,)).rowcount > 0
+
+    def rollup(self, ledger: str, level: int, filters: Dict[str, str], start: Optional[str], end: Optional[str],
+               group: Optional[str] = None, order: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Aggregate the ``level`` rollups matching ``filters`` (dimension ->
+        value) and the inclusive period range, optionally grouped by the SQL
+        expression ``group`` (returned as "key") and ranked by |``order``|.
+        Callers pass only dimension names, ROLLUP_SUMS keys and
+        ROLLUP_BUCKETS expressions as SQL.
+        """
+        where = ["ledger = ?", "level = ?"]
+        params: List[Any] = [ledger, level]
+        for position, dimension in enumerate(ROLLUP_DIMENSIONS):
+            if level & (1 << position):
+                where.append(f"{dimension} = ''")  # lets SQLite use the whole primary key prefix
+        for dimension, value in filters.items():
+            where.append(f"{dimension} = ?")
+            params.append(value)
+        if not level & 1:
+            where.append("period != ''")  # undated entries only count toward period-less levels
+        if start is not None:
+            where.append("period >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("period <= ?")
+            params.append(end)
+        select = [f"{expr} AS {name}" for name, expr in ROLLUP_SUMS.items()]
+        if group is not None:
+            select.insert(0, f"{group} AS key")
+        sql = f"SELECT {', '.join(select)} FROM rollups WHERE {' AND '.join(where)}"
+        if group is not None:
+            sql += " GROUP BY key"
+            sql += f" ORDER BY ABS({ROLLUP_SUMS[order]}) DESC, key" if order else " ORDER BY key"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._read_lock:
+            cursor = self._reader.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+_stats_store: Optional[LedgerStatsStore] = None
+_stats_store_lock = threading.Lock()
+_ledger_locks: Dict[str, threading.Lock] = {}
+
+
+def get_stats_store() -> LedgerStatsStore:
+    global _stats_store
+    if _stats_store is None:
+        with _stats_store_lock:
+            if _stats_store is None:
+                _stats_store = LedgerStatsStore(FINANCE_STATS_DB)
+    return _stats_store
+
+
+def ledger_lock(ledger: str) -> threading.Lock:
+    """Uploads to one ledger run one at a time (its stats are read, merged and written back)"""
+    with _stats_store_lock:
+        return _ledger_locks.setdefault(ledger, threading.Lock())
+
+
+def text_codes(codes: np.ndarray, labels: Optional[pd.Index], rows: int) -> Tuple[np.ndarray, pd.Index]:
+    """
+    ``codes`` re-pointed at unique text labels, which stats and rollups are
+    keyed on: values that read the same (1 and "1") share a label, missing
+    values are "", and a ledger without the column has just "".
+    """
+    if labels is None:
+        return np.zeros(rows, dtype=np.int64), pd.Index([""], dtype=object)
+    merged, text = pd.factorize(pd.Index(labels, dtype=object).fillna("").astype(str))
+    return merged[codes], pd.Index(text, dtype=object)
+
+
+def chunk_stats(values: np.ndarray, amount: np.ndarray, digits: np.ndarray, codes: np.ndarray, labels: pd.Index) -> pd.DataFrame:
+    """STAT_COLUMNS of one chunk per account (``codes`` index ``labels``; rows with NaN values skipped)"""
+    usable = np.isfinite(values)
+    codes, values, amount, digits = codes[usable], values[usable], amount[usable], digits[usable]
+    groups = len(labels)
+    count = np.bincount(codes, minlength=groups).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(codes, weights=values, minlength=groups) / count
+    m2 = np.bincount(codes, weights=(values - mean[codes]) ** 2, minlength=groups)
+    by_code = pd.Series(amount).groupby(codes)
+    low = by_code.min().reindex(range(groups)).to_numpy()
+    high = by_code.max().reindex(range(groups)).to_numpy()
+    digit_counts = benford_by_group(digits, codes, groups).astype(np.float64)
+    frame = pd.DataFrame(
+        np.column_stack([count, mean, m2, low, high, digit_counts]), index=labels, columns=STAT_COLUMNS
+    )
+    return frame[frame["count"] > 0]
+
+
+def merge_stats(history: pd.DataFrame, chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Combine two sets of per-account stats (Chan et al.'s parallel form of
+    Welford's update): counts and histograms add, means are count-weighted
+    and M2 gains delta^2 * n_a * n_b / n for the shift between the means.
+    """
+    accounts = history.index.union(chunk.index)
+    a = history.reindex(accounts)
+    b = chunk.reindex(accounts)
+    n_a = a["count"].fillna(0).to_numpy()
+    n_b = b["count"].fillna(0).to_numpy()
+    mean_a = a["mean"].fillna(0).to_numpy()
+    mean_b = b["mean"].fillna(0).to_numpy()
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, mean_a + delta * n_b / n, 0.0)
+        m2 = a["m2"].fillna(0).to_numpy() + b["m2"].fillna(0).to_numpy() + np.where(n > 0, delta ** 2 * n_a * n_b / n, 0.0)
+    merged = pd.DataFrame({"count": n, "mean": mean, "m2": m2}, index=accounts)
+    merged["min"] = np.fmin(a["min"].to_numpy(), b["min"].to_numpy())
+    merged["max"] = np.fmax(a["max"].to_numpy(), b["max"].to_numpy())
+    for column in DIGIT_COLUMNS:
+        merged[column] = a[column].fillna(0).to_numpy() + b[column].fillna(0).to_numpy()
+    return merged
+
+
+class RollupBuilder:
+    """
+    Month x account x counterparty rollups of one upload, built chunk by chunk.
+
+    Labels get upload-wide ids per dimension and each chunk is reduced on
+    the three ids packed into one int64. Partial rollups are buffered and
+    compacted once they outgrow the compacted part, so memory follows the
+    number of distinct groups rather than rows. ``levels`` adds the seven
+    coarser levels (any subset of the dimensions rolled up) to the detail.
+    """
+
+    def __init__(self):
+        self.labels = {dimension: pd.Index([], dtype=object) for dimension in ROLLUP_DIMENSIONS}
+        self.parts: List[pd.DataFrame] = []
+        self.compacted = 0
+        self.pending = 0
+
+    def _ids(self, dimension: str, labels: pd.Index) -> np.ndarray:
+        """Upload-wide ids of a chunk's (unique) labels"""
+        known = self.labels[dimension]
+        ids = known.get_indexer(labels)
+        new = ids < 0
+        if new.any():
+            ids[new] = np.arange(len(known), len(known) + int(new.sum()))
+            self.labels[dimension] = known.append(labels[new])
+            if len(self.labels[dimension]) > _ROLLUP_KEY_MASK:
+                raise HTTPException(
+                    status_code=413, detail=f"too_many_groups: more than {_ROLLUP_KEY_MASK} distinct {dimension} values"
+                )
+        return ids
+
+    def add(self, ledger: LedgerFrame, account: np.ndarray, account_labels: pd.Index):
+        """Absorb a scored chunk (valid amounts only); ``account`` codes index ``account_labels`` (see text_codes)"""
+        valid = ledger.valid
+        months = ledger.day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        months = np.where(ledger.has_day, months, np.iinfo(np.int64).min)
+        month_codes, month_values = pd.factorize(months)
+        period_labels = pd.Index([
+            "" if m == np.iinfo(np.int64).min else str(np.datetime64(int(m), "M")) for m in month_values.tolist()
+        ], dtype=object)
+        party, party_labels = text_codes(ledger.counterparty, ledger.counterparty_labels, ledger.rows)
+        key = (
+            (self._ids("period", period_labels)[month_codes] << (2 * _ROLLUP_KEY_BITS))
+            | (self._ids("account", account_labels)[account] << _ROLLUP_KEY_BITS)
+            | self._ids("counterparty", party_labels)[party]
+        )
+        amount = ledger.amount[valid]
+        part = pd.DataFrame({
+            "count": np.ones(len(amount), dtype=np.int64),
+            "total": amount,
+            "inflow": np.maximum(amount, 0.0),
+            "outflow": np.minimum(amount, 0.0),
+            "min": amount,
+            "max": amount,
+            "flagged": (ledger.flags[valid] != 0).astype(np.int64),
+        }).groupby(key[valid], sort=False).agg(ROLLUP_AGG)
+        self.parts.append(part)
+        self.pending += len(part)
+        if self.pending > max(self.compacted, 65536):
+            self._compact()
+
+    def _compact(self):
+        if len(self.parts) > 1:
+            self.parts = [pd.concat(self.parts).groupby(level=0, sort=False).agg(ROLLUP_AGG)]
+        self.compacted = len(self.parts[0]) if self.parts else 0
+        self.pending = 0
+
+    def levels(self) -> pd.DataFrame:
+        """Rollups at every level: ``level``, the ROLLUP_DIMENSIONS and ROLLUP_COLUMNS"""
+        self._compact()
+        if not self.parts:
+            return pd.DataFrame(columns=["level", *ROLLUP_DIMENSIONS, *ROLLUP_COLUMNS])
+        detail = self.parts[0]
+        keys = detail.index.to_numpy()
+        frames = []
+        for level in range(1 << len(ROLLUP_DIMENSIONS)):
+            keep = 0
+            for position, dimension in enumerate(ROLLUP_DIMENSIONS):
+                if not level & (1 << position):
+                    keep |= _ROLLUP_KEY_MASK << ((len(ROLLUP_DIMENSIONS) - 1 - position) * _ROLLUP_KEY_BITS)
+            rolled = detail if level == 0 else detail.groupby(keys & keep, sort=False).agg(ROLLUP_AGG)
+            packed = rolled.index.to_numpy()
+            frame = rolled.reset_index(drop=True)
+            frame.insert(0, "level", level)
+            for position, dimension in enumerate(ROLLUP_DIMENSIONS):
+                if level & (1 << position):
+                    values = ""
+                else:
+                    shift = (len(ROLLUP_DIMENSIONS) - 1 - position) * _ROLLUP_KEY_BITS
+                    values = self.labels[dimension].to_numpy()[(packed >> shift) & _ROLLUP_KEY_MASK]
+                frame.insert(1 + position, dimension, values)
+            frames.append(frame)
+        # In primary key order, which keeps the upsert's B-tree writes local
+        rollups = pd.concat(frames, ignore_index=True)
+        return rollups.sort_values(["level", *ROLLUP_DIMENSIONS], ignore_index=True)
+
+
+def sniff_format(path: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.lstrip().startswith(b"{"):
+        return "ndjson"
+    return "csv"
+
+
+def numeric_as_text(values: pd.Series) -> pd.Series:
+    """
+    A numeric column as the text the CSV reader would have given: integral
+    values without a decimal point (1001.0 reads "1001"), missing values
+    stay missing.
+    """
+    codes, uniques = pd.factorize(values)
+    text = [str(int(v)) if float(v).is_integer() else str(v) for v in uniques.tolist()]
+    return pd.Series(np.array(text + [None], dtype=object)[codes], index=values.index, name=values.name)
+
+
+def _text_columns_as_text(chunk: pd.DataFrame, text_columns: List[str]) -> pd.DataFrame:
+    # An integer column widens to float64 in any chunk with a gap, so chunks of one
+    # upload would otherwise label the same account "1001" and "1001.0"
+    for column in chunk.columns:
+        if str(column).lower() in text_columns and chunk[column].dtype.kind in "iuf":
+            chunk[column] = numeric_as_text(chunk[column])
+    return chunk
+
+
+def read_chunks(path: str, fmt: str, chunk_rows: int, text_columns: List[str]) -> Iterator[pd.DataFrame]:
+    """
+    The upload as DataFrames of at most ``chunk_rows`` rows; never the whole file at once.
+
+    Columns in ``text_columns`` (lower-case names) are read as text in every format.
+    """
+    if fmt == "csv":
+        header = pd.read_csv(path, nrows=0).columns
+        dtype = {c: str for c in header if str(c).lower() in text_columns}
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype=dtype)
+    elif fmt == "ndjson":
+        for chunk in pd.read_json(path, lines=True, chunksize=chunk_rows, dtype=False):
+            yield _text_columns_as_text(chunk, text_columns)
+    elif fmt == "parquet":
+        if _parquet is None:
+            raise HTTPException(status_code=415, detail="parquet_unavailable: install pyarrow to ingest Parquet")
+        for batch in _parquet.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield _text_columns_as_text(batch.to_pandas(), text_columns)
+    else:
+        raise HTTPException(status_code=400, detail=f"invalid_format: {fmt!r} (expected csv, ndjson or parquet)")
+
+
+def parse_fields(spec: Optional[str]) -> Optional[Dict[str, str]]:
+    """``role=column,role=column`` (the query-string form of "fields")"""
+    if not spec:
+        return None
+    fields = {}
+    for part in spec.split(","):
+        role, sep, column = part.partition("=")
+        if not sep or role.strip() not in FIELD_CANDIDATES:
+            raise HTTPException(status_code=400, detail=f"invalid_fields: {part!r} (expected role=column)")
+        fields[role.strip()] = column.strip()
+    return fields
+
+
+def ingest_file(ledger_id: str, path: str, fmt: str, options: AnomalyOptions, fields: Optional[Dict[str, str]],
+                chunk_rows: int) -> Dict[str, Any]:
+    """
+    Score and absorb an uploaded ledger file chunk by chunk.
+
+    Each chunk's per-account stats are merged into the ledger's running
+    stats first, then its rows are scored against them: running_z flags
+    |z| above the threshold for accounts with at least ``min_group_size``
+    entries so far, and the per-chunk detectors add duplicate, round-amount
+    and weekend flags. Only the top ``max_anomalies`` rows are kept. Scored
+    chunks also feed the ledger's rollups (with their flagged counts). The
+    merged stats and rollups are written back once the whole file is read,
+    so a failed upload leaves the ledger as it was.
+    """
+    store = get_stats_store()
+    scale = options.z_scale
+    text_columns = [c for role in ("account", "counterparty", "id") for c in FIELD_CANDIDATES[role]]
+    text_columns += [c.lower() for c in (fields or {}).values()]
+    with ledger_lock(ledger_id):
+        meta = store.meta(ledger_id)
+        if meta is not None and meta["scale"] != scale:
+            raise HTTPException(
+                status_code=409,
+                detail=f"scale_mismatch: ledger {ledger_id!r} stats are on the {meta['scale']} scale",
+            )
+        with _telemetry.stage("stats_load"):
+            stats = store.load(ledger_id)
+        touched = pd.Index([], dtype=object)
+        rows = chunks = invalid = 0
+        counts = {name: 0 for name in FLAG_BITS}
+        anomalies: List[Dict[str, Any]] = []
+        resolved = None
+        rollups = RollupBuilder()
+        for chunk in read_chunks(path, fmt, chunk_rows, text_columns):
+            with _telemetry.stage("chunk"):
+                if resolved is None:
+                    resolved = resolve_fields(list(chunk.columns), fields)
+                ledger = LedgerFrame(chunk, resolved)
+                values = scaled_amounts(ledger.amount, scale)
+                codes, labels = text_codes(ledger.account, ledger.account_labels, ledger.rows)
+                digits = first_digits(ledger.amount)
+                absorbed = chunk_stats(values, ledger.amount, digits, codes, labels)
+                stats = merge_stats(stats, absorbed)
+                touched = touched.union(absorbed.index)
+
+                # Score against the stats including this chunk
+                positions = stats.index.get_indexer(labels)[codes]
+                count = stats["count"].to_numpy()[positions]
+                mean = stats["mean"].to_numpy()[positions]
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    std = np.sqrt(stats["m2"].to_numpy()[positions] / (count - 1))
+                    z = np.where(std > 0, (values - mean) / std, 0.0)
+                z[(count < max(2, options.min_group_size)) | ~ledger.valid] = np.nan
+                ledger.z = z
+                with np.errstate(invalid="ignore"):
+                    outlier = np.abs(z) > options.z_threshold
+                ledger.flag("running_z", outlier, np.abs(np.nan_to_num(z)) / options.z_threshold)
+                detect_duplicates(ledger, options)
+                detect_round_and_weekend(ledger, options)
+                rollups.add(ledger, codes, labels)
+
+                for entry in top_anomalies(ledger, options.max_anomalies):
+                    entry["row"] += rows
+                    anomalies.append(entry)
+                anomalies = sorted(anomalies, key=lambda e: -e["score"])[: options.max_anomalies]
+                for name, bit in FLAG_BITS.items():
+                    counts[name] += int(np.count_nonzero(ledger.flags & bit))
+                rows += ledger.rows
+                invalid += int((~ledger.valid).sum())
+                chunks += 1
+        with _telemetry.stage("rollup"):
+            levels = rollups.levels()
+        with _telemetry.stage("stats_save"):
+            store.save(ledger_id, scale, stats.loc[touched], rows, levels)
+        digits_total = stats[DIGIT_COLUMNS].sum().to_numpy()
+    return {
+        "ledger": ledger_id,
+        "format": fmt,
+        "rows": rows,
+        "chunks": chunks,
+        "invalid_amounts": invalid,
+        "fields": resolved,
+        "accounts_touched": int(len(touched)),
+        "rollup_groups": int((levels["level"] == 0).sum()),
+        "flag_counts": counts,
+        "anomalies": anomalies,
+        "benford": benford_test(digits_total),
+        "ledger_stats": store.meta(ledger_id),
+    }
+
+
+def account_summary(stats: pd.DataFrame, benford_min: int) -> pd.DataFrame:
+    """Mean/std/Benford MAD per account from stored stats"""
+    count = stats["count"].to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(stats["m2"].to_numpy() / (count - 1))
+        digits = stats[DIGIT_COLUMNS].to_numpy()
+        totals = digits.sum(axis=1)
+        mad = np.abs(digits / totals[:, None] - BENFORD_EXPECTED).mean(axis=1)
+    summary = pd.DataFrame(
+        {
+            "count": count.astype(np.int64),
+            "mean": stats["mean"].to_numpy(),
+            "std": np.where(count > 1, std, np.nan),
+            "min": stats["min"].to_numpy(),
+            "max": stats["max"].to_numpy(),
+            "benford_mad": np.where(totals >= max(1, benford_min), mad, np.nan),
+        },
+        index=stats.index,
+    )
+    return summary.sort_values("count", ascending=False, kind="stable")
+
+
+# Trend buckets over the stored "YYYY-MM" periods, as SQL expressions
+ROLLUP_BUCKETS = {
+    "month": "period",
+    "quarter": "substr(period, 1, 4) || '-Q' || ((CAST(substr(period, 6, 2) AS INTEGER) + 2) / 3)",
+    "year": "substr(period, 1, 4)",
+}
+
+
+def normalize_period(value: Optional[str], end: bool) -> Optional[str]:
+    """"YYYY", "YYYY-MM" or a date -> the "YYYY-MM" bound of an inclusive range"""
+    if not value:
+        return None
+    value = value.strip()
+    if len(value) == 4 and value.isdigit():
+        return f"{value}-12" if end else f"{value}-01"
+    month = value[:7]
+    if len(month) != 7 or month[4] != "-" or not (month[:4] + month[5:]).isdigit() or not 1 <= int(month[5:]) <= 12:
+        raise HTTPException(status_code=400, detail=f"invalid_period: {value!r} (expected YYYY, YYYY-MM or a date)")
+    return month
+
+
 @app.get("/")
 def read_root():
     return {"status": "active", "agent": "Dot.Finance", "role": "CFO"}
 
 @app.post("/analyze/ledger")
-def analyze_ledger(data: dict):
-    # Stub for ledger analysis
-    return {"status": "analyzed", "anomalies": [], "insight": "No data provided in stub mode."}
+def analyze_ledger(request: LedgerAnalysisRequest):
+    """
+    Flag anomalous ledger entries.
+
+    Entries come as ``entries`` (objects) or ``columns`` (name -> values);
+    columns are matched to roles by name (see FIELD_CANDIDATES) unless
+    ``fields`` maps them. Only amount is required: per-account outliers
+    need an account column, duplicates and weekend postings a date.
+    """
+    start = time.perf_counter()
+    with _telemetry.stage("load"):
+        frame = load_ledger(request)
+    result = analyze_frame(frame, request, request.fields)
+    return {"status": "analyzed", **result, "took_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+@app.post("/ingest/ledger/{ledger_id}")
+async def ingest_ledger(
+    ledger_id: str,
+    request: Request,
+    format: Optional[str] = None,
+    fields: Optional[str] = None,
+    chunk_rows: int = FINANCE_CHUNK_ROWS,
+    z_threshold: float = Query(FINANCE_Z_THRESHOLD, gt=0),
+    z_scale: Literal["log", "linear"] = "log",
+    min_group_size: int = Query(FINANCE_MIN_GROUP_SIZE, ge=0),
+    round_unit: float = Query(FINANCE_ROUND_UNIT, ge=0),
+    max_anomalies: int = Query(FINANCE_MAX_ANOMALIES, ge=0),
+):
+    """
+    Stream a CSV, NDJSON or Parquet ledger (the raw request body) into ``ledger_id``.
+
+    The body is spooled to disk and processed ``chunk_rows`` rows at a
+    time, so ledgers larger than memory work. Rows are scored against the
+    ledger's persisted per-account statistics, which then include them.
+    ``format`` is sniffed from the content when not given; ``fields`` maps
+    roles to columns as ``amount=amt,account=acct``.
+    """
+    options = AnomalyOptions(
+        z_threshold=z_threshold,
+        z_scale=z_scale,
+        min_group_size=min_group_size,
+        round_unit=round_unit,
+        max_anomalies=max_anomalies,
+    )
+    mapping = parse_fields(fields)
+    start = time.perf_counter()
+    spool = tempfile.NamedTemporaryFile(prefix="ledger-", dir=FINANCE_SPOOL_DIR, delete=False)
+    try:
+        with _telemetry.stage("spool"):
+            size = 0
+            async for block in request.stream():
+                spool.write(block)
+                size += len(block)
+            spool.close()
+        if size == 0:
+            raise HTTPException(status_code=400, detail="invalid_ledger: empty upload")
+        fmt = (format or sniff_format(spool.name)).lower()
+        result = await run_in_threadpool(ingest_file, ledger_id, spool.name, fmt, options, mapping, max(1, chunk_rows))
+    except (ValueError, pd.errors.ParserError) as e:
+        raise HTTPException(status_code=400, detail=f"invalid_ledger: {e}")
+    finally:
+        spool.close()
+        os.unlink(spool.name)
+    return {"status": "ingested", "bytes": size, **result, "took_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+@app.get("/ledgers/{ledger_id}/stats")
+def ledger_stats(ledger_id: str, limit: int = 100, benford_min_entries: int = FINANCE_BENFORD_MIN):
+    """Running statistics of an ingested ledger: totals, Benford test and the busiest accounts"""
+    store = get_stats_store()
+    meta = store.meta(ledger_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail=f"ledger_not_found: {ledger_id}")
+    stats = store.load(ledger_id)
+    summary = account_summary(stats, benford_min_entries).head(max(0, limit))
+    accounts = [
+        {"account": account, **{k: _plain(v) for k, v in row.items()}}
+        for account, row in zip(summary.index, summary.to_dict("records"))
+    ]
+    return {
+        **meta,
+        "accounts": int(len(stats)),
+        "benford": benford_test(stats[DIGIT_COLUMNS].sum().to_numpy()),
+        "top_accounts": accounts,
+    }
+
+@app.get("/ledgers/{ledger_id}/query")
+def query_ledger(
+    ledger_id: str,
+    kind: str = "totals",
+    account: Optional[str] = None,
+    counterparty: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    granularity: str = "month",
+    by: str = "counterparty",
+    metric: str = "total",
+    limit: int = 10,
+):
+    """
+    Answer from the ingested ledger's rollups, without touching entries.
+
+    ``kind`` is "totals" (count, total, inflow, outflow, min/max, flagged),
+    "trend" (the same per ``granularity`` bucket: month, quarter or year)
+    or "top" (the ``limit`` largest ``by`` values, counterparty or account,
+    ranked by |``metric``|). ``account``, ``counterparty`` and the inclusive
+    ``start``/``end`` periods filter any kind. The rollup level read is the
+    coarsest one that still has the dimensions the question needs.
+    """
+    start_time = time.perf_counter()
+    if kind not in ("totals", "trend", "top"):
+        raise HTTPException(status_code=400, detail=f"invalid_query: kind {kind!r} (expected totals, trend or top)")
+    if granularity not in ROLLUP_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"invalid_query: granularity {granularity!r} (expected month, quarter or year)")
+    if by not in ("counterparty", "account"):
+        raise HTTPException(status_code=400, detail=f"invalid_query: by {by!r} (expected counterparty or account)")
+    if metric not in ROLLUP_SUMS or metric in ("min", "max"):
+        raise HTTPException(status_code=400, detail=f"invalid_query: metric {metric!r} (expected count, total, inflow, outflow or flagged)")
+    store = get_stats_store()
+    meta = store.meta(ledger_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail=f"ledger_not_found: {ledger_id}")
+    first, last = normalize_period(start, end=False), normalize_period(end, end=True)
+    filters = {d: v for d, v in (("account", account), ("counterparty", counterparty)) if v is not None}
+    needed = set(filters)
+    if first or last or kind == "trend":
+        needed.add("period")
+    if kind == "top":
+        needed.add(by)
+    level = sum(1 << i for i, d in enumerate(ROLLUP_DIMENSIONS) if d not in needed)
+
+    with _telemetry.stage("rollup_query"):
+        if kind == "totals":
+            row = store.rollup(ledger_id, level, filters, first, last)[0]
+            result: Dict[str, Any] = {"totals": {k: (0 if v is None and k not in ("min", "max") else v) for k, v in row.items()}}
+        elif kind == "trend":
+            rows = store.rollup(ledger_id, level, filters, first, last, group=ROLLUP_BUCKETS[granularity])
+            result = {"granularity": granularity, "points": [{"period": r.pop("key"), **r} for r in rows]}
+        else:
+            rows = store.rollup(ledger_id, level, filters, first, last, group=by, order=metric, limit=max(0, limit))
+            result = {"by": by, "metric": metric, "top": [{by: r.pop("key"), **r} for r in rows]}
+    return {
+        "ledger": ledger_id,
+        "kind": kind,
+        "filters": {**filters, "start": first, "end": last},
+        "level": level,
+        **result,
+        "took_ms": round((time.perf_counter() - start_time) * 1000, 3),
+    }
+
+@app.delete("/ledgers/{ledger_id}")
+def delete_ledger(ledger_id: str):
+    """Forget an ingested ledger's statistics and rollups"""
+    if not get_stats_store().delete(ledger_id):
+        raise HTTPException(status_code=404, detail=f"ledger_not_found: {ledger_id}")
+    return {"status": "deleted", "ledger": ledger_id}
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "8000"))
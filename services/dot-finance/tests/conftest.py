@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# server reads its configuration at import time: keep the stats database out of the tree
+_tmp = tempfile.mkdtemp(prefix="dot-finance-tests-")
+os.environ.setdefault("FINANCE_STATS_DB", os.path.join(_tmp, "stats.db"))
+sys.path.insert(0, SRC_DIR)
+
+
+@pytest.fixture(scope="session")
+def api():
+    import server
+
+    return server
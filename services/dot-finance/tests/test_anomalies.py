@@ -0,0 +1,139 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def near_duplicates_by_brute_force(api, frame, options):
+    """(rows, pairs) for near duplicates, comparing every pair of rows"""
+    ledger = api.LedgerFrame(frame, api.resolve_fields(list(frame.columns)))
+    tolerance = int(round(options.near_duplicate_tolerance * 100))
+    usable = np.flatnonzero(ledger.valid & ledger.has_day)
+    near, pairs = set(), 0
+    for n, i in enumerate(usable):
+        for j in usable[n + 1:]:
+            if ledger.counterparty[i] != ledger.counterparty[j]:
+                continue
+            if (ledger.cents[i], ledger.day[i]) == (ledger.cents[j], ledger.day[j]):
+                continue
+            if abs(ledger.cents[i] - ledger.cents[j]) <= tolerance and abs(ledger.day[i] - ledger.day[j]) <= options.near_duplicate_days:
+                near.update((i, j))
+                pairs += 1
+    return len(near), pairs
+
+
+def near_duplicates(api, frame, options):
+    report = api.analyze_frame(frame, options)["detectors"]["duplicates"]
+    return report["near_duplicate_rows"], report["near_duplicate_pairs"]
+
+
+def test_near_duplicates_in_one_dense_counterparty(api):
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        "amount": np.round(100 + rng.integers(0, 80, 400) / 100, 2),
+        "date": pd.to_datetime(rng.integers(19000, 19365, 400), unit="D").astype(str),
+        "counterparty": "V1",
+    })
+    options = api.AnomalyOptions()
+    assert near_duplicates(api, frame, options) == near_duplicates_by_brute_force(api, frame, options)
+    assert near_duplicates(api, frame, options)[0] == 400
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("days,tolerance", [(3, 1.0), (0, 5.0), (10 ** 12, 0.02)])
+def test_near_duplicates_match_brute_force(api, seed, days, tolerance):
+    rng = np.random.default_rng(seed)
+    rows = 300
+    frame = pd.DataFrame({
+        "amount": pd.Series(np.round(rng.integers(0, 3000, rows) / 100, 2), dtype=object),
+        "date": pd.to_datetime(rng.integers(19000, 19060, rows), unit="D").astype(str),
+        "counterparty": rng.integers(0, 4, rows),
+    })
+    frame.loc[::17, "amount"] = "n/a"
+    frame.loc[5::23, "date"] = "unknown"
+    options = api.AnomalyOptions(near_duplicate_days=days, near_duplicate_tolerance=tolerance)
+    assert near_duplicates(api, frame, options) == near_duplicates_by_brute_force(api, frame, options)
+
+
+def test_exact_copies_are_not_near_duplicates(api):
+    frame = pd.DataFrame({"amount": [50.0, 50.0, 75.0], "date": ["2024-03-01"] * 3, "counterparty": ["A", "A", "A"]})
+    report = api.analyze_frame(frame, api.AnomalyOptions())["detectors"]["duplicates"]
+    assert report["duplicate_rows"] == 2
+    assert report["near_duplicate_rows"] == 0
+
+
+def test_dates_past_2262_keep_their_day(api):
+    frame = pd.DataFrame({"amount": [1.0, 2.0, 3.0], "date": ["2024-01-05", "9999-12-31", "not a date"]})
+    ledger = api.LedgerFrame(frame, api.resolve_fields(list(frame.columns)))
+    assert ledger.has_day.tolist() == [True, True, False]
+    assert ledger.day[:2].tolist() == [
+        int(np.datetime64("2024-01-05", "D").astype(np.int64)),
+        int(np.datetime64("9999-12-31", "D").astype(np.int64)),
+    ]
+
+
+def test_mixed_utc_offsets_parse_as_utc_days(api):
+    frame = pd.DataFrame({
+        "amount": [1.0, 2.0],
+        "date": ["2024-01-05T10:00:00+02:00", "2024-01-05T23:00:00-05:00"],
+    })
+    ledger = api.LedgerFrame(frame, api.resolve_fields(list(frame.columns)))
+    assert ledger.has_day.all()
+    assert (ledger.day.astype("datetime64[D]").astype(str)).tolist() == ["2024-01-05", "2024-01-06"]
+    assert api.analyze_frame(frame, api.AnomalyOptions())["rows"] == 2
+
+
+def test_amounts_too_large_for_cents_are_invalid_not_duplicates(api):
+    frame = pd.DataFrame({"amount": [1e300, -1e300, 9.5e16, 12.5, 12.5], "date": ["2024-03-01"] * 5})
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        ledger = api.LedgerFrame(frame, api.resolve_fields(list(frame.columns)))
+        result = api.analyze_frame(frame, api.AnomalyOptions())
+    assert ledger.valid.tolist() == [False, False, False, True, True]
+    assert result["invalid_amounts"] == 3
+    assert result["detectors"]["duplicates"]["duplicate_rows"] == 2
+    assert sorted(a["row"] for a in result["anomalies"] if "duplicate" in a["flags"]) == [3, 4]
+
+
+@pytest.mark.parametrize("z_scale", ["log", "linear"])
+def test_z_scale_is_reported(api, z_scale):
+    frame = pd.DataFrame({"amount": [1.0, 2.0, 3.0]})
+    assert api.analyze_frame(frame, api.AnomalyOptions(z_scale=z_scale))["detectors"]["robust_z"]["scale"] == z_scale
+
+
+def test_unknown_z_scale_is_rejected(api):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(api.app)
+    response = client.post("/analyze/ledger", json={"entries": [{"amount": 1.0}], "z_scale": "weird"})
+    assert response.status_code == 422
+    response = client.post("/ingest/ledger/scales", content=b"amount\n1.0\n", params={"z_scale": "weird"})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("option, value", [
+    ("z_threshold", 0), ("z_threshold", -1.5), ("min_group_size", -1), ("near_duplicate_days", -1),
+    ("max_anomalies", -1), ("round_unit", -0.5), ("near_duplicate_tolerance", -0.01),
+])
+def test_out_of_range_options_are_rejected(api, option, value):
+    from fastapi.testclient import TestClient
+
+    response = TestClient(api.app).post("/analyze/ledger", json={"entries": [{"amount": 1.0}], option: value})
+    assert response.status_code == 422, response.text
+
+
+@pytest.mark.parametrize("param, value", [
+    ("z_threshold", 0), ("z_threshold", -1), ("min_group_size", -1), ("max_anomalies", -1), ("round_unit", -1),
+])
+def test_out_of_range_ingest_params_are_rejected(api, param, value):
+    from fastapi.testclient import TestClient
+
+    response = TestClient(api.app).post("/ingest/ledger/bounds", content=b"amount\n1.0\n", params={param: value})
+    assert response.status_code == 422, response.text
+
+
+def test_small_positive_z_threshold_still_works(api):
+    frame = pd.DataFrame({"account": ["a"] * 6, "amount": [10.0, 11.0, 9.0, 10.0, 10.5, 500.0]})
+    result = api.analyze_frame(frame, api.AnomalyOptions(z_threshold=1e-9, min_group_size=0))
+    assert result["detectors"]["robust_z"]["flagged"] >= 1
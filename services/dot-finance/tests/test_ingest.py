@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def client(api):
+    from fastapi.testclient import TestClient
+
+    return TestClient(api.app)
+
+
+def ingest(client, ledger, content, **params):
+    response = client.post(f"/ingest/ledger/{ledger}", content=content, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def direct_stats(api, frame):
+    """What the running stats should hold, from one groupby over every entry"""
+    values = pd.Series(api.scaled_amounts(frame["amount"].to_numpy(dtype=np.float64), "log"), index=frame.index)
+    by_account = pd.DataFrame({"value": values, "amount": frame["amount"]}).groupby(frame["account"].astype(str))
+    return pd.DataFrame({
+        "count": by_account["value"].count(),
+        "mean": by_account["value"].mean(),
+        "var": by_account["value"].var(),
+        "min": by_account["amount"].min(),
+        "max": by_account["amount"].max(),
+    })
+
+
+def chunk_stats_of(api, frame):
+    amount = frame["amount"].to_numpy(dtype=np.float64)
+    codes, labels = pd.factorize(frame["account"].astype(str))
+    return api.chunk_stats(api.scaled_amounts(amount, "log"), amount, api.first_digits(amount), codes, pd.Index(labels))
+
+
+def test_merge_stats_matches_a_direct_groupby(api):
+    rng = np.random.default_rng(7)
+    frame = pd.DataFrame({
+        "account": rng.integers(0, 40, 5000),
+        "amount": np.round(np.exp(rng.normal(5, 1.5, 5000)) * np.where(rng.random(5000) < 0.3, -1, 1), 2),
+    })
+    merged = pd.DataFrame(columns=api.STAT_COLUMNS, dtype=np.float64)
+    for start in range(0, len(frame), 700):
+        merged = api.merge_stats(merged, chunk_stats_of(api, frame.iloc[start:start + 700]))
+
+    expected = direct_stats(api, frame)
+    merged = merged.loc[expected.index]
+    np.testing.assert_array_equal(merged["count"], expected["count"])
+    np.testing.assert_allclose(merged["mean"], expected["mean"], rtol=1e-12)
+    np.testing.assert_allclose(merged["m2"] / (merged["count"] - 1), expected["var"], rtol=1e-9)
+    np.testing.assert_array_equal(merged["min"], expected["min"])
+    np.testing.assert_array_equal(merged["max"], expected["max"])
+    digits = api.first_digits(frame["amount"].to_numpy(dtype=np.float64))
+    np.testing.assert_array_equal(merged[api.DIGIT_COLUMNS].sum().to_numpy(), np.bincount(digits[digits > 0], minlength=10)[1:])
+
+
+def test_chunked_ingest_matches_a_direct_groupby(api, client):
+    rng = np.random.default_rng(11)
+    frame = pd.DataFrame({
+        "account": rng.integers(0, 25, 3000),
+        "amount": np.round(np.exp(rng.normal(4, 1, 3000)), 2),
+        "date": pd.to_datetime(rng.integers(19000, 19300, 3000), unit="D").strftime("%Y-%m-%d"),
+    })
+    ingest(client, "chunked", frame.iloc[:1800].to_csv(index=False).encode(), chunk_rows=250)
+    ingest(client, "chunked", frame.iloc[1800:].to_json(orient="records", lines=True).encode(), chunk_rows=400)
+
+    stats = api.get_stats_store().load("chunked")
+    expected = direct_stats(api, frame)
+    assert sorted(stats.index) == sorted(expected.index)
+    stats = stats.loc[expected.index]
+    np.testing.assert_array_equal(stats["count"], expected["count"])
+    np.testing.assert_allclose(stats["mean"], expected["mean"], rtol=1e-12)
+    np.testing.assert_allclose(stats["m2"] / (stats["count"] - 1), expected["var"], rtol=1e-9)
+
+
+def test_accounts_that_read_the_same_share_stats(api, client):
+    content = b'{"account": 1, "amount": 10}\n{"account": "1", "amount": 20}\n{"account": 2, "amount": 30}\n'
+    result = ingest(client, "mixed", content, chunk_rows=10)
+    assert result["rows"] == 3
+    assert result["accounts_touched"] == 2
+    assert api.get_stats_store().load("mixed").loc["1", "count"] == 2
+
+
+def test_blank_accounts_are_one_account(api, client):
+    content = b'{"account": "a", "amount": 10}\n{"amount": 20}\n{"account": null, "amount": 30}\n'
+    result = ingest(client, "blank", content, chunk_rows=10)
+    assert result["accounts_touched"] == 2
+    stats = api.get_stats_store().load("blank")
+    assert sorted(stats.index) == ["", "a"]
+    assert stats.loc["", "count"] == 2
+
+
+def test_ndjson_account_with_a_gap_keeps_one_label_across_chunks(api, client):
+    accounts = [1001, 1001, 1001, None, 1001, 1001]
+    content = "".join(
+        f'{{"amount": {10 + i}, "account": {"null" if account is None else account}}}\n'
+        for i, account in enumerate(accounts)
+    ).encode()
+    result = ingest(client, "gappy", content, chunk_rows=4)
+    assert result["accounts_touched"] == 2
+    stats = api.get_stats_store().load("gappy")
+    assert sorted(stats.index) == ["", "1001"]
+    assert stats.loc["1001", "count"] == 5
+    assert all(entry.get("account") in ("1001", None) for entry in result["anomalies"])
+
+
+def test_numeric_id_columns_read_like_csv_text(api):
+    values = pd.Series([1001.0, np.nan, 7.5, 1001.0, -3.0], name="account")
+    text = api.numeric_as_text(values)
+    assert text.isna().tolist() == [False, True, False, False, False]
+    assert text.dropna().tolist() == ["1001", "7.5", "1001", "-3"]
+    assert api.numeric_as_text(pd.Series([42, 7], dtype=np.int64)).tolist() == ["42", "7"]
@@ -0,0 +1,83 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+LEDGER = (
+    "date,account,counterparty,amount\n"
+    "2024-01-03,4000,V1,100.00\n"
+    "2024-01-09,4000,,-40.00\n"
+    "2024-02-11,,V1,250.00\n"
+    "2024-02-12,4100,V2,-75.50\n"
+    ",4100,,10.00\n"
+    "2024-03-01,,,-5.25\n"
+    "2024-03-02,4000,V2,60.00\n"
+)
+
+
+@pytest.fixture(scope="module")
+def ledger(api):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(api.app)
+    client.delete("/ledgers/blanks")
+    response = client.post("/ingest/ledger/blanks", content=LEDGER.encode(), params={"chunk_rows": 3})
+    assert response.status_code == 200, response.text
+    entries = pd.read_csv(pd.io.common.StringIO(LEDGER), dtype=str, keep_default_na=False)
+    entries["amount"] = entries["amount"].astype(float)
+    entries["period"] = entries["date"].str[:7]
+    return client, entries
+
+
+def query(client, **params):
+    response = client.get("/ledgers/blanks/query", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_totals_count_blank_cells(ledger):
+    client, entries = ledger
+    totals = query(client)["totals"]
+    assert totals["count"] == len(entries)
+    assert totals["total"] == pytest.approx(entries["amount"].sum())
+
+
+@pytest.mark.parametrize("dimension", ["account", "counterparty"])
+def test_blank_dimension_filters(ledger, dimension):
+    client, entries = ledger
+    blank = entries[entries[dimension] == ""]
+    totals = query(client, **{dimension: ""})["totals"]
+    assert totals["count"] == len(blank)
+    assert totals["total"] == pytest.approx(blank["amount"].sum())
+
+
+@pytest.mark.parametrize("by", ["account", "counterparty"])
+def test_top_ranks_blank_values(ledger, by):
+    client, entries = ledger
+    top = query(client, kind="top", by=by, metric="count", limit=10)["top"]
+    expected = entries.groupby(by)["amount"].count()
+    assert {row[by]: row["count"] for row in top} == expected.to_dict()
+
+
+def test_trend_with_blank_account_filter_skips_undated(ledger):
+    client, entries = ledger
+    points = query(client, kind="trend", account="")["points"]
+    dated = entries[(entries["account"] == "") & (entries["period"] != "")]
+    expected = dated.groupby("period")["amount"].sum()
+    assert [p["period"] for p in points] == expected.index.tolist()
+    np.testing.assert_allclose([p["total"] for p in points], expected.to_numpy())
+
+
+def test_reads_do_not_wait_for_a_save(api, ledger):
+    store = api.get_stats_store()
+    done = threading.Event()
+
+    def read():
+        store.meta("blanks")
+        store.load("blanks")
+        done.set()
+
+    with store._lock:  # held by save() for the whole upsert
+        threading.Thread(target=read, daemon=True).start()
+        assert done.wait(2.0)
@@ -0,0 +1,12 @@
+def test_metrics_label_requests_by_route(api):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(api.app)
+    for ledger_id in ("ledger-a", "ledger-b"):
+        assert client.get(f"/ledgers/{ledger_id}/stats").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    assert 'finance_request_errors_total{endpoint="/ledgers/{ledger_id}/stats",status="404"} 2' in response.text
+    assert "ledger-a" not in response.text
@@ -1,78 +1,1074 @@
 #!/usr/bin/env python3
 
-from fastapi import FastAPI, HTTPException
+import time
+
+_module_start = time.perf_counter()  # startup timings (see /ready) count from here
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
+import asyncio
+import contextvars
+import hashlib
+import importlib
+import importlib.metadata
+import importlib.util
+import json
 import os
-from typing import Dict, Any, List, Optional
+import sqlite3
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Any, List, Optional, Tuple
 
-ROMA_AVAILABLE = False
-ROMA_VERSION: Optional[str] = None
 try:
-    # Optional dependency; may be vendored or installed from a private index.
-    from roma_dspy import Executor  # type: ignore
-    import importlib.metadata
+    from .telemetry import Telemetry
+except ImportError:  # run as a script from src/
+    from telemetry import Telemetry
+
+
+def _installed(name: str) -> bool:
+    """Whether ``name`` can be imported, without importing it"""
+    if name in sys.modules:
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
 
-    ROMA_AVAILABLE = True
+# roma_dspy (and the DSPy it pulls in) takes seconds to import, so module load
+# only checks that it is installed; load_roma() imports it during warm-up or on
+# first use. Optional dependency; may be vendored or installed from a private index.
+ROMA_AVAILABLE = _installed("roma_dspy")
+ROMA_VERSION: Optional[str] = None
+if ROMA_AVAILABLE:
     try:
         ROMA_VERSION = importlib.metadata.version("roma_dspy")
     except Exception:
         ROMA_VERSION = None
-except Exception:
-    ROMA_AVAILABLE = False
-    ROMA_VERSION = None
 
-app = FastAPI(title="ROMA Bridge API", version="0.1.0")
+# Executor calls block on LM round-trips, so they run on a bounded thread pool:
+# ROMA_THREADS at once, up to ROMA_QUEUE_DEPTH more waiting, then 429.
+# ROMA_WORKERS starts several uvicorn processes (the only shared state is the
+# optional on-disk plan cache below).
+ROMA_THREADS = int(os.getenv("ROMA_THREADS", "4"))
+ROMA_QUEUE_DEPTH = int(os.getenv("ROMA_QUEUE_DEPTH", "16"))
+ROMA_WORKERS = int(os.getenv("ROMA_WORKERS", "1"))
+
+# Request/stage latency histograms are served on /metrics; ROMA_PROFILE_HZ > 0
+# also samples thread stacks for /debug/profile (see telemetry.py).
+ROMA_PROFILE_HZ = float(os.getenv("ROMA_PROFILE_HZ", "0"))
+
+# Building an Executor means an LM client and a parsed tool set, so warm ones
+# are pooled per (strategy, LM settings, tool set): at most ROMA_EXECUTOR_POOL
+# idle per key and ROMA_EXECUTOR_KEYS keys (least recently used dropped).
+# ROMA_WARMUP lists the strategies built at startup ("" disables warm-up).
+ROMA_EXECUTOR_POOL = int(os.getenv("ROMA_EXECUTOR_POOL", str(ROMA_THREADS)))
+ROMA_EXECUTOR_KEYS = int(os.getenv("ROMA_EXECUTOR_KEYS", "16"))
+ROMA_WARMUP = [s.strip() for s in os.getenv("ROMA_WARMUP", "react").split(",") if s.strip()]
+
+# ROMA_STARTUP picks when the imports and warm-up happen: "background" (serve
+# /health at once, warm up in a task; /ready turns 200 when done), "blocking"
+# (warm up before accepting requests) or "lazy" (no warm-up; first use imports).
+ROMA_STARTUP = os.getenv("ROMA_STARTUP", "background").lower()
+
+# Opt-in /plan memoization (ROMA_PLAN_CACHE=true), keyed by goal, context,
+# strategy, LM settings and tool set: ROMA_PLAN_CACHE_ENTRIES plans kept in
+# memory for ROMA_PLAN_CACHE_TTL seconds. ROMA_PLAN_CACHE_DB adds a SQLite file
+# that survives restarts and is shared by all workers. Identical concurrent
+# requests wait for one LM call instead of each making their own.
+ROMA_PLAN_CACHE = os.getenv("ROMA_PLAN_CACHE", "false").lower() in ("1", "true", "yes")
+ROMA_PLAN_CACHE_ENTRIES = int(os.getenv("ROMA_PLAN_CACHE_ENTRIES", "1024"))
+ROMA_PLAN_CACHE_TTL = float(os.getenv("ROMA_PLAN_CACHE_TTL", "3600"))
+ROMA_PLAN_CACHE_DB = os.getenv("ROMA_PLAN_CACHE_DB", "").strip()
+
+# /plan/stream and /act/stream send a keep-alive comment after ROMA_STREAM_PING
+# seconds without an event, so idle proxies do not cut long runs.
+ROMA_STREAM_PING = float(os.getenv("ROMA_STREAM_PING", "15"))
+
+# /plan/batch runs at most ROMA_BATCH_CONCURRENCY items of one batch at a time
+# (a request may ask for fewer) and accepts up to ROMA_BATCH_MAX_ITEMS items.
+ROMA_BATCH_CONCURRENCY = int(os.getenv("ROMA_BATCH_CONCURRENCY", str(ROMA_THREADS)))
+ROMA_BATCH_MAX_ITEMS = int(os.getenv("ROMA_BATCH_MAX_ITEMS", "100"))
+
+# /jobs: /act runs queued in the SQLite file ROMA_JOBS_DB and executed by
+# ROMA_JOB_WORKERS background workers (0 disables the job API), highest priority
+# first. A running job holds a lease of ROMA_JOB_LEASE seconds, renewed while it
+# runs; if its process dies the job is picked up again once the lease lapses,
+# at most ROMA_JOB_MAX_ATTEMPTS times. ROMA_JOB_DEADLINE (seconds from submit,
+# 0 = none) applies to jobs that set no deadline of their own. Finished jobs are
+# deleted after ROMA_JOB_RETENTION seconds.
+ROMA_JOBS_DB = os.getenv("ROMA_JOBS_DB", "roma_jobs.db")
+ROMA_JOB_WORKERS = int(os.getenv("ROMA_JOB_WORKERS", "2"))
+ROMA_JOB_LEASE = float(os.getenv("ROMA_JOB_LEASE", "30"))
+ROMA_JOB_MAX_ATTEMPTS = int(os.getenv("ROMA_JOB_MAX_ATTEMPTS", "3"))
+ROMA_JOB_DEADLINE = float(os.getenv("ROMA_JOB_DEADLINE", "0"))
+ROMA_JOB_RETENTION = float(os.getenv("ROMA_JOB_RETENTION", str(7 * 24 * 3600)))
+ROMA_JOB_POLL = float(os.getenv("ROMA_JOB_POLL", "1"))
+
+PLAN_STRATEGIES = {
+    "react": "ReAct",
+    "cot": "CoT",
+    "code_act": "CodeAct"
+}
+
+
+class WorkLane:
+    """Bounded thread pool with admission control (rejects with 429 when full)"""
+
+    def __init__(self, name: str, workers: int, queue_depth: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        """Admit fn(*args) (429 when full) and start it; the returned future resolves on the event loop"""
+        with self._lock:
+            if self.in_flight >= self.workers + self.queue_depth:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"overloaded: {self.name} queue is full, retry later",
+                    headers={"Retry-After": "1"},
+                )
+            self.in_flight += 1
+        submitted = time.perf_counter()
+
+        def call():
+            _telemetry.observe_stage("queue_wait", time.perf_counter() - submitted)
+            return fn(*args)
+
+        try:
+            # Copy the context so stages recorded on the pool thread keep the request's labels
+            future = asyncio.get_running_loop().run_in_executor(self._executor, contextvars.copy_context().run, call)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+
+    async def run(self, fn, *args):
+        return await self.submit(fn, *args)
+
+
+class ExecutorPool:
+    """
+    Idle Executors keyed by (strategy, LM settings, tool-set hash).
+
+    An executor serves one call at a time: ``lease`` takes an idle one for
+    the key, or builds one, and returns it to the pool when the call
+    succeeds (a failed call may have left it in a bad state).
+    """
+
+    def __init__(self, per_key: int, max_keys: int):
+        self.per_key = max(1, per_key)
+        self.max_keys = max(1, max_keys)
+        self._idle: "OrderedDict[Tuple, List[Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def lease(self, key: Tuple, build):
+        with _telemetry.stage("executor_setup"):
+            with self._lock:
+                idle = self._idle.get(key)
+                executor = idle.pop() if idle else None
+                if executor is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            _executor_pool_total.inc(result="miss" if executor is None else "hit")
+            if executor is None:
+                executor = build()
+        yield executor
+        self.put(key, executor)
+
+    def put(self, key: Tuple, executor: Any):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.per_key:
+                idle.append(executor)
+            while len(self._idle) > self.max_keys:
+                self._idle.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "keys": len(self._idle),
+                "idle": sum(len(idle) for idle in self._idle.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class PlanCache:
+    """
+    Encoded /plan results by key: an LRU with TTL in memory, optionally
+    backed by a SQLite table that outlives the process.
+
+    ``resolve`` coalesces concurrent misses: one task per key computes the
+    plan and every caller for the key awaits its result (or its error).
+    Failures are never cached.
+    """
+
+    def __init__(self, entries: int, ttl: float, path: str = ""):
+        self.entries = max(1, entries)
+        self.ttl = ttl
+        self.path = path
+        self._plans: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        if path:
+            self._open(path)
+
+    def _open(self, path: str):
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, plan TEXT NOT NULL, expires REAL NOT NULL)")
+            conn.execute("DELETE FROM plans WHERE expires <= ?", (time.time(),))
+            self._db = conn
+        except Exception as e:
+            print(f"[ROMA] Warning: plan cache database {path} unavailable, caching in memory only: {e}")
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key: str, expires: float, plan: Any):
+        with self._lock:
+            self._plans[key] = (expires, plan)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.entries:
+                self._plans.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(found, plan); looks in memory, then on disk (blocking)"""
+        now = time.time()
+        with self._lock:
+            entry = self._plans.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._plans.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                del self._plans[key]
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    row = self._db.execute(
+                        "SELECT plan, expires FROM plans WHERE key = ? AND expires > ?", (key, now)
+                    ).fetchone()
+            except Exception as e:
+                print(f"[ROMA] Warning: plan cache lookup failed: {e}")
+                row = None
+            if row is not None:
+                plan = json.loads(row[0])
+                self._remember(key, row[1], plan)
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return True, plan
+        return False, None
+
+    def put(self, key: str, plan: Any):
+        """Store a JSON-compatible plan (blocking when the disk tier is on)"""
+        expires = time.time() + self.ttl
+        self._remember(key, expires, plan)
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO plans (key, plan, expires) VALUES (?, ?, ?)",
+                        (key, json.dumps(plan, separators=(",", ":")), expires),
+                    )
+            except Exception as e:
+                print(f"[ROMA] Warning: plan cache write failed: {e}")
+
+    async def lookup(self, key: str) -> Tuple[bool, Any]:
+        """``get`` from the event loop (the disk tier is read off-loop); counts hits"""
+        with _telemetry.stage("cache_lookup"):
+            if self._db is None:
+                found, plan = self.get(key)
+            else:
+                found, plan = await asyncio.get_running_loop().run_in_executor(None, self.get, key)
+        if found:
+            _plan_cache_total.inc(result="hit")
+        return found, plan
+
+    def count_miss(self):
+        with self._lock:
+            self.misses += 1
+        _plan_cache_total.inc(result="miss")
+
+    async def resolve(self, key: str, compute) -> Tuple[Any, bool]:
+        """
+        (plan, cached) for ``key``, awaiting ``compute()`` at most once per key at a time.
+
+        The computation runs in its own task that the first caller and any
+        coalesced ones all await shielded, so a caller going away cancels
+        neither the shared call nor the others; the plan is still cached.
+        """
+        found, plan = await self.lookup(key)
+        if found:
+            return plan, True
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            with self._lock:
+                self.coalesced += 1
+            _plan_cache_total.inc(result="coalesced")
+            return await asyncio.shield(pending), True
+
+        self.count_miss()
+        task = asyncio.ensure_future(self._fill(key, compute))
+        # Retrieved here, so a failure nobody awaits any more is not logged
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return await asyncio.shield(task), False
+
+    async def _fill(self, key: str, compute) -> Any:
+        try:
+            plan = await compute()
+            if self._db is None:
+                self.put(key, plan)
+            else:
+                await asyncio.get_running_loop().run_in_executor(None, self.put, key, plan)
+            return plan
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            served = self.hits + self.coalesced
+            lookups = served + self.misses
+            return {
+                "entries": len(self._plans),
+                "max_entries": self.entries,
+                "ttl_s": self.ttl,
+                "disk": bool(self._db is not None),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "in_flight": len(self._inflight),
+                "hit_ratio": round(served / lookups, 4) if lookups else None,
+            }
+
+
+class JobStore:
+    """
+    SQLite store of background jobs: the queue, leases, step events and results.
+
+    Workers claim the highest-priority queued job (oldest first) and hold a
+    lease on it that they renew while it runs; a job whose lease lapses (its
+    process died) is claimed again, up to ``max_attempts`` times. Idempotency
+    keys are unique, so a retried submit finds the job it created before.
+    """
+
+    TERMINAL = ("succeeded", "failed", "cancelled", "expired")
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            idempotency_key TEXT UNIQUE,
+            request_hash TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            created REAL NOT NULL,
+            deadline REAL,
+            started REAL,
+            finished REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            owner TEXT,
+            lease_until REAL,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            events INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created);
+        CREATE TABLE IF NOT EXISTS job_events (
+            job_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL,
+            ts REAL NOT NULL,
+            PRIMARY KEY (job_id, seq)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _public(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "priority": row["priority"],
+            "idempotency_key": row["idempotency_key"],
+            "created": row["created"],
+            "deadline": row["deadline"],
+            "started": row["started"],
+            "finished": row["finished"],
+            "attempts": row["attempts"],
+            "cancel_requested": bool(row["cancel_requested"]),
+            "events": row["events"],
+            "result": json.loads(row["result"]) if row["result"] is not None else None,
+            "error": row["error"],
+        }
+
+    def _row(self, job_id: str) -> Optional[sqlite3.Row]:
+        return self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def submit(self, kind: str, payload: Dict[str, Any], priority: int, deadline: Optional[float],
+               idempotency_key: Optional[str]) -> Tuple[Dict[str, Any], bool]:
+        """(job, created); an existing job with the same idempotency key is returned as is"""
+        body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        request_hash = hashlib.sha256(f"{kind}\n{body}".encode("utf-8")).hexdigest()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT INTO jobs (id, kind, idempotency_key, request_hash, payload, priority, status, created, deadline)"
+                    " VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                    (job_id, kind, idempotency_key, request_hash, body, priority, time.time(), deadline),
+                )
+                return self._public(self._row(job_id)), True
+            except sqlite3.IntegrityError:
+                row = self._db.execute("SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        if row is None:
+            raise HTTPException(status_code=500, detail="job_store_error: job insert failed")
+        if row["request_hash"] != request_hash:
+            raise HTTPException(
+                status_code=409,
+                detail=f"idempotency_conflict: key {idempotency_key!r} was already used for a different request",
+            )
+        return self._public(row), False
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._row(job_id)
+        return self._public(row) if row is not None else None
+
+    def list(self, status: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            if status:
+                rows = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created DESC LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = self._db.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [self._public(row) for row in rows]
+
+    def events(self, job_id: str, after: int, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, event, data, ts FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after, limit),
+            ).fetchall()
+        return [{"seq": r["seq"], "event": r["event"], "data": json.loads(r["data"]), "ts": r["ts"]} for r in rows]
+
+    def append_event(self, job_id: str, event: str, data: Any):
+        encoded = json.dumps(data, separators=(",", ":"), default=str)
+        with self._lock:
+            # Only the job's owner appends, so the counter is the next sequence number
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._db.execute(
+                    "UPDATE jobs SET events = events + 1 WHERE id = ? RETURNING events", (job_id,)
+                ).fetchone()[0]
+                self._db.execute(
+                    "INSERT INTO job_events (job_id, seq, event, data, ts) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, seq, event, encoded, time.time()),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def claim(self, owner: str, lease: float, max_attempts: int) -> Optional[Dict[str, Any]]:
+        """Lease the next runnable job to ``owner``: {job_id, kind, payload, deadline, attempt} or None"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'expired', finished = ?, error = 'deadline passed before the job started'"
+                    " WHERE status = 'queued' AND deadline IS NOT NULL AND deadline <= ?",
+                    (now, now),
+                )
+                # Leases that lapsed belong to workers that died mid-run
+                self._db.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished = ?, lease_until = NULL"
+                    " WHERE status = 'running' AND lease_until < ? AND cancel_requested = 1",
+                    (now, now),
+                )
+                self._db.execute(
+                    "UPDATE jobs SET status = 'failed', finished = ?, lease_until = NULL,"
+                    " error = 'abandoned: worker lost ' || attempts || ' time(s)'"
+                    " WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (now, now, max_attempts),
+                )
+                row = self._db.execute(
+                    "SELECT id, kind, payload, deadline, attempts FROM jobs"
+                    " WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+                    " ORDER BY priority DESC, created LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, started = COALESCE(started, ?),"
+                        " attempts = attempts + 1 WHERE id = ?",
+                        (owner, now + lease, now, row["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "payload": json.loads(row["payload"]),
+            "deadline": row["deadline"],
+            "attempt": row["attempts"] + 1,
+        }
+
+    def heartbeat(self, job_id: str, owner: str, lease: float) -> Optional[bool]:
+        """Renew the lease; returns whether cancellation was requested (None if the lease was lost)"""
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'"
+                " RETURNING cancel_requested",
+                (time.time() + lease, job_id, owner),
+            ).fetchone()
+        return bool(row[0]) if row is not None else None
+
+    def finish(self, job_id: str, owner: str, status: str, result: Any = None, error: Optional[str] = None):
+        encoded = json.dumps(result, separators=(",", ":"), default=str) if result is not None else None
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, result = ?, error = ?, lease_until = NULL"
+                " WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, time.time(), encoded, error, job_id, owner),
+            )
+
+    def requeue(self, job_id: str, owner: str):
+        """Hand a running job back to the queue (this process is shutting down)"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease_until = NULL"
+                " WHERE id = ? AND owner = ? AND status = 'running'",
+                (job_id, owner),
+            )
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job now, or flag a running one for its worker; None if unknown"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = CASE status WHEN 'queued' THEN 'cancelled' ELSE status END,"
+                " finished = CASE status WHEN 'queued' THEN ? ELSE finished END,"
+                " cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+            row = self._row(job_id)
+        return self._public(row) if row is not None else None
+
+    def prune(self, older_than: float) -> int:
+        cutoff = time.time() - older_than
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE finished < ? AND status IN (?, ?, ?, ?))",
+                    (cutoff, *self.TERMINAL),
+                )
+                deleted = self._db.execute(
+                    "DELETE FROM jobs WHERE finished < ? AND status IN (?, ?, ?, ?)", (cutoff, *self.TERMINAL)
+                ).rowcount
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return deleted
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+
+_executor_lane = WorkLane("roma", ROMA_THREADS, ROMA_QUEUE_DEPTH)
+_executor_pool = ExecutorPool(ROMA_EXECUTOR_POOL, ROMA_EXECUTOR_KEYS)
+_plan_cache = PlanCache(ROMA_PLAN_CACHE_ENTRIES, ROMA_PLAN_CACHE_TTL, ROMA_PLAN_CACHE_DB) if ROMA_PLAN_CACHE else None
+# Opened by the lifespan when the job API is enabled
+_job_store: Optional[JobStore] = None
+
+
+# Startup progress for /ready: starting -> warming -> ready, or failed /
+# unavailable when roma_dspy cannot be used. Times are seconds since module load.
+_startup: Dict[str, Any] = {"state": "starting", "mode": ROMA_STARTUP, "imports": {}}
+_roma_module: Any = None
+_roma_error: Optional[str] = None
+_roma_lock = threading.Lock()
+
+
+def timed_import(name: str):
+    """``importlib.import_module(name)``, recording the time taken by a first import"""
+    loaded = name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if not loaded:
+        seconds = time.perf_counter() - start
+        _startup["imports"][name] = round(seconds, 4)
+        _import_seconds.set(seconds, module=name)
+    return module
+
+
+def load_roma():
+    """The roma_dspy module, imported on first use (503 when that fails)"""
+    global ROMA_AVAILABLE, _roma_module, _roma_error
+    if _roma_module is not None:
+        return _roma_module
+    with _roma_lock:
+        if _roma_module is None and _roma_error is None:
+            try:
+                try:
+                    # Separately, so its share of the import time is reported on its own
+                    timed_import("dspy")
+                except Exception:
+                    pass
+                _roma_module = timed_import("roma_dspy")
+            except Exception as e:
+                _roma_error = f"{type(e).__name__}: {e}"
+                ROMA_AVAILABLE = False
+                print(f"[ROMA] Warning: importing roma_dspy failed: {_roma_error}")
+    if _roma_module is None:
+        raise HTTPException(status_code=503, detail=f"roma_unavailable: importing roma_dspy failed: {_roma_error}")
+    return _roma_module
+
+
+def require_roma():
+    """503 unless roma_dspy is installed and did not fail to import"""
+    if not ROMA_AVAILABLE:
+        if _roma_error is not None:
+            detail = f"roma_unavailable: importing roma_dspy failed: {_roma_error}"
+        else:
+            detail = "roma_unavailable: roma_dspy is not installed. Provide vendored source or install from your index."
+        raise HTTPException(status_code=503, detail=detail)
+
+
+async def warm_up():
+    """Import ROMA and build the ROMA_WARMUP executors, off the event loop"""
+    if not ROMA_AVAILABLE:
+        _startup["state"] = "unavailable"
+        return
+    _startup["state"] = "warming"
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        await loop.run_in_executor(None, load_roma)
+        if ROMA_WARMUP:
+            await loop.run_in_executor(None, warm_executors, ROMA_WARMUP)
+    except HTTPException as e:
+        _startup.update(state="failed", error=e.detail)
+        return
+    now = time.perf_counter()
+    _startup.update(state="ready", warmup_s=round(now - start, 4), ready_s=round(now - _module_start, 4))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warming = None
+    if ROMA_STARTUP == "blocking":
+        await warm_up()
+    elif ROMA_STARTUP == "lazy":
+        _startup["state"] = "ready" if ROMA_AVAILABLE else "unavailable"
+    else:
+        warming = asyncio.create_task(warm_up())
+    workers = await start_job_workers() if ROMA_JOB_WORKERS > 0 else []
+    _startup["serving_s"] = round(time.perf_counter() - _module_start, 4)
+    yield
+    if warming is not None and not warming.done():
+        warming.cancel()
+    await stop_job_workers(workers)
+    if _plan_cache is not None:
+        _plan_cache.close()
+
+
+app = FastAPI(title="ROMA Bridge API", version="0.1.0", lifespan=lifespan)
+
+_telemetry = Telemetry("roma", request_labels=("strategy",), profile_hz=ROMA_PROFILE_HZ)
+_telemetry.instrument(app)
+_import_seconds = _telemetry.gauge(
+    "import_seconds", "Time taken by the first import of roma_dspy and dspy", ("module",)
+)
+_executor_pool_total = _telemetry.counter(
+    "executor_pool_total", "Executor leases served warm (hit) or built (miss)", ("result",)
+)
+_stream_total = _telemetry.counter(
+    "stream_total", "Streamed runs by outcome (completed, error, cancelled by client disconnect)", ("result",)
+)
+_jobs_total = _telemetry.counter(
+    "jobs_total", "Background job runs by outcome", ("result",)
+)
+_plan_cache_total = _telemetry.counter(
+    "plan_cache_total", "/plan requests answered from the cache (hit), by another in-flight call (coalesced) or the LM (miss)", ("result",)
+)
 
 class PlanRequest(BaseModel):
     goal: str
     context: Optional[Dict[str, Any]] = None
     strategy: Optional[str] = "react"  # react, cot, code_act
+    cache: bool = True  # False skips the plan cache (when enabled) for this request
+
+class BatchPlanRequest(BaseModel):
+    items: List[PlanRequest]
+    concurrency: Optional[int] = None  # capped at ROMA_BATCH_CONCURRENCY
+    stream: bool = False  # server-sent "item" events in completion order, then "done"
 
 class ActRequest(BaseModel):
     task: str
     context: Optional[Dict[str, Any]] = None
     tools: Optional[List[Dict[str, Any]]] = None
 
+class ActJobRequest(ActRequest):
+    priority: int = 0  # higher runs first
+    deadline_s: Optional[float] = None  # seconds from submission; ROMA_JOB_DEADLINE when unset
+    idempotency_key: Optional[str] = None  # or the Idempotency-Key header
+
 class HealthResponse(BaseModel):
     status: str
     version: str
     roma_version: Optional[str] = None
     roma_available: bool = False
+    executor_pool: Optional[Dict[str, Any]] = None
+    plan_cache: Optional[Dict[str, Any]] = None
+    jobs: Optional[Dict[str, Any]] = None
+    startup: Optional[Dict[str, Any]] = None
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint"""
+    """Liveness: answers as soon as the server runs, warm or not (see /ready)"""
     return HealthResponse(
         status="ok",
         version="0.1.0",
         roma_version=ROMA_VERSION,
         roma_available=ROMA_AVAILABLE,
+        executor_pool=_executor_pool.stats(),
+        plan_cache=_plan_cache.stats() if _plan_cache is not None else None,
+        jobs=await job_stats() if _job_store is not None else None,
+        startup=_startup,
     )
 
+@app.get("/ready")
+async def readiness():
+    """Readiness: 200 once roma_dspy is imported and the warm-up executors are built, else 503"""
+    ready = _startup["state"] == "ready"
+    return JSONResponse({"ready": ready, **_startup}, status_code=200 if ready else 503)
+
+def executor_spec(strategy: str) -> Tuple[Tuple, Any]:
+    """Pool key and builder of an Executor for ``strategy`` with the current LM settings and tools"""
+    settings = lm_settings_from_env()
+    tools, tools_hash = load_tools()
+
+    def build():
+        return load_roma().Executor(prediction_strategy=strategy, lm=get_lm(settings), tools=tools)
+
+    return (strategy, settings, tools_hash), build
+
+
+def warm_executors(strategies: List[str]):
+    """Build one pooled executor per strategy (and with it the LM client and tool set)"""
+    for name in strategies:
+        strategy = PLAN_STRATEGIES.get(name, name)
+        try:
+            key, build = executor_spec(strategy)
+            _executor_pool.put(key, build())
+        except HTTPException as e:
+            print(f"[ROMA] Warning: skipping executor warm-up for {name}: {e.detail}")
+            return
+        except Exception as e:
+            print(f"[ROMA] Warning: executor warm-up for {name} failed: {e}")
+
+def run_plan(request: PlanRequest):
+    """Blocking part of /plan; runs on the executor lane"""
+    with _executor_pool.lease(*executor_spec(PLAN_STRATEGIES.get(request.strategy, "ReAct"))) as executor:
+        # Dominated by LM round-trips
+        with _telemetry.stage("execute"):
+            return executor.plan(request.goal, context=request.context or {})
+
+def plan_cache_key(request: PlanRequest) -> str:
+    """Canonical hash of everything a plan depends on: goal, context, strategy, LM settings and tool set"""
+    _, tools_hash = load_tools()
+    material = [
+        request.goal,
+        request.context or {},
+        PLAN_STRATEGIES.get(request.strategy, "ReAct"),
+        list(lm_settings_from_env()),
+        tools_hash,
+    ]
+    canonical = json.dumps(jsonable_encoder(material), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def run_act(request: ActRequest):
+    """Blocking part of /act; runs on the executor lane"""
+    with _executor_pool.lease(*executor_spec("ReAct")) as executor:
+        with _telemetry.stage("execute"):
+            return executor.forward(request.task, context=request.context or {}, tools=request.tools or [])
+
+class RunCancelled(BaseException):
+    """
+    Raised inside a streamed run once its client has gone away.
+
+    A BaseException because DSPy runs callbacks under ``except Exception``
+    and only logs what they raise; this has to unwind the run instead.
+    """
+
+
+def _fields(value: Any) -> Dict[str, Any]:
+    """Fields of a DSPy Prediction/Example (or a dict) as a plain dict"""
+    if isinstance(value, dict):
+        return value
+    to_dict = getattr(value, "toDict", None)
+    if callable(to_dict):
+        try:
+            return to_dict()
+        except Exception:
+            return {}
+    return {}
+
+
+class StepEvents:
+    """
+    DSPy callback turning a run's intermediate steps into stream events.
+
+    Module outputs carrying a thought become ``thought`` events, tool calls
+    ``tool_call``/``tool_result`` and each LM completion ``partial``. Every
+    step start checks ``cancelled`` and aborts the run with RunCancelled, so
+    a disconnected client stops the run at its next LM or tool call.
+    """
+
+    THOUGHT_FIELDS = ("next_thought", "thought", "reasoning", "rationale")
+
+    def __init__(self, emit, cancelled: threading.Event):
+        self.emit = emit
+        self.cancelled = cancelled
+
+    def _check(self):
+        if self.cancelled.is_set():
+            raise RunCancelled("client disconnected")
+
+    def on_module_start(self, call_id, instance, inputs):
+        self._check()
+
+    def on_module_end(self, call_id, outputs, exception=None):
+        fields = _fields(outputs)
+        for name in self.THOUGHT_FIELDS:
+            if fields.get(name):
+                self.emit("thought", {"id": call_id, "module": type(outputs).__name__, "text": fields[name]})
+                break
+
+    def on_lm_start(self, call_id, instance, inputs):
+        self._check()
+
+    def on_lm_end(self, call_id, outputs, exception=None):
+        if exception is None and outputs:
+            self.emit("partial", {"id": call_id, "text": outputs})
+
+    def on_tool_start(self, call_id, instance, inputs):
+        self._check()
+        self.emit("tool_call", {"id": call_id, "tool": getattr(instance, "name", type(instance).__name__), "args": inputs})
+
+    def on_tool_end(self, call_id, outputs, exception=None):
+        if exception is not None:
+            self.emit("tool_result", {"id": call_id, "error": str(exception)})
+        else:
+            self.emit("tool_result", {"id": call_id, "result": outputs})
+
+    def on_adapter_format_start(self, call_id, instance, inputs):
+        self._check()
+
+    def on_adapter_format_end(self, call_id, outputs, exception=None):
+        pass
+
+    def on_adapter_parse_start(self, call_id, instance, inputs):
+        pass
+
+    def on_adapter_parse_end(self, call_id, outputs, exception=None):
+        pass
+
+    def on_evaluate_start(self, call_id, instance, inputs):
+        pass
+
+    def on_evaluate_end(self, call_id, outputs, exception=None):
+        pass
+
+
+def run_streamed(fn, request, emit, cancelled: threading.Event):
+    """``fn(request)`` with a StepEvents callback installed for this thread's DSPy calls"""
+    try:
+        scoped = getattr(timed_import("dspy"), "context", None)
+    except Exception:
+        scoped = None
+    if scoped is None:
+        # No per-call callbacks in this DSPy: only the final result is streamed
+        return fn(request)
+    with scoped(callbacks=[StepEvents(emit, cancelled)]):
+        return fn(request)
+
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), separators=(',', ':'))}\n\n"
+
+
+def stream_run(fn, request, result_key: str, status: str, cached: Optional[Tuple[Any]] = None, store=None):
+    """
+    SSE response running ``fn(request)`` on the executor lane and relaying its steps.
+
+    Events: ``start``, then any of ``thought``/``tool_call``/``tool_result``/
+    ``partial`` as they happen, then ``result`` (``{result_key: ..., status}``)
+    or ``error`` (``{status_code, detail}``). Admission happens before the
+    response starts, so a full lane is still a plain 429. When the client
+    disconnects the run is cancelled at its next step.
+
+    ``cached`` (a 1-tuple holding a result) answers without running;
+    ``store`` is called with the encoded result of a completed run.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+    done = object()
+
+    def emit(event: str, data: Any):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    if cached is not None:
+        future = None
+    else:
+        future = _executor_lane.submit(run_streamed, fn, request, emit, cancelled)
+        future.add_done_callback(lambda _: queue.put_nowait((done, None)))
+
+    async def events():
+        outcome = "cancelled"
+        try:
+            yield sse("start", {"status": "started", "cached": future is None})
+            if future is None:
+                outcome = "completed"
+                yield sse("result", {result_key: cached[0], "status": status, "cached": True})
+                return
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), ROMA_STREAM_PING)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event is not done:
+                    yield sse(event, data)
+                    continue
+                error = future.exception()
+                if error is None:
+                    with _telemetry.stage("serialize"):
+                        result = jsonable_encoder(future.result())
+                    if store is not None:
+                        await loop.run_in_executor(None, store, result)
+                    outcome = "completed"
+                    yield sse("result", {result_key: result, "status": status})
+                else:
+                    outcome = "error"
+                    code = error.status_code if isinstance(error, HTTPException) else 500
+                    detail = error.detail if isinstance(error, HTTPException) else str(error)
+                    yield sse("error", {"status_code": code, "detail": detail})
+                return
+        finally:
+            _stream_total.inc(result=outcome)
+            if future is not None and not future.done():
+                # Client went away mid-run: stop at the next step; nobody awaits the outcome
+                cancelled.set()
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def execute_plan(request: PlanRequest) -> Tuple[Any, Optional[bool]]:
+    """The encoded plan for ``request`` and whether the plan cache answered it (None when not consulted)"""
+    if _plan_cache is None or not request.cache:
+        result = await _executor_lane.run(run_plan, request)
+        with _telemetry.stage("serialize"):
+            return jsonable_encoder(result), None
+
+    async def compute():
+        # Cached plans are stored encoded, so hits skip serialization too
+        result = await _executor_lane.run(run_plan, request)
+        with _telemetry.stage("serialize"):
+            return jsonable_encoder(result)
+
+    return await _plan_cache.resolve(plan_cache_key(request), compute)
+
 @app.post("/plan")
 async def plan_task(request: PlanRequest):
     """Plan a task using ROMA Executor"""
+    # Unknown strategies run as ReAct; label them that way too to bound cardinality
+    _telemetry.set_labels(strategy=request.strategy if request.strategy in PLAN_STRATEGIES else "react")
     try:
-        if not ROMA_AVAILABLE:
-            raise HTTPException(
-                status_code=503,
-                detail="roma_unavailable: roma_dspy is not installed. Provide vendored source or install from your index.",
-            )
-        # Initialize ROMA Executor with requested strategy
-        strategy_map = {
-            "react": "ReAct",
-            "cot": "CoT",
-            "code_act": "CodeAct"
-        }
-
-        executor = Executor(
-            prediction_strategy=strategy_map.get(request.strategy, "ReAct"),
-            lm=get_lm_from_env(),
-            tools=get_available_tools(),
-        )
-        result = executor.plan(request.goal, context=request.context or {})
-        return {"plan": result, "status": "planned"}
+        require_roma()
+        plan, cached = await execute_plan(request)
+        body = {"plan": plan, "status": "planned"}
+        if cached is not None:
+            body["cached"] = cached
+        return JSONResponse(body)
     except HTTPException:
         raise
     except Exception as e:
@@ -81,24 +1077,328 @@ async def plan_task(request: PlanRequest):
 @app.post("/act")
 async def act_on_task(request: ActRequest):
     """Execute a task using ROMA Executor"""
+    _telemetry.set_labels(strategy="react")
     try:
-        if not ROMA_AVAILABLE:
-            raise HTTPException(
-                status_code=503,
-                detail="roma_unavailable: roma_dspy is not installed. Provide vendored source or install from your index.",
-            )
-        executor = Executor(
-            prediction_strategy="ReAct",
-            lm=get_lm_from_env(),
-            tools=get_available_tools(),
-        )
-        result = executor.forward(request.task, context=request.context or {}, tools=request.tools or [])
-        return {"result": result, "status": "executed"}
+        require_roma()
+        result = await _executor_lane.run(run_act, request)
+        with _telemetry.stage("serialize"):
+            return JSONResponse(jsonable_encoder({"result": result, "status": "executed"}))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/plan/stream")
+async def plan_task_stream(request: PlanRequest):
+    """Plan a task, streaming intermediate steps as server-sent events"""
+    _telemetry.set_labels(strategy=request.strategy if request.strategy in PLAN_STRATEGIES else "react")
+    require_roma()
+    if _plan_cache is None or not request.cache:
+        return stream_run(run_plan, request, "plan", "planned")
+    # A cached plan is sent at once; a fresh one is stored when the run completes
+    key = plan_cache_key(request)
+    found, plan = await _plan_cache.lookup(key)
+    if found:
+        return stream_run(run_plan, request, "plan", "planned", cached=(plan,))
+    _plan_cache.count_miss()
+    return stream_run(run_plan, request, "plan", "planned", store=lambda result: _plan_cache.put(key, result))
+
+async def plan_batch_item(index: int, item: PlanRequest, slots: asyncio.Semaphore) -> Dict[str, Any]:
+    """One /plan/batch result; failures are reported in the item, not raised"""
+    async with slots:
+        start = time.perf_counter()
+        entry: Dict[str, Any] = {"index": index}
+        try:
+            plan, cached = await execute_plan(item)
+            entry.update(status="planned", plan=plan)
+            if cached is not None:
+                entry["cached"] = cached
+        except HTTPException as e:
+            entry.update(status="error", error={"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            entry.update(status="error", error={"status_code": 500, "detail": str(e)})
+        entry["took_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return entry
+
+@app.post("/plan/batch")
+async def plan_batch(request: BatchPlanRequest):
+    """
+    Plan several goals concurrently.
+
+    Items share the executor lane, pooled executors and plan cache with
+    /plan; at most ``concurrency`` of them run at once. Results come back in
+    request order, each with its own status, error and timing. With
+    ``stream`` they are sent as server-sent ``item`` events as they finish,
+    followed by a ``done`` summary.
+    """
+    strategies = {item.strategy if item.strategy in PLAN_STRATEGIES else "react" for item in request.items}
+    _telemetry.set_labels(strategy=strategies.pop() if len(strategies) == 1 else "mixed")
+    require_roma()
+    if len(request.items) > ROMA_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"batch_too_large: {len(request.items)} items, at most {ROMA_BATCH_MAX_ITEMS} per batch",
+        )
+    limit = ROMA_BATCH_CONCURRENCY if request.concurrency is None else min(request.concurrency, ROMA_BATCH_CONCURRENCY)
+    slots = asyncio.Semaphore(max(1, limit))
+    start = time.perf_counter()
+    tasks = [asyncio.ensure_future(plan_batch_item(i, item, slots)) for i, item in enumerate(request.items)]
+
+    def summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "count": len(results),
+            "failed": sum(1 for r in results if r["status"] == "error"),
+            "took_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    if not request.stream:
+        results = await asyncio.gather(*tasks)
+        return JSONResponse({"results": results, **summary(results)})
+
+    async def events():
+        results = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                results.append(result)
+                yield sse("item", result)
+            yield sse("done", summary(results))
+        finally:
+            # Client went away: items still waiting for a slot never start
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/act/stream")
+async def act_on_task_stream(request: ActRequest):
+    """Execute a task, streaming thoughts, tool calls and tool results as server-sent events"""
+    _telemetry.set_labels(strategy="react")
+    require_roma()
+    return stream_run(run_act, request, "result", "executed")
+
+# Background job workers. The owner id tells this process's leases apart from
+# those of other workers sharing the job database.
+_job_owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+_job_threads: Optional[ThreadPoolExecutor] = None
+_job_wakeup: Optional[asyncio.Event] = None
+_job_stopping = threading.Event()
+_job_runs: Dict[str, threading.Event] = {}  # cancel flags of the jobs running here
+_job_pruned_at = 0.0
+
+
+async def start_job_workers() -> List[asyncio.Task]:
+    global _job_store, _job_threads, _job_wakeup, _job_pruned_at
+    loop = asyncio.get_running_loop()
+    try:
+        _job_store = await loop.run_in_executor(None, JobStore, ROMA_JOBS_DB)
+    except Exception as e:
+        print(f"[ROMA] Warning: job store {ROMA_JOBS_DB} unavailable, /jobs disabled: {e}")
+        return []
+    if not ROMA_AVAILABLE:
+        # Jobs can be inspected but not run (nor submitted) without roma_dspy
+        return []
+    _job_stopping.clear()
+    _job_wakeup = asyncio.Event()
+    _job_threads = ThreadPoolExecutor(max_workers=ROMA_JOB_WORKERS, thread_name_prefix="roma-job")
+    _job_pruned_at = 0.0
+    return [asyncio.create_task(job_worker()) for _ in range(ROMA_JOB_WORKERS)]
+
+
+async def stop_job_workers(workers: List[asyncio.Task]):
+    global _job_store
+    _job_stopping.set()
+    for cancelled in list(_job_runs.values()):
+        cancelled.set()
+    if _job_wakeup is not None:
+        _job_wakeup.set()
+    if workers:
+        # Runs stop at their next step and go back to the queue; one stuck in a
+        # long LM call keeps its lease and is picked up again once it lapses
+        _, pending = await asyncio.wait(workers, timeout=10)
+        for task in pending:
+            task.cancel()
+    if _job_threads is not None:
+        _job_threads.shutdown(wait=False)
+    if _job_store is not None:
+        _job_store.close()
+        _job_store = None
+
+
+async def job_worker():
+    global _job_pruned_at
+    loop = asyncio.get_running_loop()
+    while not _job_stopping.is_set():
+        try:
+            job = await loop.run_in_executor(None, _job_store.claim, _job_owner, ROMA_JOB_LEASE, ROMA_JOB_MAX_ATTEMPTS)
+        except Exception as e:
+            print(f"[ROMA] Warning: job claim failed: {e}")
+            job = None
+        if job is not None:
+            await run_job(job)
+            continue
+        if time.time() - _job_pruned_at > 600:
+            _job_pruned_at = time.time()
+            await loop.run_in_executor(None, _job_store.prune, ROMA_JOB_RETENTION)
+        try:
+            await asyncio.wait_for(_job_wakeup.wait(), ROMA_JOB_POLL)
+        except asyncio.TimeoutError:
+            pass
+        _job_wakeup.clear()
+
+
+def _job_call(job: Dict[str, Any], emit, cancelled: threading.Event):
+    """Blocking part of a job; runs on the job threads"""
+    emit("attempt", {"attempt": job["attempt"]})
+    payload = job["payload"]
+    request = ActRequest(task=payload["task"], context=payload.get("context"), tools=payload.get("tools"))
+    return run_streamed(run_act, request, emit, cancelled)
+
+
+async def run_job(job: Dict[str, Any]):
+    """Run a claimed job to an outcome: renew its lease, honour cancels and its deadline, store the result"""
+    loop = asyncio.get_running_loop()
+    store, job_id, deadline = _job_store, job["job_id"], job["deadline"]
+    cancelled = threading.Event()
+    _job_runs[job_id] = cancelled
+
+    def emit(event: str, data: Any):
+        # Steps are persisted as they happen, so progress survives the process
+        try:
+            store.append_event(job_id, event, jsonable_encoder(data))
+        except Exception as e:
+            print(f"[ROMA] Warning: could not record {event} for job {job_id}: {e}")
+
+    outcome = None
+    try:
+        future = loop.run_in_executor(_job_threads, _job_call, job, emit, cancelled)
+        while not future.done():
+            timeout = ROMA_JOB_LEASE / 3
+            if deadline is not None and outcome is None:
+                timeout = min(timeout, max(0.0, deadline - time.time()))
+            await asyncio.wait({future}, timeout=timeout)
+            if future.done():
+                break
+            if outcome is None and deadline is not None and time.time() >= deadline:
+                outcome = "expired"
+            state = await loop.run_in_executor(None, store.heartbeat, job_id, _job_owner, ROMA_JOB_LEASE)
+            if outcome is None and state is None:
+                outcome = "lost"
+            elif outcome is None and state:
+                outcome = "cancelled"
+            if outcome is None and _job_stopping.is_set():
+                outcome = "requeued"
+            if outcome is not None or _job_stopping.is_set():
+                cancelled.set()
+        error = future.exception()
+        if outcome is None and isinstance(error, RunCancelled):
+            # Flagged directly by a cancel request or shutdown in this process
+            outcome = "requeued" if _job_stopping.is_set() else "cancelled"
+        if outcome == "lost":
+            pass  # another worker owns the job now
+        elif outcome == "requeued":
+            await loop.run_in_executor(None, store.requeue, job_id, _job_owner)
+        elif outcome in ("cancelled", "expired"):
+            # Whatever the run returned: a result that arrives after a cancel or past the deadline is dropped
+            message = "cancelled by request" if outcome == "cancelled" else "deadline exceeded"
+            await loop.run_in_executor(None, store.finish, job_id, _job_owner, outcome, None, message)
+        elif error is None:
+            with _telemetry.stage("serialize"):
+                result = jsonable_encoder(future.result())
+            outcome = "succeeded"
+            await loop.run_in_executor(None, store.finish, job_id, _job_owner, "succeeded", result)
+        else:
+            outcome = "failed"
+            detail = error.detail if isinstance(error, HTTPException) else str(error)
+            await loop.run_in_executor(None, store.finish, job_id, _job_owner, "failed", None, detail)
+        _jobs_total.inc(result=outcome)
+    except Exception as e:
+        print(f"[ROMA] Warning: job {job_id} could not be completed: {e}")
+    finally:
+        _job_runs.pop(job_id, None)
+
+
+async def job_stats() -> Dict[str, Any]:
+    counts = await asyncio.get_running_loop().run_in_executor(None, _job_store.counts)
+    return {"workers": ROMA_JOB_WORKERS if _job_threads is not None else 0, "running_here": len(_job_runs), **counts}
+
+
+def job_store() -> JobStore:
+    if _job_store is None:
+        raise HTTPException(status_code=503, detail="jobs_disabled: set ROMA_JOB_WORKERS > 0 and a writable ROMA_JOBS_DB")
+    return _job_store
+
+
+@app.post("/jobs/act", status_code=202)
+async def submit_act_job(request: ActJobRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Queue an /act run and return at once; poll GET /jobs/{job_id} for its outcome.
+
+    Resubmitting with the same idempotency key returns the existing job
+    (200) instead of starting another run; reusing a key for a different
+    request is a 409.
+    """
+    _telemetry.set_labels(strategy="react")
+    store = job_store()
+    require_roma()
+    deadline_s = request.deadline_s if request.deadline_s is not None else (ROMA_JOB_DEADLINE or None)
+    if deadline_s is not None and deadline_s <= 0:
+        raise HTTPException(status_code=400, detail="invalid_deadline: deadline_s must be positive")
+    payload = {"task": request.task, "context": request.context, "tools": request.tools}
+    job, created = await asyncio.get_running_loop().run_in_executor(
+        None,
+        store.submit,
+        "act",
+        jsonable_encoder(payload),
+        request.priority,
+        time.time() + deadline_s if deadline_s is not None else None,
+        request.idempotency_key or idempotency_key,
+    )
+    if created and _job_wakeup is not None:
+        _job_wakeup.set()
+    return JSONResponse(job, status_code=202 if created else 200)
+
+@app.get("/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = 50):
+    """Most recent jobs, optionally only those in ``status``"""
+    store = job_store()
+    jobs = await asyncio.get_running_loop().run_in_executor(None, store.list, status, max(1, min(limit, 500)))
+    return {"jobs": jobs, "count": len(jobs)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """A job's status, attempts, step count and (once finished) result or error"""
+    job = await asyncio.get_running_loop().run_in_executor(None, job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"job_not_found: {job_id}")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, after: int = 0, limit: int = 100):
+    """Recorded steps of a job with sequence numbers above ``after`` (poll with the last seq seen)"""
+    store = job_store()
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"job_not_found: {job_id}")
+    events = await loop.run_in_executor(None, store.events, job_id, after, max(1, min(limit, 1000)))
+    return {"job_id": job_id, "status": job["status"], "events": events}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a job: a queued one at once, a running one at its next step"""
+    job = await asyncio.get_running_loop().run_in_executor(None, job_store().request_cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"job_not_found: {job_id}")
+    cancelled = _job_runs.get(job_id)
+    if cancelled is not None:
+        cancelled.set()
+    return job
+
 @app.get("/schema/plan")
 async def plan_schema():
     """Get the schema for plan endpoint"""
@@ -110,7 +1410,8 @@ async def plan_schema():
             "properties": {
                 "goal": {"type": "string", "description": "The goal to plan for"},
                 "context": {"type": "object", "description": "Additional context"},
-                "strategy": {"type": "string", "enum": ["react", "cot", "code_act"], "description": "Planning strategy"}
+                "strategy": {"type": "string", "enum": ["react", "cot", "code_act"], "description": "Planning strategy"},
+                "cache": {"type": "boolean", "description": "Use the plan cache when the bridge has it enabled (default true)"}
             },
             "required": ["goal"]
         }
@@ -133,8 +1434,8 @@ async def act_schema():
         }
     }
 
-def get_lm_from_env():
-    """Get language model configuration from environment"""
+def lm_settings_from_env() -> Tuple[str, float, int]:
+    """(model, temperature, max_tokens) from the environment"""
     # ROMA uses DSPy LMs. Configure with a model string like:
     #   openrouter/anthropic/claude-3.5-sonnet
     #   openai/gpt-4o-mini
@@ -143,11 +1444,6 @@ def get_lm_from_env():
     if not model:
         raise HTTPException(status_code=400, detail="missing_config: set ROMA_MODEL (or DSPY_MODEL)")
 
-    try:
-        import dspy  # type: ignore
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"dspy_unavailable: {e}")
-
     temperature_raw = (os.getenv("ROMA_TEMPERATURE") or "0.1").strip()
     max_tokens_raw = (os.getenv("ROMA_MAX_TOKENS") or "600").strip()
     try:
@@ -158,88 +1454,142 @@ def get_lm_from_env():
         max_tokens = int(max_tokens_raw)
     except Exception:
         max_tokens = 600
+    return model, temperature, max_tokens
 
-    return dspy.LM(model, temperature=temperature, max_tokens=max_tokens)
 
-def get_available_tools():
-    """
-    Get available tools for ROMA executor.
+# One LM client per settings; executors built with the same settings share it
+_lm_clients: Dict[Tuple[str, float, int], Any] = {}
+_lm_lock = threading.Lock()
 
-    Tools can be configured via:
-    1. ROMA_TOOLS_CONFIG environment variable pointing to a JSON file
-    2. ROMA_TOOLS environment variable with comma-separated tool names
-    3. Default fallback to common MCP tools
 
-    Returns a list of tool definitions compatible with DSPy/ROMA.
-    """
-    import json
+def get_lm(settings: Tuple[str, float, int]):
+    """The DSPy LM for (model, temperature, max_tokens), created on first use"""
+    lm = _lm_clients.get(settings)
+    if lm is None:
+        with _lm_lock:
+            lm = _lm_clients.get(settings)
+            if lm is None:
+                try:
+                    dspy = timed_import("dspy")
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=f"dspy_unavailable: {e}")
+                model, temperature, max_tokens = settings
+                lm = dspy.LM(model, temperature=temperature, max_tokens=max_tokens)
+                _lm_clients[settings] = lm
+    return lm
+
+def get_lm_from_env():
+    """Get language model configuration from environment"""
+    return get_lm(lm_settings_from_env())
+
+# Placeholder definitions of common MCP tools; actual implementations come from MCP servers
+DEFAULT_TOOLS = [
+    {
+        "name": "search",
+        "description": "Search for information in the knowledge base",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Search query"}
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "read_file",
+        "description": "Read contents of a file",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string", "description": "File path to read"}
+            },
+            "required": ["path"]
+        }
+    },
+    {
+        "name": "write_file",
+        "description": "Write content to a file",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string", "description": "File path to write"},
+                "content": {"type": "string", "description": "Content to write"}
+            },
+            "required": ["path", "content"]
+        }
+    },
+    {
+        "name": "execute_command",
+        "description": "Execute a shell command",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "command": {"type": "string", "description": "Command to execute"}
+            },
+            "required": ["command"]
+        }
+    }
+]
+
+# Parsed tool sets with their hash: source -> (stamp, tools, hash). The config
+# file is re-read only when its mtime or size changes.
+_tool_sets: Dict[str, Tuple[Any, List[Dict[str, Any]], str]] = {}
+_tool_sets_lock = threading.Lock()
+
+
+def _tool_set(source: str, stamp: Any, parse) -> Tuple[List[Dict[str, Any]], str]:
+    cached = _tool_sets.get(source)
+    if cached is not None and cached[0] == stamp:
+        return cached[1], cached[2]
+    tools = parse()
+    digest = hashlib.sha1(json.dumps(tools, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    with _tool_sets_lock:
+        _tool_sets[source] = (stamp, tools, digest)
+    return tools, digest
+
 
+def load_tools() -> Tuple[List[Dict[str, Any]], str]:
+    """The configured tool set (see get_available_tools) and a hash identifying it"""
     # Option 1: Load from config file
     tools_config_path = os.getenv("ROMA_TOOLS_CONFIG")
-    if tools_config_path and os.path.exists(tools_config_path):
+    if tools_config_path:
         try:
-            with open(tools_config_path, "r") as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"[ROMA] Warning: Failed to load tools config from {tools_config_path}: {e}")
+            st = os.stat(tools_config_path)
+        except OSError:
+            st = None
+        if st is not None:
+            def parse():
+                with open(tools_config_path, "r") as f:
+                    return json.load(f)
+            try:
+                return _tool_set(f"config:{tools_config_path}", (st.st_mtime_ns, st.st_size), parse)
+            except Exception as e:
+                print(f"[ROMA] Warning: Failed to load tools config from {tools_config_path}: {e}")
 
     # Option 2: Parse from environment variable
     tools_env = os.getenv("ROMA_TOOLS", "").strip()
     if tools_env:
-        tool_names = [t.strip() for t in tools_env.split(",") if t.strip()]
-        return [{"name": name, "description": f"Tool: {name}"} for name in tool_names]
+        def parse():
+            tool_names = [t.strip() for t in tools_env.split(",") if t.strip()]
+            return [{"name": name, "description": f"Tool: {name}"} for name in tool_names]
+        return _tool_set("env", tools_env, parse)
 
     # Option 3: Default fallback - return common MCP tool stubs
-    # These are placeholder definitions; actual implementations come from MCP servers
-    default_tools = [
-        {
-            "name": "search",
-            "description": "Search for information in the knowledge base",
-            "inputSchema": {
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string", "description": "Search query"}
-                },
-                "required": ["query"]
-            }
-        },
-        {
-            "name": "read_file",
-            "description": "Read contents of a file",
-            "inputSchema": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "File path to read"}
-                },
-                "required": ["path"]
-            }
-        },
-        {
-            "name": "write_file",
-            "description": "Write content to a file",
-            "inputSchema": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "File path to write"},
-                    "content": {"type": "string", "description": "Content to write"}
-                },
-                "required": ["path", "content"]
-            }
-        },
-        {
-            "name": "execute_command",
-            "description": "Execute a shell command",
-            "inputSchema": {
-                "type": "object",
-                "properties": {
-                    "command": {"type": "string", "description": "Command to execute"}
-                },
-                "required": ["command"]
-            }
-        }
-    ]
+    return _tool_set("default", None, lambda: DEFAULT_TOOLS)
+
+def get_available_tools():
+    """
+    Get available tools for ROMA executor.
 
-    return default_tools
+    Tools can be configured via:
+    1. ROMA_TOOLS_CONFIG environment variable pointing to a JSON file
+    2. ROMA_TOOLS environment variable with comma-separated tool names
+    3. Default fallback to common MCP tools
+
+    Returns a list of tool definitions compatible with DSPy/ROMA; the list
+    is cached and shared, so callers must not modify it.
+    """
+    return load_tools()[0]
 
 
 @app.get("/tools")
@@ -252,6 +1602,13 @@ async def list_tools():
         "source": "config" if os.getenv("ROMA_TOOLS_CONFIG") else ("env" if os.getenv("ROMA_TOOLS") else "default")
     }
 
+_startup["module_s"] = round(time.perf_counter() - _module_start, 4)
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "8000"))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    if ROMA_WORKERS > 1:
+        # Each worker process imports the app by name
+        app_path = f"{__spec__.name if __spec__ else 'bridge_api'}:app"
+        uvicorn.run(app_path, host="0.0.0.0", port=port, workers=ROMA_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
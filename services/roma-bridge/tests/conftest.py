@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# bridge_api reads its configuration at import time: keep the job database out of the tree
+_tmp = tempfile.mkdtemp(prefix="roma-bridge-tests-")
+os.environ.setdefault("ROMA_JOBS_DB", os.path.join(_tmp, "jobs.db"))
+# dspy pulls in LiteLLM, which otherwise fetches its model price map over the network
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, SRC_DIR)
+
+
+@pytest.fixture(scope="session")
+def bridge():
+    import bridge_api
+
+    return bridge_api
+
+
+class FakeRoma:
+    """
+    Stands in for the roma_dspy module: its Executor runs ``plan`` and ``act``
+    (replaceable per test) instead of LM calls, and records every executor built
+    """
+
+    def __init__(self):
+        self.built = []
+        self.plan = lambda goal, context: {"goal": goal, "steps": []}
+        self.act = lambda task, context, tools: {"task": task}
+        roma = self
+
+        class Executor:
+            def __init__(self, prediction_strategy, lm, tools):
+                self.strategy, self.lm, self.tools = prediction_strategy, lm, tools
+                roma.built.append(self)
+
+            def plan(self, goal, context):
+                return roma.plan(goal, context)
+
+            def forward(self, task, context, tools):
+                return roma.act(task, context, tools)
+
+        self.Executor = Executor
+
+
+@pytest.fixture
+def roma(bridge, monkeypatch):
+    """ROMA "installed" as a FakeRoma, with an empty executor pool and LM settings from a test model"""
+    roma = FakeRoma()
+    monkeypatch.setenv("ROMA_MODEL", "test/model")
+    monkeypatch.delenv("ROMA_TOOLS_CONFIG", raising=False)
+    monkeypatch.delenv("ROMA_TOOLS", raising=False)
+    monkeypatch.setattr(bridge, "ROMA_AVAILABLE", True)
+    monkeypatch.setattr(bridge, "_roma_module", roma)
+    monkeypatch.setattr(bridge, "_roma_error", None)
+    monkeypatch.setattr(bridge, "_executor_pool", bridge.ExecutorPool(2, 8))
+    # LM clients are opaque to executors; the settings tuple stands in for one
+    monkeypatch.setattr(bridge, "get_lm", lambda settings: settings)
+    return roma
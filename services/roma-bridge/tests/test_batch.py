@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def client(bridge, roma):
+    from fastapi.testclient import TestClient
+
+    return TestClient(bridge.app)
+
+
+def batch(client, goals, **body):
+    response = client.post("/plan/batch", json={"items": [{"goal": goal} for goal in goals], **body})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_results_come_back_in_input_order(client, roma):
+    # Earlier items take longer, so they finish last
+    roma.plan = lambda goal, context: time.sleep(0.02 * (5 - int(goal[-1]))) or {"goal": goal}
+    body = batch(client, [f"goal-{i}" for i in range(5)], concurrency=5)
+    assert [r["index"] for r in body["results"]] == list(range(5))
+    assert [r["plan"]["goal"] for r in body["results"]] == [f"goal-{i}" for i in range(5)]
+    assert all(r["status"] == "planned" and r["took_ms"] >= 0 for r in body["results"])
+    assert (body["count"], body["failed"]) == (5, 0)
+
+
+def test_a_failing_item_does_not_fail_the_others(client, roma):
+    def plan(goal, context):
+        if goal == "bad":
+            raise ValueError("no plan for this goal")
+        return {"goal": goal}
+
+    roma.plan = plan
+    body = batch(client, ["first", "bad", "last"])
+    first, bad, last = body["results"]
+    assert (first["status"], first["plan"]) == ("planned", {"goal": "first"})
+    assert (last["status"], last["plan"]) == ("planned", {"goal": "last"})
+    assert bad["status"] == "error"
+    assert bad["error"] == {"status_code": 500, "detail": "no plan for this goal"}
+    assert body["failed"] == 1
+
+
+@pytest.mark.parametrize("requested, cap, expected", [(2, 8, 2), (10, 3, 3), (None, 2, 2)])
+def test_concurrency_is_bounded(bridge, client, roma, monkeypatch, requested, cap, expected):
+    monkeypatch.setattr(bridge, "ROMA_BATCH_CONCURRENCY", cap)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def plan(goal, context):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.03)
+        with lock:
+            running[0] -= 1
+        return {"goal": goal}
+
+    roma.plan = plan
+    body = batch(client, [f"goal-{i}" for i in range(8)], concurrency=requested)
+    assert body["failed"] == 0
+    assert peak[0] == expected
+
+
+def test_oversized_batch_is_rejected(bridge, client, monkeypatch):
+    monkeypatch.setattr(bridge, "ROMA_BATCH_MAX_ITEMS", 3)
+    response = client.post("/plan/batch", json={"items": [{"goal": "g"}] * 4})
+    assert response.status_code == 413
+    assert response.json()["detail"].startswith("batch_too_large:")
+
+
+def test_streamed_items_arrive_as_they_finish(client, roma):
+    roma.plan = lambda goal, context: time.sleep(0.05 if goal == "slow" else 0) or {"goal": goal}
+    response = client.post("/plan/batch", json={"items": [{"goal": "slow"}, {"goal": "fast"}], "stream": True})
+    assert response.status_code == 200
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert [(event, data.get("index")) for event, data in events] == [("item", 1), ("item", 0), ("done", None)]
+    assert events[-1][1]["count"] == 2
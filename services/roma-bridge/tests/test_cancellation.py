@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+dspy = pytest.importorskip("dspy")
+
+
+def stepping_run(steps, on_step):
+    """A run of ``steps`` DSPy tool calls, so StepEvents sees each one start"""
+    def step(i: int) -> int:
+        on_step(i)
+        return i
+
+    tool = dspy.Tool(step)
+
+    def fn(_request):
+        for i in range(steps):
+            tool(i=i)
+        return {"steps": steps}
+
+    return fn
+
+
+def test_run_stops_at_next_step_once_cancelled(bridge):
+    cancelled = threading.Event()
+    seen = []
+
+    def on_step(i):
+        seen.append(i)
+        if i == 2:
+            cancelled.set()
+
+    with pytest.raises(bridge.RunCancelled):
+        bridge.run_streamed(stepping_run(10, on_step), None, lambda event, data: None, cancelled)
+    assert seen == [0, 1, 2]
+
+
+def test_run_streams_tool_steps(bridge):
+    events = []
+    result = bridge.run_streamed(
+        stepping_run(2, lambda i: None), None, lambda event, data: events.append(event), threading.Event()
+    )
+    assert result == {"steps": 2}
+    assert events == ["tool_call", "tool_result", "tool_call", "tool_result"]
+
+
+def test_run_cancelled_is_not_an_exception(bridge):
+    # DSPy swallows Exceptions raised by callbacks; cancellation must get through
+    assert not issubclass(bridge.RunCancelled, Exception)
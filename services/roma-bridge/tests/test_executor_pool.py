@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture
+def client(bridge, roma):
+    from fastapi.testclient import TestClient
+
+    return TestClient(bridge.app)
+
+
+def plan(client, goal="g", strategy="react"):
+    response = client.post("/plan", json={"goal": goal, "strategy": strategy})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_executor_returns_to_the_pool_only_after_success(bridge):
+    pool = bridge.ExecutorPool(2, 4)
+    built = []
+
+    def build():
+        built.append(object())
+        return built[-1]
+
+    with pool.lease(("k",), build) as executor:
+        assert pool.stats()["idle"] == 0
+    assert pool.stats()["idle"] == 1
+
+    with pytest.raises(RuntimeError):
+        with pool.lease(("k",), build) as reused:
+            assert reused is executor
+            raise RuntimeError("the LM call failed")
+    # A failed executor is dropped, so the next lease builds a new one
+    assert pool.stats()["idle"] == 0
+    with pool.lease(("k",), build) as fresh:
+        assert fresh is not executor
+    assert len(built) == 2
+    assert (pool.stats()["hits"], pool.stats()["misses"]) == (1, 2)
+
+
+def test_pool_bounds_idle_executors_per_key_and_keys(bridge):
+    pool = bridge.ExecutorPool(2, 2)
+    for key in ("a", "a", "a", "b", "c"):
+        pool.put((key,), object())
+    assert pool.stats() == {"keys": 2, "idle": 2, "hits": 0, "misses": 0}
+
+
+def test_failed_run_drops_its_executor(bridge, client, roma):
+    def fail(goal, context):
+        raise ValueError("bad plan")
+
+    roma.plan = fail
+    assert client.post("/plan", json={"goal": "g"}).status_code == 500
+    assert bridge._executor_pool.stats()["idle"] == 0
+
+
+def test_same_settings_reuse_one_executor(bridge, client, roma):
+    for goal in ("a", "b", "c"):
+        plan(client, goal)
+    assert len(roma.built) == 1
+    assert bridge._executor_pool.stats()["hits"] == 2
+
+
+def test_strategy_model_and_tools_each_get_their_own_entry(bridge, client, roma, monkeypatch):
+    plan(client)
+    plan(client, strategy="cot")
+    monkeypatch.setenv("ROMA_MODEL", "test/other-model")
+    plan(client)
+    monkeypatch.setenv("ROMA_TOOLS", "search,read_file")
+    plan(client)
+    assert len(roma.built) == 4
+    assert len({(e.strategy, e.lm, json.dumps(e.tools, sort_keys=True)) for e in roma.built}) == 4
+    assert bridge._executor_pool.stats()["keys"] == 4
+
+    # Back to the first settings: its idle executor is reused
+    monkeypatch.setenv("ROMA_MODEL", "test/model")
+    monkeypatch.delenv("ROMA_TOOLS")
+    plan(client)
+    assert len(roma.built) == 4
+
+
+def test_rewritten_tools_config_is_reloaded(bridge, client, roma, tmp_path, monkeypatch):
+    path = tmp_path / "tools.json"
+    path.write_text(json.dumps([{"name": "search"}]))
+    monkeypatch.setenv("ROMA_TOOLS_CONFIG", str(path))
+
+    tools, digest = bridge.load_tools()
+    assert tools == [{"name": "search"}]
+    # Unchanged file: the parsed set is reused, not re-read
+    assert bridge.load_tools()[0] is tools
+    plan(client)
+
+    path.write_text(json.dumps([{"name": "search"}, {"name": "read_file"}]))
+    tools, new_digest = bridge.load_tools()
+    assert tools == [{"name": "search"}, {"name": "read_file"}] and new_digest != digest
+
+    # Same size, new contents: the mtime alone triggers the reload
+    path.write_text(json.dumps([{"name": "search"}, {"name": "read_fil2"}]))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert bridge.load_tools()[0] == [{"name": "search"}, {"name": "read_fil2"}]
+
+    plan(client)
+    assert [executor.tools for executor in roma.built] == [
+        [{"name": "search"}], [{"name": "search"}, {"name": "read_fil2"}],
+    ]
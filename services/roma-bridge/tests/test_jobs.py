@@ -0,0 +1,209 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+dspy = pytest.importorskip("dspy")
+
+STEPS = 100
+PAYLOAD = {"task": "t", "context": None, "tools": None}
+
+
+@pytest.fixture
+def jobs(bridge, tmp_path, monkeypatch):
+    """A JobStore of its own, driven by calling run_job directly (no worker tasks)"""
+    store = bridge.JobStore(str(tmp_path / "jobs.db"))
+    threads = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(bridge, "_job_store", store)
+    monkeypatch.setattr(bridge, "_job_threads", threads)
+    monkeypatch.setattr(bridge, "ROMA_JOB_LEASE", 0.3)  # heartbeat (and cancel check) every 0.1s
+    yield store
+    bridge._job_stopping.clear()
+    threads.shutdown(wait=True)
+    store.close()
+
+
+@pytest.fixture
+def steps(bridge, monkeypatch):
+    """Replace the ROMA run with STEPS DSPy tool calls of 20ms each; returns the steps taken"""
+    taken = []
+
+    def step(i: int) -> int:
+        taken.append(i)
+        time.sleep(0.02)
+        return i
+
+    def job_call(job, emit, cancelled):
+        tool = dspy.Tool(step)
+
+        def run(_request):
+            for i in range(STEPS):
+                tool(i=i)
+            return {"steps": STEPS}
+
+        return bridge.run_streamed(run, None, emit, cancelled)
+
+    monkeypatch.setattr(bridge, "_job_call", job_call)
+    return taken
+
+
+def start(bridge, store, deadline=None):
+    job, created = store.submit("act", PAYLOAD, 0, deadline, None)
+    assert created
+    claimed = store.claim(bridge._job_owner, bridge.ROMA_JOB_LEASE, 3)
+    assert claimed["job_id"] == job["job_id"]
+    return claimed
+
+
+async def wait_for(predicate, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_job_runs_to_success(bridge, jobs, steps):
+    job = start(bridge, jobs)
+    asyncio.run(bridge.run_job(job))
+    stored = jobs.get(job["job_id"])
+    assert stored["status"] == "succeeded"
+    assert stored["result"] == {"steps": STEPS}
+    assert len(steps) == STEPS
+
+
+def test_cancel_request_stops_running_job(bridge, jobs, steps):
+    job = start(bridge, jobs)
+
+    async def scenario():
+        run = asyncio.create_task(bridge.run_job(job))
+        await wait_for(lambda: len(steps) >= 2)
+        jobs.request_cancel(job["job_id"])  # seen by the next heartbeat
+        await run
+
+    asyncio.run(scenario())
+    stored = jobs.get(job["job_id"])
+    assert stored["status"] == "cancelled"
+    assert stored["result"] is None
+    assert len(steps) < STEPS
+
+
+def test_in_process_cancel_flag_stops_running_job(bridge, jobs, steps):
+    job = start(bridge, jobs)
+
+    async def scenario():
+        run = asyncio.create_task(bridge.run_job(job))
+        await wait_for(lambda: len(steps) >= 2)
+        bridge._job_runs[job["job_id"]].set()  # what POST /jobs/{id}/cancel does for a local run
+        await run
+
+    asyncio.run(scenario())
+    assert jobs.get(job["job_id"])["status"] == "cancelled"
+    assert len(steps) < STEPS
+
+
+def test_deadline_expires_running_job(bridge, jobs, steps):
+    job = start(bridge, jobs, deadline=time.time() + 0.3)
+    asyncio.run(bridge.run_job(job))
+    stored = jobs.get(job["job_id"])
+    assert stored["status"] == "expired"
+    assert stored["error"] == "deadline exceeded"
+    assert len(steps) < STEPS
+
+
+def test_shutdown_requeues_running_job(bridge, jobs, steps):
+    job = start(bridge, jobs)
+
+    async def scenario():
+        run = asyncio.create_task(bridge.run_job(job))
+        await wait_for(lambda: len(steps) >= 2)
+        bridge._job_stopping.set()
+        for flag in list(bridge._job_runs.values()):
+            flag.set()
+        await run
+
+    asyncio.run(scenario())
+    stored = jobs.get(job["job_id"])
+    assert stored["status"] == "queued"
+    assert len(steps) < STEPS
+    again = jobs.claim("other-worker", 30, 3)
+    assert again["job_id"] == job["job_id"] and again["attempt"] == 2
+
+
+def test_result_arriving_after_cancel_is_dropped(bridge, jobs, monkeypatch):
+    finished = threading.Event()
+
+    def job_call(job, emit, cancelled):
+        # No DSPy steps, so nothing checks the flag: the run completes regardless
+        time.sleep(0.4)
+        finished.set()
+        return {"late": True}
+
+    monkeypatch.setattr(bridge, "_job_call", job_call)
+    job = start(bridge, jobs)
+
+    async def scenario():
+        run = asyncio.create_task(bridge.run_job(job))
+        await asyncio.sleep(0.05)
+        jobs.request_cancel(job["job_id"])
+        await run
+
+    asyncio.run(scenario())
+    stored = jobs.get(job["job_id"])
+    assert finished.is_set()
+    assert stored["status"] == "cancelled"
+    assert stored["result"] is None
+
+
+def test_result_arriving_after_deadline_is_dropped(bridge, jobs, monkeypatch):
+    monkeypatch.setattr(bridge, "_job_call", lambda job, emit, cancelled: (time.sleep(0.4), {"late": True})[1])
+    job = start(bridge, jobs, deadline=time.time() + 0.1)
+    asyncio.run(bridge.run_job(job))
+    stored = jobs.get(job["job_id"])
+    assert stored["status"] == "expired"
+    assert stored["result"] is None
+
+
+def test_cancel_queued_job(bridge, jobs):
+    job, _ = jobs.submit("act", PAYLOAD, 0, None, None)
+    assert jobs.request_cancel(job["job_id"])["status"] == "cancelled"
+    assert jobs.claim(bridge._job_owner, 30, 3) is None
+
+
+def test_queued_job_past_deadline_expires_unrun(bridge, jobs):
+    job, _ = jobs.submit("act", PAYLOAD, 0, time.time() - 1, None)
+    assert jobs.claim(bridge._job_owner, 30, 3) is None
+    assert jobs.get(job["job_id"])["status"] == "expired"
+
+
+def test_idempotency_key_returns_the_same_job(jobs):
+    first, created = jobs.submit("act", PAYLOAD, 0, None, "key-1")
+    again, created_again = jobs.submit("act", PAYLOAD, 0, None, "key-1")
+    assert created and not created_again
+    assert again["job_id"] == first["job_id"]
+    with pytest.raises(HTTPException) as error:
+        jobs.submit("act", {**PAYLOAD, "task": "other"}, 0, None, "key-1")
+    assert error.value.status_code == 409
+
+
+def test_claim_order_is_priority_then_age(jobs):
+    low, _ = jobs.submit("act", PAYLOAD, 0, None, None)
+    high, _ = jobs.submit("act", PAYLOAD, 5, None, None)
+    later_low, _ = jobs.submit("act", PAYLOAD, 0, None, None)
+    order = [jobs.claim("w", 30, 3)["job_id"] for _ in range(3)]
+    assert order == [high["job_id"], low["job_id"], later_low["job_id"]]
+
+
+def test_lapsed_lease_is_reclaimed_then_abandoned(jobs):
+    job, _ = jobs.submit("act", PAYLOAD, 0, None, None)
+    first = jobs.claim("dead-worker", -1, 2)  # lease already lapsed
+    assert first["attempt"] == 1
+    assert jobs.heartbeat(job["job_id"], "other", 30) is None  # not the owner
+    second = jobs.claim("next-worker", -1, 2)
+    assert second["job_id"] == job["job_id"] and second["attempt"] == 2
+    assert jobs.claim("third-worker", 30, 2) is None
+    stored = jobs.get(job["job_id"])
+    assert stored["status"] == "failed"
+    assert stored["error"].startswith("abandoned")
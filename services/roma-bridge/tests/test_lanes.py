@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+
+async def fill(lane, gate):
+    """Block every worker and queue slot of ``lane`` on ``gate``"""
+    blocked = [lane.submit(gate.wait, 5) for _ in range(lane.workers + lane.queue_depth)]
+    assert lane.in_flight == len(blocked)
+    return blocked
+
+
+def test_saturated_lane_answers_429_until_a_call_finishes(bridge, roma, monkeypatch):
+    lane = bridge.WorkLane("roma", 2, 1)
+    monkeypatch.setattr(bridge, "_executor_lane", lane)
+    gate = threading.Event()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=bridge.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bridge") as client:
+            blocked = await fill(lane, gate)
+            response = await client.post("/plan", json={"goal": "g"})
+            assert response.status_code == 429
+            assert response.headers["Retry-After"] == "1"
+            assert response.json()["detail"] == "overloaded: roma queue is full, retry later"
+            assert lane.rejected == 1 and lane.in_flight == 3
+
+            gate.set()
+            assert await asyncio.gather(*blocked) == [True] * 3
+            assert lane.in_flight == 0
+            response = await client.post("/plan", json={"goal": "g"})
+            assert response.status_code == 200, response.text
+            assert response.json()["plan"] == {"goal": "g", "steps": []}
+
+    asyncio.run(scenario())
+
+
+def test_in_flight_is_released_after_success_and_failure(bridge):
+    lane = bridge.WorkLane("test", 1, 0)
+
+    def fail():
+        raise ValueError("boom")
+
+    async def scenario():
+        assert await lane.run(lambda: "done") == "done"
+        with pytest.raises(ValueError):
+            await lane.run(fail)
+        assert (lane.in_flight, lane.rejected) == (0, 0)
+
+        gate = threading.Event()
+        blocked = await fill(lane, gate)
+        with pytest.raises(bridge.HTTPException) as rejected:
+            lane.submit(lambda: "never")
+        assert rejected.value.status_code == 429 and rejected.value.headers == {"Retry-After": "1"}
+        gate.set()
+        await asyncio.gather(*blocked)
+        assert (lane.in_flight, lane.rejected) == (0, 1)
+        assert await lane.run(lambda: "room again") == "room again"
+
+    asyncio.run(scenario())
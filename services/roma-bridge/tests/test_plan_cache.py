@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+
+
+def counting(result=None, error=None, gate=None):
+    """A compute() that counts its calls, optionally waiting on ``gate`` first"""
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        if gate is not None:
+            await gate.wait()
+        if error is not None:
+            raise error
+        return result
+
+    return compute, calls
+
+
+def test_second_lookup_is_a_hit(bridge):
+    cache = bridge.PlanCache(16, 60)
+    compute, calls = counting({"plan": 1})
+
+    async def scenario():
+        assert await cache.resolve("k", compute) == ({"plan": 1}, False)
+        assert await cache.resolve("k", compute) == ({"plan": 1}, True)
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_concurrent_misses_share_one_call(bridge):
+    cache = bridge.PlanCache(16, 60)
+
+    async def scenario():
+        gate = asyncio.Event()
+        compute, calls = counting({"plan": 2}, gate=gate)
+        tasks = [asyncio.create_task(cache.resolve("k", compute)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        gate.set()
+        results = await asyncio.gather(*tasks)
+        assert len(calls) == 1
+        assert results[0] == ({"plan": 2}, False)
+        assert all(r == ({"plan": 2}, True) for r in results[1:])
+
+    asyncio.run(scenario())
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_owner_going_away_does_not_fail_coalesced_waiters(bridge):
+    cache = bridge.PlanCache(16, 60)
+
+    async def scenario():
+        gate = asyncio.Event()
+        compute, calls = counting({"plan": 3}, gate=gate)
+        owner = asyncio.create_task(cache.resolve("k", compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.resolve("k", compute))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        await asyncio.sleep(0.01)
+        gate.set()
+        assert await waiter == ({"plan": 3}, True)
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+    # The shared call still completed and filled the cache
+    assert cache.get("k") == (True, {"plan": 3})
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached(bridge):
+    cache = bridge.PlanCache(16, 60)
+
+    async def scenario():
+        gate = asyncio.Event()
+        compute, calls = counting(error=ValueError("boom"), gate=gate)
+        tasks = [asyncio.create_task(cache.resolve("k", compute)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        gate.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+    assert cache.get("k") == (False, None)
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_entries_expire_after_ttl(bridge):
+    cache = bridge.PlanCache(16, 0.05)
+    cache.put("k", {"plan": 4})
+    assert cache.get("k") == (True, {"plan": 4})
+    time.sleep(0.1)
+    assert cache.get("k") == (False, None)
+
+
+def test_lru_evicts_oldest_entry(bridge):
+    cache = bridge.PlanCache(2, 60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1) and cache.get("c") == (True, 3)
+
+
+def test_disk_tier_outlives_the_cache(bridge, tmp_path):
+    path = str(tmp_path / "plans.db")
+    first = bridge.PlanCache(16, 60, path)
+    first.put("k", {"plan": 5})
+    first.close()
+    second = bridge.PlanCache(16, 60, path)
+    assert second.get("k") == (True, {"plan": 5})
+    assert second.stats()["disk_hits"] == 1
+    second.close()
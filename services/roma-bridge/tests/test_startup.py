@@ -0,0 +1,99 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+@pytest.fixture
+def startup(bridge, monkeypatch):
+    """A fresh startup record, and no job workers for the lifespan to start"""
+    monkeypatch.setattr(bridge, "ROMA_JOB_WORKERS", 0)
+    monkeypatch.setattr(bridge, "ROMA_STARTUP", "background")
+    monkeypatch.setattr(bridge, "ROMA_WARMUP", ["react"])
+    monkeypatch.setattr(bridge, "_startup", {"state": "starting", "mode": "background", "imports": {}})
+    return bridge._startup
+
+
+def ready(client):
+    response = client.get("/ready")
+    return response.status_code, response.json()
+
+
+def test_importing_the_bridge_does_not_import_roma_or_dspy():
+    probe = "import sys, bridge_api; print(sorted(m for m in ('dspy', 'roma_dspy', 'litellm') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", probe], cwd=SRC_DIR, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "[]"
+
+
+def test_background_warm_up_goes_from_starting_to_ready(bridge, roma, startup, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    gate = threading.Event()
+
+    def load_roma():
+        gate.wait(5)
+        return roma
+
+    monkeypatch.setattr(bridge, "load_roma", load_roma)
+    assert ready(TestClient(bridge.app)) == (503, {"ready": False, **startup})
+    assert startup["state"] == "starting"
+
+    with TestClient(bridge.app) as client:
+        status, body = ready(client)
+        assert status == 503 and body["state"] in ("starting", "warming")
+        # Liveness does not wait for the warm-up
+        health = client.get("/health")
+        assert health.status_code == 200 and health.json()["startup"]["state"] in ("starting", "warming")
+
+        gate.set()
+        deadline = time.monotonic() + 5
+        while ready(client)[0] != 200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        status, body = ready(client)
+        assert status == 200
+        assert body["ready"] is True and body["state"] == "ready"
+        assert body["warmup_s"] >= 0 and body["ready_s"] >= body["warmup_s"]
+
+        # The warm-up executor serves the first /plan
+        assert [executor.strategy for executor in roma.built] == ["ReAct"]
+        assert client.post("/plan", json={"goal": "g"}).status_code == 200
+        assert len(roma.built) == 1
+        assert bridge._executor_pool.stats()["hits"] == 1
+
+
+def test_lazy_startup_is_ready_at_once_and_builds_on_first_use(bridge, roma, startup, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(bridge, "ROMA_STARTUP", "lazy")
+    with TestClient(bridge.app) as client:
+        assert ready(client)[0] == 200
+        assert roma.built == []
+        assert client.post("/plan", json={"goal": "g"}).json()["plan"] == {"goal": "g", "steps": []}
+        assert len(roma.built) == 1
+
+
+def test_missing_roma_is_unavailable_but_alive(bridge, startup, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *args: None)
+    monkeypatch.delitem(sys.modules, "roma_dspy", raising=False)
+    monkeypatch.setattr(bridge, "ROMA_AVAILABLE", bridge._installed("roma_dspy"))
+    monkeypatch.setattr(bridge, "_roma_error", None)
+    assert bridge.ROMA_AVAILABLE is False
+
+    with TestClient(bridge.app) as client:
+        status, body = ready(client)
+        assert status == 503 and body["state"] == "unavailable"
+        health = client.get("/health")
+        assert health.status_code == 200
+        assert health.json()["status"] == "ok" and health.json()["roma_available"] is False
+        response = client.post("/plan", json={"goal": "g"})
+        assert response.status_code == 503
+        assert response.json()["detail"].startswith("roma_unavailable:")
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+dspy = pytest.importorskip("dspy")
+
+
+@pytest.fixture
+def client(bridge, roma):
+    from fastapi.testclient import TestClient
+
+    return TestClient(bridge.app)
+
+
+@pytest.fixture
+def plan_cache(bridge, monkeypatch):
+    cache = bridge.PlanCache(16, 60)
+    monkeypatch.setattr(bridge, "_plan_cache", cache)
+    return cache
+
+
+def stream(client, path, body):
+    """The (event, data) pairs of an SSE response, keep-alive comments skipped"""
+    response = client.post(path, json=body)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = block.split("\n")
+        if lines[0].startswith(":"):
+            continue
+        events.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+    return events
+
+
+def tool_steps(result):
+    """A plan/act body making two DSPy tool calls before returning ``result``"""
+    tool = dspy.Tool(lambda i: i * 10, name="times_ten")
+
+    def run(*args):
+        for i in range(2):
+            tool(i=i)
+        return result
+
+    return run
+
+
+def test_plan_stream_sends_start_steps_then_result(client, roma):
+    roma.plan = tool_steps({"steps": ["a", "b"]})
+    events = stream(client, "/plan/stream", {"goal": "g"})
+    assert [event for event, _ in events] == ["start", "tool_call", "tool_result", "tool_call", "tool_result", "result"]
+    assert events[0][1] == {"status": "started", "cached": False}
+    assert events[1][1]["tool"] == "times_ten" and events[1][1]["args"] == {"kwargs": {"i": 0}}
+    assert events[4][1]["result"] == 10 and events[4][1]["id"] == events[3][1]["id"]
+    assert events[-1][1] == {"plan": {"steps": ["a", "b"]}, "status": "planned"}
+
+
+def test_act_stream_sends_the_result_under_its_key(client, roma):
+    roma.act = tool_steps({"answer": 42})
+    events = stream(client, "/act/stream", {"task": "t"})
+    assert events[-1] == ("result", {"result": {"answer": 42}, "status": "executed"})
+
+
+@pytest.mark.parametrize("error, expected", [
+    (lambda bridge: bridge.HTTPException(status_code=422, detail="unplannable goal"), {"status_code": 422, "detail": "unplannable goal"}),
+    (lambda bridge: ValueError("LM returned garbage"), {"status_code": 500, "detail": "LM returned garbage"}),
+])
+def test_failed_run_ends_with_an_error_event(bridge, client, roma, error, expected):
+    def fail(goal, context):
+        tool_steps(None)()
+        raise error(bridge)
+
+    roma.plan = fail
+    events = stream(client, "/plan/stream", {"goal": "g"})
+    assert [event for event, _ in events] == ["start", "tool_call", "tool_result", "tool_call", "tool_result", "error"]
+    assert events[-1][1] == expected
+
+
+def test_completed_stream_fills_the_plan_cache(bridge, client, roma, plan_cache):
+    calls = []
+    roma.plan = lambda goal, context: calls.append(goal) or {"goal": goal}
+
+    first = stream(client, "/plan/stream", {"goal": "g"})
+    assert first[0][1]["cached"] is False
+    assert first[-1] == ("result", {"plan": {"goal": "g"}, "status": "planned"})
+    assert plan_cache.stats()["misses"] == 1 and plan_cache.stats()["entries"] == 1
+
+    # The stored plan answers /plan/stream and /plan without running again
+    again = stream(client, "/plan/stream", {"goal": "g"})
+    assert again == [
+        ("start", {"status": "started", "cached": True}),
+        ("result", {"plan": {"goal": "g"}, "status": "planned", "cached": True}),
+    ]
+    response = client.post("/plan", json={"goal": "g"})
+    assert response.json()["plan"] == {"goal": "g"} and response.json()["cached"] is True
+    assert calls == ["g"]
+
+
+def test_failed_or_uncached_streams_do_not_store(client, roma, plan_cache):
+    def fail(goal, context):
+        raise ValueError("no plan")
+
+    roma.plan = fail
+    assert stream(client, "/plan/stream", {"goal": "g"})[-1][0] == "error"
+    roma.plan = lambda goal, context: {"goal": goal}
+    assert stream(client, "/plan/stream", {"goal": "g", "cache": False})[-1][0] == "result"
+    assert plan_cache.stats()["entries"] == 0
+    assert stream(client, "/plan/stream", {"goal": "g"})[0][1]["cached"] is False
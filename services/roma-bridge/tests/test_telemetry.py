@@ -0,0 +1,16 @@
+def test_metrics_label_requests_by_route_and_strategy(bridge, roma):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(bridge.app)
+    assert client.post("/plan", json={"goal": "g", "strategy": "cot"}).status_code == 200
+    # Without the lifespan there is no job store, so job lookups fail
+    for job_id in ("job-a", "job-b"):
+        assert client.get(f"/jobs/{job_id}").status_code == 503
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    text = response.text
+    assert 'roma_stage_duration_seconds_count{endpoint="/plan",stage="execute",strategy="cot"}' in text
+    assert 'roma_request_errors_total{endpoint="/jobs/{job_id}",status="503",strategy=""}' in text
+    assert "job-a" not in text
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+OpenSearch Stand-in
+
+A small in-process imitation of the OpenSearch REST endpoints that the
+search service's opensearch backend uses, so the backend can be exercised
+and benchmarked offline:
+
+- GET /_cluster/health, GET /_cat/indices[/<pattern>]
+- PUT /<index> (mappings are accepted and ignored)
+- POST /_bulk (index actions)
+- POST /_msearch, POST /<index>/_search: bool/multi_match (BM25), knn with
+  filter, term/terms/range filters, min_score, sort on _score then id,
+  search_after
+- POST /<index>/_mget
+
+Scoring approximates OpenSearch (BM25 with k1=1.2, b=0.75; kNN scores are
+(1 + cosine) / 2) and is exact rather than approximate for kNN.
+
+Usage (from services/search):
+    python -m bench.opensearch_standin --port 9200 [--reject-rate 0.1]
+    OPENSEARCH_URL=http://127.0.0.1:9200 SEARCH_BACKEND=opensearch python src/search_api.py
+
+``--reject-rate`` answers that fraction of _bulk items with 429, to exercise
+the client's retries.
+"""
+
+import argparse
+import fnmatch
+import json
+import math
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class StandinIndex:
+    """Documents of one index plus per-field token counts for BM25"""
+
+    def __init__(self, name: str, settings: Dict[str, Any]):
+        self.name = name
+        self.settings = settings
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.terms: Dict[str, Dict[str, Dict[str, int]]] = {}  # field -> doc id -> term -> tf
+
+    def put(self, doc_id: str, source: Dict[str, Any]):
+        self.docs[doc_id] = source
+        metadata_text = " ".join(v for v in flatten(source.get("metadata") or {}).values() if isinstance(v, str))
+        for field, text in (("content", source.get("content") or ""), ("metadata_text", metadata_text)):
+            counts: Dict[str, int] = {}
+            for term in tokenize(text):
+                counts[term] = counts.get(term, 0) + 1
+            self.terms.setdefault(field, {})[doc_id] = counts
+
+    def bm25(self, field: str, query: str, k1: float = 1.2, b: float = 0.75) -> Dict[str, float]:
+        docs = self.terms.get(field, {})
+        if not docs:
+            return {}
+        avg = sum(sum(c.values()) for c in docs.values()) / len(docs) or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            df = sum(1 for counts in docs.values() if term in counts)
+            if not df:
+                continue
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            for doc_id, counts in docs.items():
+                tf = counts.get(term)
+                if tf:
+                    length = sum(counts.values())
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg))
+        return scores
+
+
+def flatten(metadata: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    out = {}
+    for key, value in metadata.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, f"{prefix}{key}."))
+        else:
+            out[prefix + key] = value
+    return out
+
+
+def field_values(source: Dict[str, Any], path: str) -> List[Any]:
+    value: Any = source
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return []
+        value = value[part]
+    return value if isinstance(value, list) else [value]
+
+
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, bool) or isinstance(b, bool):
+        return str(a).lower() == str(b).lower()
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return float(a) == float(b)
+    return a == b
+
+
+def matches_filter(source: Dict[str, Any], clause: Dict[str, Any]) -> bool:
+    kind, spec = next(iter(clause.items()))
+    if kind == "bool":
+        return all(matches_filter(source, c) for c in as_list(spec.get("filter")) + as_list(spec.get("must")))
+    path, arg = next(iter(spec.items()))
+    values = field_values(source, path)
+    if kind == "term":
+        return any(_same(v, arg) for v in values)
+    if kind == "terms":
+        return any(_same(v, a) for v in values for a in arg)
+    if kind == "range":
+        def ok(v):
+            try:
+                return all({
+                    "gt": lambda x, y: x > y, "gte": lambda x, y: x >= y,
+                    "lt": lambda x, y: x < y, "lte": lambda x, y: x <= y,
+                }[op](v, bound) for op, bound in arg.items())
+            except TypeError:
+                return False
+        return any(ok(v) for v in values if not isinstance(v, bool))
+    raise ValueError(f"unsupported filter clause: {kind}")
+
+
+def as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def project(source: Dict[str, Any], spec: Any) -> Optional[Dict[str, Any]]:
+    """Apply a _source spec: False, a list of include paths or {"includes": [...]}"""
+    if spec is False:
+        return None
+    if spec is None or spec is True:
+        return source
+    includes = spec if isinstance(spec, list) else spec.get("includes", [])
+    out: Dict[str, Any] = {}
+    for path in includes:
+        head, _, rest = path.partition(".")
+        if head not in source:
+            continue
+        if not rest:
+            out[head] = source[head]
+        elif isinstance(source[head], dict) and rest in source[head]:
+            out.setdefault(head, {})[rest] = source[head][rest]
+    return out
+
+
+def create_app(reject_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    app = FastAPI(title="OpenSearch stand-in")
+    indexes: Dict[str, StandinIndex] = {}
+    rng = random.Random(seed)
+
+    def error(status: int, kind: str, reason: str) -> JSONResponse:
+        return JSONResponse({"error": {"type": kind, "reason": reason}, "status": status}, status_code=status)
+
+    def search(name: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        index = indexes.get(name)
+        if index is None:
+            return {"error": {"type": "index_not_found_exception", "reason": f"no such index [{name}]"}, "status": 404}
+        query = body.get("query") or {"match_all": {}}
+        filters: List[Dict[str, Any]] = []
+        if "bool" in query:
+            filters = as_list(query["bool"].get("filter"))
+            query = query["bool"].get("must") or {"match_all": {}}
+            if isinstance(query, list):
+                query = query[0]
+        kind, spec = next(iter(query.items()))
+        if kind == "multi_match":
+            scores: Dict[str, float] = {}
+            for field in spec.get("fields", ["content"]):
+                name_, _, boost = field.partition("^")
+                for doc_id, score in index.bm25(name_, spec["query"]).items():
+                    # best_fields: the best single field wins
+                    scores[doc_id] = max(scores.get(doc_id, 0.0), score * float(boost or 1))
+        elif kind == "knn":
+            field, knn = next(iter(spec.items()))
+            filters = filters + as_list(knn.get("filter"))
+            vector = np.asarray(knn["vector"], dtype=np.float64)
+            scores = {}
+            for doc_id, source in index.docs.items():
+                emb = source.get(field)
+                if emb is None or not all(matches_filter(source, c) for c in filters):
+                    continue
+                emb = np.asarray(emb, dtype=np.float64)
+                denom = np.linalg.norm(emb) * np.linalg.norm(vector)
+                scores[doc_id] = (1.0 + (float(emb @ vector) / denom if denom else 0.0)) / 2.0
+            scores = dict(sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:int(knn["k"])])
+        elif kind == "match_all":
+            scores = {doc_id: 1.0 for doc_id in index.docs}
+        else:
+            raise ValueError(f"unsupported query: {kind}")
+        min_score = body.get("min_score")
+        hits = [
+            (doc_id, score) for doc_id, score in scores.items()
+            if all(matches_filter(index.docs[doc_id], c) for c in filters)
+            and (min_score is None or score >= min_score)
+        ]
+        hits.sort(key=lambda h: (-h[1], h[0]))
+        after = body.get("search_after")
+        if after:
+            hits = [h for h in hits if h[1] < after[0] or (h[1] == after[0] and h[0] > after[1])]
+        out = []
+        for doc_id, score in hits[:int(body.get("size", 10))]:
+            hit = {"_index": name, "_id": doc_id, "_score": score, "sort": [score, doc_id]}
+            source = project(index.docs[doc_id], body.get("_source"))
+            if source is not None:
+                hit["_source"] = source
+            out.append(hit)
+        return {"took": 1, "hits": {"total": {"value": len(hits), "relation": "eq"}, "hits": out}, "status": 200}
+
+    @app.get("/")
+    async def info():
+        return {"name": "standin", "version": {"distribution": "opensearch", "number": "2.11.0"}}
+
+    @app.get("/_cluster/health")
+    async def cluster_health():
+        return {"cluster_name": "standin", "status": "green", "number_of_nodes": 1}
+
+    @app.get("/_cat/indices")
+    @app.get("/_cat/indices/{pattern}")
+    async def cat_indices(pattern: str = "*"):
+        return [
+            {
+                "index": name,
+                "health": "green",
+                "docs.count": str(len(index.docs)),
+                "store.size": str(len(json.dumps(index.docs))),
+                "pri": str(index.settings.get("index", {}).get("number_of_shards", 1)),
+            }
+            for name, index in sorted(indexes.items()) if fnmatch.fnmatch(name, pattern)
+        ]
+
+    @app.put("/{name}")
+    async def create_index(name: str, request: Request):
+        if name in indexes:
+            return error(400, "resource_already_exists_exception", f"index [{name}] already exists")
+        body = await request.json() if await request.body() else {}
+        indexes[name] = StandinIndex(name, body.get("settings", {}))
+        return {"acknowledged": True, "index": name}
+
+    @app.post("/_bulk")
+    async def bulk(request: Request):
+        lines = [json.loads(line) for line in (await request.body()).splitlines() if line.strip()]
+        items, errors = [], False
+        i = 0
+        while i < len(lines):
+            (action, meta), source = next(iter(lines[i].items())), lines[i + 1]
+            i += 2
+            if action != "index":
+                items.append({action: {"_id": meta.get("_id"), "status": 400, "error": {"type": "illegal_argument_exception", "reason": "unsupported"}}})
+                errors = True
+                continue
+            if reject_rate and rng.random() < reject_rate:
+                items.append({"index": {"_id": meta["_id"], "status": 429, "error": {
+                    "type": "es_rejected_execution_exception", "reason": "rejected execution (stand-in)"}}})
+                errors = True
+                continue
+            index = indexes.setdefault(meta["_index"], StandinIndex(meta["_index"], {}))
+            index.put(meta["_id"], source)
+            items.append({"index": {"_index": meta["_index"], "_id": meta["_id"], "status": 201, "result": "created"}})
+        return {"took": 1, "errors": errors, "items": items}
+
+    @app.post("/_msearch")
+    async def msearch(request: Request):
+        lines = [json.loads(line) for line in (await request.body()).splitlines() if line.strip()]
+        return {"responses": [search(lines[i]["index"], lines[i + 1]) for i in range(0, len(lines), 2)]}
+
+    @app.post("/{name}/_search")
+    async def search_one(name: str, request: Request):
+        result = search(name, await request.json())
+        if "error" in result:
+            return JSONResponse(result, status_code=result["status"])
+        return result
+
+    @app.post("/{name}/_mget")
+    async def mget(name: str, request: Request):
+        index = indexes.get(name)
+        if index is None:
+            return error(404, "index_not_found_exception", f"no such index [{name}]")
+        body = await request.json()
+        includes = request.query_params.get("_source_includes")
+        spec = includes.split(",") if includes else body.get("_source")
+        docs = []
+        for doc_id in body.get("ids", []):
+            source = index.docs.get(doc_id)
+            if source is None:
+                docs.append({"_index": name, "_id": doc_id, "found": False})
+            else:
+                docs.append({"_index": name, "_id": doc_id, "found": True, "_source": project(source, spec)})
+        return {"docs": docs}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenSearch stand-in for offline testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="fraction of _bulk items answered with 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.reject_rate, args.seed), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Search API Benchmarks
+
+Reproducible latency/throughput measurements for the search backends.
+Every backend runs in its own subprocess (search_api reads its
+configuration at import time) against a temporary database, over a
+seeded synthetic corpus, so two runs with the same arguments measure the
+same work.
+
+Usage (from services/search):
+    python -m bench.search_bench run --docs 20000 --output ../../benchmark-results/search.json
+    python -m bench.search_bench compare base.json head.json --threshold 0.10
+
+``run`` measures, per backend:
+- ingest: upsert_<backend>() directly and POST /upsert through the app
+- query (direct): search_<backend>(), the semantic leg, hybrid fusion and
+  filtered search, called sequentially
+- query (http): POST /query via an in-process ASGI client, at each
+  --concurrency level (p50/p95/p99 latency and QPS)
+
+``compare`` diffs two result files and exits with status 1 when a latency
+grew, or a throughput shrank, by more than --threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Consonant-vowel syllables make pronounceable, unique synthetic words
+_SYLLABLES = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"]
+_LANGS = ["py", "ts", "go", "rs", "java"]
+
+
+# =============================================================================
+# Synthetic Corpus
+# =============================================================================
+
+def make_word(rank: int) -> str:
+    """Word for a vocabulary rank (bijective base-80 over syllables)"""
+    parts = []
+    rank += 1
+    while rank:
+        rank, digit = divmod(rank - 1, len(_SYLLABLES))
+        parts.append(_SYLLABLES[digit])
+    return "".join(parts)
+
+
+def make_corpus(docs: int, vocab: int, doc_len: int, zipf: float, seed: int) -> List[Dict[str, Any]]:
+    """Documents whose word frequencies follow a Zipf distribution over ``vocab`` words"""
+    rng = np.random.default_rng(seed)
+    words = [make_word(i) for i in range(vocab)]
+    lengths = np.clip(rng.poisson(doc_len, docs), 1, None)
+    ranks = np.minimum(rng.zipf(zipf, int(lengths.sum())), vocab) - 1
+    corpus = []
+    pos = 0
+    for i, length in enumerate(lengths.tolist()):
+        corpus.append({
+            "id": f"doc-{i}",
+            "content": " ".join(words[r] for r in ranks[pos:pos + length].tolist()),
+            "metadata": {"lang": _LANGS[i % len(_LANGS)], "n": i % 1000, "group": f"g{i % 50}"},
+        })
+        pos += length
+    return corpus
+
+
+def make_queries(count: int, vocab: int, zipf: float, seed: int) -> List[str]:
+    """1-3 word queries mixing frequent and rare terms"""
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for _ in range(count):
+        terms = int(rng.integers(1, 4))
+        ranks = np.minimum(rng.zipf(zipf, terms), vocab) - 1
+        # Skew away from the very top ranks so most queries are selective
+        ranks = (ranks + rng.integers(0, 200, terms)) % vocab
+        queries.append(" ".join(make_word(int(r)) for r in ranks))
+    return queries
+
+
+# =============================================================================
+# Measurement
+# =============================================================================
+
+def latency_stats(samples: List[float], wall: Optional[float] = None) -> Dict[str, Any]:
+    """Percentiles in milliseconds; qps from wall time (or the sum of samples)"""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    elapsed = wall if wall is not None else float(np.sum(samples))
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "qps": round(len(samples) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def time_calls(fn: Callable[[Any], Any], args: List[Any], warmup: int) -> Dict[str, Any]:
+    for arg in args[:warmup]:
+        fn(arg)
+    samples = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - start)
+    return latency_stats(samples)
+
+
+def ingest(fn: Callable[[List[Dict[str, Any]]], Any], corpus: List[Dict[str, Any]], batch: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    for i in range(0, len(corpus), batch):
+        fn(corpus[i:i + batch])
+    seconds = time.perf_counter() - start
+    return {
+        "docs": len(corpus),
+        "batch": batch,
+        "seconds": round(seconds, 3),
+        "docs_per_sec": round(len(corpus) / seconds, 1) if seconds > 0 else None,
+    }
+
+
+async def http_benchmark(api, params: Dict[str, Any], corpus: List[Dict[str, Any]], queries: List[str]) -> Dict[str, Any]:
+    import httpx
+
+    results: Dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=api.app)
+    # ASGITransport does not send lifespan events; run the app's lifespan explicitly
+    async with api.app.router.lifespan_context(api.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def upsert(batch: List[Dict[str, Any]]):
+                response = await client.post("/upsert", json={"documents": batch, "index_name": "bench_http"})
+                response.raise_for_status()
+
+            start = time.perf_counter()
+            for i in range(0, len(corpus), params["batch"]):
+                await upsert(corpus[i:i + params["batch"]])
+            seconds = time.perf_counter() - start
+            results["ingest"] = {
+                "docs": len(corpus),
+                "batch": params["batch"],
+                "seconds": round(seconds, 3),
+                "docs_per_sec": round(len(corpus) / seconds, 1) if seconds > 0 else None,
+            }
+
+            for query in queries[:params["warmup"]]:
+                await client.post("/query", json={"query": query, "index_name": "bench_http"})
+
+            for concurrency in params["concurrency"]:
+                pending = iter(queries)
+                samples: List[float] = []
+                errors = 0
+
+                async def worker():
+                    nonlocal errors
+                    for query in pending:
+                        start = time.perf_counter()
+                        response = await client.post("/query", json={
+                            "query": query, "limit": params["limit"], "index_name": "bench_http",
+                        })
+                        samples.append(time.perf_counter() - start)
+                        if response.status_code != 200:
+                            errors += 1
+
+                wall_start = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+                wall = time.perf_counter() - wall_start
+                results[f"query_c{concurrency}"] = {**latency_stats(samples, wall), "errors": errors}
+    return results
+
+
+def run_backend(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Benchmark one backend; runs inside the per-backend subprocess"""
+    sys.path.insert(0, SRC_DIR)
+    import search_api as api  # configured from the environment set by the parent
+
+    backend = params["backend"]
+    corpus = make_corpus(params["docs"], params["vocab"], params["doc_len"], params["zipf"], params["seed"])
+    queries = make_queries(params["queries"], params["vocab"], params["zipf"], params["seed"])
+    limit = params["limit"]
+    warmup = params["warmup"]
+
+    if backend == "sqlite":
+        upsert, lexical, semantic = api.upsert_sqlite, api.search_sqlite, api.search_semantic_sqlite
+    else:
+        upsert, lexical, semantic = api.upsert_memory, api.search_memory, api.search_semantic_memory
+
+    results: Dict[str, Any] = {}
+    results["ingest_direct"] = ingest(lambda docs: upsert(docs, index_name="bench_direct"), corpus, params["batch"])
+
+    filters = api.parse_filters({"lang": "py", "n": {"lt": 500}})
+    direct = {
+        "lexical": time_calls(lambda q: lexical(q, limit, None, "bench_direct"), queries, warmup),
+        "semantic": time_calls(lambda q: semantic(q, limit, None, "bench_direct"), queries, warmup),
+        "hybrid": time_calls(
+            lambda q: api.search_hybrid(q, limit, 1.0, 1.0, None, "bench_direct"), queries, warmup
+        ),
+        "lexical_filtered": time_calls(lambda q: lexical(q, limit, filters, "bench_direct"), queries, warmup),
+    }
+    for name, stats in direct.items():
+        results[f"query_direct_{name}"] = stats
+
+    http = asyncio.run(http_benchmark(api, params, corpus, queries))
+    results["ingest_http"] = http.pop("ingest")
+    for name, stats in http.items():
+        results[f"{name}_http"] = stats
+    return results
+
+
+# =============================================================================
+# Commands
+# =============================================================================
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def cmd_run(args) -> int:
+    params = {
+        "docs": args.docs,
+        "vocab": args.vocab,
+        "doc_len": args.doc_len,
+        "zipf": args.zipf,
+        "queries": args.queries,
+        "limit": args.limit,
+        "batch": args.batch,
+        "warmup": args.warmup,
+        "concurrency": [int(c) for c in args.concurrency.split(",")],
+        "seed": args.seed,
+    }
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": {**params, "query_cache": args.cache},
+        },
+        "results": {},
+    }
+
+    for backend in args.backends.split(","):
+        with tempfile.TemporaryDirectory(prefix="search-bench-") as tmp:
+            env = dict(os.environ, SEARCH_BACKEND=backend, SQLITE_DB_PATH=os.path.join(tmp, "bench.db"))
+            env.pop("MEMORY_SNAPSHOT_DIR", None)
+            if not args.cache:
+                env["QUERY_CACHE_ENTRIES"] = "0"
+            out_path = os.path.join(tmp, "result.json")
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "_backend", json.dumps({**params, "backend": backend}), out_path],
+                env=env,
+            )
+            if child.returncode != 0:
+                print(f"[bench] {backend} failed with exit code {child.returncode}", file=sys.stderr)
+                return child.returncode
+            with open(out_path) as f:
+                report["results"][backend] = json.load(f)
+        print_results(backend, report["results"][backend])
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[bench] wrote {args.output}")
+    return 0
+
+
+def print_results(backend: str, results: Dict[str, Any]):
+    print(f"\n== {backend}")
+    for name, stats in results.items():
+        if "docs_per_sec" in stats:
+            print(f"  {name:30s} {stats['docs_per_sec']:>10} docs/s  ({stats['docs']} docs in {stats['seconds']}s)")
+        else:
+            print(
+                f"  {name:30s} p50 {stats['p50_ms']:>8}ms  p95 {stats['p95_ms']:>8}ms  "
+                f"p99 {stats['p99_ms']:>8}ms  {stats['qps']:>9} qps"
+                + (f"  errors {stats['errors']}" if stats.get("errors") else "")
+            )
+
+
+def flatten_metrics(report: Dict[str, Any]) -> Dict[str, float]:
+    """backend.scenario.metric -> value, for the metrics that compare() judges"""
+    metrics = {}
+    for backend, scenarios in report["results"].items():
+        for scenario, stats in scenarios.items():
+            for metric, value in stats.items():
+                if isinstance(value, (int, float)) and (metric.endswith("_ms") or metric in ("qps", "docs_per_sec")):
+                    metrics[f"{backend}.{scenario}.{metric}"] = float(value)
+    return metrics
+
+
+def compare_reports(base: Dict[str, Any], head: Dict[str, Any], threshold: float) -> Tuple[List[Tuple], List[str]]:
+    """Rows of (metric, base, head, relative change, verdict) plus the regressed metric names"""
+    base_metrics = flatten_metrics(base)
+    head_metrics = flatten_metrics(head)
+    rows = []
+    regressions = []
+    for metric in sorted(base_metrics.keys() & head_metrics.keys()):
+        old, new = base_metrics[metric], head_metrics[metric]
+        change = (new - old) / old if old else 0.0
+        # Latencies should go down, throughputs up
+        worse = change if metric.endswith("_ms") else -change
+        verdict = "REGRESSION" if worse > threshold else ("improved" if worse < -threshold else "")
+        if verdict == "REGRESSION":
+            regressions.append(metric)
+        rows.append((metric, old, new, change, verdict))
+    return rows, regressions
+
+
+def cmd_compare(args) -> int:
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    if base["meta"].get("params") != head["meta"].get("params"):
+        print("[bench] warning: runs used different parameters; deltas may not be meaningful", file=sys.stderr)
+
+    rows, regressions = compare_reports(base, head, args.threshold)
+    print(f"{'metric':58s} {'base':>12s} {'head':>12s} {'change':>8s}")
+    for metric, old, new, change, verdict in rows:
+        print(f"{metric:58s} {old:>12.3f} {new:>12.3f} {change:>+8.1%} {verdict}")
+    print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%} "
+          f"({base['meta'].get('git')} -> {head['meta'].get('git')})")
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "_backend":
+        # Internal: per-backend worker spawned by ``run``
+        results = run_backend(json.loads(argv[1]))
+        with open(argv[2], "w") as f:
+            json.dump(results, f)
+        return 0
+
+    parser = argparse.ArgumentParser(description="Search API benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument("--backends", default="memory,sqlite", help="comma-separated backends")
+    run.add_argument("--docs", type=int, default=20000, help="corpus size")
+    run.add_argument("--vocab", type=int, default=50000, help="vocabulary size")
+    run.add_argument("--doc-len", type=int, default=80, help="mean words per document")
+    run.add_argument("--zipf", type=float, default=1.2, help="Zipf exponent of word frequencies")
+    run.add_argument("--queries", type=int, default=500, help="queries per scenario")
+    run.add_argument("--limit", type=int, default=10, help="results per query")
+    run.add_argument("--batch", type=int, default=1000, help="documents per upsert")
+    run.add_argument("--warmup", type=int, default=20, help="untimed queries before each scenario")
+    run.add_argument("--concurrency", default="1,8,32", help="comma-separated HTTP concurrency levels")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--cache", action="store_true", help="keep the /query result cache enabled")
+    run.add_argument("--output", help="write results as JSON")
+    run.set_defaults(func=cmd_run)
+
+    compare = commands.add_parser("compare", help="diff two result files")
+    compare.add_argument("base")
+    compare.add_argument("head")
+    compare.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
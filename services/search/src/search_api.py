@@ -6,243 +6,3510 @@ Provides hybrid search (BM25 + semantic) with graceful degradation.
 Supports multiple backends:
 1. OpenSearch (production) - set OPENSEARCH_URL
 2. SQLite FTS (fallback) - local file-based full-text search
-3. In-memory (demo) - simple keyword matching for development
+3. In-memory (demo) - BM25 over an in-process inverted index for development
 
 Configure via environment variables:
 - SEARCH_BACKEND: "opensearch", "sqlite", or "memory" (default: "memory")
 - OPENSEARCH_URL: OpenSearch cluster URL
+- OPENSEARCH_USERNAME / OPENSEARCH_PASSWORD: Basic auth credentials (default: none)
+- OPENSEARCH_VERIFY_TLS: Verify the cluster's TLS certificate (default: true)
+- OPENSEARCH_TIMEOUT: Seconds per OpenSearch request (default: 10)
+- OPENSEARCH_MAX_CONNECTIONS: Pooled keep-alive connections to the cluster (default: 32)
+- OPENSEARCH_INDEX_PREFIX: Prefix of the OpenSearch index behind each index_name (default: none)
+- OPENSEARCH_BULK_DOCS / OPENSEARCH_BULK_BYTES: Bounds of one _bulk request (default: 500 / 5 MiB)
+- OPENSEARCH_BULK_RETRIES: Retries of rejected _bulk items, with backoff (default: 3)
+- OPENSEARCH_REFRESH: refresh= of an upsert's last _bulk request (default: wait_for, read-your-writes)
+- OPENSEARCH_QUERY_FIELDS: multi_match fields (default: content,metadata_text)
+- OPENSEARCH_HEALTH_TTL: Seconds /health caches the cluster probe (default: 5)
 - SQLITE_DB_PATH: Path to SQLite database file
+- SQLITE_READERS: Number of pooled SQLite read connections (default: 4)
+- SQLITE_UPSERT_BATCH_SIZE: Rows per executemany batch on upsert (default: 500)
+- SEARCH_EMBEDDER: "hashing[:dim]" (default, offline) or "sentence-transformers:<model>"
+- VECTOR_INDEX_PATH: Vector index file prefix (default: SQLITE_DB_PATH + ".vectors")
+- VECTOR_PERSIST: Persist the SQLite backend's vector index to disk (default: true)
+- SEARCH_MIN_SIMILARITY: Cosine below which semantic hits are dropped before fusion (default: 0.2)
+- QUERY_CACHE_ENTRIES / QUERY_CACHE_BYTES: /query result cache bounds (0 disables)
+- INGEST_BATCH_SIZE: Documents per batch for /upsert/stream (default: 1000)
+- SEARCH_SHARDS: Hash shards for newly created indexes (default: 1)
+- SEARCH_READ_WORKERS / SEARCH_WRITE_WORKERS: Threads for blocking query / ingest work (default: SQLITE_READERS / 1)
+- SEARCH_QUEUE_DEPTH: Calls allowed to wait per lane before /query or /upsert answers 429 (default: 64)
+- SEARCH_WORKERS: uvicorn worker processes (default: 1; the memory backend always runs one)
+- MEMORY_SNAPSHOT_DIR: Persist memory indexes here as snapshots plus an upsert log (default: off)
+- MEMORY_SNAPSHOT_EVERY: Logged documents that trigger a new snapshot (default: 50000)
+- MEMORY_FSYNC: fsync the upsert log and snapshot files (default: true)
+- SEARCH_PROFILE_HZ: Sample all thread stacks at this rate, served on /debug/profile (default: 0, off)
+
+Request and per-stage latency histograms, in-flight gauges and error counters
+are exported on GET /metrics (see telemetry.py).
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import uvicorn
-import os
-import sqlite3
-import json
-import hashlib
-from datetime import datetime
-from typing import Dict, Any, List, Optional
-from contextlib import contextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+import uvicorn
+import asyncio
+import base64
+import contextvars
+import os
+import sqlite3
+import json
+import hashlib
+import shutil
+import bisect
+import heapq
+import numpy as np
+import math
+import mmap
+import queue
+import random
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Any, List, Optional, Set, Tuple
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+
+try:
+    import httpx
+except ImportError:  # only the opensearch backend needs it
+    httpx = None
+
+try:
+    from .telemetry import Telemetry
+except ImportError:  # run as a script, or imported with src/ on sys.path
+    from telemetry import Telemetry
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "memory").lower()
+OPENSEARCH_URL = os.getenv("OPENSEARCH_URL", "")
+OPENSEARCH_USERNAME = os.getenv("OPENSEARCH_USERNAME", "")
+OPENSEARCH_PASSWORD = os.getenv("OPENSEARCH_PASSWORD", "")
+OPENSEARCH_VERIFY_TLS = os.getenv("OPENSEARCH_VERIFY_TLS", "true").lower() in ("1", "true", "yes")
+OPENSEARCH_TIMEOUT = float(os.getenv("OPENSEARCH_TIMEOUT", "10"))
+OPENSEARCH_MAX_CONNECTIONS = int(os.getenv("OPENSEARCH_MAX_CONNECTIONS", "32"))
+OPENSEARCH_INDEX_PREFIX = os.getenv("OPENSEARCH_INDEX_PREFIX", "").lower()
+OPENSEARCH_BULK_DOCS = int(os.getenv("OPENSEARCH_BULK_DOCS", "500"))
+OPENSEARCH_BULK_BYTES = int(os.getenv("OPENSEARCH_BULK_BYTES", str(5 * 1024 * 1024)))
+OPENSEARCH_BULK_RETRIES = int(os.getenv("OPENSEARCH_BULK_RETRIES", "3"))
+OPENSEARCH_REFRESH = os.getenv("OPENSEARCH_REFRESH", "wait_for").lower()
+OPENSEARCH_QUERY_FIELDS = [f.strip() for f in os.getenv("OPENSEARCH_QUERY_FIELDS", "content,metadata_text").split(",") if f.strip()]
+OPENSEARCH_HEALTH_TTL = float(os.getenv("OPENSEARCH_HEALTH_TTL", "5"))
+# Without a URL the opensearch backend keeps serving from the in-memory index
+OPENSEARCH_ENABLED = SEARCH_BACKEND == "opensearch" and bool(OPENSEARCH_URL)
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "search_index.db")
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", "4"))
+SQLITE_UPSERT_BATCH_SIZE = int(os.getenv("SQLITE_UPSERT_BATCH_SIZE", "500"))
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+SEARCH_EMBEDDER = os.getenv("SEARCH_EMBEDDER", "hashing").strip()
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", SQLITE_DB_PATH + ".vectors")
+VECTOR_PERSIST = os.getenv("VECTOR_PERSIST", "true").lower() in ("1", "true", "yes")
+VECTOR_SAVE_EVERY = int(os.getenv("VECTOR_SAVE_EVERY", "10000"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_OVERSAMPLE = int(os.getenv("HYBRID_OVERSAMPLE", "3"))
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.2"))
+QUERY_CACHE_ENTRIES = int(os.getenv("QUERY_CACHE_ENTRIES", "1024"))
+QUERY_CACHE_BYTES = int(os.getenv("QUERY_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+INGEST_MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", str(16 * 1024 * 1024)))
+
+DEFAULT_INDEX_NAME = "global_agent_docs"
+SEARCH_SHARDS = int(os.getenv("SEARCH_SHARDS", "1"))
+SEARCH_FANOUT_WORKERS = int(os.getenv("SEARCH_FANOUT_WORKERS", "8"))
+
+SEARCH_READ_WORKERS = int(os.getenv("SEARCH_READ_WORKERS", str(SQLITE_READERS)))
+SEARCH_WRITE_WORKERS = int(os.getenv("SEARCH_WRITE_WORKERS", "1"))
+SEARCH_QUEUE_DEPTH = int(os.getenv("SEARCH_QUEUE_DEPTH", "64"))
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "1"))
+
+MEMORY_SNAPSHOT_DIR = os.getenv("MEMORY_SNAPSHOT_DIR", "")
+MEMORY_SNAPSHOT_EVERY = int(os.getenv("MEMORY_SNAPSHOT_EVERY", "50000"))
+MEMORY_FSYNC = os.getenv("MEMORY_FSYNC", "true").lower() in ("1", "true", "yes")
+
+SEARCH_PROFILE_HZ = float(os.getenv("SEARCH_PROFILE_HZ", "0"))
+
+# Stay well below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds
+_SQLITE_MAX_VARS = 900
+
+# Cumulative ingest throughput (reported by /upsert and /stats)
+_ingest_stats: Dict[str, float] = {"documents": 0, "unchanged": 0, "seconds": 0.0}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the pool and initialise the schema once, before serving traffic
+    if SEARCH_BACKEND == "sqlite":
+        for index in list(get_sqlite_pool_indexes()):
+            get_sqlite_vectors(index)
+    elif SEARCH_BACKEND == "memory" and MEMORY_SNAPSHOT_DIR:
+        load_memory_snapshots()
+    elif OPENSEARCH_ENABLED:
+        # Open the pool and learn the cluster's state before the first request
+        await opensearch_health()
+    yield
+    await close_opensearch_client()
+    _read_lane.shutdown()
+    _write_lane.shutdown()
+    close_fan_out()
+    close_sqlite_vectors()
+    close_sqlite_pool()
+    close_memory_snapshots()
+
+
+app = FastAPI(title="Search API", version="0.2.0", lifespan=lifespan)
+
+_telemetry = Telemetry("search", labels={"backend": SEARCH_BACKEND}, profile_hz=SEARCH_PROFILE_HZ)
+_telemetry.instrument(app)
+
+class SearchRequest(BaseModel):
+    query: str
+    limit: Optional[int] = 10
+    filters: Optional[Dict[str, Any]] = None
+    context: Optional[Dict[str, Any]] = None
+    # Reciprocal rank fusion weights; set one to 0 to query a single leg
+    lexical_weight: Optional[float] = 1.0
+    semantic_weight: Optional[float] = 1.0
+    # Semantic hits less cosine-similar than this are dropped (default SEARCH_MIN_SIMILARITY),
+    # so a query matching nothing returns nothing instead of its nearest strangers
+    min_similarity: Optional[float] = None
+    index_name: Optional[str] = DEFAULT_INDEX_NAME
+    # Fields per hit besides id and score: "content", "metadata", "metadata.<key>",
+    # "snippet", "highlight" (default: content and metadata)
+    fields: Optional[List[str]] = None
+    snippet_tokens: Optional[int] = None
+    highlight_tags: Optional[List[str]] = None
+    # next_cursor of the previous page: continue after its last hit
+    search_after: Optional[str] = None
+    # Hybrid only: hits per leg that are fused (default limit * HYBRID_OVERSAMPLE);
+    # kept by cursors, so it also bounds how far hybrid results can be paged
+    rank_window: Optional[int] = None
+
+class UpsertRequest(BaseModel):
+    documents: List[Dict[str, Any]]
+    index_name: Optional[str] = DEFAULT_INDEX_NAME
+    # Hash shards used only when this upsert creates the index
+    shards: Optional[int] = None
+    # Rewrite documents even when their hash matches the manifest
+    force: Optional[bool] = False
+
+class DocumentHash(BaseModel):
+    id: str
+    hash: str
+
+class DeltaSyncRequest(BaseModel):
+    documents: List[DocumentHash]
+    index_name: Optional[str] = DEFAULT_INDEX_NAME
+
+class HealthResponse(BaseModel):
+    status: str
+    version: str
+    opensearch_status: Optional[str] = None
+    vector_store_status: Optional[str] = None
+    embedder: Optional[str] = None
+    vector_count: Optional[int] = None
+
+@app.get("/health", response_model=HealthResponse)
+async def health_check():
+    """Health check endpoint"""
+    opensearch_status = "not_configured"
+    vector_store_status = "not_configured"
+    vector_count = None
+
+    status = "ok"
+
+    if OPENSEARCH_ENABLED:
+        opensearch_status = await opensearch_health()
+        vector_store_status = "opensearch_knn"
+        if opensearch_status in ("red", "unreachable"):
+            status = "degraded"
+    elif SEARCH_BACKEND == "sqlite":
+        opensearch_status = "n/a"
+        vector_store_status = "sqlite_fts+vectors"
+        # Only vector indexes this process has loaded; /health never touches the database
+        vector_count = sum(len(vectors) for vectors in list(_sqlite_vectors.values()))
+    else:
+        opensearch_status = "n/a"
+        vector_store_status = "memory+vectors"
+        vector_count = sum(len(index.vectors) for index in list(_memory_indexes.values()))
+
+    return HealthResponse(
+        status=status,
+        version="0.2.0",
+        opensearch_status=opensearch_status,
+        vector_store_status=vector_store_status,
+        embedder=get_embedder().name,
+        vector_count=vector_count
+    )
+
+
+# =============================================================================
+# Metadata Filters
+# =============================================================================
+
+_FILTER_OPS = ("eq", "in", "gt", "gte", "lt", "lte")
+_SQL_OPS = {"eq": "=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _index_value(value: Any) -> Optional[Tuple[str, Any]]:
+    """Normalise a scalar metadata value to a ("n", float) or ("t", str) pair"""
+    if isinstance(value, bool):
+        return ("t", "true" if value else "false")
+    if isinstance(value, (int, float)):
+        return ("n", float(value))
+    if isinstance(value, str):
+        return ("t", value)
+    return None
+
+
+def metadata_entries(metadata: Optional[Dict[str, Any]]) -> List[Tuple[str, Tuple[str, Any]]]:
+    """Indexable (field, value) pairs of a document; list values index each element"""
+    entries = []
+    for field, value in (metadata or {}).items():
+        for item in value if isinstance(value, list) else (value,):
+            norm = _index_value(item)
+            if norm is not None:
+                entries.append((field, norm))
+    return entries
+
+
+def parse_filters(filters: Optional[Dict[str, Any]]) -> List[Tuple[str, str, Any]]:
+    """
+    Parse SearchRequest.filters into (field, op, value) clauses that are ANDed.
+
+    ``{"lang": "py"}`` is equality, ``{"lang": ["py", "ts"]}`` is ``in`` and
+    ``{"size": {"gte": 10, "lt": 100}}`` applies comparison operators. Strings
+    compare lexicographically, so ISO dates work with range operators.
+    """
+    clauses = []
+    for field, spec in (filters or {}).items():
+        if isinstance(spec, dict):
+            ops = spec
+        elif isinstance(spec, list):
+            ops = {"in": spec}
+        else:
+            ops = {"eq": spec}
+        for op, value in ops.items():
+            if op not in _FILTER_OPS:
+                raise HTTPException(status_code=400, detail=f"invalid_filter: unsupported operator '{op}' on '{field}'")
+            if op == "in" and not isinstance(value, list):
+                raise HTTPException(status_code=400, detail=f"invalid_filter: 'in' on '{field}' expects a list")
+            normalised = [_index_value(v) for v in (value if op == "in" else [value])]
+            if any(n is None for n in normalised):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"invalid_filter: values for '{field}' must be strings, numbers or booleans"
+                )
+            clauses.append((field, op, normalised if op == "in" else normalised[0]))
+    return clauses
+
+
+# =============================================================================
+# Change Detection (content-hash manifest)
+# =============================================================================
+
+# Every index remembers the hash each document was last written with. Upserts
+# skip documents whose hash is unchanged, so resending a mostly unchanged
+# corpus costs no deletes, rewrites, embeddings, new indexed_at stamps or
+# cache invalidations; POST /sync/delta tells a caller which of its (id, hash)
+# pairs need sending at all. Documents written before the manifest existed
+# have no hash and are rewritten once.
+
+def content_hash(content: str, metadata: Optional[Dict[str, Any]]) -> str:
+    """md5 hex of the UTF-8 JSON ``[content, metadata]`` with sorted keys and no whitespace"""
+    canonical = json.dumps([content, metadata or {}], sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.md5(canonical.encode()).hexdigest()
+
+
+def upsert_rows(documents: List[Dict[str, Any]]) -> Dict[str, Tuple[str, Dict[str, Any], str]]:
+    """
+    id -> (content, metadata, hash) for an upsert; the last occurrence of an id wins.
+
+    A document's own ``hash`` (e.g. a source-system version) is kept as is;
+    otherwise content_hash() of its content and metadata is used.
+    """
+    rows: Dict[str, Tuple[str, Dict[str, Any], str]] = {}
+    for doc in documents:
+        content = doc.get("content", "")
+        metadata = doc.get("metadata", {})
+        doc_id = doc.get("id") or hashlib.md5(content.encode()).hexdigest()
+        rows[doc_id] = (content, metadata, str(doc.get("hash") or content_hash(content, metadata)))
+    return rows
+
+
+def changed_rows(
+    rows: Dict[str, Tuple[str, Dict[str, Any], str]],
+    known: Dict[str, str],
+) -> Dict[str, Tuple[str, Dict[str, Any], str]]:
+    """The rows whose hash differs from the manifest's (``known``)"""
+    return {doc_id: row for doc_id, row in rows.items() if known.get(doc_id) != row[2]}
+
+
+# =============================================================================
+# Result Projection (fields, snippets) & Keyset Cursors
+# =============================================================================
+
+# Backends rank (doc_id, score) pairs only; the fields of the final page are
+# loaded afterwards ("materialised"), so large documents that are filtered,
+# fused away or not requested are never read or decoded.
+
+Hit = Tuple[str, float]
+
+_PROJECTABLE_FIELDS = ("content", "metadata", "snippet", "highlight")
+SNIPPET_MAX_TOKENS = 64  # FTS5's limit for snippet()
+
+
+class Projection:
+    """
+    The fields a hit carries besides ``id`` and ``score``.
+
+    ``fields`` entries are "content", "metadata", "metadata.<key>" (only that
+    key), "snippet" (best-matching fragment of ``snippet_tokens`` tokens) and
+    "highlight" (whole content); query terms are wrapped in ``tags``.
+    """
+
+    def __init__(self, fields: Optional[List[str]] = None, snippet_tokens: int = 24, tags: Tuple[str, str] = ("<b>", "</b>")):
+        fields = ["content", "metadata"] if fields is None else fields
+        requested = {field.split(".", 1)[0] for field in fields}
+        # Whole metadata wins over individual keys
+        keys = [field[len("metadata."):] for field in fields if field.startswith("metadata.")]
+        self.metadata_keys: Optional[List[str]] = keys if keys and "metadata" not in fields else None
+        self.content = "content" in requested
+        self.metadata = "metadata" in requested
+        self.snippet = "snippet" in requested
+        self.highlight = "highlight" in requested
+        self.snippet_tokens = snippet_tokens
+        self.tags = tags
+
+    def key(self) -> Tuple:
+        return (
+            self.content, self.metadata, tuple(self.metadata_keys or ()),
+            self.snippet, self.highlight, self.snippet_tokens, self.tags,
+        )
+
+    def hit(
+        self,
+        doc_id: str,
+        score: float,
+        content: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        snippet: Optional[str] = None,
+        highlight: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"id": doc_id}
+        if self.content:
+            result["content"] = content
+        if self.snippet:
+            result["snippet"] = snippet
+        if self.highlight:
+            result["highlight"] = highlight
+        result["score"] = score
+        if self.metadata:
+            metadata = metadata or {}
+            if self.metadata_keys is not None:
+                metadata = {key: metadata[key] for key in self.metadata_keys if key in metadata}
+            result["metadata"] = metadata
+        return result
+
+
+DEFAULT_PROJECTION = Projection()
+
+
+def parse_projection(fields: Optional[List[str]], snippet_tokens: Optional[int], highlight_tags: Optional[List[str]]) -> Projection:
+    """Validate SearchRequest's projection options"""
+    if fields is None and snippet_tokens is None and highlight_tags is None:
+        return DEFAULT_PROJECTION
+    for field in fields or ():
+        if field not in _PROJECTABLE_FIELDS and not (field.startswith("metadata.") and len(field) > len("metadata.")):
+            raise HTTPException(
+                status_code=400,
+                detail=f"invalid_fields: unknown field '{field}' (use {', '.join(_PROJECTABLE_FIELDS)} or metadata.<key>)"
+            )
+    tokens = 24 if snippet_tokens is None else snippet_tokens
+    if not 1 <= tokens <= SNIPPET_MAX_TOKENS:
+        raise HTTPException(status_code=400, detail=f"invalid_fields: snippet_tokens must be 1-{SNIPPET_MAX_TOKENS}")
+    if highlight_tags is not None and len(highlight_tags) != 2:
+        raise HTTPException(status_code=400, detail="invalid_fields: highlight_tags must be [open, close]")
+    return Projection(fields, tokens, tuple(highlight_tags) if highlight_tags else ("<b>", "</b>"))
+
+
+def _mark(text: str, spans: List[Tuple[int, int]], tags: Tuple[str, str]) -> str:
+    parts = []
+    pos = 0
+    for start, end in spans:
+        parts.append(text[pos:start])
+        parts.append(tags[0] + text[start:end] + tags[1])
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def make_highlight(text: str, terms: Set[str], tags: Tuple[str, str]) -> str:
+    """``text`` with every token in ``terms`` wrapped in ``tags`` (like FTS5 highlight())"""
+    return _mark(text, [m.span() for m in _TOKEN_RE.finditer(text) if m.group().lower() in terms], tags)
+
+
+def make_snippet(text: str, terms: Set[str], tokens: int, tags: Tuple[str, str], ellipsis: str = "...") -> str:
+    """
+    The ``tokens``-token fragment of ``text`` with the most distinct query
+    terms (earliest wins ties), matches marked, like FTS5 snippet().
+    """
+    words = list(_TOKEN_RE.finditer(text))
+    if not words:
+        return ""
+    hits = [i for i, m in enumerate(words) if m.group().lower() in terms]
+    hit_terms = [words[i].group().lower() for i in hits]
+    first = 0
+    best = 0
+    # Slide a window that starts a little before each match over the matches
+    counts: Dict[str, int] = {}
+    lo = hi = 0
+    for i in hits:
+        start = max(0, min(i - tokens // 4, len(words) - tokens))
+        while hi < len(hits) and hits[hi] < start + tokens:
+            counts[hit_terms[hi]] = counts.get(hit_terms[hi], 0) + 1
+            hi += 1
+        while hits[lo] < start:
+            counts[hit_terms[lo]] -= 1
+            if not counts[hit_terms[lo]]:
+                del counts[hit_terms[lo]]
+            lo += 1
+        if len(counts) > best:
+            first, best = start, len(counts)
+    window = words[first:first + tokens]
+    begin = 0 if first == 0 else window[0].start()
+    end = len(text) if first + tokens >= len(words) else window[-1].end()
+    spans = [(m.start() - begin, m.end() - begin) for m in window if m.group().lower() in terms]
+    return (ellipsis if begin else "") + _mark(text[begin:end], spans, tags) + (ellipsis if end < len(text) else "")
+
+
+def _hit_order(hit: Hit) -> Tuple[float, str]:
+    return (-hit[1], hit[0])
+
+
+def after_cursor(hit: Hit, after: Optional[Hit]) -> bool:
+    """True if ``hit`` sorts after the cursor position (score descending, then id)"""
+    return after is None or hit[1] < after[1] or (hit[1] == after[1] and hit[0] > after[0])
+
+
+def top_hits(hits, limit: int, after: Optional[Hit] = None) -> List[Hit]:
+    """
+    The first ``limit`` (doc_id, score) pairs after ``after``, by descending
+    score and then id. The id tie-break makes the order total, which keeps
+    keyset pages from repeating or skipping equally scored hits.
+    """
+    if limit <= 0:
+        return []
+    if after is not None:
+        hits = [hit for hit in hits if after_cursor(hit, after)]
+    elif not isinstance(hits, list):
+        hits = list(hits)
+    top = heapq.nlargest(limit + 1, hits, key=itemgetter(1))
+    if len(top) > limit and top[limit][1] == top[limit - 1][1]:
+        # A tie straddles the cut: the id order decides which of them make it
+        return heapq.nsmallest(limit, hits, key=_hit_order)
+    return sorted(top[:limit], key=_hit_order)
+
+
+def query_fingerprint(request: "SearchRequest", index_name: str) -> str:
+    """Identifies the ranking a cursor belongs to (not its page size or projection)"""
+    return hashlib.md5(json.dumps([
+        SEARCH_BACKEND,
+        index_name,
+        " ".join(request.query.split()),
+        request.filters or {},
+        request.lexical_weight,
+        request.semantic_weight,
+        request.min_similarity,
+    ], sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def encode_cursor(last: Hit, window: int, fingerprint: str, rank: int) -> str:
+    payload = json.dumps([last[1], last[0], window, fingerprint, rank], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, fingerprint: str) -> Tuple[Hit, int, int]:
+    """
+    Return the cursor's last hit, the hybrid fusion window of its first page
+    and how many hits the pages so far have returned
+    """
+    try:
+        score, doc_id, window, cursor_fingerprint, rank = json.loads(
+            base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        )
+        last = (str(doc_id), float(score))
+        window, rank = int(window), int(rank)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid_cursor: malformed search_after token")
+    if cursor_fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=400,
+            detail="invalid_cursor: search_after belongs to a different query, filters, weights or index"
+        )
+    return last, window, rank
+
+
+# =============================================================================
+# SQLite FTS Backend
+# =============================================================================
+
+class SQLitePool:
+    """
+    Long-lived SQLite connections: one writer plus a fixed set of readers.
+
+    The database runs in WAL mode so readers never block the writer (and vice
+    versa). Writes are serialised through a single connection guarded by a
+    lock; readers are handed out from a queue and returned after use.
+    """
+
+    def __init__(self, path: str, readers: int = 4):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(max(1, readers)):
+            self._readers.put(self._connect())
+        self._all = [self._writer] + list(self._readers.queue)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: transactions are managed explicitly (BEGIN/COMMIT)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        return conn
+
+    @contextmanager
+    def reader(self):
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        with self._write_lock:
+            yield self._writer
+
+    def close(self):
+        for conn in self._all:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_sqlite_pool: Optional[SQLitePool] = None
+_sqlite_pool_lock = threading.Lock()
+
+
+def get_sqlite_pool() -> SQLitePool:
+    """Return the process-wide pool, creating it and the schema on first use"""
+    global _sqlite_pool
+    if _sqlite_pool is None:
+        with _sqlite_pool_lock:
+            if _sqlite_pool is None:
+                pool = SQLitePool(SQLITE_DB_PATH, readers=SQLITE_READERS)
+                init_sqlite_fts(pool)
+                _load_sqlite_indexes(pool)
+                _sqlite_pool = pool
+    return _sqlite_pool
+
+
+def close_sqlite_pool():
+    global _sqlite_pool
+    with _sqlite_pool_lock:
+        if _sqlite_pool is not None:
+            _sqlite_pool.close()
+            _sqlite_pool = None
+            _sqlite_indexes.clear()
+
+
+@contextmanager
+def get_sqlite_connection():
+    """Get a pooled read connection with FTS5 support"""
+    with get_sqlite_pool().reader() as conn:
+        yield conn
+
+
+@contextmanager
+def sqlite_transaction(conn: sqlite3.Connection):
+    """Run a block inside BEGIN IMMEDIATE ... COMMIT on a writer connection"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _create_shard_tables(conn: sqlite3.Connection, prefix: str):
+    """
+    Create one shard's tables.
+
+    {prefix}_ids maps document ids to FTS rowids so upserts can delete by
+    rowid instead of scanning {prefix}_fts for the (unindexed) id column,
+    and records the index generation that last wrote each document and
+    its content hash (the change-detection manifest);
+    {prefix}_meta holds one row per (document, field, scalar value).
+    """
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {prefix}_fts USING fts5(
+            id, content, metadata, tokenize='porter'
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {prefix}_ids (
+            rowid INTEGER PRIMARY KEY,
+            doc_id TEXT NOT NULL UNIQUE,
+            gen INTEGER NOT NULL DEFAULT 0,
+            hash TEXT
+        )
+    """)
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({prefix}_ids)")}
+    if "gen" not in columns:
+        conn.execute(f"ALTER TABLE {prefix}_ids ADD COLUMN gen INTEGER NOT NULL DEFAULT 0")
+    if "hash" not in columns:
+        conn.execute(f"ALTER TABLE {prefix}_ids ADD COLUMN hash TEXT")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {prefix}_ids_gen ON {prefix}_ids (gen)")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {prefix}_meta (
+            doc_rowid INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value_text TEXT,
+            value_num REAL
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {prefix}_meta_text ON {prefix}_meta (key, value_text, doc_rowid)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {prefix}_meta_num ON {prefix}_meta (key, value_num, doc_rowid)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {prefix}_meta_doc ON {prefix}_meta (doc_rowid)")
+
+
+def init_sqlite_fts(pool: SQLitePool):
+    """
+    Initialize the SQLite schema (once per process).
+
+    Shard 0 of the default index lives in the original documents_* tables;
+    older databases are migrated in place according to PRAGMA user_version.
+    """
+    with pool.writer() as conn, sqlite_transaction(conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        _create_shard_tables(conn, "documents")
+        if version < 1:
+            # Backfill databases created before the id map existed
+            conn.execute("""
+                INSERT OR REPLACE INTO documents_ids (rowid, doc_id)
+                SELECT rowid, id FROM documents_fts ORDER BY rowid
+            """)
+        if version < 2:
+            rows = conn.execute("SELECT m.rowid, f.metadata FROM documents_ids m JOIN documents_fts f ON f.rowid = m.rowid")
+            conn.executemany(
+                "INSERT INTO documents_meta (doc_rowid, key, value_text, value_num) VALUES (?, ?, ?, ?)",
+                [
+                    entry
+                    for row in rows.fetchall()
+                    for entry in _sqlite_meta_rows(row[0], json.loads(row[1]) if row[1] else {})
+                ]
+            )
+        if version < 3:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_indexes (
+                    name TEXT PRIMARY KEY,
+                    shards INTEGER NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            # Existing data lives in the single documents_* shard
+            has_docs = conn.execute("SELECT EXISTS (SELECT 1 FROM documents_ids)").fetchone()[0]
+            _register_sqlite_index(conn, DEFAULT_INDEX_NAME, 1 if has_docs else SEARCH_SHARDS)
+        if version < 4:
+            # Generations live in the database so every worker process sees every write
+            conn.execute("ALTER TABLE search_indexes ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+            for row in conn.execute("SELECT name, shards FROM search_indexes").fetchall():
+                for shard in range(row[1]):
+                    _create_shard_tables(conn, shard_prefix(row[0], shard))
+        conn.execute("PRAGMA user_version = 4")
+
+
+class SQLiteIndex:
+    """A named index split into hash shards, each a set of {prefix}_* tables"""
+
+    def __init__(self, name: str, shards: int):
+        self.name = name
+        self.prefixes = [shard_prefix(name, shard) for shard in range(shards)]
+
+    def prefix_for(self, doc_id: str) -> str:
+        return self.prefixes[shard_for(doc_id, len(self.prefixes))]
+
+    @property
+    def vector_path(self) -> str:
+        if self.name == DEFAULT_INDEX_NAME:
+            return VECTOR_INDEX_PATH
+        return f"{VECTOR_INDEX_PATH}.{index_slug(self.name)}"
+
+
+_sqlite_indexes: Dict[str, SQLiteIndex] = {}
+
+
+def get_sqlite_pool_indexes() -> List[SQLiteIndex]:
+    """All registered SQLite indexes (opens the pool if needed)"""
+    get_sqlite_pool()
+    return list(_sqlite_indexes.values())
+
+
+def shard_prefix(index_name: str, shard: int) -> str:
+    if index_name == DEFAULT_INDEX_NAME and shard == 0:
+        return "documents"
+    return f"{index_slug(index_name)}_s{shard}"
+
+
+def _register_sqlite_index(conn: sqlite3.Connection, name: str, shards: int):
+    conn.execute(
+        "INSERT OR IGNORE INTO search_indexes (name, shards, created_at) VALUES (?, ?, ?)",
+        (name, shards, datetime.utcnow().isoformat())
+    )
+    for shard in range(shards):
+        _create_shard_tables(conn, shard_prefix(name, shard))
+
+
+def _load_sqlite_indexes(pool: SQLitePool):
+    with pool.reader() as conn:
+        for row in conn.execute("SELECT name, shards FROM search_indexes"):
+            _sqlite_indexes.setdefault(row["name"], SQLiteIndex(row["name"], row["shards"]))
+
+
+def get_sqlite_index(name: str, create: bool = False, shards: Optional[int] = None) -> Optional[SQLiteIndex]:
+    """Look up a named index, optionally creating it with ``shards`` shards"""
+    pool = get_sqlite_pool()
+    index = _sqlite_indexes.get(name)
+    if index is None:
+        # Another worker process may have created it since this one started
+        with pool.reader() as conn:
+            row = conn.execute("SELECT shards FROM search_indexes WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            index = _sqlite_indexes.setdefault(name, SQLiteIndex(name, row["shards"]))
+    if index is None and create:
+        with pool.writer() as conn:
+            index = _sqlite_indexes.get(name)
+            if index is None:
+                with sqlite_transaction(conn):
+                    _register_sqlite_index(conn, name, max(1, shards or SEARCH_SHARDS))
+                row = conn.execute("SELECT shards FROM search_indexes WHERE name = ?", (name,)).fetchone()
+                index = _sqlite_indexes[name] = SQLiteIndex(name, row["shards"])
+    return index
+
+
+def sqlite_generation(conn: sqlite3.Connection, name: str) -> int:
+    row = conn.execute("SELECT generation FROM search_indexes WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _sqlite_meta_rows(rowid: int, metadata: Dict[str, Any]) -> List[Tuple[int, str, Optional[str], Optional[float]]]:
+    return [
+        (rowid, field, value if kind == "t" else None, value if kind == "n" else None)
+        for field, (kind, value) in metadata_entries(metadata)
+    ]
+
+
+def _sqlite_filter_sql(clauses: List[Tuple[str, str, Any]], rowid_column: str, prefix: str) -> Tuple[str, List[Any]]:
+    """Translate filter clauses into rowid IN (...) conditions on {prefix}_meta"""
+    parts: List[str] = []
+    params: List[Any] = []
+    for field, op, value in clauses:
+        clause_params: List[Any] = [field]
+        if op == "in":
+            alternatives = []
+            for kind, column in (("t", "value_text"), ("n", "value_num")):
+                values = [v for k, v in value if k == kind]
+                if values:
+                    alternatives.append(f"{column} IN ({','.join('?' * len(values))})")
+                    clause_params.extend(values)
+            condition = " OR ".join(alternatives) or "0"
+        else:
+            kind, bound = value
+            condition = f"{'value_num' if kind == 'n' else 'value_text'} {_SQL_OPS[op]} ?"
+            clause_params.append(bound)
+        parts.append(f"{rowid_column} IN (SELECT doc_rowid FROM {prefix}_meta WHERE key = ? AND ({condition}))")
+        params.extend(clause_params)
+    return " AND ".join(parts), params
+
+
+def _rank_sqlite_shard(prefix: str, query: str, limit: int, filters: List[Tuple[str, str, Any]], after: Optional[Hit]) -> List[Hit]:
+    """Top ``limit`` (doc_id, score) pairs of one shard; no document bodies are read"""
+    # "+rowid" keeps the IN lists out of FTS5's planner; given a rowid constraint it
+    # probes MATCH per candidate row and loses its rank ordering (~25x slower)
+    filter_sql, filter_params = _sqlite_filter_sql(filters, "+rowid", prefix)
+    conditions = [f"{prefix}_fts MATCH ?"]
+    params: List[Any] = [query]
+    if filter_sql:
+        conditions.append(filter_sql)
+        params.extend(filter_params)
+    if after is not None:
+        # Keyset: rows ranked after the cursor (FTS5 rank is the negated score).
+        # "+rank": FTS5 reads a bare rank constraint as a rank function to use
+        conditions.append("(+rank > ? OR (+rank = ? AND id > ?))")
+        params.extend((-after[1], -after[1], after[0]))
+    sql = f"SELECT id, rank FROM {prefix}_fts WHERE {' AND '.join(conditions)}"
+    with _telemetry.stage("fts"), get_sqlite_connection() as conn:
+        rows = conn.execute(f"{sql} ORDER BY rank LIMIT ?", (*params, limit + 1)).fetchall()
+        if len(rows) > limit and rows[limit][1] == rows[limit - 1][1]:
+            # FTS5 orders equal ranks arbitrarily; fetch the whole tie so top_hits cuts it by id
+            boundary = rows[limit - 1][1]
+            rows = [row for row in rows if row[1] < boundary]
+            rows += conn.execute(f"{sql} AND +rank = ?", (*params, boundary)).fetchall()
+    return top_hits([(row[0], -row[1]) for row in rows], limit)
+
+
+def rank_sqlite(
+    query: str,
+    limit: int,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    after: Optional[Hit] = None,
+) -> List[Hit]:
+    """BM25 ranking with SQLite FTS5 across the index's shards, metadata filters evaluated in SQL"""
+    index = get_sqlite_index(index_name)
+    if index is None or limit <= 0:
+        return []
+    per_shard = fan_out(lambda prefix: _rank_sqlite_shard(prefix, query, limit, filters or [], after), index.prefixes)
+    return merge_ranked(per_shard, limit)
+
+
+def search_sqlite(
+    query: str,
+    limit: int,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    after: Optional[Hit] = None,
+    projection: Projection = DEFAULT_PROJECTION,
+) -> List[Dict[str, Any]]:
+    """Search using SQLite FTS5 across the index's shards, with metadata filters evaluated in SQL"""
+    hits = rank_sqlite(query, limit, filters, index_name, after)
+    return materialize_sqlite(index_name, hits, query, projection)
+
+
+def _lookup_rowids(conn: sqlite3.Connection, prefix: str, doc_ids: List[str]) -> Dict[str, int]:
+    """Map document ids to their FTS rowids (missing ids are omitted)"""
+    found: Dict[str, int] = {}
+    for start in range(0, len(doc_ids), _SQLITE_MAX_VARS):
+        chunk = doc_ids[start:start + _SQLITE_MAX_VARS]
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"SELECT rowid, doc_id FROM {prefix}_ids WHERE doc_id IN ({placeholders})", chunk
+        ):
+            found[row["doc_id"]] = row["rowid"]
+    return found
+
+
+def _upsert_sqlite_shard(
+    conn: sqlite3.Connection,
+    prefix: str,
+    items: List[Tuple[str, Tuple[str, Dict[str, Any], str]]],
+    batch_size: int,
+    generation: int,
+):
+    next_rowid = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {prefix}_ids").fetchone()[0] + 1
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        existing = _lookup_rowids(conn, prefix, [doc_id for doc_id, _ in batch])
+
+        # Delete existing and insert new (upsert pattern for FTS)
+        stale = [(rowid,) for rowid in existing.values()]
+        conn.executemany(f"DELETE FROM {prefix}_fts WHERE rowid = ?", stale)
+        conn.executemany(f"DELETE FROM {prefix}_meta WHERE doc_rowid = ?", stale)
+        fts_rows = []
+        meta_rows = []
+        new_ids = []
+        old_ids = []
+        for doc_id, (content, metadata, doc_hash) in batch:
+            rowid = existing.get(doc_id)
+            if rowid is None:
+                rowid = next_rowid
+                next_rowid += 1
+                new_ids.append((rowid, doc_id, generation, doc_hash))
+            else:
+                old_ids.append((generation, doc_hash, rowid))
+            fts_rows.append((rowid, doc_id, content, json.dumps(metadata)))
+            meta_rows.extend(_sqlite_meta_rows(rowid, metadata))
+        conn.executemany(
+            f"INSERT INTO {prefix}_fts (rowid, id, content, metadata) VALUES (?, ?, ?, ?)",
+            fts_rows
+        )
+        conn.executemany(
+            f"INSERT INTO {prefix}_meta (doc_rowid, key, value_text, value_num) VALUES (?, ?, ?, ?)",
+            meta_rows
+        )
+        conn.executemany(f"UPDATE {prefix}_ids SET gen = ?, hash = ? WHERE rowid = ?", old_ids)
+        conn.executemany(f"INSERT INTO {prefix}_ids (rowid, doc_id, gen, hash) VALUES (?, ?, ?, ?)", new_ids)
+
+
+def upsert_sqlite(
+    documents: List[Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    shards: Optional[int] = None,
+    force: bool = False,
+) -> Tuple[int, int]:
+    """
+    Upsert documents into SQLite FTS; returns (written, unchanged).
+
+    Documents whose hash matches the manifest are skipped unless ``force``;
+    the manifest is re-read inside the write transaction, so a concurrent
+    upsert cannot make this one skip a document it has since changed.
+    The rest are written in a single transaction, in executemany batches
+    of ``batch_size`` (default SQLITE_UPSERT_BATCH_SIZE) per shard. Existing
+    documents keep their rowid so the id map only grows for new ids. The
+    same transaction bumps the index generation, which invalidates cached
+    queries and tells other worker processes which vectors to refresh.
+    """
+    batch_size = max(1, batch_size or SQLITE_UPSERT_BATCH_SIZE)
+    index = get_sqlite_index(index_name, create=True, shards=shards)
+
+    rows = upsert_rows(documents)
+    received = len(rows)
+    pending = rows
+    if not force:
+        # A first pass on a reader, so unchanged documents are neither embedded nor queued for the writer
+        with _telemetry.stage("manifest"):
+            pending = changed_rows(rows, sqlite_document_hashes(index, list(rows)))
+    if not pending:
+        # Nothing changed: no write, and cached queries stay valid
+        return 0, received
+    with _telemetry.stage("embed"):
+        embedded = dict(zip(pending, get_embedder().embed([content for content, _, _ in pending.values()])))
+
+    vector_index = get_sqlite_vectors(index)
+    with get_sqlite_pool().writer() as conn:
+        with _telemetry.stage("sql_write"), sqlite_transaction(conn):
+            if not force:
+                # Decide again under the write lock: another upsert may have committed since the first pass
+                pending = changed_rows(rows, sqlite_document_hashes(index, list(rows), conn))
+                if not pending:
+                    return 0, received
+                late = [doc_id for doc_id in pending if doc_id not in embedded]
+                if late:
+                    embedded.update(zip(late, get_embedder().embed([pending[doc_id][0] for doc_id in late])))
+            items = list(pending.items())
+            by_shard: Dict[str, List[Tuple[str, Tuple[str, Dict[str, Any], str]]]] = {}
+            for item in items:
+                by_shard.setdefault(index.prefix_for(item[0]), []).append(item)
+            conn.execute("UPDATE search_indexes SET generation = generation + 1 WHERE name = ?", (index.name,))
+            generation = sqlite_generation(conn, index.name)
+            for prefix, shard_items in by_shard.items():
+                _upsert_sqlite_shard(conn, prefix, shard_items, batch_size, generation)
+        with _telemetry.stage("vector_update"):
+            vector_index.upsert([doc_id for doc_id, _ in items], np.stack([embedded[doc_id] for doc_id, _ in items]))
+        if vector_index.generation == generation - 1:
+            # Otherwise another process wrote in between; the next sync catches up
+            vector_index.generation = generation
+    if VECTOR_PERSIST and vector_index.dirty >= VECTOR_SAVE_EVERY:
+        with _telemetry.stage("vector_save"):
+            save_sqlite_vectors(index, vector_index)
+    return len(items), received - len(items)
+
+
+def sqlite_document_hashes(
+    index: SQLiteIndex,
+    doc_ids: List[str],
+    conn: Optional[sqlite3.Connection] = None,
+) -> Dict[str, str]:
+    """
+    Manifest hashes of the given documents (unknown and unhashed ids are omitted).
+
+    Reads through ``conn`` when given (e.g. the writer, inside its
+    transaction), otherwise through a pooled reader.
+    """
+    by_shard: Dict[str, List[str]] = {}
+    for doc_id in doc_ids:
+        by_shard.setdefault(index.prefix_for(doc_id), []).append(doc_id)
+    hashes: Dict[str, str] = {}
+    with (nullcontext(conn) if conn is not None else get_sqlite_connection()) as conn:
+        for prefix, ids in by_shard.items():
+            for start in range(0, len(ids), _SQLITE_MAX_VARS):
+                chunk = ids[start:start + _SQLITE_MAX_VARS]
+                placeholders = ",".join("?" * len(chunk))
+                for row in conn.execute(
+                    f"SELECT doc_id, hash FROM {prefix}_ids WHERE doc_id IN ({placeholders}) AND hash IS NOT NULL", chunk
+                ):
+                    hashes[row["doc_id"]] = row["hash"]
+    return hashes
+
+
+def _fetch_sqlite_documents(
+    index: SQLiteIndex,
+    doc_ids: List[str],
+    content: bool = True,
+    metadata: bool = True,
+) -> Dict[str, Dict[str, Any]]:
+    """Load content and/or metadata for the given ids through each shard's id map"""
+    columns = "".join((", f.content" if content else "", ", f.metadata" if metadata else ""))
+    by_shard: Dict[str, List[str]] = {}
+    for doc_id in doc_ids:
+        by_shard.setdefault(index.prefix_for(doc_id), []).append(doc_id)
+    rows = []
+    with _telemetry.stage("fetch_documents"), get_sqlite_connection() as conn:
+        for prefix, shard_ids in by_shard.items():
+            for start in range(0, len(shard_ids), _SQLITE_MAX_VARS):
+                chunk = shard_ids[start:start + _SQLITE_MAX_VARS]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(conn.execute(f"""
+                    SELECT m.doc_id{columns}
+                    FROM {prefix}_ids m JOIN {prefix}_fts f ON f.rowid = m.rowid
+                    WHERE m.doc_id IN ({placeholders})
+                """, chunk))
+    found: Dict[str, Dict[str, Any]] = {}
+    with _telemetry.stage("decode_metadata"):
+        for row in rows:
+            doc: Dict[str, Any] = {}
+            if content:
+                doc["content"] = row["content"]
+            if metadata:
+                doc["metadata"] = json.loads(row["metadata"]) if row["metadata"] else {}
+            found[row["doc_id"]] = doc
+    return found
+
+
+def _sqlite_fragments(index: SQLiteIndex, doc_ids: List[str], query: str, projection: Projection) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """
+    FTS5 snippet()/highlight() of the documents that match ``query``.
+
+    Documents that don't match (semantic-only hits) or a query FTS5 cannot
+    parse are left out; the caller builds those fragments itself.
+    """
+    pre, post = projection.tags
+    columns = []
+    params: List[Any] = []
+    if projection.snippet:
+        columns.append("snippet({p}_fts, 1, ?, ?, '...', ?)")
+        params.extend((pre, post, projection.snippet_tokens))
+    if projection.highlight:
+        columns.append("highlight({p}_fts, 1, ?, ?)")
+        params.extend((pre, post))
+    by_shard: Dict[str, List[str]] = {}
+    for doc_id in doc_ids:
+        by_shard.setdefault(index.prefix_for(doc_id), []).append(doc_id)
+    found: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    with get_sqlite_connection() as conn:
+        for prefix, shard_ids in by_shard.items():
+            select = ", ".join(column.format(p=prefix) for column in columns)
+            for start in range(0, len(shard_ids), _SQLITE_MAX_VARS):
+                chunk = shard_ids[start:start + _SQLITE_MAX_VARS]
+                try:
+                    # A rowid constraint makes FTS5 probe MATCH per listed row, which is what we want here
+                    rows = conn.execute(f"""
+                        SELECT id, {select} FROM {prefix}_fts
+                        WHERE {prefix}_fts MATCH ?
+                        AND rowid IN (SELECT rowid FROM {prefix}_ids WHERE doc_id IN ({",".join("?" * len(chunk))}))
+                    """, (*params, query, *chunk)).fetchall()
+                except sqlite3.OperationalError:
+                    return {}
+                for row in rows:
+                    values = iter(row[1:])
+                    found[row[0]] = (
+                        next(values) if projection.snippet else None,
+                        next(values) if projection.highlight else None,
+                    )
+    return found
+
+
+def materialize_sqlite(index_name: str, hits: List[Hit], query: str, projection: Projection) -> List[Dict[str, Any]]:
+    """Load the projected fields of ranked hits; hits deleted in the meantime are dropped"""
+    index = get_sqlite_index(index_name)
+    if index is None or not hits:
+        return []
+    doc_ids = [doc_id for doc_id, _ in hits]
+    fragments: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    fallback = False
+    if projection.snippet or projection.highlight:
+        with _telemetry.stage("snippets"):
+            fragments = _sqlite_fragments(index, doc_ids, query, projection)
+        fallback = len(fragments) < len(doc_ids)
+    docs = _fetch_sqlite_documents(index, doc_ids, content=projection.content or fallback, metadata=projection.metadata)
+    terms = set(tokenize(query)) if fallback else set()
+    results = []
+    for doc_id, score in hits:
+        doc = docs.get(doc_id)
+        if doc is None:
+            continue
+        snippet, highlight = fragments.get(doc_id, (None, None))
+        if fallback and doc_id not in fragments:
+            if projection.snippet:
+                snippet = make_snippet(doc["content"], terms, projection.snippet_tokens, projection.tags)
+            if projection.highlight:
+                highlight = make_highlight(doc["content"], terms, projection.tags)
+        results.append(projection.hit(doc_id, score, doc.get("content"), doc.get("metadata"), snippet, highlight))
+    return results
+
+
+def _sqlite_filtered_ids(index: SQLiteIndex, filters: List[Tuple[str, str, Any]]) -> Set[str]:
+    """Ids of all documents matching the filter clauses"""
+    def shard_ids(prefix: str) -> Set[str]:
+        filter_sql, filter_params = _sqlite_filter_sql(filters, "rowid", prefix)
+        with get_sqlite_connection() as conn:
+            return {row[0] for row in conn.execute(f"SELECT doc_id FROM {prefix}_ids WHERE {filter_sql}", filter_params)}
+    return set().union(*fan_out(shard_ids, index.prefixes))
+
+
+def rank_semantic_sqlite(
+    query: str,
+    limit: int,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    after: Optional[Hit] = None,
+    min_similarity: float = 0.0,
+) -> List[Hit]:
+    """Nearest-neighbour ranking over the SQLite backend's vector index (cosine >= ``min_similarity``)"""
+    index = get_sqlite_index(index_name)
+    if index is None:
+        return []
+    with _telemetry.stage("filter"):
+        allowed = _sqlite_filtered_ids(index, filters) if filters else None
+    vectors = get_sqlite_vectors(index)
+    with _telemetry.stage("embed"):
+        query_vector = get_embedder().embed([query])
+    with _telemetry.stage("vector_search"):
+        return vectors.search(query_vector, limit, allowed_ids=allowed, after=after, min_similarity=min_similarity)[0]
+
+
+def search_semantic_sqlite(
+    query: str,
+    limit: int,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    after: Optional[Hit] = None,
+    projection: Projection = DEFAULT_PROJECTION,
+) -> List[Dict[str, Any]]:
+    """Nearest-neighbour search over the SQLite backend's vector index"""
+    hits = rank_semantic_sqlite(query, limit, filters, index_name, after)
+    return materialize_sqlite(index_name, hits, query, projection)
+
+
+def sqlite_index_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-index and per-shard document counts and on-disk sizes"""
+    with get_sqlite_connection() as conn:
+        try:
+            sizes = {
+                row[0]: row[1]
+                for row in conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+            }
+        except sqlite3.Error:
+            sizes = None  # dbstat is not compiled into every SQLite build
+        indexes = {}
+        for name, index in sorted(_sqlite_indexes.items()):
+            shards = []
+            for shard, prefix in enumerate(index.prefixes):
+                shard_bytes = None
+                if sizes is not None:
+                    owned = (f"{prefix}_", f"sqlite_autoindex_{prefix}_")
+                    shard_bytes = sum(size for obj, size in sizes.items() if obj.startswith(owned))
+                shards.append({
+                    "shard": shard,
+                    "table_prefix": prefix,
+                    "documents": conn.execute(f"SELECT COUNT(*) FROM {prefix}_ids").fetchone()[0],
+                    "bytes": shard_bytes,
+                })
+            indexes[name] = {
+                "documents": sum(s["documents"] for s in shards),
+                "bytes": None if sizes is None else sum(s["bytes"] for s in shards),
+                "shards": shards,
+            }
+        return indexes
+
+
+# =============================================================================
+# In-Memory Backend (Demo/Development)
+# =============================================================================
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokenizer shared by indexing and querying"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """
+    Incrementally maintained inverted index with BM25 scoring.
+
+    postings maps term -> {doc_id: term frequency}. Query cost is
+    proportional to the postings of the query terms, not the corpus size.
+    An index started from a snapshot segment materialises each term's
+    postings on first use.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.total_len = 0
+        # Distinct terms per document, so a re-upsert can remove stale postings
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self._segment: Optional["ShardSegment"] = None
+        self._unloaded: Dict[str, Tuple[int, int]] = {}
+        self._terms_of = None
+        # Concurrent searches may materialise the same term
+        self._load_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    @property
+    def term_count(self) -> int:
+        return len(self.postings) + len(self._unloaded)
+
+    def load_segment(self, segment: "ShardSegment", terms_of):
+        """
+        Start from a snapshot segment.
+
+        ``terms_of(doc_id)`` returns the distinct terms of a snapshot
+        document, which are not kept in memory until it is re-upserted.
+        """
+        self.doc_len = dict(zip(segment.ids, segment.doc_len.tolist()))
+        self.total_len = int(segment.doc_len.sum())
+        self._segment = segment
+        self._unloaded = dict(segment.terms)
+        self._terms_of = terms_of
+
+    def _postings(self, term: str) -> Optional[Dict[str, int]]:
+        plist = self.postings.get(term)
+        if plist is None and term in self._unloaded:
+            with self._load_lock:
+                plist = self.postings.get(term)
+                if plist is None and term in self._unloaded:
+                    # Publish before unlisting so lock-free readers always find the term
+                    plist = self.postings[term] = self._segment.postings(*self._unloaded[term])
+                    del self._unloaded[term]
+        return plist
+
+    def export(self, ordinal: Dict[str, int]) -> Tuple[Dict[str, Tuple[int, int]], np.ndarray, np.ndarray]:
+        """Flatten all postings into (term table, doc ordinals, term frequencies) for a snapshot"""
+        terms: Dict[str, Tuple[int, int]] = {}
+        docs: List[np.ndarray] = []
+        tfs: List[np.ndarray] = []
+        pos = 0
+        with self._load_lock:
+            if self._unloaded:
+                # Unloaded terms only reference documents that were never re-upserted
+                segment = self._segment
+                remap = np.array([ordinal[doc_id] for doc_id in segment.ids], dtype=np.int32)
+                for term, (start, end) in self._unloaded.items():
+                    docs.append(remap[segment.post_doc[start:end]])
+                    tfs.append(np.asarray(segment.post_tf[start:end]))
+                    terms[term] = (pos, pos + end - start)
+                    pos += end - start
+            for term, plist in self.postings.items():
+                docs.append(np.fromiter((ordinal[doc_id] for doc_id in plist), dtype=np.int32, count=len(plist)))
+                tfs.append(np.fromiter(plist.values(), dtype=np.int32, count=len(plist)))
+                terms[term] = (pos, pos + len(plist))
+                pos += len(plist)
+        empty = np.zeros(0, dtype=np.int32)
+        return terms, np.concatenate(docs) if docs else empty, np.concatenate(tfs) if tfs else empty
+
+    def add(self, doc_id: str, text: str):
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        tf: Dict[str, int] = {}
+        for token in tokens:
+            tf[token] = tf.get(token, 0) + 1
+        for term, freq in tf.items():
+            plist = self._postings(term)
+            if plist is None:
+                plist = self.postings[term] = {}
+            plist[doc_id] = freq
+        self._doc_terms[doc_id] = tuple(tf)
+        self.doc_len[doc_id] = len(tokens)
+        self.total_len += len(tokens)
+
+    def remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            terms = self._terms_of(doc_id) if self._terms_of is not None and doc_id in self.doc_len else ()
+        for term in terms:
+            plist = self._postings(term)
+            if plist is not None:
+                plist.pop(doc_id, None)
+                if not plist:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id, 0)
+
+    def search(self, query: str, limit: int, allowed: Optional[Set[str]] = None, after: Optional[Hit] = None) -> List[Hit]:
+        """
+        Return the top ``limit`` (doc_id, bm25_score) pairs, best first.
+
+        ``allowed`` restricts scoring to a pre-filtered set of documents;
+        ``after`` skips hits up to and including a keyset cursor.
+        """
+        n_docs = len(self.doc_len)
+        if n_docs == 0 or limit <= 0:
+            return []
+        avgdl = self.total_len / n_docs or 1.0
+        k1, b = self.k1, self.b
+        doc_len = self.doc_len
+
+        with _telemetry.stage("tokenize"):
+            terms = list(dict.fromkeys(tokenize(query)))
+        scores: Dict[str, float] = {}
+        for term in terms:
+            plist = self._postings(term)
+            if not plist:
+                continue
+            df = len(plist)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            if allowed is None:
+                matches = plist.items()
+            elif len(allowed) < df:
+                matches = [(doc_id, plist[doc_id]) for doc_id in allowed if doc_id in plist]
+            else:
+                matches = [(doc_id, tf) for doc_id, tf in plist.items() if doc_id in allowed]
+            for doc_id, tf in matches:
+                norm = k1 * (1.0 - b + b * doc_len[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+
+        return top_hits(scores.items(), limit, after)
+
+
+class FieldIndex:
+    """
+    Per-field posting sets over normalised metadata values.
+
+    Equality and ``in`` are direct lookups; range operators bisect a lazily
+    rebuilt sorted list of the field's distinct values. Fields of a snapshot
+    segment are materialised on first use.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[Tuple[str, Any], Set[str]]] = {}
+        self._sorted: Dict[str, List[Tuple[str, Any]]] = {}
+        self._doc_entries: Dict[str, List[Tuple[str, Tuple[str, Any]]]] = {}
+        self._segment: Optional["ShardSegment"] = None
+        self._unloaded: Dict[str, Tuple[int, int]] = {}
+        self._entries_of = None
+        self._load_lock = threading.Lock()
+
+    def load_segment(self, segment: "ShardSegment", entries_of):
+        """Start from a snapshot segment; ``entries_of(doc_id)`` recomputes a snapshot document's entries"""
+        self._segment = segment
+        self._unloaded = dict(segment.fields)
+        self._entries_of = entries_of
+
+    def _values(self, field: str, create: bool = False) -> Optional[Dict[Tuple[str, Any], Set[str]]]:
+        values = self._postings.get(field)
+        if values is None and field in self._unloaded:
+            with self._load_lock:
+                values = self._postings.get(field)
+                if values is None and field in self._unloaded:
+                    values = self._postings[field] = self._segment.field_values(*self._unloaded[field])
+                    del self._unloaded[field]
+        if values is None and create:
+            values = self._postings[field] = {}
+        return values
+
+    def export(self, ordinal: Dict[str, int]) -> Tuple[Dict[str, Tuple[int, int]], bytes]:
+        """Serialise every field's values as JSON blobs, returning (field table, blob)"""
+        table: Dict[str, Tuple[int, int]] = {}
+        chunks: List[bytes] = []
+        pos = 0
+        with self._load_lock:
+            fields: List[Tuple[str, List[List[Any]]]] = []
+            if self._unloaded:
+                ids = self._segment.ids
+                for field, (start, end) in self._unloaded.items():
+                    fields.append((field, [
+                        [kind, value, [ordinal[ids[o]] for o in ordinals]]
+                        for kind, value, ordinals in self._segment.field_items(start, end)
+                    ]))
+            for field, values in self._postings.items():
+                fields.append((field, [
+                    [kind, value, sorted(ordinal[doc_id] for doc_id in docs)]
+                    for (kind, value), docs in values.items()
+                ]))
+        for field, items in fields:
+            chunk = json.dumps(items).encode()
+            chunks.append(chunk)
+            table[field] = (pos, pos + len(chunk))
+            pos += len(chunk)
+        return table, b"".join(chunks)
+
+    def add(self, doc_id: str, metadata: Optional[Dict[str, Any]]):
+        if doc_id in self._doc_entries or self._entries_of is not None:
+            self.remove(doc_id)
+        entries = metadata_entries(metadata)
+        for field, value in entries:
+            values = self._values(field, create=True)
+            if value not in values:
+                values[value] = set()
+                self._sorted.pop(field, None)
+            values[value].add(doc_id)
+        self._doc_entries[doc_id] = entries
+
+    def remove(self, doc_id: str):
+        entries = self._doc_entries.pop(doc_id, None)
+        if entries is None:
+            entries = self._entries_of(doc_id) if self._entries_of is not None else ()
+        for field, value in entries:
+            values = self._values(field)
+            docs = values.get(value)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del values[value]
+                    self._sorted.pop(field, None)
+
+    def _match_clause(self, field: str, op: str, value: Any) -> Set[str]:
+        values = self._values(field) or {}
+        if op == "eq":
+            return values.get(value, set())
+        if op == "in":
+            return set().union(*(values.get(v, set()) for v in value))
+
+        keys = self._sorted.get(field)
+        if keys is None:
+            keys = self._sorted[field] = sorted(values)
+        kind = value[0]
+        # Only compare values of the same kind (numbers with numbers, text with text)
+        lo = bisect.bisect_left(keys, (kind,))
+        hi = bisect.bisect_left(keys, (kind + "\x00",))
+        if op in ("gt", "gte"):
+            lo = (bisect.bisect_right if op == "gt" else bisect.bisect_left)(keys, value, lo, hi)
+        else:
+            hi = (bisect.bisect_left if op == "lt" else bisect.bisect_right)(keys, value, lo, hi)
+        return set().union(*(values[k] for k in keys[lo:hi]))
+
+    def match(self, clauses: List[Tuple[str, str, Any]]) -> Set[str]:
+        """Ids of documents satisfying every clause"""
+        result: Optional[Set[str]] = None
+        for field, op, value in clauses:
+            docs = self._match_clause(field, op, value)
+            result = set(docs) if result is None else result & docs
+            if not result:
+                break
+        return result if result is not None else set()
+
+
+def _map_file(path: str):
+    """Read-only mmap of a file (empty files map to b"")"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ShardSegment:
+    """
+    Read-only snapshot of one memory shard, memory-mapped from ``<path>.*``.
+
+    Contents and metadata sit in contiguous buffers addressed by offsets
+    arrays, postings in flat (doc ordinal, tf) arrays addressed by a term
+    table, and field values in JSON blobs addressed by a field table. Only
+    the ids are read eagerly; everything else is paged in on access.
+    """
+
+    def __init__(self, path: str):
+        with open(path + ".ids.json") as f:
+            self.ids: List[str] = json.load(f)
+        self.ordinals = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._content = _map_file(path + ".content.bin")
+        self._content_off = np.load(path + ".content.off.npy", mmap_mode="r")
+        self._meta = _map_file(path + ".meta.bin")
+        self._meta_off = np.load(path + ".meta.off.npy", mmap_mode="r")
+        self.doc_len = np.load(path + ".doclen.npy", mmap_mode="r")
+        with open(path + ".terms.json") as f:
+            self.terms: Dict[str, Tuple[int, int]] = json.load(f)
+        self.post_doc = np.load(path + ".post_doc.npy", mmap_mode="r")
+        self.post_tf = np.load(path + ".post_tf.npy", mmap_mode="r")
+        with open(path + ".fields.json") as f:
+            self.fields: Dict[str, Tuple[int, int]] = json.load(f)
+        self._fields = _map_file(path + ".fields.bin")
+        # Content hashes aligned with ids (absent in snapshots written before the manifest)
+        self.hashes: List[Optional[str]] = []
+        if os.path.exists(path + ".hashes.json"):
+            with open(path + ".hashes.json") as f:
+                self.hashes = json.load(f)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        i = self.ordinals.get(doc_id)
+        if i is None:
+            return None
+        c0, c1 = int(self._content_off[i]), int(self._content_off[i + 1])
+        m0, m1 = int(self._meta_off[i]), int(self._meta_off[i + 1])
+        return {"content": self._content[c0:c1].decode(), "metadata": json.loads(self._meta[m0:m1])}
+
+    def postings(self, start: int, end: int) -> Dict[str, int]:
+        ids = self.ids
+        return {ids[o]: tf for o, tf in zip(self.post_doc[start:end].tolist(), self.post_tf[start:end].tolist())}
+
+    def field_items(self, start: int, end: int) -> List[List[Any]]:
+        return json.loads(self._fields[start:end])
+
+    def field_values(self, start: int, end: int) -> Dict[Tuple[str, Any], Set[str]]:
+        ids = self.ids
+        return {(kind, value): {ids[o] for o in ordinals} for kind, value, ordinals in self.field_items(start, end)}
+
+
+class DocStore:
+    """
+    Documents of one memory shard: an optional snapshot segment plus a dict
+    of documents upserted since, which shadows the segment.
+    """
+
+    def __init__(self, segment: Optional[ShardSegment] = None):
+        self._segment = segment
+        self._overlay: Dict[str, Dict[str, Any]] = {}
+        self._added = 0  # overlay ids that are not in the segment
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        doc = self._overlay.get(doc_id)
+        if doc is None and self._segment is not None:
+            doc = self._segment.document(doc_id)
+        return doc
+
+    def __getitem__(self, doc_id: str) -> Dict[str, Any]:
+        doc = self.get(doc_id)
+        if doc is None:
+            raise KeyError(doc_id)
+        return doc
+
+    def __setitem__(self, doc_id: str, doc: Dict[str, Any]):
+        if doc_id not in self._overlay and (self._segment is None or doc_id not in self._segment.ordinals):
+            self._added += 1
+        self._overlay[doc_id] = doc
+
+    def __len__(self) -> int:
+        return (len(self._segment) if self._segment is not None else 0) + self._added
+
+    def ids(self) -> List[str]:
+        if self._segment is None:
+            return list(self._overlay)
+        overlay = self._overlay
+        return [doc_id for doc_id in self._segment.ids if doc_id not in overlay] + list(overlay)
+
+
+class MemoryShard:
+    """One hash shard of a memory index: documents plus their lexical indexes"""
+
+    def __init__(self):
+        self.store = DocStore()
+        self.index = InvertedIndex()
+        self.fields = FieldIndex()
+        self.hashes: Dict[str, str] = {}  # change-detection manifest
+        self.content_bytes = 0
+
+    def load_segment(self, segment: ShardSegment, content_bytes: int):
+        self.store = DocStore(segment)
+        self.index.load_segment(segment, self._terms_of)
+        self.fields.load_segment(segment, self._entries_of)
+        self.hashes = {doc_id: h for doc_id, h in zip(segment.ids, segment.hashes) if h}
+        self.content_bytes = content_bytes
+
+    def _terms_of(self, doc_id: str) -> Tuple[str, ...]:
+        doc = self.store.get(doc_id)
+        return tuple(dict.fromkeys(tokenize(doc["content"]))) if doc is not None else ()
+
+    def _entries_of(self, doc_id: str) -> List[Tuple[str, Tuple[str, Any]]]:
+        doc = self.store.get(doc_id)
+        return metadata_entries(doc["metadata"]) if doc is not None else []
+
+    def put(self, doc_id: str, content: str, metadata: Dict[str, Any], doc_hash: Optional[str] = None):
+        old = self.store.get(doc_id)
+        if old is not None:
+            self.content_bytes -= len(old["content"])
+        # Index first: removing stale postings may need the stored (old) document
+        self.index.add(doc_id, content)
+        self.fields.add(doc_id, metadata)
+        self.store[doc_id] = {"content": content, "metadata": metadata}
+        self.content_bytes += len(content)
+        if doc_hash:
+            self.hashes[doc_id] = doc_hash
+        else:
+            self.hashes.pop(doc_id, None)
+
+    def search(self, query: str, limit: int, filters: List[Tuple[str, str, Any]], after: Optional[Hit] = None) -> List[Hit]:
+        with _telemetry.stage("filter"):
+            allowed = self.fields.match(filters) if filters else None
+        if allowed is not None and not allowed:
+            return []
+        with _telemetry.stage("bm25"):
+            return self.index.search(query, limit, allowed=allowed, after=after)
+
+
+class MemoryIndex:
+    """
+    A named in-memory index: ``shards`` hash shards plus one vector index.
+
+    BM25 statistics are per shard (as with the SQLite backend), so scores
+    of a sharded index approximate those of a single shard. Searches hold
+    ``lock`` for reading and upserts for writing.
+    """
+
+    def __init__(self, name: str, shards: int):
+        self.name = name
+        self.shards = [MemoryShard() for _ in range(max(1, shards))]
+        self.vectors = VectorIndex(get_embedder().dim)
+        self.lock = RWLock()
+        # Persistence (MEMORY_SNAPSHOT_DIR): every logged upsert takes the next seq
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.log_documents = 0
+        self._log = None
+        self.checkpoint_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(shard.store) for shard in self.shards)
+
+    def shard_for(self, doc_id: str) -> MemoryShard:
+        return self.shards[shard_for(doc_id, len(self.shards))]
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return self.shard_for(doc_id).store.get(doc_id)
+
+    def document_hashes(self, doc_ids: List[str]) -> Dict[str, str]:
+        """Manifest hashes of the given documents (unknown and unhashed ids are omitted)"""
+        hashes = {}
+        for doc_id in doc_ids:
+            doc_hash = self.shard_for(doc_id).hashes.get(doc_id)
+            if doc_hash is not None:
+                hashes[doc_id] = doc_hash
+        return hashes
+
+    def match(self, filters: List[Tuple[str, str, Any]]) -> Set[str]:
+        return set().union(*(shard.fields.match(filters) for shard in self.shards))
+
+
+_memory_indexes: Dict[str, MemoryIndex] = {}
+_memory_indexes_lock = threading.Lock()
+
+
+def get_memory_index(name: str, create: bool = False, shards: Optional[int] = None) -> Optional[MemoryIndex]:
+    """Look up a named memory index, optionally creating it with ``shards`` shards"""
+    index = _memory_indexes.get(name)
+    if index is None and create:
+        with _memory_indexes_lock:
+            index = _memory_indexes.get(name)
+            if index is None:
+                index = MemoryIndex(name, shards or SEARCH_SHARDS)
+                if MEMORY_SNAPSHOT_DIR:
+                    open_memory_log(index)
+                _memory_indexes[name] = index
+    return index
+
+
+def rank_memory(
+    query: str,
+    limit: int,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    after: Optional[Hit] = None,
+) -> List[Hit]:
+    """In-memory BM25 ranking over each shard's inverted index"""
+    index = get_memory_index(index_name)
+    if index is None:
+        return []
+    with index.lock.read():
+        per_shard = fan_out(lambda shard: shard.search(query, limit, filters or [], after), index.shards)
+    return merge_ranked(per_shard, limit)
+
+
+def rank_semantic_memory(
+    query: str,
+    limit: int,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    after: Optional[Hit] = None,
+    min_similarity: float = 0.0,
+) -> List[Hit]:
+    """Nearest-neighbour ranking over the in-memory vector index (cosine >= ``min_similarity``)"""
+    index = get_memory_index(index_name)
+    if index is None:
+        return []
+    with _telemetry.stage("embed"):
+        query_vector = get_embedder().embed([query])
+    with index.lock.read():
+        with _telemetry.stage("filter"):
+            allowed = index.match(filters) if filters else None
+        if allowed is not None and not allowed:
+            return []
+        with _telemetry.stage("vector_search"):
+            return index.vectors.search(query_vector, limit, allowed_ids=allowed, after=after, min_similarity=min_similarity)[0]
+
+
+def materialize_memory(index_name: str, hits: List[Hit], query: str, projection: Projection) -> List[Dict[str, Any]]:
+    """Build the projected fields of ranked hits; hits deleted in the meantime are dropped"""
+    index = get_memory_index(index_name)
+    if index is None or not hits:
+        return []
+    terms = set(tokenize(query)) if projection.snippet or projection.highlight else set()
+    results = []
+    with index.lock.read(), _telemetry.stage("fetch_documents"):
+        for doc_id, score in hits:
+            doc = index.get(doc_id)
+            if doc is None:
+                continue
+            content = doc["content"]
+            results.append(projection.hit(
+                doc_id,
+                score,
+                content,
+                doc.get("metadata", {}),
+                make_snippet(content, terms, projection.snippet_tokens, projection.tags) if projection.snippet else None,
+                make_highlight(content, terms, projection.tags) if projection.highlight else None,
+            ))
+    return results
+
+
+def search_memory(
+    query: str,
+    limit: int,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    after: Optional[Hit] = None,
+    projection: Projection = DEFAULT_PROJECTION,
+) -> List[Dict[str, Any]]:
+    """In-memory BM25 search over each shard's inverted index"""
+    hits = rank_memory(query, limit, filters, index_name, after)
+    return materialize_memory(index_name, hits, query, projection)
+
+
+def search_semantic_memory(
+    query: str,
+    limit: int,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    after: Optional[Hit] = None,
+    projection: Projection = DEFAULT_PROJECTION,
+) -> List[Dict[str, Any]]:
+    """Nearest-neighbour search over the in-memory vector index"""
+    hits = rank_semantic_memory(query, limit, filters, index_name, after)
+    return materialize_memory(index_name, hits, query, projection)
+
+
+def upsert_memory(
+    documents: List[Dict[str, Any]],
+    index_name: str = DEFAULT_INDEX_NAME,
+    shards: Optional[int] = None,
+    force: bool = False,
+) -> Tuple[int, int]:
+    """
+    Add documents to in-memory store and index; returns (written, unchanged).
+
+    Documents whose hash matches the manifest keep their indexed_at and are
+    skipped unless ``force``; the manifest is checked again under the write
+    lock, so a concurrent upsert cannot make this one skip a document it has
+    since changed.
+    """
+    index = get_memory_index(index_name, create=True, shards=shards)
+    received_rows = upsert_rows(documents)
+    received = len(received_rows)
+    changed = received_rows
+    if not force and changed:
+        with index.lock.read(), _telemetry.stage("manifest"):
+            changed = changed_rows(changed, index.document_hashes(list(changed)))
+    if not changed:
+        return 0, received
+    # Embed before taking the write lock so searches are only blocked by the index updates
+    with _telemetry.stage("embed"):
+        embedded = dict(zip(changed, get_embedder().embed([content for content, _, _ in changed.values()])))
+    with index.lock.write():
+        if not force:
+            changed = changed_rows(received_rows, index.document_hashes(list(received_rows)))
+            if not changed:
+                return 0, received
+            late = [doc_id for doc_id in changed if doc_id not in embedded]
+            if late:
+                embedded.update(zip(late, get_embedder().embed([changed[doc_id][0] for doc_id in late])))
+        indexed_at = datetime.utcnow().isoformat()
+        rows = [
+            (doc_id, content, {**metadata, "indexed_at": indexed_at})
+            for doc_id, (content, metadata, _) in changed.items()
+        ]
+        hashes = [doc_hash for _, _, doc_hash in changed.values()]
+        vectors = np.stack([embedded[doc_id] for doc_id in changed])
+        with _telemetry.stage("index"):
+            _apply_memory_rows(index, rows, vectors, hashes)
+        if index._log is not None:
+            with _telemetry.stage("log_append"):
+                append_memory_log(index, rows, hashes)
+    if index._log is not None and index.log_documents >= MEMORY_SNAPSHOT_EVERY:
+        with _telemetry.stage("checkpoint"):
+            checkpoint_memory_index(index)
+    return len(rows), received - len(rows)
+
+
+def _apply_memory_rows(
+    index: MemoryIndex,
+    rows: List[Tuple[str, str, Dict[str, Any]]],
+    vectors: Optional[np.ndarray],
+    hashes: Optional[List[Optional[str]]] = None,
+):
+    for i, (doc_id, content, metadata) in enumerate(rows):
+        index.shard_for(doc_id).put(doc_id, content, metadata, hashes[i] if hashes else None)
+    if rows:
+        index.vectors.upsert([doc_id for doc_id, _, _ in rows], vectors)
+
+
+def memory_index_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-index and per-shard document counts and content sizes"""
+    indexes = {}
+    for name, index in sorted(_memory_indexes.items()):
+        with index.lock.read():
+            shards = [
+                {
+                    "shard": k,
+                    "documents": len(shard.store),
+                    "terms": shard.index.term_count,
+                    "bytes": shard.content_bytes,
+                }
+                for k, shard in enumerate(index.shards)
+            ]
+        indexes[name] = {
+            "documents": sum(s["documents"] for s in shards),
+            "bytes": sum(s["bytes"] for s in shards),
+            "vectors": len(index.vectors),
+            "shards": shards,
+        }
+        if index._log is not None:
+            indexes[name]["snapshot"] = {
+                "seq": index.seq,
+                "snapshot_seq": index.snapshot_seq,
+                "log_documents": index.log_documents,
+            }
+    return indexes
+
+
+# =============================================================================
+# Memory Snapshots (mmap segments + append-only upsert log)
+# =============================================================================
+#
+# Each memory index persists under MEMORY_SNAPSHOT_DIR/<index slug>/:
+#   index.json       name and shard count
+#   CURRENT          name of the live snapshot directory
+#   snap-<seq>/      manifest.json, shard<k>.* segment files, vectors.npy
+#   log.ndjson       upserts since the snapshot, one {"seq", "docs"} per line
+#
+# Startup maps the snapshot (no parsing of contents or postings) and replays
+# log entries newer than the manifest's seq.
+
+def memory_index_dir(name: str) -> str:
+    return os.path.join(MEMORY_SNAPSHOT_DIR, index_slug(name))
+
+
+def _write_atomic(path: str, text: str):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(text)
+        if MEMORY_FSYNC:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_current(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def open_memory_log(index: MemoryIndex):
+    root = memory_index_dir(index.name)
+    os.makedirs(root, exist_ok=True)
+    info_path = os.path.join(root, "index.json")
+    if not os.path.exists(info_path):
+        _write_atomic(info_path, json.dumps({"name": index.name, "shards": len(index.shards)}))
+    index._log = open(os.path.join(root, "log.ndjson"), "ab")
+
+
+def append_memory_log(index: MemoryIndex, rows: List[Tuple[str, str, Dict[str, Any]]], hashes: List[str]):
+    """Make an applied upsert durable (caller holds the index write lock)"""
+    index.seq += 1
+    index._log.write((json.dumps({"seq": index.seq, "docs": rows, "hashes": hashes}) + "\n").encode())
+    index._log.flush()
+    if MEMORY_FSYNC:
+        os.fsync(index._log.fileno())
+    index.log_documents += len(rows)
+
+
+def _write_shard_segment(shard: MemoryShard, path: str):
+    """Write one shard in the ShardSegment layout"""
+    ids = shard.store.ids()
+    ordinal = {doc_id: i for i, doc_id in enumerate(ids)}
+    content_off = np.zeros(len(ids) + 1, dtype=np.int64)
+    meta_off = np.zeros(len(ids) + 1, dtype=np.int64)
+    with open(path + ".content.bin", "wb") as content_file, open(path + ".meta.bin", "wb") as meta_file:
+        for i, doc_id in enumerate(ids):
+            doc = shard.store[doc_id]
+            content = doc["content"].encode()
+            meta = json.dumps(doc["metadata"]).encode()
+            content_file.write(content)
+            meta_file.write(meta)
+            content_off[i + 1] = content_off[i] + len(content)
+            meta_off[i + 1] = meta_off[i] + len(meta)
+    np.save(path + ".content.off.npy", content_off)
+    np.save(path + ".meta.off.npy", meta_off)
+    np.save(path + ".doclen.npy", np.array([shard.index.doc_len[doc_id] for doc_id in ids], dtype=np.int32))
+
+    terms, post_doc, post_tf = shard.index.export(ordinal)
+    np.save(path + ".post_doc.npy", post_doc)
+    np.save(path + ".post_tf.npy", post_tf)
+    with open(path + ".terms.json", "w") as f:
+        json.dump(terms, f)
+
+    table, blob = shard.fields.export(ordinal)
+    with open(path + ".fields.bin", "wb") as f:
+        f.write(blob)
+    with open(path + ".fields.json", "w") as f:
+        json.dump(table, f)
+    with open(path + ".hashes.json", "w") as f:
+        json.dump([shard.hashes.get(doc_id) for doc_id in ids], f)
+    with open(path + ".ids.json", "w") as f:
+        json.dump(ids, f)
+
+
+def checkpoint_memory_index(index: MemoryIndex) -> int:
+    """
+    Write a new snapshot of ``index`` and truncate its log; returns the snapshot seq.
+
+    Holds the read lock, so searches continue while upserts wait.
+    """
+    with index.checkpoint_lock, index.lock.read():
+        if index.seq == index.snapshot_seq and _read_current(memory_index_dir(index.name)):
+            return index.snapshot_seq
+        root = memory_index_dir(index.name)
+        name = f"snap-{index.seq:012d}"
+        tmp = os.path.join(root, f"{name}.tmp{os.getpid()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        content_bytes = []
+        for k, shard in enumerate(index.shards):
+            _write_shard_segment(shard, os.path.join(tmp, f"shard{k}"))
+            content_bytes.append(shard.content_bytes)
+        index.vectors.save(os.path.join(tmp, "vectors"))
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump({
+                "format": 1,
+                "name": index.name,
+                "shards": len(index.shards),
+                "seq": index.seq,
+                "documents": len(index),
+                "content_bytes": content_bytes,
+                "created_at": datetime.utcnow().isoformat(),
+            }, f)
+        if MEMORY_FSYNC:
+            for entry in os.listdir(tmp):
+                with open(os.path.join(tmp, entry), "rb") as f:
+                    os.fsync(f.fileno())
+
+        final = os.path.join(root, name)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+        previous = _read_current(root)
+        _write_atomic(os.path.join(root, "CURRENT"), name)
+        # Everything logged so far is in the snapshot (upserts are blocked by the read lock)
+        index._log.truncate(0)
+        index.snapshot_seq = index.seq
+        index.log_documents = 0
+        if previous and previous != name:
+            # Open maps of the old segment stay valid until the process exits
+            shutil.rmtree(os.path.join(root, previous), ignore_errors=True)
+        return index.snapshot_seq
+
+
+def load_memory_index(root: str) -> MemoryIndex:
+    """Map the current snapshot of an index directory and replay its log"""
+    with open(os.path.join(root, "index.json")) as f:
+        info = json.load(f)
+    index = MemoryIndex(info["name"], info["shards"])
+    current = _read_current(root)
+    if current:
+        snap = os.path.join(root, current)
+        with open(os.path.join(snap, "manifest.json")) as f:
+            manifest = json.load(f)
+        for k, shard in enumerate(index.shards):
+            shard.load_segment(ShardSegment(os.path.join(snap, f"shard{k}")), manifest["content_bytes"][k])
+        vectors = VectorIndex.load(os.path.join(snap, "vectors"))
+        if vectors is None:
+            # Saved by another embedder: re-embed from the mapped contents
+            vectors = VectorIndex(get_embedder().dim)
+            for shard in index.shards:
+                ids = shard.store.ids()
+                for start in range(0, len(ids), 1000):
+                    chunk = ids[start:start + 1000]
+                    vectors.upsert(chunk, get_embedder().embed([shard.store[doc_id]["content"] for doc_id in chunk]))
+        index.vectors = vectors
+        index.seq = index.snapshot_seq = manifest["seq"]
+
+    log_path = os.path.join(root, "log.ndjson")
+    if os.path.exists(log_path):
+        good = 0
+        with open(log_path, "rb") as f:
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("torn write")
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                good = f.tell()
+                if entry["seq"] <= index.seq:
+                    continue  # already in the snapshot (crash before the log was truncated)
+                rows = [(doc_id, content, metadata) for doc_id, content, metadata in entry["docs"]]
+                embedded = get_embedder().embed([content for _, content, _ in rows])
+                _apply_memory_rows(index, rows, embedded, entry.get("hashes"))
+                index.seq = entry["seq"]
+                index.log_documents += len(rows)
+        if good < os.path.getsize(log_path):
+            # Drop a partially written last entry so new appends stay readable
+            with open(log_path, "r+b") as f:
+                f.truncate(good)
+
+    for entry in os.listdir(root):
+        if entry.startswith("snap-") and entry != current:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    open_memory_log(index)
+    return index
+
+
+def load_memory_snapshots():
+    """Load every index persisted under MEMORY_SNAPSHOT_DIR"""
+    if not os.path.isdir(MEMORY_SNAPSHOT_DIR):
+        return
+    for entry in sorted(os.listdir(MEMORY_SNAPSHOT_DIR)):
+        root = os.path.join(MEMORY_SNAPSHOT_DIR, entry)
+        if os.path.exists(os.path.join(root, "index.json")):
+            index = load_memory_index(root)
+            _memory_indexes[index.name] = index
+            if index.log_documents >= MEMORY_SNAPSHOT_EVERY:
+                checkpoint_memory_index(index)
+
+
+def close_memory_snapshots():
+    """Checkpoint indexes with logged upserts so the next start replays nothing"""
+    with _memory_indexes_lock:
+        for index in _memory_indexes.values():
+            if index._log is not None:
+                if index.seq != index.snapshot_seq:
+                    checkpoint_memory_index(index)
+                index._log.close()
+                index._log = None
+
+
+# =============================================================================
+# Index Routing (named indexes, hash shards, fan-out)
+# =============================================================================
+
+_INDEX_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+_fanout_executor: Optional[ThreadPoolExecutor] = None
+_fanout_lock = threading.Lock()
+
+
+def resolve_index_name(name: Optional[str]) -> str:
+    """Validate a client-supplied index name (None means the default index)"""
+    if not name:
+        return DEFAULT_INDEX_NAME
+    if not _INDEX_NAME_RE.match(name):
+        raise HTTPException(
+            status_code=400,
+            detail="invalid_index_name: use 1-64 letters, digits, '_', '-' or '.'"
+        )
+    return name
+
+
+def index_slug(name: str) -> str:
+    """Filesystem/SQL-safe identifier for an index name"""
+    readable = re.sub(r"[^0-9A-Za-z]", "_", name)[:40]
+    return f"ix_{readable}_{hashlib.md5(name.encode()).hexdigest()[:6]}"
+
+
+def shard_for(doc_id: str, shards: int) -> int:
+    """Stable hash shard of a document id (independent of PYTHONHASHSEED)"""
+    if shards <= 1:
+        return 0
+    return int.from_bytes(hashlib.md5(doc_id.encode()).digest()[:8], "little") % shards
+
+
+def index_exists(name: str) -> bool:
+    if name == DEFAULT_INDEX_NAME:
+        return True
+    if SEARCH_BACKEND == "sqlite":
+        return get_sqlite_index(name) is not None
+    return get_memory_index(name) is not None
+
+
+def fan_out(fn, shards: List[Any]) -> List[Any]:
+    """Run ``fn`` over every shard, in parallel when there is more than one"""
+    global _fanout_executor
+    if len(shards) == 1:
+        return [fn(shards[0])]
+    if _fanout_executor is None:
+        with _fanout_lock:
+            if _fanout_executor is None:
+                _fanout_executor = ThreadPoolExecutor(max_workers=SEARCH_FANOUT_WORKERS, thread_name_prefix="shard")
+    # Each shard call runs in its own copy of the caller's context (request telemetry labels)
+    futures = [_fanout_executor.submit(contextvars.copy_context().run, fn, shard) for shard in shards]
+    return [future.result() for future in futures]
+
+
+def close_fan_out():
+    global _fanout_executor
+    with _fanout_lock:
+        if _fanout_executor is not None:
+            _fanout_executor.shutdown(wait=False)
+            _fanout_executor = None
+
+
+def merge_ranked(result_lists: List[List[Hit]], limit: int) -> List[Hit]:
+    """k-way heap merge of per-shard (doc_id, score) lists, each already in top_hits order"""
+    if len(result_lists) == 1:
+        return result_lists[0][:limit]
+    return list(islice(heapq.merge(*result_lists, key=_hit_order), limit))
+
+
+# =============================================================================
+# Semantic Leg (local embeddings + flat vector index)
+# =============================================================================
+
+class HashingEmbedder:
+    """
+    Deterministic feature-hashing embedder; needs no model and works offline.
+
+    Word unigrams and character trigrams are hashed into ``dim`` signed
+    buckets, so documents sharing word stems land close together.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        self._slots: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _hash(self, feature: str) -> Tuple[int, float]:
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+        return h % self.dim, (1.0 if h >> 63 else -1.0)
+
+    def _token_slots(self, token: str) -> Tuple[np.ndarray, np.ndarray]:
+        slots = self._slots.get(token)
+        if slots is None:
+            padded = f"#{token}#"
+            features = [(token, 1.0)] + [(padded[i:i + 3], 0.5) for i in range(len(padded) - 2)]
+            idx = np.empty(len(features), dtype=np.int64)
+            val = np.empty(len(features), dtype=np.float32)
+            for j, (feature, weight) in enumerate(features):
+                idx[j], sign = self._hash(feature)
+                val[j] = sign * weight
+            slots = (idx, val)
+            if len(self._slots) < 500_000:
+                self._slots[token] = slots
+        return slots
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tf: Dict[str, int] = {}
+            for token in tokenize(text):
+                tf[token] = tf.get(token, 0) + 1
+            for token, freq in tf.items():
+                idx, val = self._token_slots(token)
+                np.add.at(out[row], idx, val * (1.0 + math.log(freq)))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+
+class SentenceTransformerEmbedder:
+    """Embedder backed by a local sentence-transformers model"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer  # type: ignore
+        self._model = SentenceTransformer(model_name)
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+        self.name = f"sentence-transformers:{model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self._model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Return the configured embedder (SEARCH_EMBEDDER), created on first use"""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                kind, _, arg = SEARCH_EMBEDDER.partition(":")
+                if kind == "sentence-transformers":
+                    _embedder = SentenceTransformerEmbedder(arg or "all-MiniLM-L6-v2")
+                elif kind == "hashing":
+                    _embedder = HashingEmbedder(int(arg) if arg else 512)
+                else:
+                    raise ValueError(f"unknown SEARCH_EMBEDDER: {SEARCH_EMBEDDER}")
+    return _embedder
+
+
+class VectorIndex:
+    """
+    Flat float32 matrix of L2-normalised vectors with cosine top-k.
+
+    Rows of removed documents are recycled. An index loaded from disk stays
+    memory-mapped (pages load lazily) until the first write copies it in.
+    ``generation`` is the backend generation the vectors are current with.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self.dirty = 0
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= len(self._matrix) and self._matrix.flags.writeable:
+            return
+        capacity = max(needed, 2 * len(self._matrix), 1024)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        live = np.zeros(capacity, dtype=bool)
+        live[:self._size] = self._live[:self._size]
+        self._matrix, self._live = matrix, live
+
+    def upsert(self, doc_ids: List[str], vectors: np.ndarray):
+        with self._lock:
+            self._reserve(len(doc_ids))
+            for doc_id, vector in zip(doc_ids, vectors):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        row = self._size
+                        self._size += 1
+                        self._ids.append(None)
+                    self._rows[doc_id] = row
+                    self._ids[row] = doc_id
+                self._matrix[row] = vector
+                self._live[row] = True
+            self.dirty += len(doc_ids)
+
+    def remove(self, doc_ids: List[str]):
+        with self._lock:
+            self._reserve(0)
+            for doc_id in doc_ids:
+                row = self._rows.pop(doc_id, None)
+                if row is not None:
+                    self._ids[row] = None
+                    self._live[row] = False
+                    self._matrix[row] = 0.0
+                    self._free.append(row)
+            self.dirty += len(doc_ids)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        limit: int,
+        allowed_ids: Optional[Set[str]] = None,
+        after: Optional[Hit] = None,
+        min_similarity: float = 0.0,
+    ) -> List[List[Hit]]:
+        """
+        Batched cosine top-k: one (doc_id, score) list per query row, in top_hits order.
+
+        ``allowed_ids`` restricts candidates to a pre-filtered set of documents;
+        ``after`` skips hits up to and including a keyset cursor. Only positive
+        similarities of at least ``min_similarity`` are returned.
+        """
+        with self._lock:
+            n = self._size
+            if n == 0 or limit <= 0:
+                return [[] for _ in range(len(queries))]
+            mask = self._live[:n]
+            if allowed_ids is not None:
+                allowed_rows = [self._rows[doc_id] for doc_id in allowed_ids if doc_id in self._rows]
+                mask = np.zeros(n, dtype=bool)
+                mask[allowed_rows] = True
+            sims = queries @ self._matrix[:n].T
+            sims[:, ~mask] = -np.inf
+            sims[sims < min_similarity] = -np.inf
+            if after is not None:
+                last_id, score = after
+                for q in range(len(queries)):
+                    ties = np.nonzero(sims[q] == score)[0]
+                    sims[q, sims[q] > score] = -np.inf
+                    for row in ties:
+                        if self._ids[row] is None or self._ids[row] <= last_id:
+                            sims[q, row] = -np.inf
+            # One extra candidate shows whether equal similarities straddle the cut
+            k = min(limit + 1, n)
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            results = []
+            for q in range(len(queries)):
+                cand = top[q][np.argsort(-sims[q, top[q]], kind="stable")]
+                boundary = sims[q, cand[limit - 1]] if len(cand) > limit else 0.0
+                if boundary > 0 and sims[q, cand[limit]] == boundary:
+                    cand = np.nonzero(sims[q] >= boundary)[0]
+                results.append(top_hits(
+                    [(self._ids[row], float(sims[q, row])) for row in cand if sims[q, row] > 0], limit
+                ))
+            return results
+
+    def save(self, prefix: str):
+        """Write ``<prefix>.npy`` (matrix) and ``<prefix>.ids.json`` atomically"""
+        tmp = f".tmp{os.getpid()}"
+        with self._lock:
+            with open(prefix + ".npy" + tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(self._matrix[:self._size]))
+            with open(prefix + ".ids.json" + tmp, "w") as f:
+                json.dump({
+                    "dim": self.dim,
+                    "embedder": get_embedder().name,
+                    "generation": self.generation,
+                    "ids": self._ids,
+                }, f)
+            os.replace(prefix + ".npy" + tmp, prefix + ".npy")
+            os.replace(prefix + ".ids.json" + tmp, prefix + ".ids.json")
+            self.dirty = 0
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> Optional["VectorIndex"]:
+        """Load a saved index, or return None if missing or built by another embedder"""
+        try:
+            with open(prefix + ".ids.json") as f:
+                meta = json.load(f)
+            matrix = np.load(prefix + ".npy", mmap_mode="r" if mmap else None)
+        except (OSError, ValueError):
+            return None
+        if meta.get("embedder") != get_embedder().name or matrix.shape != (len(meta["ids"]), meta["dim"]):
+            return None
+        index = cls(meta["dim"])
+        index._matrix = matrix
+        index._ids = list(meta["ids"])
+        index._size = len(index._ids)
+        index.generation = meta.get("generation", 0)
+        index._live = np.array([doc_id is not None for doc_id in index._ids], dtype=bool)
+        for row, doc_id in enumerate(index._ids):
+            if doc_id is None:
+                index._free.append(row)
+            else:
+                index._rows[doc_id] = row
+        return index
+
+
+_sqlite_vectors: Dict[str, VectorIndex] = {}
+_sqlite_vectors_lock = threading.Lock()
+
+
+def _embed_sqlite_documents(index: SQLiteIndex, vectors: VectorIndex, since: int = -1, batch: int = 1000):
+    """Embed the index's documents last written after generation ``since`` into ``vectors``"""
+    with get_sqlite_connection() as conn:
+        for prefix in index.prefixes:
+            cursor = conn.execute(f"""
+                SELECT m.doc_id, f.content
+                FROM {prefix}_ids m JOIN {prefix}_fts f ON f.rowid = m.rowid
+                WHERE m.gen > ?
+            """, (since,))
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    break
+                vectors.upsert([r["doc_id"] for r in rows], get_embedder().embed([r["content"] for r in rows]))
+
+
+def _sync_sqlite_vectors(index: SQLiteIndex, vectors: VectorIndex):
+    """Catch up with writes made since ``vectors.generation`` (e.g. by another worker process)"""
+    with get_sqlite_connection() as conn:
+        generation = sqlite_generation(conn, index.name)
+    if generation > vectors.generation:
+        _embed_sqlite_documents(index, vectors, since=vectors.generation)
+        vectors.generation = max(vectors.generation, generation)
+
+
+def save_sqlite_vectors(index: SQLiteIndex, vectors: VectorIndex):
+    """Persist vectors while holding the database write lock, so worker processes never interleave files"""
+    with get_sqlite_pool().writer() as conn, sqlite_transaction(conn):
+        vectors.save(index.vector_path)
+
+
+def get_sqlite_vectors(index: SQLiteIndex) -> VectorIndex:
+    """
+    Return the vector index of a SQLite index, current with the database.
+
+    Persisted vectors are reused and only documents written since they were
+    saved are re-embedded; if the result still does not match the id maps
+    (e.g. after an embedder change) everything is rebuilt.
+    """
+    vectors = _sqlite_vectors.get(index.name)
+    if vectors is None:
+        with _sqlite_vectors_lock:
+            vectors = _sqlite_vectors.get(index.name)
+            if vectors is None:
+                if VECTOR_PERSIST:
+                    with get_sqlite_pool().writer() as conn, sqlite_transaction(conn):
+                        vectors = VectorIndex.load(index.vector_path)
+                with get_sqlite_connection() as conn:
+                    generation = sqlite_generation(conn, index.name)
+                    expected = sum(
+                        conn.execute(f"SELECT COUNT(*) FROM {prefix}_ids").fetchone()[0] for prefix in index.prefixes
+                    )
+                if vectors is not None:
+                    _sync_sqlite_vectors(index, vectors)
+                if vectors is None or len(vectors) != expected:
+                    vectors = VectorIndex(get_embedder().dim)
+                    vectors.generation = generation
+                    _embed_sqlite_documents(index, vectors)
+                if VECTOR_PERSIST and vectors.dirty:
+                    save_sqlite_vectors(index, vectors)
+                _sqlite_vectors[index.name] = vectors
+                return vectors
+    with get_sqlite_connection() as conn:
+        stale = sqlite_generation(conn, index.name) > vectors.generation
+    if stale:
+        with _telemetry.stage("vector_sync"), _sqlite_vectors_lock:
+            _sync_sqlite_vectors(index, vectors)
+    return vectors
+
+
+def close_sqlite_vectors():
+    with _sqlite_vectors_lock:
+        for name, vectors in _sqlite_vectors.items():
+            index = _sqlite_indexes.get(name)
+            if index is not None and VECTOR_PERSIST and vectors.dirty:
+                save_sqlite_vectors(index, vectors)
+        _sqlite_vectors.clear()
+
 
 # =============================================================================
-# Configuration
+# Hybrid Retrieval (reciprocal rank fusion)
 # =============================================================================
 
-SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "memory").lower()
-OPENSEARCH_URL = os.getenv("OPENSEARCH_URL", "")
-SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "search_index.db")
+def fuse_results(legs: List[Tuple[List[Hit], float]], limit: int, k: int = RRF_K, after: Optional[Hit] = None) -> List[Hit]:
+    """
+    Merge ranked (doc_id, score) lists with weighted reciprocal rank fusion.
 
-# In-memory document store for demo mode
-_memory_store: Dict[str, Dict[str, Any]] = {}
+    Each document scores sum(weight / (k + rank)) over the legs it appears in.
+    """
+    fused: Dict[str, float] = {}
+    for results, weight in legs:
+        for rank, (doc_id, _) in enumerate(results, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return top_hits(fused.items(), limit, after)
 
-app = FastAPI(title="Search API", version="0.2.0")
 
-class SearchRequest(BaseModel):
-    query: str
-    limit: Optional[int] = 10
-    filters: Optional[Dict[str, Any]] = None
-    context: Optional[Dict[str, Any]] = None
+def search_hybrid(
+    query: str,
+    limit: int,
+    lexical_weight: float = 1.0,
+    semantic_weight: float = 1.0,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    projection: Projection = DEFAULT_PROJECTION,
+    after: Optional[Hit] = None,
+    window: Optional[int] = None,
+    min_similarity: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run the lexical and/or semantic leg of the active backend and fuse them.
 
-class UpsertRequest(BaseModel):
-    documents: List[Dict[str, Any]]
-    index_name: Optional[str] = "global_agent_docs"
+    Fusion covers the top ``window`` hits of each leg (default ``limit *
+    HYBRID_OVERSAMPLE``); semantic hits below ``min_similarity`` (default
+    SEARCH_MIN_SIMILARITY) are dropped first, so unrelated documents never
+    enter the fused ranking. ``after`` continues from a keyset cursor: a single
+    leg resumes where the cursor stopped; a fused ranking only stays the same
+    for the same window, so hybrid pages end once the window is used up.
+    """
+    if SEARCH_BACKEND == "sqlite":
+        lexical, semantic, materialize = rank_sqlite, rank_semantic_sqlite, materialize_sqlite
+    else:
+        lexical, semantic, materialize = rank_memory, rank_semantic_memory, materialize_memory
+    floor = SEARCH_MIN_SIMILARITY if min_similarity is None else min_similarity
 
-class HealthResponse(BaseModel):
-    status: str
-    version: str
-    opensearch_status: Optional[str] = None
-    vector_store_status: Optional[str] = None
+    if semantic_weight <= 0:
+        hits = lexical(query, limit, filters, index_name, after)
+    elif lexical_weight <= 0:
+        hits = semantic(query, limit, filters, index_name, after, min_similarity=floor)
+    else:
+        candidates = window or limit * HYBRID_OVERSAMPLE
+        legs = [
+            (lexical(query, candidates, filters, index_name), lexical_weight),
+            (semantic(query, candidates, filters, index_name, min_similarity=floor), semantic_weight),
+        ]
+        with _telemetry.stage("fuse"):
+            hits = fuse_results(legs, limit, after=after)
+    return materialize(index_name, hits, query, projection)
 
-@app.get("/health", response_model=HealthResponse)
-async def health_check():
-    """Health check endpoint"""
-    opensearch_status = "not_configured"
-    vector_store_status = "not_configured"
+# =============================================================================
+# OpenSearch Backend (pooled async HTTP client, _bulk, multi_match + kNN)
+# =============================================================================
 
-    if SEARCH_BACKEND == "opensearch" and OPENSEARCH_URL:
-        opensearch_status = "configured"  # Would check connectivity in production
-    elif SEARCH_BACKEND == "sqlite":
-        opensearch_status = "n/a"
-        vector_store_status = "sqlite_fts"
+# Every index_name maps to one OpenSearch index holding id, content, metadata
+# and the embedder's vector (knn_vector, HNSW, cosine). Metadata strings are
+# mapped as keywords, so filters match exact values as on the other backends,
+# and copied into ``metadata_text`` so multi_match searches them like the FTS5
+# metadata column. Ranking stays the same as elsewhere: score descending then
+# id (a sort on the ``id`` keyword), and the legs are fused here with RRF.
+# Scores are OpenSearch's: BM25, and (1 + cosine) / 2 for kNN.
+
+_RETRYABLE_STATUS = (429, 502, 503, 504)
+
+_os_client = None
+_os_indexes: Set[str] = set()  # OpenSearch indexes known to exist
+_os_health: Tuple[float, str] = (0.0, "unknown")
+_os_health_probe: Optional["asyncio.Task"] = None
+
+
+def get_opensearch_client():
+    """The process-wide keep-alive client, created on first use"""
+    global _os_client
+    if _os_client is None:
+        if httpx is None:
+            raise HTTPException(status_code=503, detail="opensearch_unavailable: httpx is not installed")
+        _os_client = httpx.AsyncClient(
+            base_url=OPENSEARCH_URL.rstrip("/"),
+            auth=(OPENSEARCH_USERNAME, OPENSEARCH_PASSWORD) if OPENSEARCH_USERNAME else None,
+            verify=OPENSEARCH_VERIFY_TLS,
+            timeout=httpx.Timeout(OPENSEARCH_TIMEOUT, connect=min(OPENSEARCH_TIMEOUT, 5.0)),
+            limits=httpx.Limits(
+                max_connections=OPENSEARCH_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENSEARCH_MAX_CONNECTIONS,
+                keepalive_expiry=60.0,
+            ),
+        )
+    return _os_client
+
+
+async def close_opensearch_client():
+    global _os_client
+    if _os_client is not None:
+        await _os_client.aclose()
+        _os_client = None
+
+
+def opensearch_index(name: str) -> str:
+    """OpenSearch index behind an index_name (lowercase; a hash keeps mixed-case names apart)"""
+    if name != name.lower():
+        return f"{OPENSEARCH_INDEX_PREFIX}{name.lower()}-{hashlib.md5(name.encode()).hexdigest()[:6]}"
+    return OPENSEARCH_INDEX_PREFIX + name
+
+
+def _os_error(body: Any) -> Tuple[str, str]:
+    """(type, reason) of an OpenSearch error body"""
+    error = body.get("error") if isinstance(body, dict) else None
+    if isinstance(error, dict):
+        return error.get("type", "error"), error.get("reason", "")
+    return "error", str(error or body)[:200]
+
+
+async def opensearch_request(
+    method: str,
+    path: str,
+    body: Any = None,
+    ndjson: Optional[List[Any]] = None,
+    params: Optional[Dict[str, Any]] = None,
+    allow: Tuple[int, ...] = (),
+    timeout: Optional[float] = None,
+) -> Tuple[int, Any]:
+    """
+    One call to the cluster: (status, decoded body).
+
+    ``ndjson`` sends one JSON document per line (_bulk, _msearch). Transport
+    errors become 502, an exhausted connection pool 429, and error statuses
+    not listed in ``allow`` 502 (404 index_not_found 404).
+    """
+    client = get_opensearch_client()
+    kwargs: Dict[str, Any] = {"params": params}
+    if ndjson is not None:
+        kwargs["content"] = "".join(json.dumps(line, separators=(",", ":")) + "\n" for line in ndjson).encode()
+        kwargs["headers"] = {"content-type": "application/x-ndjson"}
+    elif body is not None:
+        kwargs["content"] = json.dumps(body, separators=(",", ":")).encode()
+        kwargs["headers"] = {"content-type": "application/json"}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    try:
+        response = await client.request(method, path, **kwargs)
+    except httpx.PoolTimeout:
+        raise HTTPException(
+            status_code=429,
+            detail="overloaded: opensearch connection pool is exhausted, retry later",
+            headers={"Retry-After": "1"}
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"opensearch_unavailable: {type(e).__name__}: {e}")
+    try:
+        decoded = response.json() if response.content else None
+    except ValueError:
+        decoded = response.text
+    if response.status_code >= 400 and response.status_code not in allow:
+        kind, reason = _os_error(decoded)
+        if kind == "index_not_found_exception":
+            raise HTTPException(status_code=404, detail=f"index_not_found: {reason}")
+        raise HTTPException(status_code=502, detail=f"opensearch_error: {response.status_code} {kind}: {reason}")
+    return response.status_code, decoded
+
+
+async def opensearch_health() -> str:
+    """
+    Cluster status ("green", "yellow", "red" or "unreachable"), probed at
+    most once per OPENSEARCH_HEALTH_TTL; concurrent callers share one probe.
+    """
+    global _os_health_probe
+    checked_at, status = _os_health
+    if time.monotonic() - checked_at < OPENSEARCH_HEALTH_TTL:
+        return status
+
+    async def probe() -> str:
+        global _os_health_probe, _os_health
+        try:
+            _, body = await opensearch_request("GET", "/_cluster/health", timeout=min(OPENSEARCH_TIMEOUT, 2.0))
+            result = body.get("status", "unknown") if isinstance(body, dict) else "unknown"
+        except HTTPException:
+            result = "unreachable"
+        _os_health = (time.monotonic(), result)
+        _os_health_probe = None
+        return result
+
+    if _os_health_probe is None or _os_health_probe.get_loop() is not asyncio.get_running_loop():
+        _os_health_probe = asyncio.ensure_future(probe())
+    return await asyncio.shield(_os_health_probe)
+
+
+def _opensearch_mapping(shards: int, dim: int) -> Dict[str, Any]:
+    return {
+        "settings": {"index": {"number_of_shards": max(1, shards), "knn": True}},
+        "mappings": {
+            # Strings stay strings: ISO dates compare lexicographically, as in parse_filters
+            "date_detection": False,
+            "dynamic_templates": [
+                {"metadata_strings": {
+                    "path_match": "metadata.*",
+                    "match_mapping_type": "string",
+                    "mapping": {"type": "keyword", "ignore_above": 8191, "copy_to": "metadata_text"},
+                }},
+                {"metadata_numbers": {
+                    "path_match": "metadata.*",
+                    "match_mapping_type": "long",
+                    "mapping": {"type": "double"},
+                }},
+            ],
+            "properties": {
+                "id": {"type": "keyword"},
+                "hash": {"type": "keyword", "index": False},
+                "content": {"type": "text"},
+                "metadata_text": {"type": "text"},
+                "metadata": {"type": "object"},
+                "embedding": {
+                    "type": "knn_vector",
+                    "dimension": dim,
+                    "method": {"name": "hnsw", "space_type": "cosinesimil", "engine": "lucene"},
+                },
+            },
+        },
+    }
+
+
+async def ensure_opensearch_index(name: str, shards: Optional[int] = None) -> str:
+    """Create the OpenSearch index behind ``name`` unless it exists"""
+    target = opensearch_index(name)
+    if target not in _os_indexes:
+        status, body = await opensearch_request(
+            "PUT", f"/{target}", _opensearch_mapping(shards or SEARCH_SHARDS, get_embedder().dim), allow=(400,)
+        )
+        if status == 400 and _os_error(body)[0] != "resource_already_exists_exception":
+            kind, reason = _os_error(body)
+            raise HTTPException(status_code=502, detail=f"opensearch_error: 400 {kind}: {reason}")
+        _os_indexes.add(target)
+    return target
+
+
+def _bulk_batches(items: List[Tuple[str, bytes]], max_docs: int, max_bytes: int) -> List[List[Tuple[str, bytes]]]:
+    """Split (doc_id, action lines) items into _bulk bodies of at most max_docs / max_bytes"""
+    batches: List[List[Tuple[str, bytes]]] = []
+    batch: List[Tuple[str, bytes]] = []
+    size = 0
+    for item in items:
+        if batch and (len(batch) >= max_docs or size + len(item[1]) > max_bytes):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(item)
+        size += len(item[1])
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def _send_bulk(batch: List[Tuple[str, bytes]], refresh: Optional[str]) -> List[Tuple[str, str]]:
+    """
+    POST one _bulk body; items rejected with 429/5xx (and whole-request
+    failures) are resent with jittered exponential backoff. Returns the
+    (doc_id, reason) pairs that still failed.
+    """
+    client = get_opensearch_client()
+    pending = batch
+    failed: List[Tuple[str, str]] = []
+    for attempt in range(OPENSEARCH_BULK_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(min(5.0, 0.1 * 2 ** attempt) * random.uniform(0.5, 1.0))
+        last = attempt == OPENSEARCH_BULK_RETRIES
+        params = {"refresh": refresh} if refresh else None
+        try:
+            with _telemetry.stage("bulk"):
+                response = await client.post(
+                    "/_bulk", content=b"".join(lines for _, lines in pending), params=params,
+                    headers={"content-type": "application/x-ndjson"},
+                )
+        except httpx.HTTPError as e:
+            if last:
+                raise HTTPException(status_code=502, detail=f"opensearch_unavailable: {type(e).__name__}: {e}")
+            continue
+        if response.status_code in _RETRYABLE_STATUS and not last:
+            continue
+        if response.status_code >= 400:
+            try:
+                kind, reason = _os_error(response.json())
+            except ValueError:
+                kind, reason = "error", response.text[:200]
+            raise HTTPException(status_code=502, detail=f"opensearch_error: {response.status_code} {kind}: {reason}")
+        body = response.json()
+        if not body.get("errors"):
+            return failed
+        retry = []
+        for item, result in zip(pending, body.get("items", [])):
+            outcome = next(iter(result.values()))
+            status = outcome.get("status", 500)
+            if status < 300:
+                continue
+            if (status == 429 or status >= 500) and not last:
+                retry.append(item)
+            else:
+                failed.append((item[0], "{}: {}".format(*_os_error(outcome))))
+        if not retry:
+            return failed
+        pending = retry
+    return failed
+
+
+def _embed_documents(texts: List[str]) -> np.ndarray:
+    with _telemetry.stage("embed"):
+        return get_embedder().embed(texts)
+
+
+async def upsert_opensearch(
+    documents: List[Dict[str, Any]],
+    index_name: str = DEFAULT_INDEX_NAME,
+    shards: Optional[int] = None,
+    admit: bool = True,
+    force: bool = False,
+) -> Tuple[int, int]:
+    """
+    Index documents with the _bulk API; returns (written, unchanged).
+
+    Documents whose stored hash matches are skipped unless ``force`` (one
+    _mget). Bodies are bounded by OPENSEARCH_BULK_DOCS and
+    OPENSEARCH_BULK_BYTES and sent one at a time; only the last one asks for
+    OPENSEARCH_REFRESH, which makes the whole upsert searchable. Embedding
+    runs on the write lane.
+    """
+    rows = upsert_rows(documents)
+    received = len(rows)
+    if not force and rows:
+        with _telemetry.stage("manifest"):
+            rows = changed_rows(rows, await opensearch_document_hashes(index_name, list(rows)))
+    if not rows:
+        return 0, received
+    items = list(rows.items())
+    vectors = await _write_lane.run(_embed_documents, [content for _, (content, _, _) in items], admit=admit)
+    target = await ensure_opensearch_index(index_name, shards)
+
+    with _telemetry.stage("encode"):
+        encoded = []
+        for (doc_id, (content, metadata, doc_hash)), vector in zip(items, vectors.tolist()):
+            action = json.dumps({"index": {"_index": target, "_id": doc_id}}, separators=(",", ":"))
+            source = json.dumps(
+                {"id": doc_id, "hash": doc_hash, "content": content, "metadata": metadata, "embedding": vector},
+                separators=(",", ":"), default=str,
+            )
+            encoded.append((doc_id, f"{action}\n{source}\n".encode()))
+    batches = _bulk_batches(encoded, max(1, OPENSEARCH_BULK_DOCS), max(1, OPENSEARCH_BULK_BYTES))
+
+    failed: List[Tuple[str, str]] = []
+    for i, batch in enumerate(batches):
+        refresh = OPENSEARCH_REFRESH if i == len(batches) - 1 and OPENSEARCH_REFRESH != "false" else None
+        failed.extend(await _send_bulk(batch, refresh))
+    if failed:
+        doc_id, reason = failed[0]
+        raise HTTPException(
+            status_code=502,
+            detail=f"opensearch_bulk_failed: {len(failed)} of {len(items)} documents were rejected "
+                   f"(first: {doc_id}: {reason})"
+        )
+    return len(items), received - len(items)
+
+
+async def opensearch_document_hashes(index_name: str, doc_ids: List[str]) -> Dict[str, str]:
+    """Stored hashes of the given documents, via _mget (unknown and unhashed ids are omitted)"""
+    target = opensearch_index(index_name)
+    hashes: Dict[str, str] = {}
+    for start in range(0, len(doc_ids), 1000):
+        status, body = await opensearch_request(
+            "POST", f"/{target}/_mget", {"ids": doc_ids[start:start + 1000]},
+            params={"_source_includes": "hash"}, allow=(404,),
+        )
+        if status == 404:
+            return {}  # the index does not exist yet
+        for doc in body.get("docs", []):
+            doc_hash = (doc.get("_source") or {}).get("hash") if doc.get("found") else None
+            if doc_hash:
+                hashes[doc["_id"]] = doc_hash
+    return hashes
+
+
+def _opensearch_filters(filters: Optional[List[Tuple[str, str, Any]]]) -> List[Dict[str, Any]]:
+    """parse_filters clauses as OpenSearch filter clauses on metadata.<field>"""
+    clauses = []
+    for field, op, value in filters or ():
+        path = f"metadata.{field}"
+        if op == "eq":
+            clauses.append({"term": {path: value[1]}})
+        elif op == "in":
+            clauses.append({"terms": {path: [v[1] for v in value]}})
+        else:
+            clauses.append({"range": {path: {op: value[1]}}})
+    return clauses
+
+
+def _opensearch_source(projection: Projection) -> Any:
+    """_source filter for the fields a projection needs (False when only id and score)"""
+    includes = []
+    if projection.content or projection.snippet or projection.highlight:
+        includes.append("content")
+    if projection.metadata:
+        if projection.metadata_keys is None:
+            includes.append("metadata")
+        else:
+            includes.extend(f"metadata.{key}" for key in projection.metadata_keys)
+    return includes or False
+
+
+def _opensearch_body(
+    query: Dict[str, Any],
+    size: int,
+    after: Optional[Hit] = None,
+    source: Any = False,
+    min_score: Optional[float] = None,
+) -> Dict[str, Any]:
+    body: Dict[str, Any] = {
+        "size": size,
+        "query": query,
+        # The id tie-break gives the same total order as top_hits
+        "sort": [{"_score": "desc"}, {"id": "asc"}],
+        "track_scores": True,
+        "_source": source,
+    }
+    if after is not None:
+        body["search_after"] = [after[1], after[0]]
+    if min_score is not None:
+        body["min_score"] = min_score
+    return body
+
+
+def _embed_query(query: str) -> List[float]:
+    with _telemetry.stage("embed"):
+        return get_embedder().embed([query])[0].tolist()
+
+
+def _opensearch_hit(hit: Dict[str, Any]) -> Hit:
+    return (hit["_id"], float(hit["sort"][0]))
+
+
+def _materialize_opensearch_hit(hit: Hit, source: Dict[str, Any], terms: Set[str], projection: Projection) -> Dict[str, Any]:
+    content = source.get("content") or ""
+    return projection.hit(
+        hit[0],
+        hit[1],
+        content,
+        source.get("metadata", {}),
+        make_snippet(content, terms, projection.snippet_tokens, projection.tags) if projection.snippet else None,
+        make_highlight(content, terms, projection.tags) if projection.highlight else None,
+    )
+
+
+async def search_opensearch(
+    query: str,
+    limit: int,
+    lexical_weight: float = 1.0,
+    semantic_weight: float = 1.0,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    index_name: str = DEFAULT_INDEX_NAME,
+    projection: Projection = DEFAULT_PROJECTION,
+    after: Optional[Hit] = None,
+    window: Optional[int] = None,
+    rank: int = 0,
+    min_similarity: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Hybrid search on OpenSearch, with the semantics of search_hybrid().
+
+    Both legs go out in one _msearch: multi_match over OPENSEARCH_QUERY_FIELDS
+    and a filtered kNN query for the ``window`` nearest neighbours. A single
+    leg pages with search_after and returns its page's _source directly; a
+    semantic-only page asks kNN for the ``rank`` hits already returned plus
+    ``limit``, so it is not cut off at the window. Fused results are fetched
+    afterwards with _mget. kNN hits below ``min_similarity`` are dropped with
+    min_score (kNN scores are (1 + cosine) / 2).
+    """
+    target = opensearch_index(index_name)
+    candidates = window or limit * HYBRID_OVERSAMPLE
+    clauses = _opensearch_filters(filters)
+    lexical = {"bool": {
+        "must": {"multi_match": {"query": query, "fields": OPENSEARCH_QUERY_FIELDS, "lenient": True}},
+        "filter": clauses,
+    }}
+    single = semantic_weight <= 0 or lexical_weight <= 0
+    min_score = (1.0 + (SEARCH_MIN_SIMILARITY if min_similarity is None else min_similarity)) / 2.0
+    semantic = None
+    if semantic_weight > 0:
+        k = rank + limit if single else max(candidates, limit)
+        knn: Dict[str, Any] = {"vector": await _read_lane.run(_embed_query, query), "k": k}
+        if clauses:
+            knn["filter"] = {"bool": {"filter": clauses}}
+        semantic = {"knn": {"embedding": knn}}
+
+    if single:
+        searches = [_opensearch_body(
+            lexical if semantic is None else semantic, limit, after, _opensearch_source(projection),
+            None if semantic is None else min_score,
+        )]
     else:
-        opensearch_status = "n/a"
-        vector_store_status = "memory"
+        searches = [_opensearch_body(lexical, candidates), _opensearch_body(semantic, candidates, min_score=min_score)]
+    lines: List[Any] = []
+    for search in searches:
+        lines.extend(({"index": target}, search))
+    with _telemetry.stage("opensearch"):
+        _, body = await opensearch_request("POST", "/_msearch", ndjson=lines)
 
-    return HealthResponse(
-        status="ok",
-        version="0.2.0",
-        opensearch_status=opensearch_status,
-        vector_store_status=vector_store_status
+    legs = []
+    for response in body.get("responses", []):
+        if "error" in response:
+            kind, reason = _os_error(response)
+            if kind == "index_not_found_exception":
+                if index_name == DEFAULT_INDEX_NAME:
+                    return []  # Nothing has been indexed yet, as on the other backends
+                raise HTTPException(status_code=404, detail=f"index_not_found: {index_name}")
+            raise HTTPException(status_code=502, detail=f"opensearch_error: {response.get('status')} {kind}: {reason}")
+        legs.append(response["hits"]["hits"])
+
+    terms = set(tokenize(query)) if projection.snippet or projection.highlight else set()
+    if single:
+        return [
+            _materialize_opensearch_hit(_opensearch_hit(hit), hit.get("_source") or {}, terms, projection)
+            for hit in legs[0]
+        ]
+
+    with _telemetry.stage("fuse"):
+        hits = fuse_results(
+            [([_opensearch_hit(hit) for hit in legs[0]], lexical_weight),
+             ([_opensearch_hit(hit) for hit in legs[1]], semantic_weight)],
+            limit,
+            after=after,
+        )
+    source = _opensearch_source(projection)
+    if not hits or source is False:
+        return [projection.hit(doc_id, score) for doc_id, score in hits]
+    with _telemetry.stage("fetch_documents"):
+        _, fetched = await opensearch_request(
+            "POST", f"/{target}/_mget", {"ids": [doc_id for doc_id, _ in hits]},
+            params={"_source_includes": ",".join(source)},
+        )
+    sources = {doc["_id"]: doc.get("_source") or {} for doc in fetched.get("docs", []) if doc.get("found")}
+    # Documents deleted since ranking are dropped, like materialize_memory()
+    return [
+        _materialize_opensearch_hit(hit, sources[hit[0]], terms, projection)
+        for hit in hits if hit[0] in sources
+    ]
+
+
+async def opensearch_index_stats() -> Dict[str, Dict[str, Any]]:
+    """Document counts and store sizes of the service's OpenSearch indexes"""
+    pattern = f"{OPENSEARCH_INDEX_PREFIX}*" if OPENSEARCH_INDEX_PREFIX else "*"
+    _, rows = await opensearch_request(
+        "GET", f"/_cat/indices/{pattern}",
+        params={"format": "json", "bytes": "b", "h": "index,health,docs.count,store.size,pri"},
     )
+    indexes = {}
+    for row in sorted(rows or [], key=itemgetter("index")):
+        if row["index"].startswith("."):
+            continue  # system indexes
+        indexes[row["index"]] = {
+            "documents": int(row.get("docs.count") or 0),
+            "bytes": int(row.get("store.size") or 0),
+            "shards": int(row.get("pri") or 0),
+            "health": row.get("health"),
+        }
+    return indexes
 
 
 # =============================================================================
-# SQLite FTS Backend
+# Worker Lanes (bounded thread pools + admission control)
 # =============================================================================
 
-@contextmanager
-def get_sqlite_connection():
-    """Get SQLite connection with FTS5 support"""
-    conn = sqlite3.connect(SQLITE_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+class RWLock:
+    """
+    Many concurrent readers or one writer; a waiting writer blocks new readers.
 
+    Time spent waiting is recorded as the "lock_wait" stage.
+    """
 
-def init_sqlite_fts():
-    """Initialize SQLite FTS5 table"""
-    with get_sqlite_connection() as conn:
-        conn.execute("""
-            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
-                id, content, metadata, tokenize='porter'
-            )
-        """)
-        conn.commit()
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
 
+    @contextmanager
+    def read(self):
+        start = time.perf_counter()
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        _telemetry.observe_stage("lock_wait", time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
 
-def search_sqlite(query: str, limit: int) -> List[Dict[str, Any]]:
-    """Search using SQLite FTS5"""
-    with get_sqlite_connection() as conn:
-        cursor = conn.execute("""
-            SELECT id, content, metadata, rank
-            FROM documents_fts
-            WHERE documents_fts MATCH ?
-            ORDER BY rank
-            LIMIT ?
-        """, (query, limit))
-        results = []
-        for row in cursor:
-            results.append({
-                "id": row["id"],
-                "content": row["content"],
-                "score": -row["rank"],  # FTS5 rank is negative, lower is better
-                "metadata": json.loads(row["metadata"]) if row["metadata"] else {}
-            })
-        return results
+    @contextmanager
+    def write(self):
+        start = time.perf_counter()
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        _telemetry.observe_stage("lock_wait", time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
 
 
-def upsert_sqlite(documents: List[Dict[str, Any]]) -> int:
-    """Upsert documents into SQLite FTS"""
-    init_sqlite_fts()
-    count = 0
-    with get_sqlite_connection() as conn:
-        for doc in documents:
-            doc_id = doc.get("id") or hashlib.md5(doc.get("content", "").encode()).hexdigest()
-            content = doc.get("content", "")
-            metadata = json.dumps(doc.get("metadata", {}))
-
-            # Delete existing and insert new (upsert pattern for FTS)
-            conn.execute("DELETE FROM documents_fts WHERE id = ?", (doc_id,))
-            conn.execute(
-                "INSERT INTO documents_fts (id, content, metadata) VALUES (?, ?, ?)",
-                (doc_id, content, metadata)
+class WorkLane:
+    """
+    Bounded thread pool that keeps blocking work off the event loop.
+
+    At most ``workers`` calls run at once and ``queue_depth`` more may wait;
+    further calls are rejected with 429 instead of queueing without bound.
+    Calls run in a copy of the caller's context, and the time they wait for
+    a thread is recorded as the "queue_wait" stage.
+    """
+
+    def __init__(self, name: str, workers: int, queue_depth: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self.workers + self.queue_depth
+
+    def admit(self):
+        """Raise 429 if the lane has no room for another call"""
+        if self.saturated:
+            with self._lock:
+                self.rejected += 1
+            _lane_rejected.inc(lane=self.name)
+            raise HTTPException(
+                status_code=429,
+                detail=f"overloaded: {self.name} queue is full, retry later",
+                headers={"Retry-After": "1"}
             )
-            count += 1
-        conn.commit()
-    return count
+
+    async def run(self, fn, *args, admit: bool = True):
+        """
+        Run ``fn(*args)`` on the lane and await its result.
+
+        ``admit=False`` skips admission control, for work belonging to a
+        request that was already admitted (e.g. later batches of a stream).
+        """
+        if admit:
+            self.admit()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            self.in_flight += 1
+            _lane_in_flight.set(self.in_flight, lane=self.name)
+        submitted = time.perf_counter()
+
+        def call():
+            _telemetry.observe_stage("queue_wait", time.perf_counter() - submitted)
+            return fn(*args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, contextvars.copy_context().run, call)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                _lane_in_flight.set(self.in_flight, lane=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+_lane_in_flight = _telemetry.gauge("lane_in_flight", "Calls running or queued on a worker lane", ("lane",))
+_lane_rejected = _telemetry.counter("lane_rejected_total", "Calls rejected with 429 by a worker lane", ("lane",))
+
+# Queries and ingest get separate pools so a bulk load cannot starve searches
+_read_lane = WorkLane("search-read", SEARCH_READ_WORKERS, SEARCH_QUEUE_DEPTH)
+_write_lane = WorkLane("search-write", SEARCH_WRITE_WORKERS, SEARCH_QUEUE_DEPTH)
 
 
 # =============================================================================
-# In-Memory Backend (Demo/Development)
+# Query Result Cache
 # =============================================================================
 
-def search_memory(query: str, limit: int) -> List[Dict[str, Any]]:
-    """Simple in-memory keyword search"""
-    query_lower = query.lower()
-    results = []
+class ResultCache:
+    """
+    LRU cache of /query results bounded by entry count and approximate bytes.
 
-    for doc_id, doc in _memory_store.items():
-        content = doc.get("content", "").lower()
-        # Simple relevance: count query terms found
-        score = sum(1 for term in query_lower.split() if term in content)
-        if score > 0:
-            results.append({
-                "id": doc_id,
-                "content": doc["content"],
-                "score": score / len(query_lower.split()),
-                "metadata": doc.get("metadata", {})
-            })
+    Keys embed the index generation, so an upsert makes older entries
+    unreachable; they age out of the LRU instead of being served stale.
+    """
 
-    # Sort by score descending
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return results[:limit]
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[List[Dict[str, Any]], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
 
-def upsert_memory(documents: List[Dict[str, Any]]) -> int:
-    """Add documents to in-memory store"""
-    count = 0
-    for doc in documents:
-        doc_id = doc.get("id") or hashlib.md5(doc.get("content", "").encode()).hexdigest()
-        _memory_store[doc_id] = {
-            "content": doc.get("content", ""),
-            "metadata": {
-                **doc.get("metadata", {}),
-                "indexed_at": datetime.utcnow().isoformat()
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple, results: List[Dict[str, Any]]):
+        size = len(json.dumps(results, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (results, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
             }
-        }
-        count += 1
-    return count
+
+
+_query_cache = ResultCache(QUERY_CACHE_ENTRIES, QUERY_CACHE_BYTES)
+
+# Bumped by every write to a memory index; part of every cache key. The
+# SQLite backend keeps its generations in search_indexes instead.
+_index_generations: Dict[str, int] = {}
+_generation_lock = threading.Lock()
+
+
+def get_generation(index_name: str) -> int:
+    if SEARCH_BACKEND == "sqlite":
+        with get_sqlite_connection() as conn:
+            return sqlite_generation(conn, index_name)
+    return _index_generations.get(index_name, 0)
+
+
+def index_generations() -> Dict[str, int]:
+    if SEARCH_BACKEND == "sqlite":
+        with get_sqlite_connection() as conn:
+            return {row[0]: row[1] for row in conn.execute("SELECT name, generation FROM search_indexes")}
+    return dict(_index_generations)
+
+
+def bump_generation(index_name: str) -> int:
+    with _generation_lock:
+        _index_generations[index_name] = _index_generations.get(index_name, 0) + 1
+        return _index_generations[index_name]
+
+
+def query_cache_key(request: SearchRequest, index_name: str, projection: Projection) -> Tuple:
+    """Cache key from the normalised query, limit, filters, weights, page, projection and backend"""
+    query = " ".join(request.query.split())
+    if SEARCH_BACKEND == "memory":
+        # The memory tokenizer is case-insensitive; FTS5 operators are not
+        query = query.lower()
+    return (
+        SEARCH_BACKEND,
+        index_name,
+        get_generation(index_name),
+        query,
+        request.limit or 10,
+        json.dumps(request.filters or {}, sort_keys=True, default=str),
+        request.lexical_weight,
+        request.semantic_weight,
+        request.min_similarity,
+        request.rank_window,
+        request.search_after,
+        projection.key(),
+    )
+
+
+def run_query(
+    request: SearchRequest,
+    index_name: str,
+    filters: List[Tuple[str, str, Any]],
+    projection: Projection = DEFAULT_PROJECTION,
+    after: Optional[Hit] = None,
+    window: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Blocking part of /query (runs on the read lane): cache lookup, then hybrid search"""
+    if not index_exists(index_name):
+        raise HTTPException(status_code=404, detail=f"index_not_found: {index_name}")
+    cache_key = None
+    if _query_cache.enabled:
+        with _telemetry.stage("cache_lookup"):
+            cache_key = query_cache_key(request, index_name, projection)
+            cached = _query_cache.get(cache_key)
+        if cached is not None:
+            return cached, True
+    results = search_hybrid(
+        request.query,
+        request.limit or 10,
+        lexical_weight=1.0 if request.lexical_weight is None else request.lexical_weight,
+        semantic_weight=1.0 if request.semantic_weight is None else request.semantic_weight,
+        filters=filters,
+        index_name=index_name,
+        projection=projection,
+        after=after,
+        window=window,
+        min_similarity=request.min_similarity,
+    )
+    if cache_key:
+        _query_cache.put(cache_key, results)
+    return results, False
+
 
 @app.post("/query")
 async def search_documents(request: SearchRequest):
-    """Search documents using configured backend"""
-    import time
+    """
+    Search documents using configured backend.
+
+    Pages are ``limit`` hits long; pass a response's ``next_cursor`` back as
+    ``search_after`` for the next page (same query, filters and weights).
+    Single-leg queries page through every match; hybrid pages end once the
+    fused ``rank_window`` is used up.
+    """
     start = time.time()
 
     try:
         results = []
+        cached = False
+        next_cursor = None
 
-        if SEARCH_BACKEND == "opensearch" and OPENSEARCH_URL:
-            # OpenSearch integration (placeholder for future)
-            # client = OpenSearchClient(OPENSEARCH_URL)
-            # results = client.search(query=request.query, limit=request.limit)
-            raise HTTPException(
-                status_code=503,
-                detail="opensearch_not_implemented: OpenSearch backend configured but not yet integrated"
+        with _telemetry.stage("parse"):
+            index_name = resolve_index_name(request.index_name)
+            filters = parse_filters(request.filters)
+            projection = parse_projection(request.fields, request.snippet_tokens, request.highlight_tags)
+            fingerprint = query_fingerprint(request, index_name)
+            limit = request.limit or 10
+            if request.limit is not None and request.limit < 1:
+                raise HTTPException(status_code=400, detail="invalid_limit: limit must be at least 1")
+            if request.rank_window is not None and request.rank_window < 1:
+                raise HTTPException(status_code=400, detail="invalid_rank_window: rank_window must be at least 1")
+            if request.min_similarity is not None and not 0.0 <= request.min_similarity <= 1.0:
+                raise HTTPException(status_code=400, detail="invalid_min_similarity: min_similarity must be between 0 and 1")
+            if request.search_after:
+                after, window, rank = decode_cursor(request.search_after, fingerprint)
+            else:
+                after, window, rank = None, request.rank_window or limit * HYBRID_OVERSAMPLE, 0
+        if OPENSEARCH_ENABLED:
+            # Not cached here: other writers can change the cluster, and it has its own caches
+            results = await search_opensearch(
+                request.query,
+                limit,
+                lexical_weight=1.0 if request.lexical_weight is None else request.lexical_weight,
+                semantic_weight=1.0 if request.semantic_weight is None else request.semantic_weight,
+                filters=filters,
+                index_name=index_name,
+                projection=projection,
+                after=after,
+                window=window,
+                rank=rank,
+                min_similarity=request.min_similarity,
             )
-        elif SEARCH_BACKEND == "sqlite":
-            results = search_sqlite(request.query, request.limit or 10)
         else:
-            results = search_memory(request.query, request.limit or 10)
+            results, cached = await _read_lane.run(run_query, request, index_name, filters, projection, after, window)
+        if results and len(results) >= limit:
+            next_cursor = encode_cursor((results[-1]["id"], results[-1]["score"]), window, fingerprint, rank + len(results))
 
         took_ms = int((time.time() - start) * 1000)
 
-        return {
-            "results": results,
-            "total": len(results),
-            "query": request.query,
-            "backend": SEARCH_BACKEND,
-            "took_ms": took_ms
-        }
+        # Results are plain JSON values, so render directly (and time it)
+        # instead of going through FastAPI's jsonable_encoder
+        with _telemetry.stage("serialize"):
+            return JSONResponse({
+                "results": results,
+                "total": len(results),
+                "query": request.query,
+                "backend": SEARCH_BACKEND,
+                "took_ms": took_ms,
+                "cached": cached,
+                "next_cursor": next_cursor
+            })
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def index_documents(
+    documents: List[Dict[str, Any]],
+    index_name: str,
+    shards: Optional[int] = None,
+    force: bool = False,
+) -> Tuple[int, int]:
+    """Write a batch to the active backend and invalidate the index's cached queries if anything changed"""
+    if SEARCH_BACKEND == "sqlite":
+        return upsert_sqlite(documents, index_name=index_name, shards=shards, force=force)
+    written, unchanged = upsert_memory(documents, index_name=index_name, shards=shards, force=force)
+    if written:
+        bump_generation(index_name)
+    return written, unchanged
+
+
+def document_hashes(index_name: str, doc_ids: List[str]) -> Dict[str, str]:
+    """Manifest hashes of the given documents in a local (sqlite or memory) index"""
+    if SEARCH_BACKEND == "sqlite":
+        index = get_sqlite_index(index_name)
+        return sqlite_document_hashes(index, doc_ids) if index is not None else {}
+    index = get_memory_index(index_name)
+    if index is None:
+        return {}
+    with index.lock.read():
+        return index.document_hashes(doc_ids)
+
+
+async def write_documents(
+    documents: List[Dict[str, Any]],
+    index_name: str,
+    shards: Optional[int] = None,
+    admit: bool = True,
+    force: bool = False,
+) -> Tuple[int, int]:
+    """Index a batch on the active backend (local backends write on the write lane); returns (written, unchanged)"""
+    if OPENSEARCH_ENABLED:
+        return await upsert_opensearch(documents, index_name, shards, admit=admit, force=force)
+    return await _write_lane.run(index_documents, documents, index_name, shards, force, admit=admit)
+
+
+def _record_ingest(written: int, unchanged: int, seconds: float):
+    _ingest_stats["documents"] += written + unchanged
+    _ingest_stats["unchanged"] += unchanged
+    _ingest_stats["seconds"] += seconds
+
+
 @app.post("/upsert")
 async def upsert_documents(request: UpsertRequest):
     """Upsert documents into the search index"""
+    start = time.time()
     try:
-        count = 0
-
-        if SEARCH_BACKEND == "opensearch" and OPENSEARCH_URL:
-            raise HTTPException(
-                status_code=503,
-                detail="opensearch_not_implemented: OpenSearch backend configured but not yet integrated"
-            )
-        elif SEARCH_BACKEND == "sqlite":
-            count = upsert_sqlite(request.documents)
-        else:
-            count = upsert_memory(request.documents)
+        index_name = resolve_index_name(request.index_name)
+        written, unchanged = await write_documents(request.documents, index_name, request.shards, force=bool(request.force))
+        count = written + unchanged
+        elapsed = time.time() - start
+        _record_ingest(written, unchanged, elapsed)
 
         return {
             "status": "success",
             "documents_processed": count,
-            "index_name": request.index_name,
+            "documents_unchanged": unchanged,
+            "index_name": index_name,
             "backend": SEARCH_BACKEND,
+            "took_ms": int(elapsed * 1000),
+            "docs_per_sec": round(count / elapsed, 1) if elapsed > 0 else None,
             "message": f"Successfully processed {count} documents"
         }
     except HTTPException:
@@ -251,6 +3518,221 @@ async def upsert_documents(request: UpsertRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# =============================================================================
+# Streaming Ingest (NDJSON, optionally gzip)
+# =============================================================================
+
+async def iter_ndjson_lines(chunks, gzipped: Optional[bool] = None, max_line: int = INGEST_MAX_LINE_BYTES):
+    """
+    Yield complete lines from an async byte stream.
+
+    gzip is detected from the magic bytes unless ``gzipped`` is given.
+    Decompression output is bounded per step so memory stays flat.
+    """
+    decoder = None
+    buffer = b""
+    started = False
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if not started:
+            started = True
+            if gzipped is None:
+                gzipped = chunk[:2] == b"\x1f\x8b"
+            if gzipped:
+                decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        pending = chunk
+        while pending:
+            if decoder is not None:
+                data = decoder.decompress(pending, 1 << 20)
+                pending = decoder.unconsumed_tail
+            else:
+                data, pending = pending, b""
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line
+            if len(buffer) > max_line:
+                raise ValueError(f"line exceeds {max_line} bytes")
+    if decoder is not None:
+        buffer += decoder.flush()
+    if buffer:
+        yield buffer
+
+
+class NDJSONIngestResponse(Response):
+    """
+    Reads an NDJSON upload from the request body while streaming progress back.
+
+    Implemented at the ASGI level because StreamingResponse may consume
+    ``receive`` to watch for disconnects, which would swallow body chunks.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def __init__(self, request: Request, batch_size: int, gzipped: Optional[bool], index_name: str, force: bool = False):
+        # Same header setup as StreamingResponse: no Content-Length
+        self.status_code = 200
+        self.background = None
+        self.init_headers()
+        self._request = request
+        self._batch_size = max(1, batch_size)
+        self._gzipped = gzipped
+        self._index_name = index_name
+        self._force = force
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": self.raw_headers})
+
+        async def emit(event: Dict[str, Any]):
+            await send({"type": "http.response.body", "body": (json.dumps(event) + "\n").encode(), "more_body": True})
+
+        start = time.time()
+        processed = 0
+        unchanged = 0
+        batches = 0
+        errors = 0
+        line_no = 0
+        decode_seconds = 0.0
+        batch: List[Dict[str, Any]] = []
+
+        def progress(event: str) -> Dict[str, Any]:
+            elapsed = time.time() - start
+            return {
+                "event": event,
+                "documents_processed": processed,
+                "documents_unchanged": unchanged,
+                "batches": batches,
+                "errors": errors,
+                "index_name": self._index_name,
+                "backend": SEARCH_BACKEND,
+                "took_ms": int(elapsed * 1000),
+                "docs_per_sec": round(processed / elapsed, 1) if elapsed > 0 else None,
+            }
+
+        async def flush():
+            nonlocal processed, unchanged, batches, decode_seconds
+            if batch:
+                _telemetry.observe_stage("decode", decode_seconds)
+                decode_seconds = 0.0
+                batch_start = time.time()
+                # Already admitted: later batches wait for the lane (backpressure) instead of failing
+                written, skipped = await write_documents(list(batch), self._index_name, admit=False, force=self._force)
+                _record_ingest(written, skipped, time.time() - batch_start)
+                processed += written + skipped
+                unchanged += skipped
+                batches += 1
+                batch.clear()
+                await emit(progress("progress"))
+
+        try:
+            async for line in iter_ndjson_lines(self._request.stream(), self._gzipped):
+                line_no += 1
+                if not line.strip():
+                    continue
+                decode_start = time.perf_counter()
+                try:
+                    doc = json.loads(line)
+                    if not isinstance(doc, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as e:
+                    decode_seconds += time.perf_counter() - decode_start
+                    errors += 1
+                    if errors <= 100:
+                        await emit({"event": "error", "line": line_no, "error": str(e)})
+                    continue
+                decode_seconds += time.perf_counter() - decode_start
+                batch.append(doc)
+                if len(batch) >= self._batch_size:
+                    await flush()
+            await flush()
+            await emit(progress("done"))
+        except Exception as e:
+            await emit({**progress("failed"), "error": str(e)})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+@app.post("/upsert/stream")
+async def upsert_documents_stream(
+    request: Request,
+    index_name: str = DEFAULT_INDEX_NAME,
+    batch_size: int = INGEST_BATCH_SIZE,
+    gzip: Optional[bool] = None,
+    force: bool = False,
+):
+    """
+    Bulk-ingest NDJSON documents (one UpsertRequest document per line).
+
+    The body is read incrementally and indexed in ``batch_size`` batches;
+    progress is streamed back as NDJSON events. Gzip bodies are detected
+    automatically (or forced with ``?gzip=true``). Unchanged documents are
+    skipped unless ``?force=true``.
+    """
+    _write_lane.admit()
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        gzip = True
+    return NDJSONIngestResponse(request, batch_size, gzip, resolve_index_name(index_name), force)
+
+
+@app.post("/sync/delta")
+async def delta_sync(request: DeltaSyncRequest):
+    """
+    Which of the caller's documents need (re)sending: ids the index lacks or
+    holds with a different hash. Hashes are the documents' own ``hash``
+    field as upserted, or else content_hash() of content and metadata.
+    """
+    start = time.time()
+    index_name = resolve_index_name(request.index_name)
+    doc_ids = [doc.id for doc in request.documents]
+    if OPENSEARCH_ENABLED:
+        known = await opensearch_document_hashes(index_name, doc_ids)
+    else:
+        known = await _read_lane.run(document_hashes, index_name, doc_ids)
+    needed = [doc.id for doc in request.documents if known.get(doc.id) != doc.hash]
+    return {
+        "index_name": index_name,
+        "checked": len(doc_ids),
+        "needed": needed,
+        "unchanged": len(doc_ids) - len(needed),
+        "took_ms": int((time.time() - start) * 1000),
+    }
+
+
+def collect_index_stats() -> Dict[str, Dict[str, Any]]:
+    if SEARCH_BACKEND == "sqlite":
+        try:
+            _load_sqlite_indexes(get_sqlite_pool())
+            return sqlite_index_stats()
+        except Exception:
+            return {}
+    return memory_index_stats()
+
+
+@app.post("/snapshot")
+async def snapshot_indexes(index_name: Optional[str] = None):
+    """Checkpoint memory indexes to MEMORY_SNAPSHOT_DIR now (e.g. before a deploy)"""
+    if SEARCH_BACKEND != "memory" or not MEMORY_SNAPSHOT_DIR:
+        raise HTTPException(
+            status_code=400,
+            detail="snapshots_disabled: requires SEARCH_BACKEND=memory and MEMORY_SNAPSHOT_DIR"
+        )
+    if index_name:
+        name = resolve_index_name(index_name)
+        if get_memory_index(name) is None:
+            raise HTTPException(status_code=404, detail=f"index_not_found: {name}")
+        names = [name]
+    else:
+        names = sorted(_memory_indexes)
+
+    def checkpoint_all() -> Dict[str, int]:
+        with _telemetry.stage("checkpoint"):
+            return {name: checkpoint_memory_index(_memory_indexes[name]) for name in names}
+
+    start = time.time()
+    seqs = await _write_lane.run(checkpoint_all)
+    return {"status": "success", "snapshots": seqs, "took_ms": int((time.time() - start) * 1000)}
+
+
 @app.get("/stats")
 async def get_stats():
     """Get search index statistics"""
@@ -259,15 +3741,21 @@ async def get_stats():
         "document_count": 0
     }
 
-    if SEARCH_BACKEND == "sqlite":
-        try:
-            with get_sqlite_connection() as conn:
-                cursor = conn.execute("SELECT COUNT(*) FROM documents_fts")
-                stats["document_count"] = cursor.fetchone()[0]
-        except Exception:
-            stats["document_count"] = 0
+    if OPENSEARCH_ENABLED:
+        stats["indexes"] = await opensearch_index_stats()
     else:
-        stats["document_count"] = len(_memory_store)
+        stats["indexes"] = await _read_lane.run(collect_index_stats)
+    stats["document_count"] = sum(index["documents"] for index in stats["indexes"].values())
+
+    ingest_seconds = _ingest_stats["seconds"]
+    stats["ingest"] = {
+        "documents": int(_ingest_stats["documents"]),
+        "unchanged": int(_ingest_stats["unchanged"]),
+        "seconds": round(ingest_seconds, 3),
+        "docs_per_sec": round(_ingest_stats["documents"] / ingest_seconds, 1) if ingest_seconds > 0 else None,
+    }
+    stats["query_cache"] = {**_query_cache.stats(), "generations": await _read_lane.run(index_generations)}
+    stats["lanes"] = {"read": _read_lane.stats(), "write": _write_lane.stats()}
 
     return stats
 
@@ -281,9 +3769,37 @@ async def query_schema():
             "type": "object",
             "properties": {
                 "query": {"type": "string", "description": "Search query"},
-                "limit": {"type": "integer", "description": "Maximum results", "default": 10},
-                "filters": {"type": "object", "description": "Search filters"},
-                "context": {"type": "object", "description": "Additional context"}
+                "limit": {"type": "integer", "description": "Maximum results", "default": 10, "minimum": 1},
+                "filters": {
+                    "type": "object",
+                    "description": "Metadata filters, ANDed: {field: value} (equality), {field: [values]} (in), "
+                                   "or {field: {eq|in|gt|gte|lt|lte: value}}"
+                },
+                "context": {"type": "object", "description": "Additional context"},
+                "lexical_weight": {"type": "number", "description": "BM25 leg weight for rank fusion (0 disables)", "default": 1.0},
+                "semantic_weight": {"type": "number", "description": "Vector leg weight for rank fusion (0 disables)", "default": 1.0},
+                "min_similarity": {
+                    "type": "number",
+                    "description": "Drop semantic hits with a lower cosine similarity (0 to 1; default SEARCH_MIN_SIMILARITY)"
+                },
+                "index_name": {"type": "string", "description": "Index to search", "default": "global_agent_docs"},
+                "fields": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Fields per hit besides id and score: content, metadata, metadata.<key>, snippet, highlight "
+                                   "(default: content and metadata)"
+                },
+                "snippet_tokens": {"type": "integer", "description": "Tokens per snippet (1-64)", "default": 24},
+                "highlight_tags": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Open and close tags around matched terms", "default": ["<b>", "</b>"]
+                },
+                "search_after": {"type": "string", "description": "next_cursor of the previous page"},
+                "rank_window": {
+                    "type": "integer",
+                    "description": "Hybrid only: hits per leg to fuse (default limit x HYBRID_OVERSAMPLE); pages of a hybrid query end after it"
+                }
             },
             "required": ["query"]
         }
@@ -303,7 +3819,14 @@ async def upsert_schema():
                     "items": {"type": "object"},
                     "description": "Documents to upsert"
                 },
-                "index_name": {"type": "string", "description": "Index name", "default": "global_agent_docs"}
+                "index_name": {"type": "string", "description": "Index name", "default": "global_agent_docs"},
+                "shards": {"type": "integer", "description": "Hash shards when the upsert creates the index"},
+                "force": {
+                    "type": "boolean",
+                    "description": "Rewrite documents whose hash is unchanged (a document's own 'hash' field, "
+                                   "else md5 of the sorted-key JSON [content, metadata])",
+                    "default": False
+                }
             },
             "required": ["documents"]
         }
@@ -311,4 +3834,13 @@ async def upsert_schema():
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "8000"))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = SEARCH_WORKERS
+    if workers > 1 and SEARCH_BACKEND == "memory":
+        print("[Search] Warning: the memory backend is per-process; ignoring SEARCH_WORKERS and running one worker")
+        workers = 1
+    if workers > 1:
+        # Each worker process imports the app itself and opens its own pools
+        app_path = f"{__spec__.name if __spec__ else 'search_api'}:app"
+        uvicorn.run(app_path, host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
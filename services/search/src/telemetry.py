@@ -0,0 +1,408 @@
+"""
+Request and stage telemetry for the Python services.
+
+Records Prometheus-style metrics in process and serves them on GET /metrics in
+the text exposition format (no prometheus_client dependency):
+
+- <ns>_request_duration_seconds{endpoint,method,status,...}  histogram
+- <ns>_requests_in_flight{endpoint,...}                      gauge
+- <ns>_request_errors_total{endpoint,status,...}             counter (status >= 400)
+- <ns>_stage_duration_seconds{endpoint,stage,...}            histogram
+- <ns>_stage_errors_total{endpoint,stage,error,...}          counter
+
+"..." are the service's own labels: constant ones (e.g. backend) are fixed when
+the Telemetry is created, per-request ones (e.g. strategy) are filled in by the
+handler with ``set_labels()``.
+
+Stages are timed with ``with telemetry.stage("sql"):`` anywhere below a
+request. The endpoint label comes from a context variable set by the
+middleware, so work handed to another thread must run inside a copy of the
+caller's context (``contextvars.copy_context().run``); stages outside any
+request are labelled endpoint="background".
+
+Passing ``profile_hz`` > 0 starts a sampling profiler that walks every thread's
+Python stack at that rate; GET /debug/profile returns the counts as collapsed
+stacks (flamegraph.pl / speedscope input), ``?reset=true`` clears them.
+
+Metrics are per process: with several uvicorn workers each scrape sees the one
+worker that answered it.
+
+Every service ships its own copy of this file (each image is built from its
+service directory); keep the copies identical.
+"""
+
+import bisect
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.routing import Match
+
+# Request latencies range from sub-millisecond cache hits to minute-long LM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# Label values of the request being served (endpoint plus per-request labels).
+# The dict is shared by reference with copied contexts, so labels set from a
+# worker thread are still seen by the middleware.
+_request_labels: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar(
+    "telemetry_request_labels", default=None
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# =============================================================================
+# Metrics
+# =============================================================================
+
+class Metric:
+    """A named metric family; samples are keyed by label values in ``labelnames`` order"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple([str(labels.get(name, "")) for name in self.labelnames])
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        self.observe_key(self._key(labels), value)
+
+    def observe_key(self, key: Tuple[str, ...], value: float):
+        """``observe`` with the label values already in ``labelnames`` order"""
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, the last one is +Inf; then the sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][slot] += 1
+            state[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        names = self.labelnames + ("le",)
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(names, key + (_format_number(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# =============================================================================
+# Sampling Profiler
+# =============================================================================
+
+_THREAD_NUMBER_RE = re.compile(r"_\d+$")
+
+
+class SamplingProfiler:
+    """Counts collapsed Python stacks of every thread, sampled ``hz`` times a second"""
+
+    def __init__(self, hz: float, max_stacks: int = 20000, max_depth: int = 64):
+        self.hz = hz
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="telemetry-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        interval = 1.0 / self.hz
+        me = threading.get_ident()
+        while not self._stop.wait(interval):
+            # Pool threads differ only by their numeric suffix; fold them together
+            names = {t.ident: _THREAD_NUMBER_RE.sub("", t.name) for t in threading.enumerate()}
+            collapsed = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < self.max_depth:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, "thread"))
+                collapsed.append(";".join(reversed(frames)))
+            with self._lock:
+                self.samples += 1
+                for stack in collapsed:
+                    if stack not in self._stacks and len(self._stacks) >= self.max_stacks:
+                        stack = "[truncated]"
+                    self._stacks[stack] = self._stacks.get(stack, 0) + 1
+
+    def collapsed(self, reset: bool = False) -> str:
+        with self._lock:
+            stacks = self._stacks
+            if reset:
+                self._stacks = {}
+                self.samples = 0
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
+
+
+# =============================================================================
+# Telemetry
+# =============================================================================
+
+class _Stage:
+    __slots__ = ("telemetry", "name", "start")
+
+    def __init__(self, telemetry: "Telemetry", name: str):
+        self.telemetry = telemetry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        telemetry = self.telemetry
+        telemetry.stage_seconds.observe_key(telemetry._stage_key(self.name), elapsed)
+        if exc_type is not None:
+            telemetry.stage_errors.inc(stage=self.name, error=exc_type.__name__, **telemetry._labels())
+        return False
+
+
+class Telemetry:
+    """
+    Metrics registry plus the middleware and routes that feed and expose it.
+
+    ``labels`` are constant labels added to every request/stage sample,
+    ``request_labels`` are label names the handlers fill in per request.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        labels: Optional[Dict[str, str]] = None,
+        request_labels: Tuple[str, ...] = (),
+        profile_hz: float = 0.0,
+    ):
+        self.namespace = namespace
+        self.const_labels = {name: str(value) for name, value in (labels or {}).items()}
+        self.request_labels = tuple(request_labels)
+        self._background = {"endpoint": "background", **self.const_labels}
+        self.metrics: List[Metric] = []
+        self._app: Optional[FastAPI] = None
+        self._routes: Dict[Tuple[str, str], str] = {}
+
+        extra = self._extra_labels = tuple(self.const_labels) + self.request_labels
+        self.request_seconds = self.histogram(
+            "request_duration_seconds", "Time from request start to the last response byte",
+            ("endpoint", "method", "status") + extra,
+        )
+        self.in_flight = self.gauge(
+            "requests_in_flight", "Requests currently being served", ("endpoint",) + tuple(self.const_labels)
+        )
+        self.request_errors = self.counter(
+            "request_errors_total", "Requests answered with status >= 400", ("endpoint", "status") + extra
+        )
+        self.stage_seconds = self.histogram(
+            "stage_duration_seconds", "Time spent in each processing stage of a request", ("endpoint", "stage") + extra
+        )
+        self.stage_errors = self.counter(
+            "stage_errors_total", "Exceptions raised out of a processing stage", ("endpoint", "stage", "error") + extra
+        )
+        self.profiler = SamplingProfiler(profile_hz) if profile_hz > 0 else None
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(f"{self.namespace}_{name}", help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(f"{self.namespace}_{name}", help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(f"{self.namespace}_{name}", help, labelnames, buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    # --- per-request state ---------------------------------------------------
+
+    def _labels(self) -> Dict[str, str]:
+        labels = _request_labels.get()
+        return self._background if labels is None else labels
+
+    def _stage_key(self, name: str) -> Tuple[str, ...]:
+        # Hot path: stage_seconds labels are ("endpoint", "stage", *const, *request)
+        labels = self._labels()
+        return (labels["endpoint"], name, *[labels.get(label, "") for label in self._extra_labels])
+
+    def set_labels(self, **values):
+        """Fill in per-request labels (names must be in ``request_labels``)"""
+        labels = _request_labels.get()
+        if labels is not None:
+            labels.update((name, str(value)) for name, value in values.items() if name in self.request_labels)
+
+    def stage(self, name: str) -> _Stage:
+        """Context manager timing one stage of the current request"""
+        return _Stage(self, name)
+
+    def observe_stage(self, name: str, seconds: float):
+        """Record a stage measured elsewhere (e.g. time spent queued for a thread)"""
+        self.stage_seconds.observe_key(self._stage_key(name), seconds)
+
+    # --- exposition ----------------------------------------------------------
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def route_for(self, scope) -> str:
+        """Route path template for a request, so path parameters don't become label values"""
+        key = (scope.get("method", ""), scope["path"])
+        path = self._routes.get(key)
+        if path is None:
+            path = "unmatched"
+            for route in self._app.router.routes:
+                match, _ = route.matches(scope)
+                if match == Match.FULL:
+                    path = getattr(route, "path", path)
+                    break
+            if path != "unmatched" and len(self._routes) < 1024:
+                self._routes[key] = path
+        return path
+
+    def instrument(self, app: FastAPI):
+        """Install the request middleware and the /metrics (and /debug/profile) routes"""
+        self._app = app
+        app.add_middleware(TelemetryMiddleware, telemetry=self)
+
+        async def metrics():
+            return PlainTextResponse(self.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+        app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+
+        if self.profiler is not None:
+            async def profile(reset: bool = False):
+                samples = self.profiler.samples
+                return PlainTextResponse(self.profiler.collapsed(reset), headers={"X-Profile-Samples": str(samples)})
+
+            app.add_api_route("/debug/profile", profile, methods=["GET"], include_in_schema=False)
+            self.profiler.start()
+
+
+class TelemetryMiddleware:
+    """ASGI middleware recording latency, in-flight count and errors per endpoint"""
+
+    def __init__(self, app, telemetry: Telemetry):
+        self.app = app
+        self.telemetry = telemetry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        telemetry = self.telemetry
+        endpoint = telemetry.route_for(scope)
+        labels = {"endpoint": endpoint, **telemetry.const_labels}
+        token = _request_labels.set(labels)
+        status = 500
+
+        async def send_and_record(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        telemetry.in_flight.inc(endpoint=endpoint, **telemetry.const_labels)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            elapsed = time.perf_counter() - start
+            telemetry.in_flight.dec(endpoint=endpoint, **telemetry.const_labels)
+            telemetry.request_seconds.observe(elapsed, method=scope["method"], status=status, **labels)
+            if status >= 400:
+                telemetry.request_errors.inc(status=status, **labels)
+            _request_labels.reset(token)
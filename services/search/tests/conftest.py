@@ -0,0 +1,49 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC_DIR = os.path.join(SERVICE_DIR, "src")
+
+# search_api reads its configuration at import time: the in-memory backend,
+# with snapshots and the SQLite files kept out of the tree
+_tmp = tempfile.mkdtemp(prefix="search-tests-")
+os.environ.setdefault("SEARCH_BACKEND", "memory")
+os.environ.setdefault("MEMORY_SNAPSHOT_DIR", os.path.join(_tmp, "snapshots"))
+os.environ.setdefault("MEMORY_FSYNC", "false")
+os.environ.setdefault("SQLITE_DB_PATH", os.path.join(_tmp, "search_index.db"))
+sys.path.insert(0, SRC_DIR)
+# bench.opensearch_standin stands in for a cluster in the OpenSearch backend tests
+sys.path.insert(0, SERVICE_DIR)
+
+_index_names = itertools.count()
+
+
+@pytest.fixture(scope="session")
+def api():
+    import search_api
+
+    return search_api
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(api, request, monkeypatch):
+    """Run a test against each local backend (both keep their indexes for the whole session)"""
+    monkeypatch.setattr(api, "SEARCH_BACKEND", request.param)
+    return request.param
+
+
+@pytest.fixture
+def client(api, backend):
+    from fastapi.testclient import TestClient
+
+    return TestClient(api.app)
+
+
+@pytest.fixture
+def index_name(request, backend):
+    """An index name of the test's own, so tests never see each other's documents"""
+    return f"{request.node.originalname[:40]}-{backend}-{next(_index_names)}"
@@ -0,0 +1,92 @@
+def upsert(client, index_name, documents):
+    response = client.post("/upsert", json={"documents": documents, "index_name": index_name})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def query(client, index_name, text="ledger"):
+    response = client.post("/query", json={"index_name": index_name, "query": text, "semantic_weight": 0})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def ids(response):
+    return [hit["id"] for hit in response["results"]]
+
+
+def test_repeated_query_is_served_from_the_cache(client, index_name):
+    upsert(client, index_name, [{"id": "a", "content": "ledger audit"}, {"id": "b", "content": "vector search"}])
+    first = query(client, index_name)
+    second = query(client, index_name)
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["results"] == first["results"]
+
+
+def test_upsert_bumps_the_generation_and_misses(api, client, index_name):
+    upsert(client, index_name, [{"id": "a", "content": "ledger audit"}])
+    assert query(client, index_name)["cached"] is False
+    assert query(client, index_name)["cached"] is True
+    generation = api.get_generation(index_name)
+
+    upsert(client, index_name, [{"id": "b", "content": "ledger entry"}])
+    assert api.get_generation(index_name) > generation
+    fresh = query(client, index_name)
+    assert fresh["cached"] is False
+    assert sorted(ids(fresh)) == ["a", "b"]
+
+
+def test_upsert_to_another_index_keeps_cached_entries(api, client, index_name):
+    other = index_name + "-other"
+    upsert(client, index_name, [{"id": "a", "content": "ledger audit"}])
+    upsert(client, other, [{"id": "x", "content": "ledger elsewhere"}])
+    query(client, index_name)
+    generation = api.get_generation(index_name)
+
+    upsert(client, other, [{"id": "y", "content": "another ledger"}])
+    assert api.get_generation(index_name) == generation
+    cached = query(client, index_name)
+    assert cached["cached"] is True
+    assert ids(cached) == ["a"]
+
+
+def test_unchanged_upsert_keeps_cached_entries(client, index_name):
+    documents = [{"id": "a", "content": "ledger audit"}]
+    upsert(client, index_name, documents)
+    query(client, index_name)
+    assert upsert(client, index_name, documents)["documents_unchanged"] == 1
+    assert query(client, index_name)["cached"] is True
+
+
+def test_entry_cap_evicts_least_recently_used(api):
+    cache = api.ResultCache(max_entries=2, max_bytes=1 << 20)
+    cache.put(("a",), [{"id": "a"}])
+    cache.put(("b",), [{"id": "b"}])
+    assert cache.get(("a",)) is not None  # now "b" is the least recently used
+    cache.put(("c",), [{"id": "c"}])
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) == [{"id": "a"}] and cache.get(("c",)) == [{"id": "c"}]
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+
+
+def test_byte_cap_evicts_and_skips_oversized_results(api):
+    results = [{"id": "x" * 40}]
+    size = len(api.json.dumps(results))
+    cache = api.ResultCache(max_entries=100, max_bytes=size * 2)
+    for key in ("a", "b", "c"):
+        cache.put((key,), results)
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] == size * 2 and stats["evictions"] == 1
+    assert cache.get(("a",)) is None
+
+    cache.put(("huge",), [{"id": "x" * size * 3}])
+    assert cache.get(("huge",)) is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_capped_cache_evicts_query_results(api, client, index_name, monkeypatch):
+    monkeypatch.setattr(api, "_query_cache", api.ResultCache(max_entries=1, max_bytes=1 << 20))
+    upsert(client, index_name, [{"id": "a", "content": "ledger audit"}, {"id": "b", "content": "vector search"}])
+    query(client, index_name, "ledger")
+    query(client, index_name, "vector")
+    assert query(client, index_name, "ledger")["cached"] is False
+    assert api._query_cache.stats()["evictions"] >= 1
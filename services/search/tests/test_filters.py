@@ -0,0 +1,66 @@
+import pytest
+
+INDEX = "filters"
+DOCUMENTS = [
+    {"id": f"doc-{i:02d}", "content": f"ledger entry {i}",
+     "metadata": {"kind": ("invoice", "receipt", "refund")[i % 3], "amount": i * 10, "posted": f"2024-0{1 + i % 9}-15",
+                  "tags": ["even" if i % 2 == 0 else "odd", f"q{1 + i % 4}"], "flagged": i % 5 == 0}}
+    for i in range(30)
+]
+
+FILTERS = [
+    ({"kind": "invoice"}, lambda m: m["kind"] == "invoice"),
+    ({"flagged": True}, lambda m: m["flagged"]),
+    ({"tags": "odd"}, lambda m: "odd" in m["tags"]),
+    ({"kind": ["receipt", "refund"]}, lambda m: m["kind"] != "invoice"),
+    ({"tags": ["q1", "q3"]}, lambda m: "q1" in m["tags"] or "q3" in m["tags"]),
+    ({"amount": {"gte": 50, "lt": 200}}, lambda m: 50 <= m["amount"] < 200),
+    ({"posted": {"gte": "2024-03-01", "lt": "2024-06-01"}}, lambda m: "2024-03" <= m["posted"][:7] < "2024-06"),
+    ({"kind": "refund", "amount": {"gte": 100}}, lambda m: m["kind"] == "refund" and m["amount"] >= 100),
+    ({"kind": "missing"}, lambda m: False),
+]
+
+
+@pytest.fixture(scope="module")
+def clients(api):
+    from fastapi.testclient import TestClient
+
+    clients = {}
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for backend in ("memory", "sqlite"):
+            monkeypatch.setattr(api, "SEARCH_BACKEND", backend)
+            client = TestClient(api.app)
+            response = client.post("/upsert", json={"documents": DOCUMENTS, "index_name": INDEX})
+            assert response.status_code == 200, response.text
+            clients[backend] = client
+    return clients
+
+
+def matching_ids(api, monkeypatch, client, backend, filters, **weights):
+    monkeypatch.setattr(api, "SEARCH_BACKEND", backend)
+    response = client.post("/query", json={"index_name": INDEX, "query": "ledger", "limit": 100, "rank_window": 100,
+                                           "filters": filters, "fields": [], **weights})
+    assert response.status_code == 200, response.text
+    return {hit["id"] for hit in response.json()["results"]}
+
+
+@pytest.mark.parametrize("filters, keep", FILTERS)
+@pytest.mark.parametrize("weights", [{"semantic_weight": 0}, {"lexical_weight": 0}, {}])
+def test_backends_agree_on_filtered_ids(api, monkeypatch, clients, filters, keep, weights):
+    expected = {doc["id"] for doc in DOCUMENTS if keep(doc["metadata"])}
+    for backend, client in clients.items():
+        assert matching_ids(api, monkeypatch, client, backend, filters, **weights) == expected, backend
+
+
+@pytest.mark.parametrize("filters", [
+    {"kind": {"ne": "invoice"}},
+    {"kind": {"exists": True}},
+    {"kind": {"in": "invoice"}},
+    {"kind": {"eq": {"nested": 1}}},
+])
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_unsupported_filters_are_rejected(api, monkeypatch, clients, backend, filters):
+    monkeypatch.setattr(api, "SEARCH_BACKEND", backend)
+    response = clients[backend].post("/query", json={"index_name": INDEX, "query": "ledger", "filters": filters})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("invalid_filter:")
@@ -0,0 +1,66 @@
+import gzip
+import json
+
+import pytest
+
+
+def ndjson(count, start=0):
+    return b"".join(
+        json.dumps({"id": f"doc-{i:03d}", "content": f"ledger entry {i}", "metadata": {"n": i}}).encode() + b"\n"
+        for i in range(start, start + count)
+    )
+
+
+def stream(client, index_name, body, headers=None, **params):
+    response = client.post("/upsert/stream", params={"index_name": index_name, **params}, content=body, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def chunks(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def count(client, index_name):
+    return client.get("/stats").json()["indexes"][index_name]["documents"]
+
+
+def test_progress_per_batch_then_done(client, index_name):
+    events = stream(client, index_name, ndjson(25), batch_size=10)
+    assert [e["event"] for e in events] == ["progress", "progress", "progress", "done"]
+    assert [e["documents_processed"] for e in events] == [10, 20, 25, 25]
+    assert events[-1]["batches"] == 3 and events[-1]["errors"] == 0
+    assert count(client, index_name) == 25
+
+    again = stream(client, index_name, ndjson(25), batch_size=10)[-1]
+    assert (again["documents_processed"], again["documents_unchanged"]) == (25, 25)
+
+
+def test_lines_split_across_body_chunks(client, index_name):
+    events = stream(client, index_name, chunks(ndjson(30), 7), batch_size=8)
+    assert events[-1]["event"] == "done" and events[-1]["documents_processed"] == 30
+    assert count(client, index_name) == 30
+
+
+@pytest.mark.parametrize("how", ["detected", "header", "param"])
+def test_gzip_bodies(client, index_name, how):
+    body = gzip.compress(ndjson(40))
+    headers = {"content-encoding": "gzip"} if how == "header" else None
+    params = {"gzip": "true"} if how == "param" else {}
+    events = stream(client, index_name, chunks(body, 64), headers=headers, batch_size=15, **params)
+    assert events[-1]["event"] == "done"
+    assert events[-1]["documents_processed"] == 40 and events[-1]["errors"] == 0
+    assert count(client, index_name) == 40
+
+
+def test_malformed_lines_are_counted_without_aborting(client, index_name):
+    body = ndjson(3) + b'{"id": "broken", "content": \n' + b"[1, 2]\n" + b"\n" + ndjson(4, start=3)
+    events = stream(client, index_name, body, batch_size=100)
+    errors = [e for e in events if e["event"] == "error"]
+    assert [e["line"] for e in errors] == [4, 5]
+    assert events[-1]["event"] == "done"
+    assert (events[-1]["documents_processed"], events[-1]["errors"]) == (7, 2)
+    assert count(client, index_name) == 7
+
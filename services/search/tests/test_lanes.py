@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+
+async def fill(lane, gate):
+    """Block every worker and queue slot of ``lane`` on ``gate``"""
+    blocked = [asyncio.ensure_future(lane.run(gate.wait, 5)) for _ in range(lane.workers + lane.queue_depth)]
+    while lane.in_flight < len(blocked):
+        await asyncio.sleep(0.01)
+    return blocked
+
+
+def test_saturated_read_lane_answers_429_until_a_call_finishes(api, backend, index_name, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    assert TestClient(api.app).post("/upsert", json={
+        "documents": [{"id": "d1", "content": "hello lanes"}], "index_name": index_name,
+    }).status_code == 200
+    lane = api.WorkLane("search-read", 2, 1)
+    monkeypatch.setattr(api, "_read_lane", lane)
+    monkeypatch.setattr(api, "_query_cache", api.ResultCache(0, 0))
+    gate = threading.Event()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://search") as client:
+            blocked = await fill(lane, gate)
+            response = await client.post("/query", json={"query": "hello", "index_name": index_name})
+            assert response.status_code == 429
+            assert response.headers["Retry-After"] == "1"
+            assert response.json()["detail"] == "overloaded: search-read queue is full, retry later"
+            assert lane.rejected == 1 and lane.in_flight == 3
+
+            gate.set()
+            assert await asyncio.gather(*blocked) == [True] * 3
+            assert lane.in_flight == 0
+            response = await client.post("/query", json={"query": "hello", "index_name": index_name})
+            assert response.status_code == 200, response.text
+            assert [hit["id"] for hit in response.json()["results"]] == ["d1"]
+            lanes = (await client.get("/stats")).json()["lanes"]
+            assert lanes["read"]["rejected"] == 1 and lanes["read"]["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_in_flight_is_released_after_success_and_failure(api):
+    lane = api.WorkLane("test", 1, 0)
+
+    def fail():
+        raise ValueError("boom")
+
+    async def scenario():
+        assert await lane.run(lambda: "done") == "done"
+        with pytest.raises(ValueError):
+            await lane.run(fail)
+        assert (lane.in_flight, lane.completed, lane.rejected) == (0, 2, 0)
+
+        gate = threading.Event()
+        blocked = await fill(lane, gate)
+        with pytest.raises(api.HTTPException) as rejected:
+            await lane.run(lambda: "never")
+        assert rejected.value.status_code == 429 and rejected.value.headers == {"Retry-After": "1"}
+        # Work already admitted for a request skips admission control
+        gate.set()
+        assert await lane.run(lambda: "admitted", admit=False) == "admitted"
+        await asyncio.gather(*blocked)
+        assert lane.stats() == {"workers": 1, "queue_depth": 0, "in_flight": 0, "completed": 4, "rejected": 1}
+
+    asyncio.run(scenario())
+    lane.shutdown()
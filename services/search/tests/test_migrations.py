@@ -0,0 +1,66 @@
+import json
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def old_database(api, tmp_path, monkeypatch):
+    """A version-0 database (documents_fts only) that the pool opens next"""
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE VIRTUAL TABLE documents_fts USING fts5(id, content, metadata, tokenize='porter')")
+    conn.executemany("INSERT INTO documents_fts (id, content, metadata) VALUES (?, ?, ?)", [
+        ("old-1", "quokka ledger from before the id map", json.dumps({"kind": "invoice", "amount": 10})),
+        ("old-2", "quokka receipt from before the id map", json.dumps({"kind": "receipt", "amount": 20})),
+        ("old-3", "unrelated note", None),
+    ])
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(api, "SEARCH_BACKEND", "sqlite")
+    monkeypatch.setattr(api, "SQLITE_DB_PATH", path)
+    monkeypatch.setattr(api, "_sqlite_pool", None)
+    monkeypatch.setattr(api, "_sqlite_indexes", {})
+    yield path
+    api.close_sqlite_pool()
+
+
+def test_version_0_database_is_migrated_in_place(api, old_database):
+    pool = api.get_sqlite_pool()
+    with pool.reader() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 4
+        assert [tuple(row) for row in conn.execute("SELECT rowid, doc_id FROM documents_ids ORDER BY rowid")] == [
+            (1, "old-1"), (2, "old-2"), (3, "old-3"),
+        ]
+        assert sorted(tuple(row) for row in conn.execute("SELECT doc_rowid, key, value_text, value_num FROM documents_meta")) == [
+            (1, "amount", None, 10.0), (1, "kind", "invoice", None),
+            (2, "amount", None, 20.0), (2, "kind", "receipt", None),
+        ]
+        # The existing documents become the single shard of the default index
+        assert tuple(conn.execute("SELECT name, shards, generation FROM search_indexes").fetchone()) == (
+            api.DEFAULT_INDEX_NAME, 1, 0,
+        )
+
+
+def test_migrated_documents_are_searchable_and_filterable(api, old_database):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(api.app)
+    response = client.post("/query", json={"query": "quokka", "semantic_weight": 0, "filters": {"amount": {"gte": 15}}})
+    assert response.status_code == 200, response.text
+    assert [hit["id"] for hit in response.json()["results"]] == ["old-2"]
+
+    response = client.post("/upsert", json={"documents": [{"id": "old-1", "content": "quokka rewritten"}]})
+    assert response.status_code == 200, response.text
+    with api.get_sqlite_pool().reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM documents_fts WHERE id = 'old-1'").fetchone()[0] == 1
+
+
+def test_migration_runs_once(api, old_database):
+    api.get_sqlite_pool()
+    api.close_sqlite_pool()
+    api.init_sqlite_fts(api.get_sqlite_pool())
+    with api.get_sqlite_pool().reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM documents_meta").fetchone()[0] == 4
+        assert conn.execute("SELECT COUNT(*) FROM search_indexes").fetchone()[0] == 1
@@ -0,0 +1,165 @@
+import httpx
+import pytest
+
+from bench.opensearch_standin import create_app
+
+INDEX = "os-paging"
+
+
+def document(i):
+    return {"id": f"doc-{i:03d}", "content": f"alpha {'beta ' * (i % 4)}gamma {i % 5}",
+            "metadata": {"group": i % 3, "n": i, "tag": ("red", "green", "blue")[i % 3]}}
+
+
+def connect(api, monkeypatch, reject_rate=0.0):
+    """Point the OpenSearch backend at a fresh stand-in; returns a client and the paths the backend called"""
+    from fastapi.testclient import TestClient
+
+    calls = []
+
+    async def record(request):
+        calls.append(request.url.path)
+
+    client = httpx.AsyncClient(
+        base_url="http://standin",
+        transport=httpx.ASGITransport(app=create_app(reject_rate=reject_rate, seed=7)),
+        event_hooks={"request": [record]},
+    )
+    monkeypatch.setattr(api, "SEARCH_BACKEND", "opensearch")
+    monkeypatch.setattr(api, "OPENSEARCH_ENABLED", True)
+    monkeypatch.setattr(api, "_os_client", client)
+    monkeypatch.setattr(api, "_os_indexes", set())
+    monkeypatch.setattr(api, "_os_health", (0.0, "unknown"))
+    monkeypatch.setattr(api, "_os_health_probe", None)
+    return TestClient(api.app), calls
+
+
+def upsert(client, documents, index_name=INDEX):
+    return client.post("/upsert", json={"documents": documents, "index_name": index_name})
+
+
+@pytest.fixture(scope="module")
+def client(api):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        client, _ = connect(api, monkeypatch)
+        response = upsert(client, [document(i) for i in range(40)])
+        assert response.status_code == 200, response.text
+        yield client
+
+
+def query(client, **body):
+    response = client.post("/query", json={"index_name": INDEX, "fields": [], **body})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def ranking(client, **body):
+    return [(hit["id"], hit["score"]) for hit in query(client, limit=100, **body)["results"]]
+
+
+def pages(client, limit, **body):
+    found, cursor = [], None
+    while True:
+        page = query(client, limit=limit, search_after=cursor, **body)
+        found.append([(hit["id"], hit["score"]) for hit in page["results"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return found
+
+
+def test_bulk_bodies_respect_the_document_and_byte_caps(api, monkeypatch):
+    client, calls = connect(api, monkeypatch)
+    monkeypatch.setattr(api, "OPENSEARCH_BULK_DOCS", 10)
+    assert upsert(client, [document(i) for i in range(35)], "os-bulk").status_code == 200
+    assert calls.count("/_bulk") == 4
+
+    calls.clear()
+    monkeypatch.setattr(api, "OPENSEARCH_BULK_BYTES", 1)
+    response = upsert(client, [{**document(i), "content": f"rewritten {i}"} for i in range(5)], "os-bulk")
+    assert response.status_code == 200, response.text
+    assert calls.count("/_bulk") == 5  # one document per body once any two exceed the byte cap
+    assert client.get("/stats").json()["indexes"]["os-bulk"]["documents"] == 35
+
+
+def test_rejected_bulk_items_are_retried(api, monkeypatch):
+    client, calls = connect(api, monkeypatch, reject_rate=0.3)
+    monkeypatch.setattr(api, "OPENSEARCH_BULK_RETRIES", 8)
+    response = upsert(client, [document(i) for i in range(40)], "os-retry")
+    assert response.status_code == 200, response.text
+    assert response.json()["documents_processed"] == 40
+    assert calls.count("/_bulk") > 1
+    assert client.get("/stats").json()["indexes"]["os-retry"]["documents"] == 40
+
+
+def test_items_still_rejected_after_the_retries_fail_the_upsert(api, monkeypatch):
+    client, calls = connect(api, monkeypatch, reject_rate=1.0)
+    monkeypatch.setattr(api, "OPENSEARCH_BULK_RETRIES", 1)
+    response = upsert(client, [document(i) for i in range(3)], "os-rejected")
+    assert response.status_code == 502
+    assert response.json()["detail"].startswith("opensearch_bulk_failed: 3 of 3 documents were rejected")
+    assert calls.count("/_bulk") == 2
+
+
+def test_hybrid_query_fuses_both_legs_of_one_msearch(api, client):
+    window = 12
+    lexical = ranking(client, query="alpha beta", semantic_weight=0)[:window]
+    semantic = ranking(client, query="alpha beta", lexical_weight=0)[:window]
+    expected = api.fuse_results([(lexical, 1.0), (semantic, 0.5)], 5)
+
+    hits = query(client, query="alpha beta", limit=5, semantic_weight=0.5, rank_window=window)["results"]
+    assert [(hit["id"], hit["score"]) for hit in hits] == expected
+
+
+@pytest.mark.parametrize("filters, keep", [
+    ({"group": 1}, lambda i: i % 3 == 1),
+    ({"tag": ["red", "blue"]}, lambda i: i % 3 != 1),
+    ({"n": {"gte": 10, "lt": 25}}, lambda i: 10 <= i < 25),
+])
+@pytest.mark.parametrize("weights", [{"lexical_weight": 0}, {"semantic_weight": 0}, {}])
+def test_filters_are_translated_for_every_leg(client, filters, keep, weights):
+    hits = query(client, query="alpha", limit=100, rank_window=100, filters=filters, **weights)["results"]
+    assert {hit["id"] for hit in hits} == {document(i)["id"] for i in range(40) if keep(i)}
+
+
+@pytest.mark.parametrize("body", [
+    {"query": "alpha beta", "semantic_weight": 0},
+    {"query": "gamma", "semantic_weight": 0, "filters": {"group": 1}},
+    {"query": "alpha beta", "lexical_weight": 0},
+    {"query": "alpha beta", "lexical_weight": 0, "filters": {"n": {"lt": 30}}},
+])
+def test_single_leg_pages_concatenate_to_the_full_ranking(client, body):
+    full = ranking(client, **body)
+    paged = pages(client, 7, **body)
+    assert all(len(page) == 7 for page in paged[:-1])
+    assert [hit for page in paged for hit in page] == full
+    assert len({doc_id for doc_id, _ in full}) == len(full)
+
+
+def test_semantic_pages_are_not_cut_off_at_the_window(client):
+    paged = pages(client, 7, query="alpha beta", lexical_weight=0)
+    assert sum(len(page) for page in paged) == 40
+
+
+def test_hybrid_pages_stay_within_the_rank_window(client):
+    body = {"query": "alpha beta gamma", "rank_window": 12}
+    paged = [hit for page in pages(client, 5, **body) for hit in page]
+    assert paged == ranking(client, **body)
+    assert len(paged) == len({doc_id for doc_id, _ in paged})
+
+
+def test_health_probes_the_cluster_once_per_ttl(api, monkeypatch):
+    client, calls = connect(api, monkeypatch)
+    for _ in range(3):
+        response = client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["opensearch_status"] == "green"
+    assert calls.count("/_cluster/health") == 1
+
+    monkeypatch.setattr(api, "_os_health", (api._os_health[0] - api.OPENSEARCH_HEALTH_TTL, "green"))
+    client.get("/health")
+    assert calls.count("/_cluster/health") == 2
+
+
+@pytest.mark.parametrize("weights", [{}, {"lexical_weight": 0}])
+def test_query_matching_nothing_returns_nothing(client, weights):
+    assert query(client, query="zzqx nonsense", **weights)["results"] == []
@@ -0,0 +1,70 @@
+import pytest
+
+INDEX = "paging"
+
+
+@pytest.fixture(scope="module")
+def client(api):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(api.app)
+    # Repeated contents give equal scores, so pages must split ties by id
+    documents = [
+        {"id": f"doc-{i:03d}", "content": f"alpha {'beta ' * (i % 4)}gamma {i % 5}", "metadata": {"group": i % 3}}
+        for i in range(40)
+    ]
+    response = client.post("/upsert", json={"documents": documents, "index_name": INDEX})
+    assert response.status_code == 200, response.text
+    return client
+
+
+def query(client, **body):
+    response = client.post("/query", json={"index_name": INDEX, "fields": [], **body})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def pages(client, limit, **body):
+    """Every page of a query, following next_cursor until it runs out"""
+    found, cursor = [], None
+    while True:
+        page = query(client, limit=limit, search_after=cursor, **body)
+        found.append([(hit["id"], hit["score"]) for hit in page["results"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return found
+
+
+@pytest.mark.parametrize("body", [
+    {"query": "alpha beta", "semantic_weight": 0},
+    {"query": "gamma", "semantic_weight": 0, "filters": {"group": 1}},
+    {"query": "alpha beta", "lexical_weight": 0},
+])
+def test_pages_concatenate_to_the_full_ranking(client, body):
+    full = [(hit["id"], hit["score"]) for hit in query(client, limit=100, **body)["results"]]
+    paged = pages(client, 7, **body)
+    assert all(len(page) == 7 for page in paged[:-1])
+    assert [hit for page in paged for hit in page] == full
+    assert len({doc_id for doc_id, _ in full}) == len(full)
+
+
+def test_hybrid_pages_stay_within_the_rank_window(client):
+    body = {"query": "alpha beta gamma", "rank_window": 12}
+    paged = [hit for page in pages(client, 5, **body) for hit in page]
+    assert paged == [(hit["id"], hit["score"]) for hit in query(client, limit=100, **body)["results"]]
+    assert len(paged) == len({doc_id for doc_id, _ in paged})
+
+
+def test_cursor_of_another_query_is_rejected(client):
+    cursor = query(client, query="alpha", limit=3, semantic_weight=0)["next_cursor"]
+    response = client.post("/query", json={"index_name": INDEX, "query": "gamma", "limit": 3, "semantic_weight": 0,
+                                           "search_after": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("invalid_cursor:")
+
+
+def test_malformed_cursor_is_rejected(client):
+    response = client.post("/query", json={"index_name": INDEX, "query": "alpha", "search_after": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("invalid_cursor:")
+
@@ -0,0 +1,177 @@
+import math
+
+import numpy as np
+import pytest
+
+DOCUMENTS = [
+    {"id": "d1", "content": "hello world, the first program in every language"},
+    {"id": "d2", "content": "asyncio event loops schedule coroutines and callbacks"},
+    {"id": "d3", "content": "BM25 ranks documents by term frequency and rarity"},
+    {"id": "d4", "content": "ledger audit trail for quarterly finance reviews"},
+]
+
+
+@pytest.fixture
+def corpus(client, index_name):
+    response = client.post("/upsert", json={"documents": DOCUMENTS, "index_name": index_name})
+    assert response.status_code == 200, response.text
+    return index_name
+
+
+def query(client, index_name, text, **body):
+    response = client.post("/query", json={"index_name": index_name, "query": text, **body})
+    assert response.status_code == 200, response.text
+    return [hit["id"] for hit in response.json()["results"]]
+
+
+@pytest.mark.parametrize("weights", [{}, {"lexical_weight": 0}])
+def test_query_matching_nothing_returns_nothing(client, corpus, weights):
+    assert query(client, corpus, "zzqx nonsense", **weights) == []
+
+
+def test_hybrid_query_returns_only_related_documents(client, corpus):
+    assert query(client, corpus, "hello") == ["d1"]
+    assert query(client, corpus, "ledger audits") == ["d4"]
+
+
+def test_min_similarity_can_be_lowered_per_request(client, corpus):
+    strangers = query(client, corpus, "zzqx nonsense", lexical_weight=0, min_similarity=0)
+    assert strangers and set(strangers) <= {"d1", "d2", "d3", "d4"}
+
+
+@pytest.mark.parametrize("min_similarity", [-0.5, 1.5])
+def test_min_similarity_must_be_between_0_and_1(client, corpus, min_similarity):
+    response = client.post("/query", json={"index_name": corpus, "query": "hello", "min_similarity": min_similarity})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("invalid_min_similarity:")
+
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+@pytest.mark.parametrize("weights", [{}, {"lexical_weight": 0}, {"semantic_weight": 0}])
+def test_limit_below_one_is_rejected(client, corpus, limit, weights):
+    response = client.post("/query", json={"index_name": corpus, "query": "hello", "limit": limit, **weights})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "invalid_limit: limit must be at least 1"
+
+
+def bm25(tf, df, n_docs, doc_len, avgdl, k1=1.2, b=0.75):
+    idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+    return idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * doc_len / avgdl))
+
+
+@pytest.fixture
+def inverted(api):
+    index = api.InvertedIndex()
+    index.add("a", "apple apple banana")
+    index.add("b", "apple cherry cherry cherry cherry")
+    index.add("c", "banana")
+    return index
+
+
+def test_bm25_scores_match_the_formula(inverted):
+    avgdl = (3 + 5 + 1) / 3
+    hits = dict(inverted.search("apple banana", 10))
+    assert hits["a"] == pytest.approx(bm25(2, 2, 3, 3, avgdl) + bm25(1, 2, 3, 3, avgdl))
+    assert hits["b"] == pytest.approx(bm25(1, 2, 3, 5, avgdl))
+    assert hits["c"] == pytest.approx(bm25(1, 2, 3, 1, avgdl))
+    # Repeated query terms count once
+    assert dict(inverted.search("apple apple", 10)) == dict(inverted.search("apple", 10))
+
+
+def test_bm25_favours_rare_terms_and_short_documents(inverted):
+    # cherry is in one document, apple in two
+    assert dict(inverted.search("cherry", 10))["b"] > dict(inverted.search("apple", 10))["b"]
+    # Same term frequency, shorter document
+    assert [doc_id for doc_id, _ in inverted.search("banana", 10)] == ["c", "a"]
+
+
+def test_bm25_reupsert_and_remove_update_the_statistics(api, inverted):
+    inverted.add("b", "banana")
+    assert inverted.total_len == 3 + 1 + 1
+    assert "cherry" not in inverted.postings
+    assert inverted.search("cherry", 10) == []
+    assert dict(inverted.search("banana", 10))["b"] == dict(inverted.search("banana", 10))["c"]
+
+    inverted.remove("a")
+    assert len(inverted) == 2 and inverted.total_len == 2
+    assert "apple" not in inverted.postings
+
+
+def test_bm25_allowed_set_and_cursor(inverted):
+    assert [doc_id for doc_id, _ in inverted.search("apple banana", 10, allowed={"b", "c"})] == ["c", "b"]
+    full = inverted.search("apple banana", 10)
+    assert inverted.search("apple banana", 10, after=full[0]) == full[1:]
+    assert inverted.search("apple banana", 0) == []
+
+
+def test_rrf_sums_weighted_reciprocal_ranks(api):
+    lexical = [("a", 9.0), ("b", 5.0), ("c", 1.0)]
+    semantic = [("c", 0.9), ("a", 0.8)]
+    fused = dict(api.fuse_results([(lexical, 1.0), (semantic, 0.5)], 10, k=60))
+    assert fused == pytest.approx({"a": 1 / 61 + 0.5 / 62, "b": 1 / 62, "c": 1 / 63 + 0.5 / 61})
+    # Only ranks matter, not the legs' raw scores
+    rescaled = [(doc_id, score * 100) for doc_id, score in lexical]
+    assert api.fuse_results([(rescaled, 1.0), (semantic, 0.5)], 10, k=60) == api.fuse_results(
+        [(lexical, 1.0), (semantic, 0.5)], 10, k=60)
+
+
+def test_rrf_weights_decide_which_leg_leads(api):
+    lexical = [("a", 1.0), ("b", 0.5)]
+    semantic = [("b", 1.0), ("a", 0.5)]
+    assert [doc_id for doc_id, _ in api.fuse_results([(lexical, 1.0), (semantic, 0.5)], 2)] == ["a", "b"]
+    assert [doc_id for doc_id, _ in api.fuse_results([(lexical, 0.5), (semantic, 1.0)], 2)] == ["b", "a"]
+    # Equal weights tie, and the id order breaks it
+    assert [doc_id for doc_id, _ in api.fuse_results([(lexical, 1.0), (semantic, 1.0)], 2)] == ["a", "b"]
+
+
+def test_rrf_limit_and_cursor(api):
+    legs = [([(f"d{i}", 1.0 / (i + 1)) for i in range(6)], 1.0)]
+    fused = api.fuse_results(legs, 6)
+    assert api.fuse_results(legs, 2) == fused[:2]
+    assert api.fuse_results(legs, 10, after=fused[1]) == fused[2:]
+
+
+@pytest.fixture
+def vectors(api):
+    index = api.VectorIndex(2)
+    index.upsert(["z", "b", "a", "c", "d"], np.array(
+        [[1.0, 0.0], [1.0, 0.0], [1.0, 0.0], [0.6, 0.8], [-1.0, 0.0]], dtype=np.float32))
+    return index
+
+
+def test_cosine_top_k_breaks_ties_at_the_cut_by_id(vectors):
+    query = np.array([[1.0, 0.0]], dtype=np.float32)
+    assert vectors.search(query, 2) == [[("a", 1.0), ("b", 1.0)]]
+    assert vectors.search(query, 3) == [[("a", 1.0), ("b", 1.0), ("z", 1.0)]]
+    # Paging from inside the tie continues with the next id, then the next score
+    assert vectors.search(query, 2, after=("b", 1.0)) == [[("z", 1.0), ("c", pytest.approx(0.6))]]
+
+
+def test_cosine_top_k_drops_non_positive_and_below_the_floor(vectors):
+    query = np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+    assert vectors.search(query, 10) == [
+        [("a", 1.0), ("b", 1.0), ("z", 1.0), ("c", pytest.approx(0.6))],
+        [("c", pytest.approx(0.8))],
+    ]
+    assert vectors.search(query, 10, min_similarity=0.7)[0] == [("a", 1.0), ("b", 1.0), ("z", 1.0)]
+    assert vectors.search(query, 10, allowed_ids={"c", "d"})[0] == [("c", pytest.approx(0.6))]
+
+
+def test_removed_rows_are_recycled(vectors):
+    vectors.remove(["a"])
+    assert len(vectors) == 4
+    vectors.upsert(["e"], np.array([[0.0, 1.0]], dtype=np.float32))
+    assert vectors._size == 5
+    assert vectors.search(np.array([[1.0, 0.0]], dtype=np.float32), 2) == [[("b", 1.0), ("z", 1.0)]]
+
+
+def test_hashing_embedder_is_deterministic_and_normalised(api):
+    first, second = api.HashingEmbedder(64), api.HashingEmbedder(64)
+    vectors = first.embed(["ledger audits", "Ledger audits", "", "asyncio loops"])
+    assert np.array_equal(vectors, second.embed(["ledger audits", "Ledger audits", "", "asyncio loops"]))
+    assert np.allclose(np.linalg.norm(vectors, axis=1), [1.0, 1.0, 0.0, 1.0])
+    assert np.array_equal(vectors[0], vectors[1])
+    # Shared stems and trigrams land close together; unrelated words do not
+    audit = first.embed(["ledger audit"])[0]
+    assert audit @ vectors[0] > 0.5 > abs(audit @ vectors[3])
@@ -0,0 +1,62 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def sharded(api, monkeypatch):
+    monkeypatch.setattr(api, "SEARCH_SHARDS", 4)
+
+
+def upsert(client, index_name, documents):
+    response = client.post("/upsert", json={"documents": documents, "index_name": index_name})
+    assert response.status_code == 200, response.text
+
+
+def query(client, index_name, text, **body):
+    response = client.post("/query", json={"index_name": index_name, "query": text, "limit": 100, **body})
+    assert response.status_code == 200, response.text
+    return response.json()["results"]
+
+
+def test_unknown_index_is_404_and_malformed_name_is_400(client, index_name):
+    response = client.post("/query", json={"index_name": index_name + "-missing", "query": "ledger"})
+    assert response.status_code == 404
+    assert response.json()["detail"].startswith("index_not_found:")
+
+    for name in ("-leading-dash", "has space", "x" * 65, "slash/name"):
+        for path, body in (("/query", {"query": "ledger"}), ("/upsert", {"documents": []})):
+            response = client.post(path, json={"index_name": name, **body})
+            assert response.status_code == 400, (path, name)
+            assert response.json()["detail"].startswith("invalid_index_name:")
+
+
+def test_documents_stay_in_their_own_index(client, index_name):
+    other = index_name + "-other"
+    upsert(client, index_name, [{"id": f"doc-{i}", "content": f"ledger audit {i}"} for i in range(12)])
+    upsert(client, other, [{"id": f"doc-{i}", "content": f"ledger elsewhere {i}"} for i in range(3)])
+
+    hits = query(client, index_name, "ledger", semantic_weight=0)
+    assert len(hits) == 12 and all("audit" in hit["content"] for hit in hits)
+    hits = query(client, other, "ledger", semantic_weight=0)
+    assert len(hits) == 3 and all("elsewhere" in hit["content"] for hit in hits)
+
+
+@pytest.mark.parametrize("weights", [{"semantic_weight": 0}, {"lexical_weight": 0}, {}])
+def test_merged_hits_are_in_score_order_without_duplicates(client, index_name, weights):
+    documents = [{"id": f"doc-{i:02d}", "content": f"ledger {'audit ' * (i % 5)}entry {i % 7}"} for i in range(40)]
+    upsert(client, index_name, documents)
+
+    hits = [(hit["id"], hit["score"]) for hit in query(client, index_name, "ledger", rank_window=100, **weights)]
+    assert len(hits) == 40
+    assert len({doc_id for doc_id, _ in hits}) == 40
+    assert hits == sorted(hits, key=lambda hit: (-hit[1], hit[0]))
+
+    top = [(hit["id"], hit["score"]) for hit in query(client, index_name, "ledger", limit=7, rank_window=100, **weights)]
+    assert top == hits[:7]
+
+
+def test_shard_counts_add_up_to_the_index_total(client, index_name):
+    upsert(client, index_name, [{"id": f"doc-{i}", "content": f"ledger {i}"} for i in range(50)])
+    stats = client.get("/stats").json()["indexes"][index_name]
+    assert len(stats["shards"]) == 4
+    assert sum(shard["documents"] for shard in stats["shards"]) == stats["documents"] == 50
+    assert sum(1 for shard in stats["shards"] if shard["documents"]) > 1
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+
+def document(i):
+    topic = ("ledger audit", "vector search", "bm25 ranking")[i % 3]
+    return {"id": f"doc-{i:03d}", "content": f"{topic} note {i} about {topic.split()[0]}", "metadata": {"n": i, "topic": topic}}
+
+
+def ranking(index, query):
+    """Every shard's hits for ``query``, as one list in hit order"""
+    return sorted((hit for shard in index.shards for hit in shard.search(query, 50, [])), key=lambda h: (-h[1], h[0]))
+
+
+def reload(api, index):
+    loaded = api.load_memory_index(api.memory_index_dir(index.name))
+    loaded._log.close()
+    loaded._log = None
+    return loaded
+
+
+@pytest.fixture
+def index(api, request):
+    name = request.node.name.replace("[", "-").replace("]", "")
+    api.upsert_memory([document(i) for i in range(30)], index_name=name, shards=2)
+    index = api.get_memory_index(name)
+    yield index
+    index._log.close()
+    index._log = None
+    del api._memory_indexes[name]
+
+
+def test_log_replay_restores_every_upsert(api, index):
+    api.upsert_memory([document(i) for i in range(30, 40)], index_name=index.name)
+    loaded = reload(api, index)
+    assert len(loaded) == 40
+    assert loaded.seq == index.seq
+    assert loaded.log_documents == 40
+    for query in ("ledger", "bm25 ranking", "note 7"):
+        assert ranking(loaded, query) == ranking(index, query)
+
+
+def test_snapshot_plus_log_matches_the_live_index(api, index):
+    seq = api.checkpoint_memory_index(index)
+    assert seq == index.seq and index.log_documents == 0
+    api.upsert_memory([document(i) for i in range(30, 36)] + [{**document(3), "content": "rewritten ledger entry"}],
+                      index_name=index.name)
+
+    loaded = reload(api, index)
+    assert loaded.snapshot_seq == seq
+    assert loaded.log_documents == 7
+    assert len(loaded) == 36
+    assert loaded.get("doc-003")["content"] == "rewritten ledger entry"
+    assert loaded.document_hashes(["doc-003", "doc-035"]) == index.document_hashes(["doc-003", "doc-035"])
+    vector_search = api.parse_filters({"topic": "vector search"})
+    assert len(loaded.match(vector_search)) == 12
+    assert loaded.match(vector_search) == index.match(vector_search)
+    for query in ("ledger", "vector search", "rewritten"):
+        assert ranking(loaded, query) == ranking(index, query)
+
+
+def test_torn_last_log_entry_is_dropped(api, index):
+    api.upsert_memory([document(i) for i in range(30, 33)], index_name=index.name)
+    log_path = os.path.join(api.memory_index_dir(index.name), "log.ndjson")
+    size = os.path.getsize(log_path)
+    with open(log_path, "ab") as f:
+        f.write(b'{"seq": 99, "docs": [["doc-999", "half')
+
+    loaded = reload(api, index)
+    assert len(loaded) == 33
+    assert loaded.get("doc-999") is None
+    assert os.path.getsize(log_path) == size
+
+
+def test_unchanged_documents_are_not_logged(api, index):
+    logged = index.log_documents
+    written, unchanged = api.upsert_memory([document(i) for i in range(5)], index_name=index.name)
+    assert (written, unchanged) == (0, 5)
+    assert index.log_documents == logged
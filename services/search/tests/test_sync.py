@@ -0,0 +1,110 @@
+import pytest
+
+
+def document(i, content=None):
+    return {"id": f"doc-{i:02d}", "content": content or f"ledger entry {i}", "metadata": {"n": i}}
+
+
+def upsert(client, index_name, documents):
+    response = client.post("/upsert", json={"documents": documents, "index_name": index_name})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def delta(client, index_name, hashes):
+    response = client.post("/sync/delta", json={
+        "index_name": index_name,
+        "documents": [{"id": doc_id, "hash": doc_hash} for doc_id, doc_hash in hashes.items()],
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def hashes(api, documents):
+    return {doc["id"]: api.content_hash(doc["content"], doc["metadata"]) for doc in documents}
+
+
+def test_unchanged_documents_are_counted_and_not_rewritten(client, index_name):
+    documents = [document(i) for i in range(10)]
+    assert upsert(client, index_name, documents)["documents_unchanged"] == 0
+
+    again = upsert(client, index_name, documents[:6] + [document(8, "ledger entry rewritten")])
+    assert (again["documents_processed"], again["documents_unchanged"]) == (7, 6)
+
+    forced = client.post("/upsert", json={"documents": documents[:3], "index_name": index_name, "force": True}).json()
+    assert forced["documents_unchanged"] == 0
+
+
+def test_delta_lists_changed_and_missing_ids(api, client, index_name):
+    documents = [document(i) for i in range(10)]
+    upsert(client, index_name, documents)
+
+    local = hashes(api, documents)
+    local["doc-03"] = api.content_hash("edited locally", {"n": 3})
+    local["doc-07"] = "not-a-real-hash"
+    local.update(hashes(api, [document(i) for i in (10, 11)]))
+    result = delta(client, index_name, local)
+    assert result["needed"] == ["doc-03", "doc-07", "doc-10", "doc-11"]
+    assert (result["checked"], result["unchanged"]) == (12, 8)
+
+
+def test_caller_supplied_hashes_are_the_manifest(client, index_name):
+    upsert(client, index_name, [{**document(i), "hash": f"v1-{i}"} for i in range(3)])
+    assert delta(client, index_name, {"doc-00": "v1-0", "doc-01": "v2-1", "doc-02": "v1-2"})["needed"] == ["doc-01"]
+
+
+def test_delta_against_a_missing_index_needs_everything(api, client, index_name):
+    assert delta(client, index_name, hashes(api, [document(1), document(2)]))["needed"] == ["doc-01", "doc-02"]
+
+
+def test_manifest_survives_a_snapshot_reload(api, client, index_name, monkeypatch):
+    if api.SEARCH_BACKEND != "memory":
+        pytest.skip("the SQLite manifest is a table of the database itself")
+    documents = [document(i) for i in range(10)]
+    upsert(client, index_name, documents)
+    assert client.post("/snapshot", params={"index_name": index_name}).status_code == 200
+    # One more write that only the upsert log holds
+    documents[4] = document(4, "ledger entry after the snapshot")
+    upsert(client, index_name, documents[4:5])
+
+    live = api.get_memory_index(index_name)
+    live._log.close()
+    live._log = None
+    loaded = api.load_memory_index(api.memory_index_dir(index_name))
+    monkeypatch.setitem(api._memory_indexes, index_name, loaded)
+
+    assert loaded.document_hashes(list(hashes(api, documents))) == hashes(api, documents)
+    assert delta(client, index_name, hashes(api, documents))["needed"] == []
+    assert upsert(client, index_name, documents)["documents_unchanged"] == 10
+    loaded._log.close()
+    loaded._log = None
+
+
+class Interleaved:
+    """Wraps the embedder and runs ``between`` once, inside the next embed call"""
+
+    def __init__(self, embedder, between):
+        self.embedder, self.between = embedder, between
+        self.dim, self.name = embedder.dim, embedder.name
+
+    def embed(self, texts):
+        between, self.between = self.between, None
+        if between is not None:
+            between()
+        return self.embedder.embed(texts)
+
+
+def test_concurrent_change_is_not_skipped_as_unchanged(api, client, index_name, monkeypatch):
+    original, rewritten, fresh = document(1), document(1, "ledger entry rewritten"), document(2)
+    upsert(client, index_name, [original])
+
+    # Another upsert commits after this one's manifest check but before its write
+    embedder = Interleaved(api.get_embedder(), lambda: api.index_documents([rewritten], index_name))
+    monkeypatch.setattr(api, "_embedder", embedder)
+    written, unchanged = api.index_documents([original, fresh], index_name)
+
+    assert embedder.between is None
+    assert (written, unchanged) == (2, 0)
+    assert api.document_hashes(index_name, ["doc-01"]) == hashes(api, [original])
+    assert [hit["id"] for hit in client.post("/query", json={
+        "index_name": index_name, "query": "rewritten", "semantic_weight": 0}).json()["results"]] == []
@@ -0,0 +1,139 @@
+import os
+import threading
+
+import pytest
+from fastapi import FastAPI, HTTPException
+
+import telemetry
+from telemetry import Counter, Histogram, Telemetry
+
+SERVICES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+
+def samples(text):
+    """``{series: value}`` for every sample line of an exposition"""
+    return {line.rsplit(" ", 1)[0]: line.rsplit(" ", 1)[1] for line in text.splitlines() if not line.startswith("#")}
+
+
+@pytest.fixture
+def service():
+    """A small app instrumented like the services: one constant and one per-request label"""
+    metrics = Telemetry("svc", labels={"backend": "memory"}, request_labels=("strategy",))
+    app = FastAPI()
+    metrics.instrument(app)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: str, strategy: str = "plain"):
+        metrics.set_labels(strategy=strategy, unknown="ignored")
+        with metrics.stage("lookup"):
+            if item_id == "missing":
+                raise HTTPException(status_code=404, detail="no such item")
+        return {"id": item_id}
+
+    @app.get("/boom")
+    def boom():
+        with metrics.stage("parse"):
+            raise ValueError("bad input")
+
+    return app, metrics
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    histogram = Histogram("latency_seconds", "Latency", ("endpoint",), buckets=(0.5, 0.1, 1.0))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(value, endpoint="/q")
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{endpoint="/q",le="0.1"} 2',
+        'latency_seconds_bucket{endpoint="/q",le="0.5"} 3',
+        'latency_seconds_bucket{endpoint="/q",le="1"} 3',
+        'latency_seconds_bucket{endpoint="/q",le="+Inf"} 4',
+        'latency_seconds_sum{endpoint="/q"} 2.45',
+        'latency_seconds_count{endpoint="/q"} 4',
+    ]
+
+
+def test_counter_escapes_label_values_and_sorts_series():
+    counter = Counter("errors_total", "Errors", ("error",))
+    counter.inc(error='say "hi"\n')
+    counter.inc(2, error="a\\b")
+    assert counter.render()[2:] == [
+        'errors_total{error="a\\\\b"} 2',
+        'errors_total{error="say \\"hi\\"\\n"} 1',
+    ]
+
+
+def test_routes_are_labelled_by_path_template(service):
+    from fastapi.testclient import TestClient
+
+    app, metrics = service
+    client = TestClient(app)
+    for item_id in ("a", "b", "c"):
+        assert client.get(f"/items/{item_id}", params={"strategy": "react"}).status_code == 200
+    assert client.get("/nowhere").status_code == 404
+
+    series = samples(metrics.render())
+    assert series['svc_request_duration_seconds_count{endpoint="/items/{item_id}",method="GET",status="200",backend="memory",strategy="react"}'] == "3"
+    assert series['svc_request_errors_total{endpoint="unmatched",status="404",backend="memory",strategy=""}'] == "1"
+    assert series['svc_requests_in_flight{endpoint="/items/{item_id}",backend="memory"}'] == "0"
+    assert not any("/items/a" in name for name in series)
+
+
+def test_stage_and_error_counters(service):
+    from fastapi.testclient import TestClient
+
+    app, metrics = service
+    client = TestClient(app, raise_server_exceptions=False)
+    assert client.get("/items/missing").status_code == 404
+    assert client.get("/boom").status_code == 500
+
+    series = samples(metrics.render())
+    assert series['svc_stage_duration_seconds_count{endpoint="/items/{item_id}",stage="lookup",backend="memory",strategy="plain"}'] == "1"
+    assert series['svc_stage_errors_total{endpoint="/items/{item_id}",stage="lookup",error="HTTPException",backend="memory",strategy="plain"}'] == "1"
+    assert series['svc_stage_errors_total{endpoint="/boom",stage="parse",error="ValueError",backend="memory",strategy=""}'] == "1"
+    assert series['svc_request_errors_total{endpoint="/items/{item_id}",status="404",backend="memory",strategy="plain"}'] == "1"
+    assert series['svc_request_errors_total{endpoint="/boom",status="500",backend="memory",strategy=""}'] == "1"
+
+
+def test_stages_keep_the_request_labels_in_a_copied_context(service):
+    import contextvars
+
+    _, metrics = service
+    with metrics.stage("outside"):
+        pass
+    token = telemetry._request_labels.set({"endpoint": "/q", "backend": "memory"})
+    try:
+        metrics.set_labels(strategy="cot")
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(metrics.observe_stage, "queue_wait", 0.2))
+        worker.start()
+        worker.join()
+    finally:
+        telemetry._request_labels.reset(token)
+
+    series = samples(metrics.render())
+    assert series['svc_stage_duration_seconds_count{endpoint="background",stage="outside",backend="memory",strategy=""}'] == "1"
+    assert series['svc_stage_duration_seconds_sum{endpoint="/q",stage="queue_wait",backend="memory",strategy="cot"}'] == "0.2"
+
+
+def test_metrics_endpoint_serves_the_text_exposition_format(api):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(api.app)
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    assert "# TYPE search_request_duration_seconds histogram" in response.text
+    assert 'search_request_duration_seconds_count{endpoint="/health",method="GET",status="200"' in response.text
+
+
+def test_every_service_ships_the_same_telemetry_module():
+    copies = {}
+    for service in ("search", "roma-bridge", "dot-finance"):
+        path = os.path.join(SERVICES_DIR, service, "src", "telemetry.py")
+        if not os.path.exists(path):
+            pytest.skip(f"{service} is not checked out next to this service")
+        with open(path, "rb") as f:
+            copies[service] = f.read()
+    assert len(set(copies.values())) == 1, "telemetry.py copies differ; keep them identical"